@@ -0,0 +1,197 @@
+# analytics/aggregates.py
+"""
+Agregados del dashboard y de la vista 360 del cliente.
+
+Las consultas de cada panel son independientes entre sí, así que se lanzan a la
+vez en un pool acotado de hilos (cada hilo usa su propia conexión): la latencia
+queda en la de la consulta más lenta y no en la suma.
+
+No se usa el ORM async: en Django 5.0 cada consulta async pasa por
+sync_to_async(thread_sensitive=True), es decir, se ejecutan una detrás de otra
+en el mismo hilo. El pool funciona igual bajo WSGI y ASGI.
+"""
+import contextvars
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import close_old_connections, connections
+from django.db.models import Avg, Count, Max, Min, Q, Sum
+from django.utils import timezone
+
+from customers.models import Customer, CustomerContact
+from plans.models import PlanSubscription
+from visits.models import Visit, Assessment, TaskCompleted, MaterialUsed
+
+# Hilos para consultas concurrentes (1 = todo en serie, en el hilo del request)
+AGGREGATE_WORKERS = int(os.getenv("AGGREGATE_WORKERS", "4"))
+
+_executor = ThreadPoolExecutor(max_workers=max(AGGREGATE_WORKERS, 1), thread_name_prefix="aggregates")
+
+
+def _in_worker(fn):
+    # Mismo ciclo de vida que un request: respeta CONN_MAX_AGE y no deja conexiones rotas
+    close_old_connections()
+    try:
+        return fn()
+    finally:
+        close_old_connections()
+
+
+def run_concurrently(tasks):
+    """
+    {nombre: callable} -> {nombre: resultado}.
+
+    En serie si hay una sola tarea, si el pool está desactivado o si hay una
+    transacción abierta (otra conexión no vería sus cambios sin confirmar).
+    """
+    if (
+        len(tasks) < 2
+        or AGGREGATE_WORKERS < 2
+        or any(conn.in_atomic_block for conn in connections.all(initialized_only=True))
+    ):
+        return {name: fn() for name, fn in tasks.items()}
+    # copy_context: los hilos heredan el contextvar del router (réplica o primario)
+    futures = {
+        name: _executor.submit(contextvars.copy_context().run, _in_worker, fn)
+        for name, fn in tasks.items()
+    }
+    return {name: future.result() for name, future in futures.items()}
+
+
+# ---------------- Dashboard general ----------------
+
+def dashboard_overview(from_date, to_date, today=None):
+    today = today or timezone.localdate()
+    # OJO: aquí usamos start__date, no start_datetime
+    visits_qs = Visit.objects.filter(start__date__gte=from_date, start__date__lte=to_date)
+    # Si quieres que los técnicos vean solo sus visitas: filtrar aquí por user
+
+    def customers():
+        return Customer.objects.aggregate(total=Count("id"), active=Count("id", filter=Q(active=True)))
+
+    def subscriptions():
+        return PlanSubscription.objects.filter(active=True).aggregate(
+            active=Count("id"), revenue=Sum("plan__price")
+        )
+
+    def visit_totals():
+        return Visit.objects.aggregate(
+            planned_today=Count("id", filter=Q(start__date=today, status=Visit.Status.SCHEDULED)),
+            completed_today=Count("id", filter=Q(end__date=today, status=Visit.Status.COMPLETED)),
+            completed_range=Count("id", filter=Q(
+                start__date__gte=from_date, start__date__lte=to_date, status=Visit.Status.COMPLETED,
+            )),
+        )
+
+    def visits_by_status():
+        return list(visits_qs.values("status").annotate(count=Count("id")).order_by("status"))
+
+    def visits_by_day():
+        rows = visits_qs.values("start__date").annotate(count=Count("id")).order_by("start__date")
+        return [{"date": row["start__date"], "count": row["count"]} for row in rows]
+
+    r = run_concurrently({
+        "customers": customers,
+        "subscriptions": subscriptions,
+        "visit_totals": visit_totals,
+        "visits_by_status": visits_by_status,
+        "visits_by_day": visits_by_day,
+    })
+    return {
+        "range": {"from": from_date, "to": to_date},
+        "totals": {
+            "total_customers": r["customers"]["total"],
+            "active_customers": r["customers"]["active"],
+            "active_subscriptions": r["subscriptions"]["active"],
+            "visits_planned_today": r["visit_totals"]["planned_today"],
+            "visits_completed_today": r["visit_totals"]["completed_today"],
+            "visits_completed_range": r["visit_totals"]["completed_range"],
+            "estimated_monthly_revenue": r["subscriptions"]["revenue"] or 0,
+        },
+        "charts": {
+            "visits_by_status": r["visits_by_status"],
+            "visits_by_day": r["visits_by_day"],
+        },
+    }
+
+
+# ---------------- Vista 360 de un cliente ----------------
+
+def customer_overview(customer_id, now=None):
+    now = now or timezone.now()
+    visits = Visit.active_objects.filter(subscription__customer_id=customer_id)
+    # hijos de visitas activas del cliente
+    of_customer = {"visit__subscription__customer_id": customer_id, "visit__active": True}
+
+    def contacts():
+        return CustomerContact.active_objects.filter(customer_id=customer_id).aggregate(
+            total=Count("id"), main=Max("id", filter=Q(is_main=True))
+        )
+
+    def subscription():
+        # la activa, por el índice único de active_for_customer
+        return (
+            PlanSubscription.active_objects.filter(active_for_customer=customer_id)
+            .values("id", "plan_id", "plan__name", "plan__price", "start_date", "recurrence")
+            .first()
+        )
+
+    def subscriptions_by_status():
+        rows = (
+            PlanSubscription.active_objects.filter(customer_id=customer_id)
+            .values("status").annotate(count=Count("id")).order_by("status")
+        )
+        return {row["status"]: row["count"] for row in rows}
+
+    def visit_totals():
+        return visits.aggregate(
+            total=Count("id"),
+            scheduled=Count("id", filter=Q(status=Visit.Status.SCHEDULED)),
+            in_progress=Count("id", filter=Q(status=Visit.Status.IN_PROGRESS)),
+            completed=Count("id", filter=Q(status=Visit.Status.COMPLETED)),
+            canceled=Count("id", filter=Q(status=Visit.Status.CANCELED)),
+            last_completed=Max("start", filter=Q(status=Visit.Status.COMPLETED)),
+            next_scheduled=Min("start", filter=Q(status=Visit.Status.SCHEDULED, start__gte=now)),
+        )
+
+    def work():
+        return TaskCompleted.active_objects.filter(completada=True, **of_customer).aggregate(
+            tasks_completed=Count("id"), hours=Sum("hours")
+        )
+
+    def materials():
+        return MaterialUsed.active_objects.filter(**of_customer).aggregate(
+            count=Count("id"), cost=Sum("unit_cost")
+        )
+
+    def rating():
+        return Assessment.active_objects.filter(**of_customer).aggregate(
+            average=Avg("rating"), count=Count("id")
+        )
+
+    r = run_concurrently({
+        "contacts": contacts,
+        "subscription": subscription,
+        "subscriptions_by_status": subscriptions_by_status,
+        "visit_totals": visit_totals,
+        "work": work,
+        "materials": materials,
+        "rating": rating,
+    })
+    average = r["rating"]["average"]
+    return {
+        "contacts": {"total": r["contacts"]["total"], "main_contact_id": r["contacts"]["main"]},
+        "subscription": r["subscription"],
+        "subscriptions_by_status": r["subscriptions_by_status"],
+        "visits": r["visit_totals"],
+        "work": {
+            "tasks_completed": r["work"]["tasks_completed"],
+            "hours": r["work"]["hours"] or 0,
+            "materials_used": r["materials"]["count"],
+            "materials_cost": r["materials"]["cost"] or 0,
+        },
+        "rating": {
+            "average": round(average, 2) if average is not None else None,
+            "count": r["rating"]["count"],
+        },
+    }
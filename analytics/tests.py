@@ -1,3 +1,122 @@
-from django.test import TestCase
+import threading
+import time
+from datetime import date, timedelta
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.test import AsyncClient, TransactionTestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from analytics import aggregates
+from customers.models import Customer, CustomerContact
+from plans.models import Plan, PlanTask, PlanSubscription
+from users.models import User
+from visits.models import Visit, Assessment, TaskCompleted, MaterialUsed
+
+
+# TransactionTestCase: los hilos del pool usan otra conexión y solo ven datos confirmados
+class ConcurrentAggregatesTests(TransactionTestCase):
+    databases = "__all__"  # con réplica configurada, los GET leen de ella (core/db/routers.py)
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="admin", email="admin@x.com", password="x", is_staff=True)
+        self.customer = Customer.objects.create(name="ACME", identification="1-111")
+        Customer.objects.create(name="Baja", identification="2-222", active=False)
+        self.contact = CustomerContact.objects.create(
+            customer=self.customer, name="Ana", email="ana@x.com", phone="1", is_main=True
+        )
+        plan = Plan.objects.create(name="Básico", price=100)
+        task = PlanTask.objects.create(plan=plan, name="Limpieza")
+        self.sub = PlanSubscription.objects.create(
+            customer=self.customer, plan=plan, start_date=date.today(), status="active"
+        )
+        now = timezone.now()
+        done = Visit.objects.create(
+            subscription=self.sub, user=self.user, start=now - timedelta(days=1), end=now,
+            status=Visit.Status.COMPLETED,
+        )
+        Visit.objects.create(subscription=self.sub, user=self.user, start=now + timedelta(days=2))
+        TaskCompleted.objects.create(visit=done, plan_task=task, name="Limpieza", hours=3, completada=True)
+        MaterialUsed.objects.create(visit=done, description="Cable", unit_cost=5)
+        MaterialUsed.objects.create(visit=done, description="Tornillos", unit_cost="2.50")
+        Assessment.objects.create(visit=done, rating=4)
+
+    def test_independent_tasks_overlap(self):
+        threads = []
+
+        def slow():
+            threads.append(threading.current_thread().name)
+            time.sleep(0.2)
+            return True
+
+        started = time.perf_counter()
+        out = aggregates.run_concurrently({f"t{i}": slow for i in range(4)})
+        elapsed = time.perf_counter() - started
+
+        self.assertEqual(out, {f"t{i}": True for i in range(4)})
+        self.assertLess(elapsed, 0.6)  # ~0.2 s en paralelo, 0.8 s en serie
+        self.assertTrue(all(name.startswith("aggregates") for name in threads), threads)
+
+    def test_serial_inside_transaction(self):
+        with transaction.atomic():
+            out = aggregates.run_concurrently({
+                "a": lambda: threading.current_thread().name,
+                "b": lambda: Customer.objects.count(),
+            })
+        self.assertEqual(out["a"], threading.current_thread().name)
+        self.assertEqual(out["b"], 2)
+
+    def test_concurrent_and_serial_results_match(self):
+        concurrent = aggregates.customer_overview(self.customer.pk)
+        with mock.patch.object(aggregates, "AGGREGATE_WORKERS", 1):
+            serial = aggregates.customer_overview(self.customer.pk)
+        self.assertEqual(concurrent, serial)
+        self.assertEqual(concurrent["visits"]["completed"], 1)
+        self.assertEqual(concurrent["work"]["hours"], 3)
+        self.assertEqual(concurrent["rating"]["average"], 4)
+
+    def _check_dashboard(self, data):
+        totals = data["totals"]
+        self.assertEqual(totals["total_customers"], 2)
+        self.assertEqual(totals["active_customers"], 1)
+        self.assertEqual(totals["active_subscriptions"], 1)
+        self.assertEqual(float(totals["estimated_monthly_revenue"]), 100)
+
+    def _check_customer_overview(self, data):
+        self.assertEqual(data["customer"]["id"], self.customer.pk)
+        self.assertEqual(data["contacts"], {"total": 1, "main_contact_id": self.contact.pk})
+        self.assertEqual(data["subscription"]["id"], self.sub.pk)
+        self.assertEqual(data["visits"]["total"], 2)
+        self.assertEqual(data["visits"]["scheduled"], 1)
+        self.assertEqual(data["work"]["materials_used"], 2)
+        self.assertEqual(float(data["work"]["materials_cost"]), 7.5)
+
+    def test_wsgi(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        resp = client.get("/api/dashboard/overview/")
+        self.assertEqual(resp.status_code, 200, resp.content)
+        self._check_dashboard(resp.json())
+
+        resp = client.get(f"/api/customers/{self.customer.pk}/overview/")
+        self.assertEqual(resp.status_code, 200, resp.content)
+        self._check_customer_overview(resp.json())
+
+    async def test_asgi(self):
+        token = await self._access_token()
+        client, auth = AsyncClient(), {"Authorization": f"Bearer {token}"}
+
+        resp = await client.get("/api/dashboard/overview/", headers=auth)
+        self.assertEqual(resp.status_code, 200, resp.content)
+        self._check_dashboard(resp.json())
+
+        resp = await client.get(f"/api/customers/{self.customer.pk}/overview/", headers=auth)
+        self.assertEqual(resp.status_code, 200, resp.content)
+        self._check_customer_overview(resp.json())
+
+    async def _access_token(self):
+        return await sync_to_async(lambda: str(RefreshToken.for_user(self.user).access_token))()
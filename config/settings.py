@@ -62,6 +62,10 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.MemoryMiddleware',
+    'core.middleware.ProfilingMiddleware',  # ?_profile=1 / X-Profile: 1 (staff)
+    'core.middleware.ReplicaRoutingMiddleware',
+    'core.middleware.NPlusOneMiddleware',  # solo con NPLUSONE=1
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -89,18 +93,62 @@ WSGI_APPLICATION = 'config.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Pool de conexiones por worker (core/db/pool.py); DB_POOL_SIZE=0 lo desactiva
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+
 DATABASES = {
     "default": {
-        "ENGINE": "django.db.backends.mysql",
+        "ENGINE": "core.db.backends.mysql",
         "NAME": os.getenv("MYSQL_DATABASE", "hidalgo_db"),
         "USER": os.getenv("MYSQL_USER", "hidalgo"),
         "PASSWORD": os.getenv("MYSQL_PASSWORD", "H1dalgo!2025"),
         "HOST": os.getenv("MYSQL_HOST", "127.0.0.1"),
         "PORT": int(os.getenv("MYSQL_PORT", "3306")),
         "OPTIONS": {"charset": "utf8mb4", "use_unicode": True},
+        # Con pool, cerrar al final del request solo devuelve la conexión al pool;
+        # sin pool, cada hilo conserva la suya DB_CONN_MAX_AGE segundos.
+        "CONN_MAX_AGE": int(os.getenv("DB_CONN_MAX_AGE", "0" if DB_POOL_SIZE else "60")),
+        "CONN_HEALTH_CHECKS": True,
+        "POOL": {
+            "MAX_SIZE": DB_POOL_SIZE,
+            "TIMEOUT": float(os.getenv("DB_POOL_TIMEOUT", "5")),
+            "CHECK_IDLE": float(os.getenv("DB_POOL_CHECK_IDLE", "30")),
+            # por debajo del wait_timeout del servidor MySQL
+            "MAX_LIFETIME": float(os.getenv("DB_POOL_MAX_LIFETIME", "1800")),
+        },
     }
 }
 
+# Réplica de lectura (opcional): GET de viewsets, dashboard y exportes (core/db/routers.py)
+if os.getenv("MYSQL_REPLICA_HOST"):
+    DATABASES["replica"] = {
+        **DATABASES["default"],
+        "HOST": os.getenv("MYSQL_REPLICA_HOST"),
+        "PORT": int(os.getenv("MYSQL_REPLICA_PORT", DATABASES["default"]["PORT"])),
+        "USER": os.getenv("MYSQL_REPLICA_USER", DATABASES["default"]["USER"]),
+        "PASSWORD": os.getenv("MYSQL_REPLICA_PASSWORD", DATABASES["default"]["PASSWORD"]),
+        "TEST": {"MIRROR": "default"},
+    }
+
+DATABASE_ROUTERS = ["core.db.routers.ReplicaRouter"]
+
+# Cache de Django: typeahead, read-your-writes y cache de consultas (core/querycache.py).
+# Con varios workers conviene uno compartido (REDIS_URL, requiere el paquete redis).
+if os.getenv("REDIS_URL"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.getenv("REDIS_URL"),
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "OPTIONS": {"MAX_ENTRIES": 10000},
+        }
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -152,6 +200,20 @@ REST_FRAMEWORK = {
     "DEFAULT_FILTER_BACKENDS": ["django_filters.rest_framework.DjangoFilterBackend"],
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
     "PAGE_SIZE": 10,
+    # JSON con orjson y MessagePack para la app móvil (core/renderers.py), por Accept / Content-Type
+    "DEFAULT_RENDERER_CLASSES": [
+        "core.renderers.ORJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+        "core.renderers.MessagePackRenderer",
+        "core.renderers.XMessagePackRenderer",
+    ],
+    "DEFAULT_PARSER_CLASSES": [
+        "core.renderers.ORJSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+        "core.renderers.MessagePackParser",
+        "core.renderers.XMessagePackParser",
+    ],
 
 }
 
@@ -164,6 +226,9 @@ AUTHENTICATION_BACKENDS = [
 MEDIA_URL = "/media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 
+# Perfiles de requests pedidos con ?_profile=1 (core/profiling.py)
+PROFILES_DIR = os.getenv("PROFILES_DIR", os.path.join(BASE_DIR, "profiles"))
+
 
 # Send email after complete a visit...
 
@@ -200,5 +265,9 @@ LOGGING = {
             "handlers": ["console"],
             "level": "DEBUG",
         },
+        "core.nplusone": {
+            "handlers": ["console"],
+            "level": "WARNING",
+        },
     },
 }
\ No newline at end of file
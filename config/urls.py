@@ -8,6 +8,10 @@ from users.views import EmailTokenObtainPairView
 from django.conf import settings
 from django.conf.urls.static import static
 from analytics.views import DashboardOverviewView
+from core.views import (
+    ImportView, MemorySnapshotDiffView, MemorySnapshotListView, MetricsView, NPlusOneReportView,
+    ProfileDetailView, ProfileListView, SearchView, SyncView, TypeaheadView,
+)
 
 
 schema_view = get_schema_view(
@@ -26,6 +30,16 @@ urlpatterns = [
     path("api/", include("plans.urls")),
     path("api/", include("visits.urls")),
     path("api/dashboard/overview/", DashboardOverviewView.as_view(), name="dashboard-overview"),
+    path("api/sync/", SyncView.as_view(), name="sync"),
+    path("api/search/", SearchView.as_view(), name="search"),
+    path("api/typeahead/<str:kind>/", TypeaheadView.as_view(), name="typeahead"),
+    path("api/import/<str:resource>/", ImportView.as_view(), name="import"),
+    path("api/metrics/", MetricsView.as_view(), name="metrics"),
+    path("api/nplusone/", NPlusOneReportView.as_view(), name="nplusone"),
+    path("api/profiles/", ProfileListView.as_view(), name="profiles"),
+    path("api/profiles/<str:profile_id>/", ProfileDetailView.as_view(), name="profile-detail"),
+    path("api/memory/snapshots/", MemorySnapshotListView.as_view(), name="memory-snapshots"),
+    path("api/memory/snapshots/<int:snapshot_id>/diff/", MemorySnapshotDiffView.as_view(), name="memory-snapshot-diff"),
 
     # JWT    path('api/auth/token/', EmailTokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('api/auth/token/', EmailTokenObtainPairView.as_view(), name='token_obtain_pair'),
@@ -4,3 +4,17 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        # Mantiene el índice de búsqueda global al día (core/search.py)
+        from .signals import connect_search_signals, connect_typeahead_signals
+        connect_search_signals()
+        # y los índices de autocompletado en memoria (core/typeahead.py)
+        connect_typeahead_signals()
+        # versiones por tabla del cache de consultas (core/querycache.py)
+        from django.db.backends.signals import connection_created
+        from .querycache import install_write_tracking
+        connection_created.connect(install_write_tracking, dispatch_uid="querycache_write_tracking")
+        # tracemalloc solo con MEMORY_DEBUG=1 (core/memory.py)
+        from .memory import start_tracing
+        start_tracing()
@@ -0,0 +1,304 @@
+# core/bulk.py
+import os
+
+from django.db import connections, router, transaction
+from django.utils import timezone
+from rest_framework import serializers, decorators, permissions, response, status
+from rest_framework.exceptions import ValidationError
+
+from .querycache import cacheable
+
+DISABLE_AUTH = os.getenv("DISABLE_AUTH", "0") == "1"
+
+# Tamaño de lote para INSERT/UPDATE masivos
+BULK_BATCH_SIZE = 500
+# Límite de ítems por request masivo
+BULK_MAX_ITEMS = 1000
+
+
+def _actor_or_none(request):
+    u = getattr(request, "user", None)
+    return u if (u and getattr(u, "is_authenticated", False)) else None
+
+
+def _mysql_autoinc(connection):
+    """
+    (auto_increment_increment, innodb_autoinc_lock_mode) de la sesión, leídos una
+    vez por conexión. Con Galera / multi-primario el paso no es 1.
+    """
+    cached = getattr(connection, "_bulk_autoinc", None)
+    if cached is None:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT @@auto_increment_increment, @@innodb_autoinc_lock_mode")
+            step, lock_mode = cursor.fetchone()
+        cached = connection._bulk_autoinc = (int(step or 1), int(lock_mode or 0))
+    return cached
+
+
+def bulk_create_with_pks(model, objs, batch_size=BULK_BATCH_SIZE, using=None):
+    """
+    bulk_create que deja los pk asignados también en MySQL.
+
+    - Backends con RETURNING (SQLite, Postgres, MariaDB>=10.5): bulk_create normal.
+    - MySQL con innodb_autoinc_lock_mode 0 ó 1: un INSERT multi-fila por lote +
+      LAST_INSERT_ID(); InnoDB reserva el bloque de una vez y los ids van de
+      auto_increment_increment en auto_increment_increment.
+    - MySQL en modo "interleaved" (2): el bloque no está garantizado, así que se
+      inserta de a una fila y cada pk sale de su propio LAST_INSERT_ID().
+    """
+    if not objs:
+        return objs
+    using = using or router.db_for_write(model)
+    connection = connections[using]
+    manager = model._base_manager.db_manager(using)
+
+    if connection.features.can_return_rows_from_bulk_insert or connection.vendor != "mysql":
+        return manager.bulk_create(objs, batch_size=batch_size)
+
+    step, lock_mode = _mysql_autoinc(connection)
+    if lock_mode >= 2:
+        batch_size = 1
+    with transaction.atomic(using=using, savepoint=False):
+        for i in range(0, len(objs), batch_size):
+            batch = objs[i:i + batch_size]
+            manager.bulk_create(batch)
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT LAST_INSERT_ID()")
+                first_id = cursor.fetchone()[0]
+            for offset, obj in enumerate(batch):
+                obj.pk = first_id + offset * step
+                obj._state.adding = False
+                obj._state.db = using
+    return objs
+
+
+def _is_id(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+class PreloadedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    PrimaryKeyRelatedField que, dentro de un BulkListSerializer, resuelve el pk
+    contra un diccionario precargado (una consulta por campo para todo el lote)
+    en lugar de un .get() por ítem.
+    """
+
+    def get_queryset(self):
+        # datos de referencia (planes, clientes, usuarios...): .get() por pk desde el cache
+        return cacheable(super().get_queryset())
+
+    def to_internal_value(self, data):
+        preloaded = getattr(self.parent, "_preloaded", None) or {}
+        cache = preloaded.get(self.field_name)
+        if cache is None:
+            return super().to_internal_value(data)
+
+        if self.pk_field is not None:
+            data = self.pk_field.to_internal_value(data)
+        if isinstance(data, bool):
+            self.fail("incorrect_type", data_type=type(data).__name__)
+        try:
+            pk = self.get_queryset().model._meta.pk.to_python(data)
+        except Exception:
+            self.fail("incorrect_type", data_type=type(data).__name__)
+        obj = cache.get(pk)
+        if obj is None:
+            self.fail("does_not_exist", pk_value=data)
+        return obj
+
+
+class BulkListSerializer(serializers.ListSerializer):
+    """
+    ListSerializer para altas / ediciones masivas:
+    - precarga las FK del lote (in_bulk) antes de validar
+    - create() -> bulk_create (con pks)
+    - update() -> bulk_update sobre las instancias pasadas en instance=[...]
+    """
+
+    def _preload_related(self, data):
+        preloaded = {}
+        for name, field in self.child.fields.items():
+            if not isinstance(field, PreloadedPrimaryKeyRelatedField) or field.read_only:
+                continue
+            model = field.get_queryset().model
+            ids = set()
+            for item in data:
+                if not isinstance(item, dict) or item.get(name) in (None, ""):
+                    continue
+                try:
+                    ids.add(model._meta.pk.to_python(item[name]))
+                except Exception:
+                    continue
+            preloaded[name] = field.get_queryset().in_bulk(ids) if ids else {}
+        self.child._preloaded = preloaded
+
+    def to_internal_value(self, data):
+        if isinstance(data, list):
+            self._preload_related(data)
+        try:
+            return super().to_internal_value(data)
+        finally:
+            self.child._preloaded = None
+
+    def partition(self, data):
+        """
+        Valida ítem por ítem con las FK del lote precargadas, sin cortar en el primer
+        error: [(attrs, None) | (None, errores), ...] alineada con data.
+        """
+        self._preload_related(data)
+        try:
+            out = []
+            for item in data:
+                try:
+                    out.append((self.run_child_validation(item), None))
+                except ValidationError as exc:
+                    out.append((None, exc.detail))
+            return out
+        finally:
+            self.child._preloaded = None
+
+    def run_child_validation(self, data):
+        # En update masivo cada ítem se valida contra su propia instancia
+        instances = getattr(self, "_instances_by_pk", None)
+        if instances is not None:
+            self.child.instance = instances.get(data.get("id")) if isinstance(data, dict) else None
+        return super().run_child_validation(data)
+
+    def create(self, validated_data):
+        model = self.child.Meta.model
+        objs = [model(**attrs) for attrs in validated_data]
+        with transaction.atomic():
+            bulk_create_with_pks(model, objs)
+        return objs
+
+    def update(self, instances, validated_data):
+        model = self.child.Meta.model
+        now = timezone.now()
+        fields = {"updated_at"}
+        for obj, attrs in zip(instances, validated_data):
+            for attr, value in attrs.items():
+                setattr(obj, attr, value)
+                fields.add(attr)
+            obj.updated_at = now
+        with transaction.atomic():
+            model._base_manager.bulk_update(instances, sorted(fields), batch_size=BULK_BATCH_SIZE)
+        return instances
+
+
+def _item_errors(errors):
+    """Convierte ser.errors (lista alineada a los ítems) a [{index, errors}] solo con los fallidos."""
+    return [{"index": i, "errors": e} for i, e in enumerate(errors) if e]
+
+
+class BulkWriteMixin:
+    """
+    Mixin para ModelViewSet de hijos de visita:
+    - POST   /<recurso>/        acepta un objeto o un arreglo JSON (alta masiva)
+    - PATCH  /<recurso>/bulk/   [{id, ...campos}]   (edición masiva)
+    - DELETE /<recurso>/bulk/   [id, ...] o [{id}]  (soft-delete masivo)
+
+    Todo en una sola transacción; los errores se reportan por índice del arreglo.
+    Las ediciones masivas no pueden mover un ítem a otro padre (bulk_parent_field).
+    """
+    bulk_parent_field = "visit"
+
+    def _check_bulk_payload(self, data):
+        if not isinstance(data, list):
+            raise ValidationError({"detail": "Se esperaba un arreglo JSON."})
+        if not data:
+            raise ValidationError({"detail": "El arreglo está vacío."})
+        if len(data) > BULK_MAX_ITEMS:
+            raise ValidationError({"detail": f"Máximo {BULK_MAX_ITEMS} ítems por solicitud."})
+
+    def bulk_create_items(self, request, items, **save_kwargs):
+        self._check_bulk_payload(items)
+        ser = self.get_serializer(data=items, many=True)
+        if not ser.is_valid():
+            return response.Response({"errors": _item_errors(ser.errors)}, status=status.HTTP_400_BAD_REQUEST)
+
+        actor = _actor_or_none(request)
+        if actor:
+            save_kwargs.update(created_by=actor, updated_by=actor)
+        with transaction.atomic():
+            objs = ser.save(**save_kwargs)
+        out = self.get_serializer(objs, many=True)
+        return response.Response(out.data, status=status.HTTP_201_CREATED)
+
+    def bulk_update_items(self, request, items, queryset):
+        self._check_bulk_payload(items)
+        ids = [item.get("id") if isinstance(item, dict) else None for item in items]
+        invalid = [
+            {"index": idx, "errors": {"id": ["Debe ser un id numérico."]}}
+            for idx, pk in enumerate(ids) if not _is_id(pk)
+        ]
+        if invalid:
+            return response.Response({"errors": invalid}, status=status.HTTP_400_BAD_REQUEST)
+        instances = queryset.in_bulk(ids)
+
+        errors = []
+        for idx, (pk, item) in enumerate(zip(ids, items)):
+            obj = instances.get(pk)
+            if obj is None:
+                errors.append({"index": idx, "errors": {"id": ["No encontrado."]}})
+            elif self._moves_parent(obj, item):
+                message = "No se puede cambiar en una edición masiva."
+                errors.append({"index": idx, "errors": {self.bulk_parent_field: [message]}})
+        if errors:
+            return response.Response({"errors": errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        ordered = [instances[pk] for pk in ids]
+        ser = self.get_serializer(ordered, data=items, many=True, partial=True)
+        ser._instances_by_pk = instances
+        if not ser.is_valid():
+            return response.Response({"errors": _item_errors(ser.errors)}, status=status.HTTP_400_BAD_REQUEST)
+
+        actor = _actor_or_none(request)
+        with transaction.atomic():
+            objs = ser.save(**({"updated_by": actor} if actor else {}))
+        out = self.get_serializer(objs, many=True)
+        return response.Response(out.data, status=status.HTTP_200_OK)
+
+    def _moves_parent(self, obj, item):
+        """El ítem trae otro padre (p.ej. otra visita): moverlo no es una edición del lote."""
+        field = self.bulk_parent_field
+        if field not in item:
+            return False
+        return str(item[field]) != str(getattr(obj, f"{field}_id"))
+
+    def bulk_soft_delete_items(self, request, items, queryset):
+        self._check_bulk_payload(items)
+        ids = [item.get("id") if isinstance(item, dict) else item for item in items]
+        errors = [
+            {"index": idx, "errors": {"id": ["Debe ser un id numérico."]}}
+            for idx, pk in enumerate(ids) if not _is_id(pk)
+        ]
+        if errors:
+            return response.Response({"errors": errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        actor = _actor_or_none(request)
+        changes = {"active": False, "updated_at": timezone.now()}
+        if actor:
+            changes["updated_by"] = actor
+        with transaction.atomic():
+            found = set(queryset.filter(pk__in=ids).values_list("pk", flat=True))
+            queryset.model._base_manager.filter(pk__in=found).update(**changes)
+
+        not_found = [pk for pk in ids if pk not in found]
+        return response.Response({"deleted": len(found), "not_found": not_found}, status=status.HTTP_200_OK)
+
+    # ---- POST sobre la colección: objeto o arreglo ----
+    def create(self, request, *args, **kwargs):
+        if isinstance(request.data, list):
+            return self.bulk_create_items(request, request.data)
+        return super().create(request, *args, **kwargs)
+
+    @decorators.action(
+        detail=False,
+        methods=["patch", "delete"],
+        url_path="bulk",
+        permission_classes=[permissions.AllowAny] if DISABLE_AUTH else [permissions.IsAuthenticated],
+    )
+    def bulk(self, request):
+        if request.method.lower() == "patch":
+            return self.bulk_update_items(request, request.data, self.get_queryset())
+        return self.bulk_soft_delete_items(request, request.data, self.get_queryset())
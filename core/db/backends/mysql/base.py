@@ -0,0 +1,11 @@
+# core/db/backends/mysql/base.py
+"""ENGINE "core.db.backends.mysql": el backend MySQL de Django con pool (core/db/pool.py)."""
+from django.db.backends.mysql import base
+
+from core.db.pool import PooledDatabaseWrapperMixin
+
+
+class DatabaseWrapper(PooledDatabaseWrapperMixin, base.DatabaseWrapper):
+    def ping_connection(self, raw):
+        # sin reconnect: una conexión caída se descarta y el pool abre otra
+        raw.ping()
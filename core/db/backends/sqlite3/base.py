@@ -0,0 +1,11 @@
+# core/db/backends/sqlite3/base.py
+"""ENGINE "core.db.backends.sqlite3": SQLite con el mismo pool, para tests y benchmarks locales."""
+from django.db.backends.sqlite3 import base
+
+from core.db.pool import PooledDatabaseWrapperMixin
+
+
+class DatabaseWrapper(PooledDatabaseWrapperMixin, base.DatabaseWrapper):
+    def pooling_enabled(self):
+        # una BD en memoria vive lo que su conexión; Django ya la mantiene abierta
+        return not self.is_in_memory_db() and super().pooling_enabled()
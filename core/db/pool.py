@@ -0,0 +1,283 @@
+# core/db/pool.py
+"""
+Pool acotado de conexiones a la BD, compartido por todos los hilos de un worker.
+
+Django abre una conexión por hilo y, sin CONN_MAX_AGE, la cierra al final de
+cada request (TCP + auth + charset en cada uno). Los hilos de correo y el pool
+de agregados abren además las suyas. Con los backends de core/db/backends:
+
+- connect() pide una conexión al pool en vez de abrir una nueva;
+- close() (fin de request, close_old_connections(), connections.close_all())
+  la devuelve al pool si quedó sana, fuera de transacción;
+- como mucho POOL["MAX_SIZE"] conexiones por worker (en uso + libres); si no hay
+  libre, se espera hasta POOL["TIMEOUT"] segundos (esas esperas son la métrica
+  clave: si crecen, el pool es chico para el número de hilos);
+- health check al prestar una conexión que estuvo ociosa más de
+  POOL["CHECK_IDLE"] segundos, y reciclado al pasar POOL["MAX_LIFETIME"]
+  (por debajo del wait_timeout de MySQL).
+
+Configuración en DATABASES[alias]["POOL"]; MAX_SIZE = 0 lo desactiva.
+"""
+import os
+import threading
+import time
+
+from django.db.utils import OperationalError
+
+POOL_DEFAULTS = {
+    "MAX_SIZE": 10,
+    "TIMEOUT": 5.0,
+    "CHECK_IDLE": 30.0,
+    "MAX_LIFETIME": 1800.0,
+}
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class PoolTimeout(OperationalError):
+    pass
+
+
+class _Slot:
+    __slots__ = ("raw", "created_at", "released_at")
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.created_at = self.released_at = time.monotonic()
+
+
+class ConnectionPool:
+    """
+    connect: () -> conexión DB-API nueva
+    ping:    (conexión) -> None; lanza excepción si la conexión no sirve
+    """
+
+    def __init__(self, name, connect, ping, max_size=10, timeout=5.0, check_idle=30.0, max_lifetime=1800.0):
+        self.name = name
+        self._connect = connect
+        self._ping = ping
+        self.max_size = max_size
+        self.timeout = timeout
+        self.check_idle = check_idle
+        self.max_lifetime = max_lifetime
+        self._cond = threading.Condition()
+        self._idle = []             # pila LIFO: la más reciente sigue caliente
+        self._in_use = {}           # id(raw) -> _Slot
+        self._pending = 0           # cupos reservados mientras se abre una conexión
+        self._pid = os.getpid()
+        self._stats = dict.fromkeys((
+            "acquired", "created", "reused", "waits", "timeouts",
+            "health_checks", "broken", "recycled", "discarded",
+        ), 0)
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    # ---------- préstamo ----------
+    def acquire(self):
+        self._check_fork()
+        started = None
+        with self._cond:
+            while True:
+                slot = self._pop_idle()
+                if slot is not None:
+                    break
+                if len(self._in_use) + len(self._idle) + self._pending < self.max_size:
+                    self._pending += 1
+                    break
+                now = time.monotonic()
+                if started is None:
+                    started = now
+                    self._stats["waits"] += 1
+                remaining = self.timeout - (now - started)
+                if remaining <= 0:
+                    self._stats["timeouts"] += 1
+                    self._record_wait(now - started)
+                    raise PoolTimeout(
+                        f"Pool '{self.name}': sin conexiones libres tras {self.timeout:g}s "
+                        f"(máximo {self.max_size})."
+                    )
+                self._cond.wait(remaining)
+            if started is not None:
+                self._record_wait(time.monotonic() - started)
+            self._stats["acquired"] += 1
+
+        if slot is not None:
+            if self._healthy(slot):
+                with self._cond:
+                    self._pending -= 1
+                    self._in_use[id(slot.raw)] = slot
+                    self._stats["reused"] += 1
+                return slot.raw
+            # rota: el cupo reservado en _pop_idle pasa a la conexión nueva
+
+        # conexión nueva (fuera del lock: el connect es lo lento)
+        try:
+            raw = self._connect()
+        except Exception:
+            with self._cond:
+                self._pending -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._pending -= 1
+            self._in_use[id(raw)] = _Slot(raw)
+            self._stats["created"] += 1
+        return raw
+
+    def _pop_idle(self):
+        # con el lock tomado; la ociosa devuelta deja su cupo reservado en _pending
+        # mientras se hace el health check fuera del lock
+        now = time.monotonic()
+        while self._idle:
+            slot = self._idle.pop()
+            if now - slot.created_at < self.max_lifetime:
+                self._pending += 1
+                return slot
+            self._stats["recycled"] += 1
+            _quiet_close(slot.raw)
+        return None
+
+    def _healthy(self, slot):
+        if time.monotonic() - slot.released_at < self.check_idle:
+            return True
+        with self._cond:
+            self._stats["health_checks"] += 1
+        try:
+            self._ping(slot.raw)
+            return True
+        except Exception:
+            with self._cond:
+                self._stats["broken"] += 1
+            _quiet_close(slot.raw)
+            return False
+
+    def _record_wait(self, seconds):
+        self._wait_total += seconds
+        self._wait_max = max(self._wait_max, seconds)
+
+    # ---------- devolución ----------
+    def release(self, raw, reusable=True):
+        with self._cond:
+            slot = self._in_use.pop(id(raw), None)
+            if slot is None:
+                reusable = False  # no es del pool (p.ej. creada antes de un fork)
+            elif reusable and time.monotonic() - slot.created_at < self.max_lifetime:
+                slot.released_at = time.monotonic()
+                self._idle.append(slot)
+                self._cond.notify()
+                return
+            elif reusable:
+                self._stats["recycled"] += 1
+            else:
+                self._stats["discarded"] += 1
+            self._cond.notify()
+        _quiet_close(raw)
+
+    def close_idle(self):
+        with self._cond:
+            idle, self._idle = self._idle, []
+        for slot in idle:
+            _quiet_close(slot.raw)
+
+    def _check_fork(self):
+        # gunicorn --preload: las conexiones del padre no se comparten con los hijos
+        if self._pid != os.getpid():
+            with self._cond:
+                self._idle, self._in_use, self._pending = [], {}, 0
+                self._pid = os.getpid()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "max_size": self.max_size,
+                "in_use": len(self._in_use) + self._pending,
+                "idle": len(self._idle),
+                **self._stats,
+                "wait_seconds_total": round(self._wait_total, 4),
+                "wait_seconds_max": round(self._wait_max, 4),
+            }
+
+
+def _quiet_close(raw):
+    try:
+        raw.close()
+    except Exception:
+        pass
+
+
+def get_pool(key, name, connect, ping, options):
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            opts = {**POOL_DEFAULTS, **(options or {})}
+            pool = _pools[key] = ConnectionPool(
+                name, connect, ping,
+                max_size=int(opts["MAX_SIZE"]),
+                timeout=float(opts["TIMEOUT"]),
+                check_idle=float(opts["CHECK_IDLE"]),
+                max_lifetime=float(opts["MAX_LIFETIME"]),
+            )
+        return pool
+
+
+def pool_stats():
+    """{alias: métricas} de los pools de este proceso (para /api/metrics/)."""
+    with _pools_lock:
+        pools = list(_pools.values())
+    return {pool.name: pool.stats() for pool in pools}
+
+
+class PooledDatabaseWrapperMixin:
+    """
+    Se mezcla delante del DatabaseWrapper de un backend de Django: el resto del
+    backend (operaciones, introspección, transacciones) queda igual.
+    """
+
+    def _pool_options(self):
+        return {**POOL_DEFAULTS, **(self.settings_dict.get("POOL") or {})}
+
+    def _pool(self, conn_params):
+        s = self.settings_dict
+        key = (self.alias, s["ENGINE"], s["NAME"], s.get("HOST"), s.get("PORT"), s.get("USER"))
+        return get_pool(
+            key, self.alias,
+            connect=lambda: super(PooledDatabaseWrapperMixin, self).get_new_connection(conn_params),
+            ping=self.ping_connection,
+            options=self._pool_options(),
+        )
+
+    def ping_connection(self, raw):
+        cursor = raw.cursor()
+        try:
+            cursor.execute("SELECT 1")
+        finally:
+            cursor.close()
+
+    def pooling_enabled(self):
+        return int(self._pool_options()["MAX_SIZE"]) > 0
+
+    def get_new_connection(self, conn_params):
+        if not self.pooling_enabled():
+            return super().get_new_connection(conn_params)
+        self._borrowed_from = self._pool(conn_params)
+        return self._borrowed_from.acquire()
+
+    def _close(self):
+        pool = getattr(self, "_borrowed_from", None)
+        if pool is None or self.connection is None:
+            return super()._close()
+        raw, self._borrowed_from = self.connection, None
+        # a mitad de transacción o con errores sin verificar: no se reutiliza
+        reusable = not self.in_atomic_block
+        if reusable and self.get_autocommit() != self.settings_dict["AUTOCOMMIT"]:
+            try:
+                raw.rollback()
+            except Exception:
+                reusable = False
+        if reusable and self.errors_occurred:
+            try:
+                self.ping_connection(raw)
+            except Exception:
+                reusable = False
+        pool.release(raw, reusable=reusable)
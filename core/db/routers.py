@@ -0,0 +1,73 @@
+# core/db/routers.py
+"""
+Lecturas a la réplica (DATABASES["replica"]) para tráfico que tolera unos
+segundos de retraso: GET de los viewsets (incluye los by-* y el feed .ics),
+el dashboard y las vistas que declaren replica_reads = True.
+
+- Las escrituras siempre van a "default".
+- Quién lee de la réplica lo decide core.middleware.ReplicaRoutingMiddleware
+  por request (un contextvar); fuera de un request todo va a "default".
+- Read-your-writes: tras un POST/PUT/PATCH/DELETE el usuario queda fijado al
+  primario REPLICA_PIN_SECONDS. La marca vive en el cache de Django: para que
+  valga entre workers el cache debe ser compartido (Redis/Memcached).
+- Dentro de una transacción en "default" se lee de "default" (consistencia).
+"""
+import os
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICA_ALIAS = "replica"
+# Segundos que un usuario lee del primario después de escribir
+REPLICA_PIN_SECONDS = float(os.getenv("REPLICA_PIN_SECONDS", "5"))
+
+_read_alias = ContextVar("read_alias", default=None)
+
+
+def replica_configured():
+    return REPLICA_ALIAS in connections.settings
+
+
+def set_read_alias(alias):
+    return _read_alias.set(alias)
+
+
+@contextmanager
+def read_from(alias):
+    """Fuerza de dónde se lee dentro del bloque (scripts, comandos, tests)."""
+    token = _read_alias.set(alias)
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+def _pin_key(who):
+    return f"replica:pin:{who}"
+
+
+def pin_to_primary(who):
+    cache.set(_pin_key(who), 1, REPLICA_PIN_SECONDS)
+
+
+def is_pinned(who):
+    return cache.get(_pin_key(who)) is not None
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        alias = _read_alias.get()
+        if alias is None or alias not in connections.settings:
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # la réplica es copia del primario: mismos datos, mismas relaciones
+        return True
@@ -0,0 +1,32 @@
+# core/exceptions.py
+from contextlib import contextmanager
+
+from django.db import IntegrityError
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+class Conflict(APIException):
+    """409: el estado actual del recurso no permite la operación (o se perdió una carrera)."""
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "El recurso cambió de estado; vuelve a intentarlo."
+    default_code = "conflict"
+
+
+@contextmanager
+def conflict_on_integrity_error(detail=None):
+    """
+    Traduce un IntegrityError (p.ej. una restricción UNIQUE ganada por otra petición
+    concurrente) a 409. Debe envolver al transaction.atomic(), no ir dentro de él.
+    """
+    try:
+        yield
+    except IntegrityError:
+        raise Conflict(detail)
+
+
+class ResponseTooLarge(APIException):
+    """413: la respuesta sin paginar pasaría el presupuesto de filas o bytes."""
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = "La respuesta es demasiado grande; usa ?page= / ?page_size=."
+    default_code = "response_too_large"
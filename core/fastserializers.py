@@ -0,0 +1,186 @@
+# core/fastserializers.py
+"""
+Serializers de solo lectura para las listas calientes (GET list y by-*).
+
+Leen con .values() y arman cada dict con una función generada una vez por
+clase (un literal de dict por fila), sin instancias de modelo ni el
+to_representation de DRF campo por campo. La salida es la misma que la del
+ModelSerializer de referencia (serializer_class), byte a byte en el JSON:
+
+- mismas claves y en el mismo orden (Meta.fields);
+- int, str, bool, choices y PK de FK se copian tal cual;
+- Decimal, fechas, horas, JSON y demás pasan por el to_representation del
+  campo DRF original; los archivos arman la URL igual que FileField;
+- los anidados (`nested`) los llena la subclase en add_nested(): un hijo
+  1:1 o FK desde columnas con prefijo de la misma consulta (nest_one), o una
+  lista con una consulta por lote para toda la página (nest_many).
+
+Se usan como un serializer de DRF (Clase(filas, many=True, context=...).data)
+sobre filas de Clase.values(queryset), así que sirven con paginate_queryset y
+core.pagination.unpaginated_response. Las escrituras siguen con DRF.
+"""
+from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured
+from rest_framework import serializers
+
+from .pagination import unpaginated_response
+
+# to_representation es la identidad para lo que ya viene así de la BD
+_IDENTITY_FIELDS = (
+    serializers.IntegerField, serializers.CharField, serializers.BooleanField, serializers.ChoiceField,
+)
+_NOT_IDENTITY_FIELDS = (serializers.MultipleChoiceField,)
+
+_compiled = {}
+
+
+def _file_converter(field, model_field):
+    storage = model_field.storage
+    request = field.context.get("request")
+
+    def convert(name):
+        # como FileField.to_representation con un FieldFile
+        if not name:
+            return None
+        if not getattr(field, "use_url", True):
+            return name
+        url = storage.url(name)
+        return request.build_absolute_uri(url) if request is not None else url
+    return convert
+
+
+def _converter(field, model_field):
+    """None si el valor de la BD ya es la representación; si no, una función."""
+    if isinstance(field, serializers.FileField):
+        return _file_converter(field, model_field)
+    if isinstance(field, serializers.PrimaryKeyRelatedField):
+        return field.pk_field.to_representation if field.pk_field is not None else None
+    if isinstance(field, _IDENTITY_FIELDS) and not isinstance(field, _NOT_IDENTITY_FIELDS):
+        return None
+    return field.to_representation
+
+
+class ValuesSerializer:
+    serializer_class = None  # ModelSerializer de referencia (el de escritura)
+    nested = ()              # campos de serializer_class que llena add_nested()
+
+    def __init__(self, instance=None, many=True, context=None, prefix=""):
+        self.instance = instance
+        self.context = context or {}
+        plan, _columns, self._row = self._compile(prefix)
+        fields = self.serializer_class(context=self.context).fields if plan else {}
+        self._converters = tuple(_converter(fields[name], model_field) for name, model_field in plan)
+
+    # ---------- compilación (una vez por clase y prefijo) ----------
+
+    @classmethod
+    def _fields(cls):
+        """[(clave, campo DRF, campo del modelo o None si es anidado)] en el orden de Meta.fields."""
+        serializer = cls.serializer_class()
+        opts = serializer.Meta.model._meta
+        out = []
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            if name in cls.nested:
+                out.append((name, field, None))
+                continue
+            try:
+                model_field = opts.get_field(field.source)
+            except FieldDoesNotExist:
+                model_field = None
+            if model_field is None or not model_field.concrete or model_field.many_to_many:
+                raise ImproperlyConfigured(
+                    f"{cls.__name__}: '{name}' no es una columna de {opts.label}; agrégalo a nested."
+                )
+            if model_field.is_relation and not isinstance(field, serializers.PrimaryKeyRelatedField):
+                raise ImproperlyConfigured(f"{cls.__name__}: '{name}' solo se soporta como PK.")
+            out.append((name, field, model_field))
+        return out
+
+    @classmethod
+    def _compile(cls, prefix=""):
+        key = (cls, prefix)
+        if key not in _compiled:
+            plan, columns, items = [], [], []
+            for name, field, model_field in cls._fields():
+                if model_field is None:
+                    items.append(f"{name!r}: None")  # lo reemplaza add_nested (mismo lugar)
+                    continue
+                column = prefix + model_field.attname
+                columns.append(column)
+                if _converter(field, model_field) is None:
+                    items.append(f"{name!r}: r[{column!r}]")
+                else:
+                    items.append(f"{name!r}: (None if (v := r[{column!r}]) is None else c[{len(plan)}](v))")
+                    plan.append((name, model_field))
+            src = "def row(r, c):\n    return {" + ", ".join(items) + "}\n"
+            namespace = {}
+            exec(compile(src, f"<{cls.__name__} row>", "exec"), namespace)
+            _compiled[key] = (plan, columns, namespace["row"])
+        return _compiled[key]
+
+    @classmethod
+    def columns(cls, prefix=""):
+        return list(cls._compile(prefix)[1])
+
+    @classmethod
+    def values(cls, queryset, *extra):
+        """El queryset de filas (dicts) que espera el serializer, más columnas extra."""
+        columns = cls.columns()
+        return queryset.prefetch_related(None).values(*columns, *(c for c in extra if c not in columns))
+
+    # ---------- salida ----------
+
+    def to_row(self, r):
+        return self._row(r, self._converters)
+
+    @property
+    def data(self):
+        rows = self.instance if isinstance(self.instance, list) else list(self.instance or ())
+        converters = self._converters
+        data = [self._row(r, converters) for r in rows]
+        if rows:
+            self.add_nested(rows, data)
+        return data
+
+    def add_nested(self, rows, data):
+        """Llena `nested` y agrega las claves extra (al final, como un to_representation)."""
+        if self.nested:
+            raise NotImplementedError(f"{type(self).__name__} debe llenar {self.nested}.")
+
+    def nest_one(self, rows, data, key, child_class, prefix):
+        """Hijo 1:1 / FK leído en la misma consulta con columnas `prefix...` (None si no hay)."""
+        child = child_class(context=self.context, prefix=prefix)
+        pk = prefix + "id"
+        for r, item in zip(rows, data):
+            item[key] = child.to_row(r) if r[pk] is not None else None
+
+    def nest_many(self, rows, data, key, child_class, queryset, fk, pk="id"):
+        """Lista de hijos con una consulta para todas las filas (como un prefetch)."""
+        child_rows = list(child_class.values(queryset.filter(**{f"{fk}__in": [r[pk] for r in rows]}), fk))
+        children = child_class(child_rows, many=True, context=self.context).data
+        groups = {}
+        for r, item in zip(child_rows, children):
+            groups.setdefault(r[fk], []).append(item)
+        for r, item in zip(rows, data):
+            item[key] = groups.get(r[pk], [])
+
+
+class ValuesListMixin:
+    """
+    GET list de un viewset con values_serializer_class; detalle y escrituras
+    siguen con serializer_class. Los by-* usan values_list_response(qs).
+    """
+    values_serializer_class = None
+
+    def list(self, request, *args, **kwargs):
+        return self.values_list_response(self.filter_queryset(self.get_queryset()))
+
+    def values_list_response(self, queryset):
+        serializer_class = self.values_serializer_class
+        context = self.get_serializer_context()
+        rows = serializer_class.values(queryset)
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(serializer_class(page, many=True, context=context).data)
+        return unpaginated_response(rows, serializer_class, context)
@@ -0,0 +1,26 @@
+# core/filters.py
+from rest_framework import filters
+
+from . import search
+
+
+class IndexedSearchFilter(filters.SearchFilter):
+    """
+    SearchFilter que, si la vista declara `search_kind`, resuelve ?search= contra el
+    índice global (core/search.py) en lugar de LIKE '%x%' sobre search_fields.
+    Coincidencia por prefijo de palabra: todas las palabras deben aparecer.
+
+    Mientras el índice del tipo esté vacío (despliegue sin `manage.py
+    rebuild_search_index`) se usa el LIKE de siempre para no devolver 0 filas.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        kind = getattr(view, "search_kind", None)
+        if kind is None:
+            return super().filter_queryset(request, queryset, view)
+        q = request.query_params.get(self.search_param, "")
+        if not q.strip():
+            return queryset
+        if not search.is_indexed(kind):
+            return super().filter_queryset(request, queryset, view)
+        return search.filter_queryset(queryset, kind, q)
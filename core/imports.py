@@ -0,0 +1,475 @@
+# core/imports.py
+"""
+Importación masiva por streaming (CSV o JSONL) para el alta de una región nueva:
+clientes, contactos, planes, tareas de plan y suscripciones.
+
+- El archivo se lee línea a línea y se procesa en lotes de IMPORT_BATCH_SIZE filas:
+  la memoria no depende del tamaño del archivo.
+- Cada lote se valida con los serializers de importación de cada app (FK precargadas,
+  una consulta por campo) y los errores se reportan por número de línea.
+- Las filas válidas se guardan con un upsert por clave natural:
+  bulk_create(update_conflicts=True) sobre los UNIQUE de cada modelo.
+  Solo se actualizan las columnas que trae la fila (una fila sin email no borra el email).
+- Cada lote va en su propia transacción: un error de datos no descarta lo ya importado.
+  Si el lote choca con un UNIQUE se reintenta fila a fila y solo se reportan las que chocan.
+
+Las FK se pueden dar por id ("customer": 12) o por clave natural
+("customer_identification": "1-0234-0567", "plan_name": "Básico").
+"""
+import csv
+import json
+from collections import defaultdict
+
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from customers.models import Customer, CustomerContact
+from customers.serializers import CustomerImportSerializer, CustomerContactImportSerializer
+from plans.models import Plan, PlanSubscription
+from plans.serializers import (
+    PlanImportSerializer,
+    PlanTaskImportSerializer,
+    PlanSubscriptionImportSerializer,
+)
+from . import search, typeahead
+from .bulk import BULK_BATCH_SIZE, bulk_create_with_pks
+
+IMPORT_BATCH_SIZE = 500
+IMPORT_MAX_BATCH_SIZE = 2000
+# Tope de errores detallados en el reporte (el conteo sigue siendo exacto)
+IMPORT_MAX_ERRORS = 1000
+
+IMPORT_FORMATS = ("csv", "jsonl")
+
+ROW_CONFLICT = {
+    "detail": "La fila choca con una restricción única (clave duplicada o escritura concurrente)."
+}
+
+
+class ImportFileError(ValueError):
+    """El archivo no se puede seguir leyendo (codificación, CSV sin encabezado...)."""
+
+    def __init__(self, line, message):
+        super().__init__(message)
+        self.line = line
+        self.message = message
+
+
+# ---------------- Lectura por streaming ----------------
+
+def detect_format(name="", content_type="", explicit=None):
+    if explicit:
+        return explicit if explicit in IMPORT_FORMATS else None
+    name = (name or "").lower()
+    content_type = (content_type or "").lower()
+    if name.endswith((".jsonl", ".ndjson")) or "ndjson" in content_type or "jsonl" in content_type:
+        return "jsonl"
+    if name.endswith(".csv") or "csv" in content_type:
+        return "csv"
+    return None
+
+
+def _text_lines(stream):
+    """Líneas en bytes (archivo subido o cuerpo del request) -> texto UTF-8 (sin BOM de Excel)."""
+    for number, raw in enumerate(stream, start=1):
+        try:
+            yield raw.decode("utf-8-sig" if number == 1 else "utf-8") if isinstance(raw, bytes) else raw
+        except UnicodeDecodeError:
+            raise ImportFileError(number, "Codificación inválida (se espera UTF-8).")
+
+
+def _csv_rows(lines):
+    reader = csv.DictReader(lines)
+    if not reader.fieldnames:
+        raise ImportFileError(1, "El CSV no tiene fila de encabezados.")
+    for row in reader:
+        if None in row:
+            yield reader.line_num, None, {"detail": "La fila tiene más columnas que el encabezado."}
+            continue
+        # celda vacía = columna ausente (no se toca ese dato)
+        yield reader.line_num, {k.strip(): v for k, v in row.items() if k and v not in ("", None)}, None
+
+
+def _jsonl_rows(lines):
+    for number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            data = json.loads(line)
+        except ValueError:
+            yield number, None, {"detail": "JSON inválido."}
+            continue
+        if not isinstance(data, dict):
+            yield number, None, {"detail": "Cada línea debe ser un objeto JSON."}
+            continue
+        yield number, data, None
+
+
+def read_rows(stream, fmt):
+    """Genera (línea, datos, error) sin cargar el archivo completo."""
+    lines = _text_lines(stream)
+    return _csv_rows(lines) if fmt == "csv" else _jsonl_rows(lines)
+
+
+# ---------------- Reporte ----------------
+
+class ImportReport:
+    def __init__(self, resource, dry_run=False):
+        self.resource = resource
+        self.dry_run = dry_run
+        self.rows = 0
+        self.imported = 0
+        self.failed = 0
+        self.errors = []
+        self.aborted = None
+
+    def fail(self, line, errors):
+        self.failed += 1
+        if len(self.errors) < IMPORT_MAX_ERRORS:
+            self.errors.append({"line": line, "errors": errors})
+
+    def as_dict(self):
+        data = {
+            "resource": self.resource,
+            "dry_run": self.dry_run,
+            "rows": self.rows,
+            "imported": self.imported,
+            "failed": self.failed,
+            "errors": self.errors,
+            "errors_truncated": self.failed > len(self.errors),
+        }
+        if self.aborted:
+            data["aborted"] = self.aborted
+        return data
+
+
+# ---------------- Importadores ----------------
+
+class Importer:
+    """
+    Base: un recurso importable.
+    - serializer_class: serializer de importación (BulkListSerializer, sin validadores UNIQUE)
+    - natural_key: campos del UNIQUE usado para el upsert
+    - references: FK -> (columna natural, modelo, campo natural) aceptada en lugar del id
+    """
+    resource = ""
+    serializer_class = None
+    natural_key = ()
+    references = {}
+
+    def __init__(self, actor=None, dry_run=False, batch_size=IMPORT_BATCH_SIZE, context=None, search_index=True):
+        self.actor = actor
+        self.dry_run = dry_run
+        self.batch_size = batch_size
+        self.context = context or {}
+        # False: no reindexar la búsqueda global por lote (cargas enormes + rebuild_search_index)
+        self.search_index = search_index
+
+    @property
+    def model(self):
+        return self.serializer_class.Meta.model
+
+    # ---------- flujo ----------
+    def run(self, rows):
+        report = ImportReport(self.resource, self.dry_run)
+        batch = []
+        try:
+            for line, data, error in rows:
+                if error is not None:
+                    report.rows += 1
+                    report.fail(line, error)
+                    continue
+                batch.append((line, data))
+                if len(batch) >= self.batch_size:
+                    self.import_batch(batch, report)
+                    batch = []
+        except ImportFileError as exc:
+            report.aborted = {"line": exc.line, "detail": exc.message}
+        if batch:
+            self.import_batch(batch, report)
+        return report.as_dict()
+
+    def import_batch(self, batch, report):
+        report.rows += len(batch)
+        lines = [line for line, _ in batch]
+        items = [data for _, data in batch]
+
+        errors = self.resolve_references(items)
+        pending = [i for i in range(len(items)) if i not in errors]
+        ser = self.serializer_class(many=True, context=self.context)
+        valid = []
+        for i, (attrs, err) in zip(pending, ser.partition([items[i] for i in pending])):
+            err = err or self.check(attrs)
+            if err:
+                errors[i] = err
+            else:
+                valid.append((i, attrs))
+        valid = self.deduplicate(valid, errors)
+
+        for i in sorted(errors):
+            report.fail(lines[i], errors[i])
+        if not valid:
+            return
+        if self.dry_run:
+            report.imported += len(valid)
+            return
+
+        rows = [attrs for _, attrs in valid]
+        try:
+            with transaction.atomic():
+                ids = self.write(rows)
+                self.after_write(ids)
+        except IntegrityError:
+            # Alguna fila choca con un UNIQUE: se reintenta el lote fila a fila para
+            # guardar las demás y reportar solo las que fallan
+            self.import_rows(valid, lines, report)
+            return
+        report.imported += len(valid)
+
+    def import_rows(self, valid, lines, report):
+        """Plan B de import_batch: una fila por savepoint (solo tras un IntegrityError)."""
+        with transaction.atomic():
+            ids = []
+            for i, attrs in valid:
+                try:
+                    with transaction.atomic():
+                        ids.extend(self.write([attrs]))
+                except IntegrityError:
+                    report.fail(lines[i], ROW_CONFLICT)
+                else:
+                    report.imported += 1
+            if ids:
+                self.after_write(ids)
+
+    # ---------- validación ----------
+    def resolve_references(self, items):
+        """Columnas naturales -> id de la FK (una consulta por referencia y lote)."""
+        errors = {}
+        for field, (column, model, natural) in self.references.items():
+            wanted = {
+                str(item[column]) for item in items
+                if item.get(field) in (None, "") and item.get(column) not in (None, "")
+            }
+            if not wanted:
+                continue
+            found = dict(model.objects.filter(**{f"{natural}__in": wanted}).values_list(natural, "id"))
+            for i, item in enumerate(items):
+                if item.get(field) not in (None, "") or item.get(column) in (None, ""):
+                    continue
+                pk = found.get(str(item[column]))
+                if pk is None:
+                    errors.setdefault(i, {})[column] = f"No existe: {item[column]}."
+                else:
+                    item[field] = pk
+        return errors
+
+    def check(self, attrs):
+        """Reglas de negocio extra por fila (las mismas que aplican las vistas). None = ok."""
+        return None
+
+    def key(self, attrs):
+        return tuple(getattr(attrs[f], "pk", attrs[f]) for f in self.natural_key)
+
+    def deduplicate(self, valid, errors):
+        """Misma clave natural repetida en el lote: gana la última (como upserts en orden)."""
+        last = {self.key(attrs): i for i, attrs in valid}
+        return [(i, attrs) for i, attrs in valid if last[self.key(attrs)] == i]
+
+    # ---------- escritura ----------
+    def create_kwargs(self):
+        return {"created_by": self.actor, "updated_by": self.actor} if self.actor else {}
+
+    def write(self, rows):
+        """
+        Upsert por clave natural. Se agrupa por conjunto de columnas presentes para
+        que cada INSERT ... ON CONFLICT / ON DUPLICATE KEY actualice solo esas.
+        """
+        groups = defaultdict(list)
+        for attrs in rows:
+            groups[frozenset(attrs)].append(attrs)
+
+        extra = ["active", "updated_at"] + (["updated_by"] if self.actor else [])
+        for fields, group in groups.items():
+            objs = [self.model(**attrs, active=True, **self.create_kwargs()) for attrs in group]
+            self.model.objects.bulk_create(
+                objs,
+                batch_size=BULK_BATCH_SIZE,
+                update_conflicts=True,
+                unique_fields=list(self.natural_key),
+                update_fields=sorted(fields - set(self.natural_key)) + extra,
+            )
+        return self.resolve_ids(rows)
+
+    def resolve_ids(self, rows):
+        """ids de las filas escritas (MySQL no devuelve pks en un upsert)."""
+        columns = [self.model._meta.get_field(f).attname for f in self.natural_key]
+        keys = {self.key(attrs) for attrs in rows}
+        lookup = Q(**{
+            f"{column}__in": list({key[n] for key in keys}) for n, column in enumerate(columns)
+        })
+        return [
+            row[-1] for row in self.model.objects.filter(lookup).values_list(*columns, "id")
+            if tuple(row[:-1]) in keys
+        ]
+
+    def after_write(self, ids):
+        """Índices derivados (búsqueda / typeahead): bulk_create no dispara señales."""
+
+
+class CustomerImporter(Importer):
+    resource = "customers"
+    serializer_class = CustomerImportSerializer
+    natural_key = ("identification",)
+
+    def after_write(self, ids):
+        from .signals import reindex_customers
+        if self.search_index:
+            transaction.on_commit(lambda: reindex_customers(ids))
+        transaction.on_commit(typeahead.TYPEAHEAD_INDEXES["customer"].invalidate)
+
+
+class ContactImporter(Importer):
+    resource = "contacts"
+    serializer_class = CustomerContactImportSerializer
+    natural_key = ("customer", "email")
+    references = {"customer": ("customer_identification", Customer, "identification")}
+
+    def deduplicate(self, valid, errors):
+        valid = super().deduplicate(valid, errors)
+        # un principal por cliente: si el lote trae varios, vale el último
+        last_main = {attrs["customer"].pk: i for i, attrs in valid if attrs.get("is_main")}
+        out = []
+        for i, attrs in valid:
+            if attrs.get("is_main") and last_main[attrs["customer"].pk] != i:
+                errors[i] = {"is_main": "Otra fila posterior del mismo cliente también es principal."}
+                continue
+            out.append((i, attrs))
+        return out
+
+    def write(self, rows):
+        # Degradar antes del upsert: en MySQL ON DUPLICATE KEY también salta con el
+        # UNIQUE de main_for_customer y actualizaría al principal anterior
+        customers = {attrs["customer"].pk for attrs in rows if attrs.get("is_main")}
+        if customers:
+            CustomerContact.objects.filter(main_for_customer__in=customers).update(
+                is_main=False, updated_at=timezone.now()
+            )
+        return super().write(rows)
+
+    def after_write(self, ids):
+        if self.search_index:
+            search.schedule_reindex("contact", ids)
+
+
+class PlanImporter(Importer):
+    resource = "plans"
+    serializer_class = PlanImportSerializer
+    natural_key = ("name",)
+
+    def after_write(self, ids):
+        if self.search_index:
+            search.schedule_reindex("plan", ids)
+        transaction.on_commit(typeahead.TYPEAHEAD_INDEXES["plan_task"].invalidate)
+
+
+class PlanTaskImporter(Importer):
+    resource = "plan_tasks"
+    serializer_class = PlanTaskImportSerializer
+    natural_key = ("plan", "name")
+    references = {"plan": ("plan_name", Plan, "name")}
+
+    def check(self, attrs):
+        if not attrs["plan"].active:
+            return {"plan": "No se pueden crear tareas en un plan inactivo."}
+        return None
+
+    def after_write(self, ids):
+        transaction.on_commit(typeahead.TYPEAHEAD_INDEXES["plan_task"].invalidate)
+
+
+class SubscriptionImporter(Importer):
+    """
+    Clave natural (customer, plan, start_date). No es UNIQUE en BD (el historial
+    admite repeticiones creadas por la API), así que el upsert es: una consulta
+    de existentes + bulk_update + bulk_create.
+    """
+    resource = "subscriptions"
+    serializer_class = PlanSubscriptionImportSerializer
+    natural_key = ("customer", "plan", "start_date")
+    references = {
+        "customer": ("customer_identification", Customer, "identification"),
+        "plan": ("plan_name", Plan, "name"),
+    }
+
+    def check(self, attrs):
+        plan = attrs["plan"]
+        if not plan.active:
+            return {"plan": "No se pueden crear o modificar suscripciones con un plan inactivo."}
+        if getattr(plan, "has_inactive_tasks", False):
+            return {"plan": "No se pueden crear o modificar suscripciones: el plan tiene tareas inactivas."}
+        return None
+
+    def deduplicate(self, valid, errors):
+        valid = super().deduplicate(valid, errors)
+        # una activa por cliente: si el lote trae varias, vale la última
+        active = PlanSubscription.Status.ACTIVE
+        last_active = {attrs["customer"].pk: i for i, attrs in valid if attrs.get("status") == active}
+        out = []
+        for i, attrs in valid:
+            if attrs.get("status") == active and last_active[attrs["customer"].pk] != i:
+                errors[i] = {"status": "Otra fila posterior del mismo cliente también es activa."}
+                continue
+            out.append((i, attrs))
+        return out
+
+    def write(self, rows):
+        now = timezone.now()
+        keys = {self.key(attrs) for attrs in rows}
+        existing = {}
+        qs = PlanSubscription.objects.filter(
+            customer_id__in={k[0] for k in keys},
+            plan_id__in={k[1] for k in keys},
+            start_date__in={k[2] for k in keys},
+        ).order_by("id")
+        for obj in qs:
+            key = (obj.customer_id, obj.plan_id, obj.start_date)
+            if key in keys:
+                existing.setdefault(key, obj)
+
+        # UNIQUE de una activa por cliente: degradar la actual antes de escribir
+        activating = {
+            attrs["customer"].pk for attrs in rows if attrs.get("status") == PlanSubscription.Status.ACTIVE
+        }
+        if activating:
+            PlanSubscription.objects.filter(active_for_customer__in=activating).update(
+                status=PlanSubscription.Status.INACTIVE, updated_at=now
+            )
+            for obj in existing.values():
+                if obj.customer_id in activating and obj.status == PlanSubscription.Status.ACTIVE:
+                    obj.status = PlanSubscription.Status.INACTIVE
+
+        to_create, updates = [], defaultdict(list)
+        for attrs in rows:
+            obj = existing.get(self.key(attrs))
+            if obj is None:
+                to_create.append(PlanSubscription(**attrs, active=True, **self.create_kwargs()))
+                continue
+            for attr, value in attrs.items():
+                setattr(obj, attr, value)
+            obj.active, obj.updated_at = True, now
+            if self.actor:
+                obj.updated_by = self.actor
+            updates[frozenset(attrs)].append(obj)
+
+        extra = ["active", "updated_at"] + (["updated_by"] if self.actor else [])
+        for fields, objs in updates.items():
+            PlanSubscription.objects.bulk_update(objs, sorted(fields) + extra, batch_size=BULK_BATCH_SIZE)
+        bulk_create_with_pks(PlanSubscription, to_create)
+        return [obj.pk for obj in existing.values()] + [obj.pk for obj in to_create]
+
+
+IMPORTERS = {
+    importer.resource: importer
+    for importer in (CustomerImporter, ContactImporter, PlanImporter, PlanTaskImporter, SubscriptionImporter)
+}
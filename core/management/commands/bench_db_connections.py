@@ -0,0 +1,111 @@
+# core/management/commands/bench_db_connections.py
+import copy
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.utils import load_backend
+
+from core.db import pool
+
+# backend con pool <-> backend de Django equivalente
+POOLED_ENGINES = {
+    "django.db.backends.mysql": "core.db.backends.mysql",
+    "django.db.backends.sqlite3": "core.db.backends.sqlite3",
+}
+PLAIN_ENGINES = {v: k for k, v in POOLED_ENGINES.items()}
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara abrir una conexión por request (sin pool, CONN_MAX_AGE=0) contra el "
+        "pool de core/db/pool.py, simulando requests en varios hilos contra la BD de --database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--database", default="default")
+        parser.add_argument("--requests", type=int, default=500, help="Requests simulados (default 500).")
+        parser.add_argument("--threads", type=int, default=8, help="Hilos concurrentes (default 8).")
+        parser.add_argument("--queries", type=int, default=3, help="Consultas por request (default 3).")
+        parser.add_argument("--pool-size", type=int, default=None, help="MAX_SIZE del pool (default: settings).")
+
+    def handle(self, *args, **opts):
+        if opts["database"] not in connections.settings:
+            raise CommandError(f"Alias desconocido: {opts['database']}")
+        if min(opts["requests"], opts["threads"], opts["queries"]) < 1:
+            raise CommandError("--requests, --threads y --queries deben ser >= 1.")
+
+        base = copy.deepcopy(connections.settings[opts["database"]])
+        engine = base["ENGINE"]
+        plain = {**base, "ENGINE": PLAIN_ENGINES.get(engine, engine), "CONN_MAX_AGE": 0}
+        pooled_engine = POOLED_ENGINES.get(plain["ENGINE"])
+        if pooled_engine is None:
+            raise CommandError(f"No hay backend con pool para {plain['ENGINE']}.")
+        pool_opts = {**pool.POOL_DEFAULTS, **(base.get("POOL") or {})}
+        if opts["pool_size"] is not None:
+            pool_opts["MAX_SIZE"] = opts["pool_size"]
+        if pool_opts["MAX_SIZE"] < 1:
+            raise CommandError("El pool está desactivado (MAX_SIZE=0); usa --pool-size.")
+        pooled = {**plain, "ENGINE": pooled_engine, "CONN_MAX_AGE": 0, "POOL": pool_opts}
+
+        self.stdout.write(
+            f"{plain['ENGINE']} · {opts['requests']} requests · {opts['threads']} hilos · "
+            f"{opts['queries']} consultas/request · pool {pool_opts['MAX_SIZE']}"
+        )
+        for label, settings_dict in (("por request", plain), ("pool", pooled)):
+            elapsed, latencies = self._run(settings_dict, opts)
+            latencies.sort()
+            p50 = latencies[len(latencies) // 2]
+            p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+            self.stdout.write(
+                f"{label:>12}: {elapsed * 1000:9.1f} ms  {opts['requests'] / elapsed:8.0f} req/s  "
+                f"p50 {p50 * 1000:6.2f} ms  p95 {p95 * 1000:6.2f} ms"
+            )
+        stats = pool.pool_stats().get("bench")
+        if stats:
+            self.stdout.write(
+                f"{'':>12}  creadas {stats['created']}, reutilizadas {stats['reused']}, "
+                f"esperas {stats['waits']} ({stats['wait_seconds_total']:.3f} s), timeouts {stats['timeouts']}"
+            )
+
+    def _run(self, settings_dict, opts):
+        backend = load_backend(settings_dict["ENGINE"])
+        remaining = [opts["requests"]]
+        lock = threading.Lock()
+        latencies = []
+        errors = []
+
+        def worker():
+            # como Django: un wrapper por hilo, que conecta y cierra en cada request
+            conn = backend.DatabaseWrapper(copy.deepcopy(settings_dict), alias="bench")
+            try:
+                while True:
+                    with lock:
+                        if remaining[0] <= 0:
+                            return
+                        remaining[0] -= 1
+                    t0 = time.perf_counter()
+                    with conn.cursor() as cursor:
+                        for _ in range(opts["queries"]):
+                            cursor.execute("SELECT 1")
+                            cursor.fetchone()
+                    conn.close()
+                    elapsed = time.perf_counter() - t0
+                    with lock:
+                        latencies.append(elapsed)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                conn.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(opts["threads"])]
+        started = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - started
+        if errors:
+            raise CommandError(f"Falló el benchmark: {errors[0]}")
+        return elapsed, latencies
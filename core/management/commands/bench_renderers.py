@@ -0,0 +1,92 @@
+# core/management/commands/bench_renderers.py
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from core.renderers import MessagePackRenderer, ORJSONRenderer
+
+DEFAULT_PATHS = [
+    "/api/visit/",
+    "/api/plan-subscriptions/",
+    "/api/evidence/",
+    "/api/task-completed/",
+    "/api/material-used/",
+    "/api/customers/",
+    "/api/plans/",
+]
+
+RENDERERS = [
+    ("json (DRF)", JSONRenderer()),
+    ("orjson", ORJSONRenderer()),
+    ("msgpack", MessagePackRenderer()),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara, por endpoint, el tiempo de codificar la respuesta y su tamaño con el "
+        "JSONRenderer de DRF, ORJSONRenderer y MessagePackRenderer (core/renderers.py). "
+        "Usa los datos de la BD configurada; solo mide el render, no la vista."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("paths", nargs="*", help=f"Rutas GET (default: {' '.join(DEFAULT_PATHS)}).")
+        parser.add_argument("--rows", type=int, default=200,
+                            help="Filas por endpoint: se juntan páginas hasta llegar (default 200).")
+        parser.add_argument("--repeat", type=int, default=50, help="Veces que se codifica cada respuesta (default 50).")
+        parser.add_argument("--user", default=None, help="Usuario staff para autenticar (default: el primero).")
+
+    def handle(self, *args, **opts):
+        if opts["repeat"] < 1:
+            raise CommandError("--repeat debe ser >= 1.")
+        users = get_user_model().objects.filter(is_staff=True, is_active=True).order_by("pk")
+        if opts["user"]:
+            users = users.filter(username=opts["user"])
+        user = users.first()
+        if user is None:
+            raise CommandError("No hay un usuario staff activo para autenticar (--user).")
+
+        client = APIClient()
+        client.force_authenticate(user)
+        header = f"{'endpoint':<28}{'filas':>7}" + "".join(f"{name:>24}" for name, _r in RENDERERS)
+        self.stdout.write(header)
+        self.stdout.write(f"{'':<35}" + "".join(f"{'ms/render     bytes':>24}" for _ in RENDERERS))
+        for path in opts["paths"] or DEFAULT_PATHS:
+            data = self._fetch(client, path, opts["rows"])
+            if isinstance(data, int):
+                self.stdout.write(f"{path:<28}  status {data}, se omite")
+                continue
+            rows = len(data)
+            cells = []
+            baseline = None
+            for _name, renderer in RENDERERS:
+                ms, size = self._measure(renderer, data, opts["repeat"])
+                baseline = baseline or ms
+                cells.append(f"{ms:8.3f} {baseline / ms:4.1f}x {size:9d}")
+            self.stdout.write(f"{path:<28}{rows:>7}" + "".join(f"{c:>24}" for c in cells))
+
+    def _fetch(self, client, path, rows):
+        """Los resultados de las primeras páginas hasta juntar `rows` (o el status si falla)."""
+        results, page = [], 1
+        while len(results) < rows:
+            response = client.get(path, {"page": page, "page_size": rows})
+            if response.status_code != 200:
+                return response.status_code
+            data = response.data
+            if not isinstance(data, dict) or "results" not in data:
+                return list(data)[:rows]  # sin paginar
+            results.extend(data["results"])
+            if not data.get("next"):
+                break
+            page += 1
+        return results[:rows]
+
+    def _measure(self, renderer, data, repeat):
+        body = renderer.render(data, renderer.media_type, {})  # calentamiento
+        started = time.perf_counter()
+        for _ in range(repeat):
+            renderer.render(data, renderer.media_type, {})
+        return (time.perf_counter() - started) * 1000 / repeat, len(body)
@@ -0,0 +1,60 @@
+# core/management/commands/import_data.py
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import imports
+
+
+class Command(BaseCommand):
+    help = (
+        "Importa clientes, contactos, planes, tareas o suscripciones desde CSV / JSONL "
+        "(upsert por clave natural, en lotes). Ej: import_data customers region_norte.csv"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("resource", choices=list(imports.IMPORTERS))
+        parser.add_argument("path")
+        parser.add_argument("--format", dest="input_format", choices=imports.IMPORT_FORMATS,
+                            help="Por defecto se deduce de la extensión.")
+        parser.add_argument("--batch-size", type=int, default=imports.IMPORT_BATCH_SIZE)
+        parser.add_argument("--dry-run", action="store_true", help="Solo validar, sin escribir.")
+        parser.add_argument(
+            "--skip-search-index", action="store_true",
+            help="No reindexar la búsqueda global por lote (correr rebuild_search_index al final).",
+        )
+
+    def handle(self, *args, **opts):
+        fmt = imports.detect_format(opts["path"], explicit=opts["input_format"])
+        if fmt is None:
+            raise CommandError("No se reconoce el formato; usa --format csv|jsonl.")
+        if opts["batch_size"] < 1:
+            raise CommandError("--batch-size debe ser mayor o igual a 1.")
+
+        importer = imports.IMPORTERS[opts["resource"]](
+            dry_run=opts["dry_run"],
+            batch_size=opts["batch_size"],
+            search_index=not opts["skip_search_index"],
+        )
+        try:
+            with open(opts["path"], "rb") as fh:
+                report = importer.run(imports.read_rows(fh, fmt))
+        except OSError as exc:
+            raise CommandError(str(exc))
+
+        for error in report["errors"]:
+            self.stderr.write(f"  línea {error['line']}: {json.dumps(error['errors'], ensure_ascii=False)}")
+        if report["errors_truncated"]:
+            self.stderr.write(f"  ... (solo se muestran {len(report['errors'])} errores)")
+        if "aborted" in report:
+            self.stderr.write(self.style.ERROR(
+                f"Lectura interrumpida en la línea {report['aborted']['line']}: {report['aborted']['detail']}"
+            ))
+
+        prefix = "[dry-run] " if report["dry_run"] else ""
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}{report['resource']}: {report['rows']} filas, "
+            f"{report['imported']} importadas, {report['failed']} con error."
+        ))
+        if opts["skip_search_index"] and report["imported"] and not report["dry_run"]:
+            self.stdout.write("Recuerda: manage.py rebuild_search_index")
@@ -0,0 +1,29 @@
+# core/management/commands/rebuild_search_index.py
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core import search
+from core.models import SearchEntry, SearchTerm
+
+
+class Command(BaseCommand):
+    help = "Reconstruye el índice de búsqueda global (SearchEntry / SearchTerm) desde cero."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--kind", action="append", choices=sorted(search.SEARCH_SOURCES),
+            help="Solo estos tipos (repetible). Por defecto: todos.",
+        )
+        parser.add_argument("--batch-size", type=int, default=search.INDEX_BATCH_SIZE)
+
+    def handle(self, *args, **opts):
+        kinds = opts["kind"] or list(search.SEARCH_SOURCES)
+        for kind in kinds:
+            # Un tipo a la vez en su transacción: si falla, su índice queda como estaba
+            with transaction.atomic():
+                SearchTerm.objects.filter(kind=kind).delete()
+                SearchEntry.objects.filter(kind=kind).delete()
+                model = search.source_model(kind)
+                done = search.index_queryset(kind, model.active_objects.all(), batch_size=opts["batch_size"])
+            self.stdout.write(f"  {kind}: {done} documentos")
+        self.stdout.write(self.style.SUCCESS("Índice de búsqueda reconstruido."))
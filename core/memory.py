@@ -0,0 +1,198 @@
+# core/memory.py
+"""
+Memoria por worker.
+
+Siempre (MEMORY_METRICS=1, por defecto): core.middleware.MemoryMiddleware
+anota por ruta el RSS al terminar cada request, cuánto creció y si subió el
+pico del proceso (ru_maxrss), más el delta de bloques asignados por Python.
+Sale en GET /api/metrics/ bajo "memory". Los números son del proceso: con
+varios hilos atendiendo a la vez, un request puede cargar con lo de otro.
+
+Solo con MEMORY_DEBUG=1: tracemalloc arranca con la app y, para staff,
+/api/memory/snapshots/ toma y lista snapshots y
+/api/memory/snapshots/<id>/diff/?base=<id> compara dos (qué líneas crecieron).
+tracemalloc hace cada asignación más lenta: es para staging o para un worker
+puntual, no para todo producción.
+"""
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+from django.utils import timezone
+
+try:
+    import resource
+except ImportError:  # Windows: sin ru_maxrss
+    resource = None
+
+MEMORY_METRICS = os.getenv("MEMORY_METRICS", "1") == "1"
+MEMORY_DEBUG = os.getenv("MEMORY_DEBUG", "0") == "1"
+# Frames por traza de tracemalloc (más = diffs más útiles y más costo)
+MEMORY_TRACE_FRAMES = int(os.getenv("MEMORY_TRACE_FRAMES", "10"))
+MEMORY_MAX_SNAPSHOTS = 5
+MEMORY_MAX_ROUTES = 500
+
+_PAGE_KB = os.sysconf("SC_PAGE_SIZE") // 1024 if hasattr(os, "sysconf") else 4
+# ru_maxrss viene en KB en Linux y en bytes en macOS
+_MAXRSS_DIVISOR = 1024 if sys.platform == "darwin" else 1
+
+
+def current_rss_kb():
+    try:
+        with open("/proc/self/statm", "rb") as fh:
+            return int(fh.read().split()[1]) * _PAGE_KB
+    except (OSError, IndexError, ValueError):
+        return peak_rss_kb()  # sin /proc: lo mejor que hay es el pico
+
+
+def peak_rss_kb():
+    if resource is None:
+        return 0
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // _MAXRSS_DIVISOR
+
+
+# ---------------- Por ruta ----------------
+
+_routes_lock = threading.Lock()
+_routes = {}
+
+
+class RequestMemory:
+    """Medición de un request: se toma antes de la vista y se cierra con finish()."""
+
+    __slots__ = ("rss", "peak", "blocks", "traced_peak")
+
+    def __init__(self):
+        self.rss = current_rss_kb()
+        self.peak = peak_rss_kb()
+        self.blocks = sys.getallocatedblocks()
+        self.traced_peak = tracemalloc.is_tracing()
+        if self.traced_peak:
+            tracemalloc.reset_peak()
+
+    def finish(self, route):
+        rss = current_rss_kb()
+        peak = peak_rss_kb()
+        blocks = sys.getallocatedblocks() - self.blocks
+        traced_peak_kb = tracemalloc.get_traced_memory()[1] // 1024 if self.traced_peak else None
+        with _routes_lock:
+            entry = _routes.get(route)
+            if entry is None:
+                if len(_routes) >= MEMORY_MAX_ROUTES:
+                    return
+                entry = _routes[route] = {
+                    "requests": 0, "rss_max_kb": 0, "rss_growth_kb": 0, "peak_raises": 0,
+                    "peak_raised_kb": 0, "alloc_blocks_max": 0, "alloc_blocks_total": 0,
+                    "traced_peak_max_kb": None,
+                }
+            entry["requests"] += 1
+            entry["rss_max_kb"] = max(entry["rss_max_kb"], rss)
+            entry["rss_growth_kb"] += max(rss - self.rss, 0)
+            if peak > self.peak:
+                entry["peak_raises"] += 1
+                entry["peak_raised_kb"] += peak - self.peak
+            entry["alloc_blocks_max"] = max(entry["alloc_blocks_max"], blocks)
+            entry["alloc_blocks_total"] += max(blocks, 0)
+            if traced_peak_kb is not None:
+                entry["traced_peak_max_kb"] = max(entry["traced_peak_max_kb"] or 0, traced_peak_kb)
+
+
+def memory_stats():
+    with _routes_lock:
+        routes = {route: dict(entry) for route, entry in _routes.items()}
+    return {
+        "rss_kb": current_rss_kb(),
+        "peak_rss_kb": peak_rss_kb(),
+        "tracemalloc": tracemalloc.is_tracing(),
+        "routes": dict(sorted(routes.items(), key=lambda r: -r[1]["peak_raised_kb"])),
+    }
+
+
+# ---------------- tracemalloc ----------------
+
+_snapshots_lock = threading.Lock()
+_snapshots = {}
+_snapshot_seq = [0]
+
+# tracemalloc y la maquinaria de import no son memoria de la app
+_SNAPSHOT_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+
+def start_tracing():
+    """Desde CoreConfig.ready(), solo con MEMORY_DEBUG=1."""
+    if MEMORY_DEBUG and not tracemalloc.is_tracing():
+        tracemalloc.start(MEMORY_TRACE_FRAMES)
+
+
+def _stat_row(stat, frames=3):
+    return {
+        "size_kb": round(stat.size / 1024, 1),
+        "count": stat.count,
+        "traceback": [f"{f.filename}:{f.lineno}" for f in stat.traceback[:frames]],
+    }
+
+
+def _diff_row(stat, frames=3):
+    row = _stat_row(stat, frames)
+    row.update(size_diff_kb=round(stat.size_diff / 1024, 1), count_diff=stat.count_diff)
+    return row
+
+
+def take_snapshot(limit=30, key_type="lineno"):
+    """Guarda un snapshot (los MEMORY_MAX_SNAPSHOTS más nuevos) y devuelve su top."""
+    snapshot = tracemalloc.take_snapshot().filter_traces(_SNAPSHOT_FILTERS)
+    current, peak = tracemalloc.get_traced_memory()
+    with _snapshots_lock:
+        _snapshot_seq[0] += 1
+        snapshot_id = _snapshot_seq[0]
+        _snapshots[snapshot_id] = {
+            "snapshot": snapshot,
+            "taken_at": timezone.now(),
+            "traced_kb": current // 1024,
+            "traced_peak_kb": peak // 1024,
+            "rss_kb": current_rss_kb(),
+        }
+        for old in sorted(_snapshots)[:-MEMORY_MAX_SNAPSHOTS]:
+            del _snapshots[old]
+    info = snapshot_info(snapshot_id)
+    info["top"] = [_stat_row(s) for s in snapshot.statistics(key_type)[:limit]]
+    return info
+
+
+def snapshot_info(snapshot_id):
+    with _snapshots_lock:
+        entry = _snapshots[snapshot_id]
+    return {"id": snapshot_id, **{k: v for k, v in entry.items() if k != "snapshot"}}
+
+
+def list_snapshots():
+    with _snapshots_lock:
+        ids = sorted(_snapshots)
+    return [snapshot_info(i) for i in ids]
+
+
+def diff_snapshots(snapshot_id, base_id, limit=30, key_type="lineno"):
+    """Qué creció de `base_id` a `snapshot_id` (KeyError si alguno no existe)."""
+    with _snapshots_lock:
+        new, old = _snapshots[snapshot_id]["snapshot"], _snapshots[base_id]["snapshot"]
+    started = time.perf_counter()
+    stats = new.compare_to(old, key_type)
+    return {
+        "id": snapshot_id,
+        "base": base_id,
+        "size_diff_kb": round(sum(s.size_diff for s in stats) / 1024, 1),
+        "top": [_diff_row(s) for s in stats[:limit]],
+        "took_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
+
+
+def clear_snapshots():
+    with _snapshots_lock:
+        _snapshots.clear()
@@ -0,0 +1,139 @@
+# core/middleware.py
+import re
+
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.signals import request_finished
+from django.dispatch import receiver
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.viewsets import ViewSetMixin
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from core import memory, nplusone, profiling
+from core.db import routers
+
+
+def _requester(request):
+    """
+    Identidad para read-your-writes sin tocar la BD: el user_id del JWT
+    (firma y vencimiento se validan sin consulta) o, sin token, la IP.
+    """
+    header = request.headers.get("Authorization", "")
+    if header.startswith("Bearer "):
+        try:
+            return f"user:{AccessToken(header[len('Bearer '):].strip())[jwt_settings.USER_ID_CLAIM]}"
+        except (TokenError, KeyError):
+            pass
+    return f"ip:{request.META.get('REMOTE_ADDR', '')}"
+
+
+_REGEX_GROUP_RE = re.compile(r"\(\?P<(\w+)>[^)]*\)")
+
+
+def _route(request):
+    """Patrón de la URL (api/visits/<pk>/), no la ruta concreta: agrupa por endpoint."""
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return request.path
+    if not match.route:
+        return match.view_name
+    # las rutas del router son regex: api/visits/(?P<pk>[^/.]+)/$ -> api/visits/<pk>/
+    return _REGEX_GROUP_RE.sub(r"<\1>", match.route).replace("^", "").rstrip("$")
+
+
+def reads_from_replica(view_func):
+    cls = getattr(view_func, "cls", None)
+    if cls is None:
+        return False
+    return getattr(cls, "replica_reads", issubclass(cls, ViewSetMixin))
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Decide por request si las lecturas van a la réplica (core/db/routers.py):
+    métodos seguros, vistas elegibles (viewsets o replica_reads = True) y
+    usuario no fijado al primario por una escritura reciente.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        # No se restaura al salir: las respuestas en streaming (.ics) leen después
+        # de que el middleware retorna; se limpia en request_finished (abajo).
+        routers.set_read_alias(None)
+        response = self.get_response(request)
+        if request.method not in SAFE_METHODS and routers.replica_configured():
+            routers.pin_to_primary(_requester(request))
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if (
+            request.method in SAFE_METHODS
+            and routers.replica_configured()
+            and reads_from_replica(view_func)
+            and not routers.is_pinned(_requester(request))
+        ):
+            routers.set_read_alias(routers.REPLICA_ALIAS)
+        return None
+
+
+@receiver(request_finished)
+def _reset_read_alias(sender, **kwargs):
+    # request_finished llega al cerrar la respuesta, también tras un streaming
+    routers.set_read_alias(None)
+
+
+class NPlusOneMiddleware:
+    """
+    Solo con NPLUSONE=1 (staging): detecta consultas repetidas por request y las
+    reporta con su culpable (core/nplusone.py). Desactivado no se instala.
+    """
+
+    def __init__(self, get_response):
+        if not nplusone.NPLUSONE_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with nplusone.track_queries() as tracker:
+            response = self.get_response(request)
+        findings = tracker.findings()
+        if findings:
+            nplusone.record(_route(request), request.method, findings)
+        return response
+
+
+class ProfilingMiddleware:
+    """
+    Perfila un request con ?_profile=1 o X-Profile: 1, solo para staff
+    (core/profiling.py). Sin la marca no agrega trabajo.
+    """
+
+    def __init__(self, get_response):
+        if not profiling.PROFILING_ALLOWED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not profiling.requested(request) or not profiling.may_profile(request):
+            return self.get_response(request)
+        response, profile_id = profiling.profile_request(request, self.get_response)
+        response["X-Profile-Id"] = profile_id
+        return response
+
+
+class MemoryMiddleware:
+    """RSS y asignaciones por ruta para /api/metrics/ (core/memory.py)."""
+
+    def __init__(self, get_response):
+        if not memory.MEMORY_METRICS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        measure = memory.RequestMemory()
+        response = self.get_response(request)
+        measure.finish(f"{request.method} {_route(request)}")
+        return response
@@ -1,7 +1,13 @@
 from django.db import models
 from django.conf import settings
 
-class ActiveManager(models.Manager):
+from .querycache import CacheableQuerySet
+
+# Manager con .cached() opcional (core/querycache.py)
+class CacheableManager(models.Manager.from_queryset(CacheableQuerySet)):
+    pass
+
+class ActiveManager(CacheableManager):
     def get_queryset(self):
         return super().get_queryset().filter(active=True)
 
@@ -9,16 +15,20 @@ class BaseModel(models.Model):
     active = models.BooleanField(default=True)
 
     # Managers
-    objects = models.Manager()         # todos (activos e inactivos)
+    objects = CacheableManager()       # todos (activos e inactivos)
     active_objects = ActiveManager()   # solo activos
 
     class Meta:
         abstract = True
 
     # Soft delete: marca como inactivo en lugar de borrar
+    # (con updated_at, si existe, para que el sync delta lo vea como tombstone)
     def delete(self, using=None, keep_parents=False):
         self.active = False
-        self.save(update_fields=["active"])
+        fields = ["active"]
+        if any(f.name == "updated_at" for f in self._meta.concrete_fields):
+            fields.append("updated_at")
+        self.save(update_fields=fields)
 
 class TimeStampedModel(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
@@ -41,3 +51,41 @@ class TimeStampedModel(models.Model):
 
     class Meta:
         abstract = True
+
+
+# ---------------- Índice de búsqueda global (ver core/search.py) ----------------
+class SearchEntry(models.Model):
+    """Un documento indexado: qué objeto es y cómo mostrarlo en los resultados."""
+    kind = models.CharField(max_length=20)          # customer, contact, plan, visit
+    object_id = models.PositiveBigIntegerField()
+    label = models.CharField(max_length=255)
+    subtitle = models.CharField(max_length=255, blank=True, default="")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["kind", "object_id"], name="searchentry_kind_object_uniq"),
+        ]
+
+    def __str__(self):
+        return f"{self.kind}#{self.object_id} {self.label}"
+
+
+class SearchTerm(models.Model):
+    """
+    Índice invertido: un término normalizado (sin tildes, minúsculas) por documento.
+    Las búsquedas son por prefijo (term LIKE 'x%'), que sí usa el índice (term, kind).
+    """
+    term = models.CharField(max_length=64)
+    kind = models.CharField(max_length=20)
+    object_id = models.PositiveBigIntegerField()
+    weight = models.PositiveSmallIntegerField(default=1)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["term", "kind"], name="searchterm_term_kind_idx"),
+            models.Index(fields=["kind", "object_id"], name="searchterm_object_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.term} -> {self.kind}#{self.object_id}"
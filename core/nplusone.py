@@ -0,0 +1,187 @@
+# core/nplusone.py
+"""
+Detector de N+1 en tiempo de ejecución (staging), complemento de
+ReadQueryBudgetTests: mira el tráfico real en vez de los datos de prueba.
+
+Con NPLUSONE=1, core.middleware.NPlusOneMiddleware agrupa por forma
+(core/sqlshape.py) las consultas de cada request. Si una forma se repite más
+de NPLUSONE_THRESHOLD veces:
+
+- se inspecciona la pila una sola vez (para esa forma en ese request) y se
+  busca el culpable: el campo del serializer que se estaba representando, el
+  atributo del modelo (FK, relación inversa) y la primera línea del proyecto;
+- se sugiere select_related (FK / one-to-one) o prefetch_related (inversas, M2M);
+- se loguea en "core.nplusone" y se acumula por (ruta, forma) para
+  GET /api/nplusone/ (solo staff).
+
+Sin NPLUSONE=1 el middleware se desactiva al arrancar (costo cero).
+"""
+import logging
+import os
+import sys
+import threading
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections, models
+from django.utils import timezone
+
+from .sqlshape import sql_shape
+
+NPLUSONE_ENABLED = os.getenv("NPLUSONE", "0") == "1"
+# Repeticiones de una misma forma en un request a partir de las cuales se reporta
+NPLUSONE_THRESHOLD = int(os.getenv("NPLUSONE_THRESHOLD", "5"))
+# Hallazgos distintos que se guardan en memoria (ruta x forma)
+NPLUSONE_MAX_FINDINGS = 200
+
+logger = logging.getLogger("core.nplusone")
+
+_PROJECT_DIR = str(settings.BASE_DIR)
+# Envoltorios del cursor del propio proyecto: no son el código que consulta
+_INFRA_PATHS = (
+    os.path.abspath(__file__),
+    os.path.join(_PROJECT_DIR, "core", "querycache.py"),
+    os.path.join(_PROJECT_DIR, "core", "db") + os.sep,
+)
+
+_findings_lock = threading.Lock()
+_findings = {}
+
+
+# ---------------- Culpable ----------------
+
+def _relation_from_frame(frame):
+    """(modelo, atributo, sugerencia) si el frame es un acceso lazy a una relación."""
+    obj = frame.f_locals.get("self")
+    if obj is None:
+        return None
+    name = frame.f_code.co_name
+    if name == "__get__":
+        field = getattr(obj, "field", None)   # FK / one-to-one directo
+        if field is not None and hasattr(field, "model"):
+            return field.model.__name__, field.name, f'select_related("{field.name}")'
+        related = getattr(obj, "related", None)  # one-to-one inverso
+        if related is not None:
+            accessor = related.get_accessor_name()
+            return related.model.__name__, accessor, f'select_related("{accessor}")'
+    if name == "get_queryset" and getattr(obj, "prefetch_cache_name", None) and hasattr(obj, "instance"):
+        cache_name = obj.prefetch_cache_name  # M2M
+        return type(obj.instance).__name__, cache_name, f'prefetch_related("{cache_name}")'
+    # FK inversa: el RelatedManager devuelve un queryset que se evalúa después
+    # (p. ej. en ListSerializer); lo delata _known_related_objects.
+    qs = obj if isinstance(obj, models.QuerySet) else getattr(obj, "queryset", None)
+    if isinstance(qs, models.QuerySet) and qs._known_related_objects:
+        field = next(iter(qs._known_related_objects))
+        cache_name = field.remote_field.get_cache_name()
+        return field.related_model.__name__, cache_name, f'prefetch_related("{cache_name}")'
+    return None
+
+
+def _serializer_field_from_frame(frame):
+    # Serializer.to_representation recorre sus campos con la variable local `field`
+    if frame.f_code.co_name != "to_representation":
+        return None
+    obj, field = frame.f_locals.get("self"), frame.f_locals.get("field")
+    field_name = getattr(field, "field_name", None)
+    if obj is None or not field_name:
+        return None
+    return f"{type(obj).__name__}.{field_name}"
+
+
+def find_culprit(frame):
+    """Recorre la pila desde `frame` hacia afuera."""
+    culprit = {"relation": None, "serializer_field": None, "code": None, "suggestion": None}
+    while frame is not None:
+        if culprit["relation"] is None:
+            rel = _relation_from_frame(frame)
+            if rel is not None:
+                culprit["relation"] = f"{rel[0]}.{rel[1]}"
+                culprit["suggestion"] = rel[2]
+        if culprit["serializer_field"] is None:
+            culprit["serializer_field"] = _serializer_field_from_frame(frame)
+        filename = os.path.abspath(frame.f_code.co_filename)
+        if (
+            culprit["code"] is None
+            and filename.startswith(_PROJECT_DIR)
+            and not filename.startswith(_INFRA_PATHS)
+            and "site-packages" not in filename
+        ):
+            rel_path = os.path.relpath(filename, _PROJECT_DIR)
+            culprit["code"] = f"{rel_path}:{frame.f_lineno} in {frame.f_code.co_name}"
+        if all(culprit.values()):
+            break
+        frame = frame.f_back
+    return culprit
+
+
+# ---------------- Por request ----------------
+
+class QueryTracker:
+    def __init__(self, threshold=None):
+        self.threshold = NPLUSONE_THRESHOLD if threshold is None else threshold
+        self.counts = Counter()
+        self.culprits = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        shape = sql_shape(sql)
+        self.counts[shape] += 1
+        if self.counts[shape] == self.threshold + 1 and shape not in self.culprits:
+            self.culprits[shape] = find_culprit(sys._getframe(1))
+        return execute(sql, params, many, context)
+
+    def findings(self):
+        return [
+            {"shape": shape, "count": self.counts[shape], **culprit}
+            for shape, culprit in self.culprits.items()
+        ]
+
+
+@contextmanager
+def track_queries(threshold=None):
+    """Instala el tracker en todas las conexiones mientras dure el bloque."""
+    tracker = QueryTracker(threshold)
+    with ExitStack() as stack:
+        for conn in connections.all():
+            stack.enter_context(conn.execute_wrapper(tracker))
+        yield tracker
+
+
+# ---------------- Reporte acumulado ----------------
+
+def record(route, method, findings):
+    now = timezone.now()
+    with _findings_lock:
+        for f in findings:
+            key = (route, f["shape"])
+            entry = _findings.get(key)
+            if entry is None:
+                if len(_findings) >= NPLUSONE_MAX_FINDINGS:
+                    continue
+                entry = _findings[key] = {
+                    "route": route, "method": method, **f,
+                    "requests": 0, "max_count": 0, "first_seen": now,
+                }
+            entry["requests"] += 1
+            entry["max_count"] = max(entry["max_count"], f["count"])
+            entry["count"] = f["count"]
+            entry["last_seen"] = now
+    for f in findings:
+        logger.warning(
+            "N+1 en %s %s: %d consultas de la misma forma. Campo: %s. Relación: %s. Código: %s. "
+            "Sugerencia: %s. SQL: %s",
+            method, route, f["count"], f["serializer_field"], f["relation"], f["code"],
+            f["suggestion"], f["shape"][:300],
+        )
+
+
+def report():
+    with _findings_lock:
+        rows = [dict(entry) for entry in _findings.values()]
+    rows.sort(key=lambda r: (r["requests"] * r["max_count"]), reverse=True)
+    return rows
+
+
+def clear():
+    with _findings_lock:
+        _findings.clear()
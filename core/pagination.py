@@ -1,8 +1,83 @@
 # core/pagination.py
+import itertools
+import os
+
+from django.http import StreamingHttpResponse
+from rest_framework import status
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from .exceptions import ResponseTooLarge
+from .renderers import ORJSONRenderer
+
+# Presupuesto de las listas sin paginar (los by-* cuando no hay paginador)
+UNPAGINATED_MAX_ROWS = int(os.getenv("UNPAGINATED_MAX_ROWS", "2000"))
+UNPAGINATED_MAX_BYTES = int(os.getenv("UNPAGINATED_MAX_BYTES", str(8 * 1024 * 1024)))
+# Qué hacer al pasarlo: "stream" (JSON por partes, memoria acotada) o "reject" (413).
+# El streaming es solo JSON: si se negoció otro formato (msgpack, browsable API) es 413.
+UNPAGINATED_OVER_BUDGET = os.getenv("UNPAGINATED_OVER_BUDGET", "stream")
+UNPAGINATED_CHUNK = 200
+
 
 class StandardResultsSetPagination(PageNumberPagination):
     page_query_param = "page"           # ?page=1
     page_size_query_param = "page_size" # ?page_size=50
     page_size = 25                      # tamaño por defecto
     max_page_size = 200                 # límite superior
+
+
+def _chunks(queryset, serializer_class, context):
+    """Serializa de a UNPAGINATED_CHUNK filas: [(datos, bytes JSON)]."""
+    renderer = ORJSONRenderer()
+    batch = []
+    for obj in queryset.iterator(chunk_size=UNPAGINATED_CHUNK):
+        batch.append(obj)
+        if len(batch) == UNPAGINATED_CHUNK:
+            data = serializer_class(batch, many=True, context=context).data
+            yield data, renderer.render(data)
+            batch = []
+    if batch:
+        data = serializer_class(batch, many=True, context=context).data
+        yield data, renderer.render(data)
+
+
+def _stream_json(bodies):
+    # une los arreglos de cada chunk en uno solo: [a,b] + [c] -> [a,b,c]
+    yield b"["
+    sep = b""
+    for body in bodies:
+        if body != b"[]":
+            yield sep + body[1:-1]
+            sep = b","
+    yield b"]"
+
+
+def _accepts_json(context):
+    renderer = getattr(context.get("request"), "accepted_renderer", None)
+    return renderer is None or isinstance(renderer, JSONRenderer)
+
+
+def unpaginated_response(queryset, serializer_class, context):
+    """
+    Respuesta de una lista sin paginar, con presupuesto de filas y bytes:
+    mientras quepa se devuelve un Response normal; si lo pasa, según
+    UNPAGINATED_OVER_BUDGET se sigue en streaming (sin tener toda la lista en
+    memoria) o se corta con 413. Solo se hace streaming si el cliente negoció
+    JSON; con otro renderer (p. ej. msgpack) no hay forma de seguir por partes
+    sin cambiarle el formato, así que se corta con 413.
+    """
+    chunks = _chunks(queryset, serializer_class, context)
+    buffered, rows, size = [], 0, 0
+    for data, body in chunks:
+        buffered.append((data, body))
+        rows += len(data)
+        size += len(body)
+        if rows > UNPAGINATED_MAX_ROWS or size > UNPAGINATED_MAX_BYTES:
+            if UNPAGINATED_OVER_BUDGET != "stream" or not _accepts_json(context):
+                raise ResponseTooLarge()
+            bodies = itertools.chain([body for _data, body in buffered], (body for _data, body in chunks))
+            response = StreamingHttpResponse(_stream_json(bodies), content_type="application/json")
+            response["X-Unpaginated-Streamed"] = "1"
+            return response
+    return Response([item for data, _body in buffered for item in data], status=status.HTTP_200_OK)
@@ -0,0 +1,270 @@
+# core/profiling.py
+"""
+Perfil de un request puntual, a pedido (solo staff), para casos que no se
+reproducen en local (p. ej. un by-customer lento para un cliente grande):
+
+    GET /api/visits/by-customer/123/?_profile=1
+    (o el header  X-Profile: 1)
+
+core.middleware.ProfilingMiddleware corre ese request bajo cProfile, registra
+cada consulta SQL con su tiempo y guarda en settings.PROFILES_DIR:
+
+    <id>.prof   estadísticas de cProfile (pstats, snakeviz, gprof2dot)
+    <id>.json   método, ruta, status, duración, usuario y las consultas
+
+La respuesta trae el header X-Profile-Id; GET /api/profiles/ los lista y
+/api/profiles/<id>/ los muestra (JSON, ?view=stats, ?view=flame, ?view=raw).
+
+Sin la marca el middleware solo mira el query string y el header.
+Las respuestas en streaming (.ics) se perfilan hasta que la vista retorna,
+no mientras se recorre el contenido.
+"""
+import cProfile
+import html
+import io
+import json
+import os
+import pstats
+import re
+import time
+import uuid
+import zlib
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+DISABLE_AUTH = os.getenv("DISABLE_AUTH", "0") == "1"
+PROFILING_ALLOWED = os.getenv("PROFILING", "1") == "1"
+# Perfiles que se conservan en disco (los más viejos se borran)
+PROFILES_KEEP = int(os.getenv("PROFILES_KEEP", "100"))
+
+PROFILE_PARAM = "_profile"
+PROFILE_HEADER = "HTTP_X_PROFILE"
+
+_ID_RE = re.compile(r"^[0-9]{8}T[0-9]{6}-[0-9a-f]{8}$")
+
+
+# ---------------- Disparo ----------------
+
+def requested(request):
+    """Barato a propósito: se llama en todos los requests."""
+    if request.META.get(PROFILE_HEADER, "") not in ("", "0"):
+        return True
+    if PROFILE_PARAM not in request.META.get("QUERY_STRING", ""):
+        return False
+    return request.GET.get(PROFILE_PARAM) not in (None, "", "0")
+
+
+def may_profile(request):
+    """
+    Solo staff, por el JWT del header (DRF aún no autenticó). La sesión del admin no
+    cuenta: la API solo acepta JWT, así que ese request respondería 401 igual.
+    """
+    if DISABLE_AUTH:
+        return True
+    try:
+        result = JWTAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return False
+    user = result[0] if result else None
+    return bool(user and user.is_staff)
+
+
+# ---------------- Captura ----------------
+
+class SQLRecorder:
+    """execute_wrapper: cada consulta con su alias y duración."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({
+                "alias": context["connection"].alias,
+                "sql": sql,
+                "params": repr(params)[:500],
+                "many": many,
+                "ms": round((time.perf_counter() - start) * 1000, 3),
+            })
+
+
+def profile_request(request, get_response):
+    """Corre el request perfilado; devuelve (respuesta, id del perfil)."""
+    recorder = SQLRecorder()
+    profiler = cProfile.Profile()
+    started_at = timezone.now()
+    start = time.perf_counter()
+    with ExitStack() as stack:
+        for conn in connections.all():
+            stack.enter_context(conn.execute_wrapper(recorder))
+        profiler.enable()
+        try:
+            response = get_response(request)
+        finally:
+            profiler.disable()
+    duration_ms = (time.perf_counter() - start) * 1000
+
+    profile_id = f"{started_at:%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}"
+    user = getattr(request, "user", None)
+    meta = {
+        "id": profile_id,
+        "created_at": started_at.isoformat(),
+        "method": request.method,
+        "path": request.get_full_path(),
+        "status": response.status_code,
+        "duration_ms": round(duration_ms, 3),
+        "user": user.get_username() if user and user.is_authenticated else None,
+        "query_count": len(recorder.queries),
+        "query_ms": round(sum(q["ms"] for q in recorder.queries), 3),
+        "queries": recorder.queries,
+    }
+    save_profile(profile_id, profiler, meta)
+    return response, profile_id
+
+
+# ---------------- Almacenamiento ----------------
+
+def profiles_dir():
+    return str(settings.PROFILES_DIR)
+
+
+def _path(profile_id, ext):
+    if not _ID_RE.match(profile_id or ""):
+        raise FileNotFoundError(profile_id)
+    return os.path.join(profiles_dir(), f"{profile_id}.{ext}")
+
+
+def save_profile(profile_id, profiler, meta):
+    os.makedirs(profiles_dir(), exist_ok=True)
+    profiler.dump_stats(_path(profile_id, "prof"))
+    with open(_path(profile_id, "json"), "w", encoding="utf-8") as fh:
+        json.dump(meta, fh, ensure_ascii=False)
+    prune_profiles()
+
+
+def list_profiles():
+    """Metadatos (sin las consultas), del más nuevo al más viejo."""
+    try:
+        names = sorted((n for n in os.listdir(profiles_dir()) if n.endswith(".json")), reverse=True)
+    except FileNotFoundError:
+        return []
+    rows = []
+    for name in names:
+        try:
+            meta = load_meta(name[:-len(".json")])
+        except (FileNotFoundError, ValueError):
+            continue
+        meta.pop("queries", None)
+        rows.append(meta)
+    return rows
+
+
+def prune_profiles():
+    names = sorted(n for n in os.listdir(profiles_dir()) if n.endswith(".json"))
+    for name in names[:max(len(names) - PROFILES_KEEP, 0)]:
+        delete_profile(name[:-len(".json")])
+
+
+def load_meta(profile_id):
+    with open(_path(profile_id, "json"), encoding="utf-8") as fh:
+        return json.load(fh)
+
+
+def profile_file(profile_id):
+    path = _path(profile_id, "prof")
+    if not os.path.exists(path):
+        raise FileNotFoundError(profile_id)
+    return path
+
+
+def delete_profile(profile_id):
+    for ext in ("prof", "json"):
+        try:
+            os.remove(_path(profile_id, ext))
+        except FileNotFoundError:
+            pass
+
+
+# ---------------- Presentación ----------------
+
+PSTATS_SORTS = {"cumulative", "tottime", "calls", "ncalls", "time"}
+
+
+def stats_text(profile_id, sort="cumulative", limit=60):
+    out = io.StringIO()
+    stats = pstats.Stats(profile_file(profile_id), stream=out)
+    stats.strip_dirs().sort_stats(sort if sort in PSTATS_SORTS else "cumulative").print_stats(limit)
+    return out.getvalue()
+
+
+def _label(func):
+    filename, line, name = func
+    if filename == "~":
+        return name  # builtins: "<method 'execute' of ...>"
+    return f"{name} ({os.path.basename(filename)}:{line})"
+
+
+def call_tree(profile_id, min_fraction=0.005, max_depth=60, max_nodes=5000):
+    """
+    Árbol de llamadas aproximado desde pstats (como snakeviz): el ancho de
+    cada hijo es el tiempo acumulado de esa función cuando la llamó ese padre.
+    """
+    stats = pstats.Stats(profile_file(profile_id)).stats
+    callees = {}
+    for func, (_cc, _nc, _tt, _ct, callers) in stats.items():
+        for caller, edge in callers.items():
+            callees.setdefault(caller, []).append((func, edge[3]))
+    roots = [(f, v[3]) for f, v in stats.items() if not v[4]]
+    total = sum(ct for _f, ct in roots) or 1e-9
+    budget = [max_nodes]
+
+    def build(func, ct, path):
+        budget[0] -= 1
+        node = {"name": _label(func), "value": ct, "children": []}
+        if len(path) < max_depth and budget[0] > 0:
+            for child, child_ct in sorted(callees.get(func, ()), key=lambda c: -c[1]):
+                if budget[0] > 0 and child not in path and child_ct / total >= min_fraction:
+                    node["children"].append(build(child, child_ct, path | {child}))
+        return node
+
+    children = [build(f, ct, {f}) for f, ct in sorted(roots, key=lambda r: -r[1]) if ct / total >= min_fraction]
+    return {"name": "request", "value": total, "children": children}
+
+
+def flame_svg(profile_id, width=1200, row=18):
+    """Flame graph (icicle, de arriba hacia abajo) en SVG, con el detalle en el title."""
+    tree = call_tree(profile_id)
+    total = tree["value"]
+    rects, depth = [], [0]
+
+    def draw(node, x, w, level):
+        depth[0] = max(depth[0], level)
+        label = html.escape(f'{node["name"]} — {node["value"] * 1000:.1f} ms ({100 * node["value"] / total:.1f}%)')
+        hue = 10 + zlib.crc32(node["name"].encode()) % 40
+        text = html.escape(node["name"][: int(w / 7)]) if w > 30 else ""
+        rects.append(
+            f'<g><title>{label}</title><rect x="{x:.2f}" y="{level * row}" width="{max(w - 0.5, 0.1):.2f}" '
+            f'height="{row - 1}" fill="hsl({hue},85%,60%)"/>'
+            f'<text x="{x + 3:.2f}" y="{level * row + row - 5}">{text}</text></g>'
+        )
+        # el árbol es aproximado: si los hijos suman más que el padre, se escalan
+        children_total = sum(c["value"] for c in node["children"])
+        scale = w / max(children_total, node["value"], 1e-9)
+        for child in node["children"]:
+            draw(child, x, child["value"] * scale, level + 1)
+            x += child["value"] * scale
+
+    draw(tree, 0, width, 0)
+    height = (depth[0] + 1) * row
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+        f'font-family="monospace" font-size="11">' + "".join(rects) + "</svg>"
+    )
@@ -0,0 +1,87 @@
+# core/query_budgets.py
+"""
+Presupuestos de consultas SQL por endpoint, verificados por core/tests.py.
+
+Este archivo es el que se revisa en code review: subir un número tiene que venir
+justificado en el PR. Si un test falla por una consulta de más, muestra el SQL
+(o la forma repetida, en un N+1) para corregir la vista o el serializer.
+"""
+
+# Escrituras (create / update): consultas por request.
+WRITE_QUERY_BUDGETS = {
+    "customer-create": 3,
+    "customer-update": 4,
+    "customer-contact-create": 5,
+    "customer-contact-update": 5,
+    "plan-create": 2,
+    "plan-update": 3,
+    "plan-task-create": 2,
+    "plan-task-update": 2,
+    "plan-subscription-create": 6,
+    "plan-subscription-update": 2,
+    "visit-create": 13,
+    "visit-update": 9,
+    "task-completed-create": 3,
+    "task-completed-update": 2,
+    "material-used-create": 2,
+    "material-used-update": 2,
+    "assessment-create": 3,
+    "assessment-update": 2,
+    "evidence-create": 2,
+    "evidence-update": 2,
+    "user-create": 3,
+    "user-update": 2,
+}
+
+# Lecturas (GET de cada ruta del router, por nombre de URL). Además del tope, el
+# número no puede crecer con la cantidad de filas: se mide con pocos y con más datos.
+READ_QUERY_BUDGETS = {
+    # users
+    "user-list": 2,
+    "user-me": 0,
+    "user-detail": 1,
+    # customers
+    "customer-list": 2,
+    "customer-detail": 1,
+    "customer-overview": 8,
+    "customer-contact-list": 2,
+    "customer-contact-by-customer": 3,
+    "customer-contact-detail": 1,
+    # plans
+    "plans-list": 3,
+    "plans-detail": 2,
+    "plan-tasks-list": 2,
+    "plan-tasks-by-plan": 3,
+    "plan-tasks-detail": 1,
+    "plan-subscriptions-list": 3,
+    "plan-subscriptions-by-customer": 4,
+    "plan-subscriptions-by-plan": 4,
+    "plan-subscriptions-detail": 2,
+    # visits
+    "visit-list": 5,
+    "visit-detail": 4,
+    "visit-agenda": 1,
+    "visit-agenda-ics": 2,
+    "visit-agenda-ics-token": 1,
+    "visit-conflicts": 1,
+    "assessment-list": 2,
+    "assessment-detail": 1,
+    "assessment-by-customer": 2,
+    "assessment-by-visit": 2,
+    "evidence-list": 2,
+    "evidence-detail": 1,
+    "evidence-by-customer": 2,
+    "evidence-by-visit": 3,
+    "task-completed-list": 2,
+    "task-completed-detail": 1,
+    "task-completed-by-customer": 2,
+    "task-completed-by-visit": 3,
+    "material-used-list": 2,
+    "material-used-detail": 1,
+    "material-used-by-customer": 2,
+    "material-used-by-visit": 3,
+}
+
+# Query string para las rutas GET que lo necesitan ({"nombre-url": {...}})
+READ_QUERY_PARAMS = {
+}
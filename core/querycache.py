@@ -0,0 +1,175 @@
+# core/querycache.py
+"""
+Cache opcional de resultados del ORM para datos de referencia (planes, tareas
+de plan, clientes, usuarios), que se leen mucho más de lo que se escriben.
+
+    Plan.objects.cached().get(pk=plan_id)
+
+- La clave es el SQL + parámetros de la consulta más la versión de cada tabla
+  que lee (incluidas las de subconsultas y joins).
+- Cualquier escritura a una tabla (save, QuerySet.update, bulk_*, delete, los
+  UPDATE de un cascade, SQL crudo) sube su versión: se detecta en el cursor
+  (execute_wrapper instalado en cada conexión), no por señales, que
+  QuerySet.update no dispara.
+- Dentro de una transacción la versión sube al confirmar; hasta entonces esa
+  conexión no usa el cache para las tablas que tocó (ve sus propios cambios).
+- La versión se lee antes de la consulta: si una escritura llega entre medio,
+  el resultado queda bajo la versión vieja y nadie lo vuelve a pedir.
+- Las lecturas con cache van al primario aunque el request lea de la réplica
+  (core/db/routers.py): la réplica podría ir detrás de la versión.
+- Solo .get() / iteración / first() / list(); count(), exists(), aggregate()
+  e iterator() van siempre a la BD.
+
+Vive en el cache de Django: con varios workers debe ser compartido (REDIS_URL)
+para que una escritura en uno invalide a los demás; QUERY_CACHE_TTL acota el
+peor caso. Por eso viene apagado salvo que haya REDIS_URL (QUERY_CACHE=1 lo
+fuerza, p.ej. con un solo worker).
+"""
+import hashlib
+import os
+import re
+import threading
+import time
+
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.db import DEFAULT_DB_ALIAS, connections, models
+
+# Con LocMemCache (por proceso) cada worker serviría lecturas viejas tras escrituras de otro
+QUERY_CACHE_ENABLED = os.getenv("QUERY_CACHE", "1" if os.getenv("REDIS_URL") else "0") == "1"
+QUERY_CACHE_TTL = int(os.getenv("QUERY_CACHE_TTL", "300"))
+
+# Modelos cuyas búsquedas por FK en serializers pasan por el cache (core/bulk.py)
+QUERY_CACHE_MODELS = {"plans.plan", "plans.plantask", "customers.customer", "users.user"}
+
+_READ_TABLES_RE = re.compile(r'\b(?:FROM|JOIN)\s+[`"]([^`"]+)[`"]', re.IGNORECASE)
+_WRITE_TABLE_RE = re.compile(
+    r'^\s*(?:INSERT\s+(?:IGNORE\s+)?INTO|REPLACE\s+INTO|UPDATE|DELETE\s+(?:[`"][^`"]+[`"]\s+)?FROM)\s+[`"]?([\w.]+)',
+    re.IGNORECASE,
+)
+_WRITE_PREFIXES = ("INSERT", "UPDATE", "DELETE", "REPLAC")
+_MISS = object()
+
+_stats_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "bypassed": 0, "bumps": 0}
+
+
+def _count(name, n=1):
+    with _stats_lock:
+        _stats[name] += n
+
+
+def query_cache_stats():
+    with _stats_lock:
+        return dict(_stats)
+
+
+# ---------------- Versiones por tabla ----------------
+
+def _version_key(table):
+    return f"qc:v:{table}"
+
+
+def table_versions(tables):
+    keys = [_version_key(t) for t in tables]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            # nunca volver a 0: tras un desalojo, una versión vieja podría coincidir
+            cache.add(key, time.time_ns(), None)
+            found[key] = cache.get(key)
+    return [found[k] for k in keys]
+
+
+def bump_tables(tables):
+    for table in tables:
+        key = _version_key(table)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), None)
+    _count("bumps", len(tables))
+
+
+def _dirty_tables(conn):
+    dirty = conn.__dict__.setdefault("_querycache_dirty", set())
+    if dirty and not conn.in_atomic_block:
+        dirty.clear()  # la transacción terminó (commit o rollback)
+    return dirty
+
+
+def track_writes(execute, sql, params, many, context):
+    """execute_wrapper: sube la versión de la tabla escrita (al confirmar, si hay transacción)."""
+    result = execute(sql, params, many, context)
+    if sql[:7].lstrip().upper().startswith(_WRITE_PREFIXES):
+        m = _WRITE_TABLE_RE.match(sql)
+        if m:
+            tables = (m.group(1).rsplit(".", 1)[-1],)
+            conn = context["connection"]
+            if conn.in_atomic_block:
+                _dirty_tables(conn).update(tables)
+                conn.on_commit(lambda: bump_tables(tables))
+            else:
+                bump_tables(tables)
+    return result
+
+
+def install_write_tracking(sender, connection, **kwargs):
+    """Receptor de connection_created (core/apps.py)."""
+    if track_writes not in connection.execute_wrappers:
+        connection.execute_wrappers.append(track_writes)
+
+
+# ---------------- QuerySet ----------------
+
+def _fetch_cached(qs):
+    conn = connections[qs.db]
+    try:
+        sql, params = qs.query.get_compiler(using=qs.db).as_sql()
+    except EmptyResultSet:
+        return None
+    tables = sorted(set(_READ_TABLES_RE.findall(sql)))
+    if not tables or _dirty_tables(conn).intersection(tables):
+        _count("bypassed")
+        return None
+    versions = table_versions(tables)
+    raw = "\x1f".join((qs.db, qs._iterable_class.__name__, sql, repr(params), repr(versions)))
+    key = "qc:r:" + hashlib.sha1(raw.encode()).hexdigest()
+    results = cache.get(key, _MISS)
+    if results is not _MISS:
+        _count("hits")
+        return results
+    _count("misses")
+    results = list(qs._iterable_class(qs))
+    cache.set(key, results, QUERY_CACHE_TTL)
+    return results
+
+
+class CacheableQuerySet(models.QuerySet):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._use_query_cache = False
+
+    def cached(self):
+        clone = self._chain()
+        clone._use_query_cache = True
+        if clone._db is None:
+            clone._db = DEFAULT_DB_ALIAS
+        return clone
+
+    def _clone(self):
+        clone = super()._clone()
+        clone._use_query_cache = self._use_query_cache
+        return clone
+
+    def _fetch_all(self):
+        if self._result_cache is None and self._use_query_cache and QUERY_CACHE_ENABLED:
+            self._result_cache = _fetch_cached(self)
+        super()._fetch_all()
+
+
+def cacheable(queryset):
+    """.cached() si el modelo está en QUERY_CACHE_MODELS y su queryset lo soporta."""
+    if queryset.model._meta.label_lower in QUERY_CACHE_MODELS and isinstance(queryset, CacheableQuerySet):
+        return queryset.cached()
+    return queryset
@@ -0,0 +1,84 @@
+# core/renderers.py
+"""
+Renderers y parsers registrados en REST_FRAMEWORK (config/settings.py).
+
+- ORJSONRenderer / ORJSONParser: application/json con orjson. Misma salida
+  que el JSONRenderer de DRF (compacto, UTF-8, fechas y Decimal con el mismo
+  encoder), en una fracción del tiempo. Con indent (?format=api, Accept:
+  application/json; indent=2) o algo que orjson no sabe codificar, cae al de DRF.
+- MessagePackRenderer / MessagePackParser: application/msgpack (o
+  application/x-msgpack, ?format=msgpack) para la app móvil: mismo contenido
+  que el JSON, binario y más chico.
+
+Se eligen por Accept / Content-Type como cualquier renderer de DRF.
+    python manage.py bench_renderers   compara tiempos y tamaños por endpoint.
+"""
+import msgpack
+import orjson
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser, JSONParser
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+# datetime / date / time / UUID / dataclass los resuelve el encoder de DRF
+# (p. ej. recorta microsegundos y usa "Z"), igual que con json.dumps
+_ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+_drf_default = JSONEncoder().default
+
+
+class ORJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        renderer_context = renderer_context or {}
+        if self.get_indent(accepted_media_type, renderer_context) or self.ensure_ascii or not self.compact:
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=_drf_default, option=_ORJSON_OPTIONS)
+        except (orjson.JSONEncodeError, TypeError):
+            # enteros de más de 64 bits, claves no string, tipos raros: DRF decide
+            return super().render(data, accepted_media_type, renderer_context)
+        # como DRF: U+2028 / U+2029 escapados (válidos en JSON, no en JS)
+        if b"\xe2\x80\xa8" in ret or b"\xe2\x80\xa9" in ret:
+            ret = ret.replace(b"\xe2\x80\xa8", b"\\u2028").replace(b"\xe2\x80\xa9", b"\\u2029")
+        return ret
+
+
+class ORJSONParser(JSONParser):
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return orjson.loads(stream.read() if stream is not None else b"")
+        except orjson.JSONDecodeError as exc:
+            raise ParseError(f"JSON parse error - {exc}")
+
+
+class MessagePackRenderer(BaseRenderer):
+    media_type = "application/msgpack"
+    format = "msgpack"
+    charset = None
+    render_style = "binary"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        # Decimal, fechas, lazy strings...: lo mismo que saldría en el JSON
+        return msgpack.packb(data, default=_drf_default, use_bin_type=True, datetime=False)
+
+
+class XMessagePackRenderer(MessagePackRenderer):
+    """El tipo no registrado que todavía mandan algunos clientes."""
+    media_type = "application/x-msgpack"
+
+
+class MessagePackParser(BaseParser):
+    media_type = "application/msgpack"
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return msgpack.unpackb(stream.read() if stream is not None else b"", raw=False)
+        except (msgpack.ExtraData, msgpack.FormatError, msgpack.StackError, ValueError) as exc:
+            raise ParseError(f"MessagePack parse error - {exc}")
+
+
+class XMessagePackParser(MessagePackParser):
+    media_type = "application/x-msgpack"
@@ -0,0 +1,298 @@
+# core/search.py
+"""
+Búsqueda global sobre un índice invertido propio (SearchEntry / SearchTerm).
+
+Reemplaza los LIKE '%x%' de SearchFilter, que recorren varias columnas y joins
+sin poder usar índices. Cada documento (cliente, contacto, plan, visita) se
+tokeniza al guardarse (señales, on_commit) en términos normalizados con peso;
+una búsqueda es un LIKE 'x%' por token sobre el índice (term, kind).
+
+Es portable (MySQL en producción, SQLite en desarrollo): no depende de FULLTEXT
+ni de FTS5, y el prefijo permite buscar mientras se escribe.
+"""
+import re
+import unicodedata
+from collections import defaultdict
+
+from django.apps import apps
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Max, Q, Value, When
+
+from .models import SearchEntry, SearchTerm
+
+TERM_MAX_LENGTH = 64
+TERM_MIN_LENGTH = 2
+QUERY_MAX_TOKENS = 6
+SEARCH_DEFAULT_LIMIT = 20
+SEARCH_MAX_LIMIT = 100
+INDEX_BATCH_SIZE = 500
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def normalize(text):
+    """minúsculas y sin tildes: 'Peña Álvarez' -> 'pena alvarez'"""
+    text = unicodedata.normalize("NFKD", str(text or "")).encode("ascii", "ignore").decode()
+    return text.lower()
+
+
+def tokenize(text, compact=False):
+    """
+    Tokens alfanuméricos normalizados. compact=True agrega además el valor sin
+    separadores (cédulas / teléfonos: '1-0234-0567' -> '102340567').
+    """
+    norm = normalize(text)
+    tokens = [t for t in _TOKEN_RE.findall(norm) if len(t) >= TERM_MIN_LENGTH]
+    if compact:
+        joined = "".join(_TOKEN_RE.findall(norm))
+        if len(joined) >= TERM_MIN_LENGTH and joined not in tokens:
+            tokens.append(joined)
+    return [t[:TERM_MAX_LENGTH] for t in tokens]
+
+
+# ---------------- Documentos por tipo ----------------
+# Cada builder devuelve (label, subtitle, [(texto, peso, compact), ...])
+
+def _customer_doc(c):
+    return c.name, c.identification or "", [
+        (c.name, 3, False),
+        (c.identification, 3, True),
+        (c.email, 2, False),
+        (c.phone, 2, True),
+        (c.location, 1, False),
+        (c.direction, 1, False),
+    ]
+
+
+def _contact_doc(ct):
+    customer = ct.customer.name if ct.customer_id else ""
+    return ct.name, customer, [
+        (ct.name, 3, False),
+        (ct.email, 2, False),
+        (ct.phone, 2, True),
+        (customer, 1, False),
+    ]
+
+
+def _plan_doc(p):
+    return p.name, "", [
+        (p.name, 3, False),
+        (p.description, 1, False),
+    ]
+
+
+def _visit_doc(v):
+    sub = v.subscription
+    customer = sub.customer if sub else None
+    name = customer.name if customer else ""
+    label = f"Visita #{v.pk}" + (f" — {name}" if name else "")
+    return label, v.start.date().isoformat() if v.start else "", [
+        (name, 2, False),
+        (customer.identification if customer else "", 2, True),
+        (v.site_address, 1, False),
+        (v.notes, 1, False),
+        (sub.notes if sub else "", 1, False),
+        (v.cancel_reason, 1, False),
+    ]
+
+
+# kind -> (modelo, builder, select_related para reindexar en lote)
+SEARCH_SOURCES = {
+    "customer": ("customers.Customer", _customer_doc, ()),
+    "contact": ("customers.CustomerContact", _contact_doc, ("customer",)),
+    "plan": ("plans.Plan", _plan_doc, ()),
+    "visit": ("visits.Visit", _visit_doc, ("subscription__customer",)),
+}
+
+
+def source_model(kind):
+    return apps.get_model(SEARCH_SOURCES[kind][0])
+
+
+def kind_for_model(model):
+    label = model._meta.label
+    for kind, (model_label, _, _) in SEARCH_SOURCES.items():
+        if model_label == label:
+            return kind
+    return None
+
+
+def _terms(fields):
+    """{término: peso} quedándose con el mayor peso por término."""
+    out = {}
+    for text, weight, compact in fields:
+        for term in tokenize(text, compact=compact):
+            if out.get(term, 0) < weight:
+                out[term] = weight
+    return out
+
+
+# ---------------- Mantenimiento del índice ----------------
+
+def remove_objects(kind, ids):
+    ids = list(ids)
+    if not ids:
+        return
+    SearchTerm.objects.filter(kind=kind, object_id__in=ids).delete()
+    SearchEntry.objects.filter(kind=kind, object_id__in=ids).delete()
+
+
+def index_objects(kind, objs):
+    """
+    (Re)indexa una lista de instancias de un mismo tipo: inactivas se quitan,
+    activas se reescriben (upsert de entradas + borrar/insertar términos).
+    """
+    _, builder, _ = SEARCH_SOURCES[kind]
+    live = [o for o in objs if getattr(o, "active", True)]
+    gone = [o.pk for o in objs if not getattr(o, "active", True)]
+
+    with transaction.atomic():
+        remove_objects(kind, gone)
+        if not live:
+            return 0
+        entries, terms = [], []
+        for obj in live:
+            label, subtitle, fields = builder(obj)
+            entries.append(SearchEntry(kind=kind, object_id=obj.pk, label=label[:255], subtitle=subtitle[:255]))
+            terms.extend(
+                SearchTerm(kind=kind, object_id=obj.pk, term=term, weight=weight)
+                for term, weight in _terms(fields).items()
+            )
+        SearchEntry.objects.bulk_create(
+            entries,
+            update_conflicts=True,
+            unique_fields=["kind", "object_id"],
+            update_fields=["label", "subtitle", "updated_at"],
+            batch_size=INDEX_BATCH_SIZE,
+        )
+        SearchTerm.objects.filter(kind=kind, object_id__in=[o.pk for o in live]).delete()
+        SearchTerm.objects.bulk_create(terms, batch_size=INDEX_BATCH_SIZE)
+    return len(live)
+
+
+def index_queryset(kind, qs, batch_size=INDEX_BATCH_SIZE):
+    """Reindexa un queryset por lotes keyset de id (para el comando y altas masivas)."""
+    _, _, related = SEARCH_SOURCES[kind]
+    qs = qs.select_related(*related).order_by("id") if related else qs.order_by("id")
+    done, last_id = 0, 0
+    while True:
+        batch = list(qs.filter(id__gt=last_id)[:batch_size])
+        if not batch:
+            return done
+        last_id = batch[-1].pk
+        done += index_objects(kind, batch)
+
+
+def reindex_ids(kind, ids):
+    ids = list(ids)
+    if ids:
+        index_queryset(kind, source_model(kind).objects.filter(pk__in=ids))
+
+
+def schedule_reindex(kind, ids):
+    """Reindexa después del commit (los .update() masivos no disparan señales)."""
+    ids = list(ids)
+    if ids:
+        transaction.on_commit(lambda: reindex_ids(kind, ids))
+
+
+# ---------------- Consultas ----------------
+
+def query_tokens(q):
+    tokens = []
+    for t in tokenize(q):
+        if t not in tokens:
+            tokens.append(t)
+    return tokens[:QUERY_MAX_TOKENS]
+
+
+def matching_ids(kind, tokens):
+    """
+    Subconsulta de object_id del tipo que contienen TODOS los tokens (por prefijo).
+    istartswith -> LIKE 'x%' sin BINARY en MySQL (usa el índice); los términos ya
+    están en minúsculas, así que es equivalente a startswith.
+    """
+    qs = None
+    for token in tokens:
+        ids = SearchTerm.objects.filter(kind=kind, term__istartswith=token).values("object_id")
+        qs = ids if qs is None else qs.filter(object_id__in=ids)
+    return qs
+
+
+def is_indexed(kind):
+    """¿Hay algo indexado del tipo? Vacío tras un despliegue sin rebuild_search_index."""
+    return SearchEntry.objects.filter(kind=kind).exists()
+
+
+def filter_queryset(queryset, kind, q):
+    """Restringe un queryset del tipo a los objetos que coinciden con q (todos los tokens)."""
+    tokens = query_tokens(q)
+    if not tokens:
+        return queryset.none() if q.strip() else queryset
+    return queryset.filter(pk__in=matching_ids(kind, tokens))
+
+
+def search(q, kinds=None, limit=SEARCH_DEFAULT_LIMIT):
+    """
+    Búsqueda global rankeada. Una consulta agregada sobre SearchTerm:
+    - por (kind, object_id) el mejor peso de cada token (x2 si el término es exacto)
+    - solo documentos que contienen todos los tokens
+    - score = suma de esos pesos
+    + una consulta por tipo presente para etiquetas y para descartar objetos ya
+      inactivos (bajas masivas que aún no pasaron por el índice).
+    """
+    tokens = query_tokens(q)
+    if not tokens:
+        return []
+    kinds = [k for k in (kinds or SEARCH_SOURCES) if k in SEARCH_SOURCES]
+
+    per_token = {}
+    for i, token in enumerate(tokens):
+        per_token[f"t{i}"] = Max(Case(
+            When(term=token, then=F("weight") * 2),
+            When(term__istartswith=token, then=F("weight")),
+            default=Value(0),
+            output_field=IntegerField(),
+        ))
+
+    match = Q()
+    for token in tokens:
+        match |= Q(term__istartswith=token)
+
+    score = sum((F(name) for name in per_token), Value(0))
+    rows = (
+        SearchTerm.objects
+        .filter(match, kind__in=kinds)
+        .values("kind", "object_id")
+        .annotate(**per_token)
+        .filter(**{f"{name}__gt": 0 for name in per_token})
+        .annotate(score=score)
+        .order_by("-score", "kind", "object_id")[:limit]
+    )
+    rows = list(rows)
+
+    ids_by_kind = defaultdict(list)
+    for row in rows:
+        ids_by_kind[row["kind"]].append(row["object_id"])
+
+    entries = {}
+    for kind, ids in ids_by_kind.items():
+        alive = set(
+            source_model(kind).objects.filter(pk__in=ids, active=True).values_list("pk", flat=True)
+        )
+        for e in SearchEntry.objects.filter(kind=kind, object_id__in=alive):
+            entries[(kind, e.object_id)] = e
+
+    results = []
+    for row in rows:
+        entry = entries.get((row["kind"], row["object_id"]))
+        if entry is None:
+            continue
+        results.append({
+            "type": row["kind"],
+            "id": row["object_id"],
+            "label": entry.label,
+            "subtitle": entry.subtitle,
+            "score": row["score"],
+        })
+    return results
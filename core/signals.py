@@ -0,0 +1,128 @@
+# core/signals.py
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+from . import search, typeahead
+
+
+def _reindex_after_commit(sender, instance, **kwargs):
+    kind = search.kind_for_model(sender)
+    pk = instance.pk
+    if kind == "customer":
+        transaction.on_commit(lambda: reindex_customer(pk))
+    else:
+        transaction.on_commit(lambda: search.reindex_ids(kind, [pk]))
+
+
+def _remove_after_commit(sender, instance, **kwargs):
+    kind = search.kind_for_model(sender)
+    pk = instance.pk
+    transaction.on_commit(lambda: search.remove_objects(kind, [pk]))
+
+
+def reindex_customer(pk):
+    reindex_customers([pk])
+
+
+def reindex_customers(ids):
+    """
+    Reindexa los clientes y, de los que cambiaron nombre o identificación (label/
+    subtitle de su entrada), también sus contactos y visitas, que incluyen esos datos.
+    """
+    from customers.models import CustomerContact
+    from visits.models import Visit
+
+    ids = list(ids)
+    entries = search.SearchEntry.objects.filter(kind="customer", object_id__in=ids)
+    before = {e[0]: e[1:] for e in entries.values_list("object_id", "label", "subtitle")}
+    search.reindex_ids("customer", ids)
+    after = {e[0]: e[1:] for e in entries.values_list("object_id", "label", "subtitle")}
+    changed = [pk for pk in ids if before.get(pk) != after.get(pk)]
+    if changed:
+        search.index_queryset("contact", CustomerContact.objects.filter(customer_id__in=changed))
+        search.index_queryset("visit", Visit.objects.filter(subscription__customer_id__in=changed))
+
+
+_NOTES_UNKNOWN = object()
+
+
+def _subscription_visits_after_commit(sender, instance, update_fields=None, **kwargs):
+    # las visitas indexan las notas de su suscripción: reindexarlas solo si cambiaron
+    if kwargs.get("created") or (update_fields is not None and "notes" not in update_fields):
+        return
+    notes = instance.__dict__.get("notes")
+    if notes == getattr(instance, "_loaded_notes", _NOTES_UNKNOWN):
+        return
+    instance._loaded_notes = notes
+    from visits.models import Visit
+
+    pk = instance.pk
+    transaction.on_commit(lambda: search.index_queryset("visit", Visit.objects.filter(subscription_id=pk)))
+
+
+def connect_search_signals():
+    from plans.models import PlanSubscription
+
+    for kind in search.SEARCH_SOURCES:
+        model = search.source_model(kind)
+        post_save.connect(_reindex_after_commit, sender=model, dispatch_uid=f"search-save-{kind}")
+        post_delete.connect(_remove_after_commit, sender=model, dispatch_uid=f"search-delete-{kind}")
+    post_save.connect(
+        _subscription_visits_after_commit, sender=PlanSubscription, dispatch_uid="search-save-subscription"
+    )
+
+
+# ---------------- Typeahead en memoria (core/typeahead.py) ----------------
+
+def _customer_typeahead(sender, instance, **kwargs):
+    index = typeahead.TYPEAHEAD_INDEXES["customer"]
+    deleted = "created" not in kwargs  # post_delete no trae 'created'
+    pk, name, identification = instance.pk, instance.name, instance.identification
+    alive = instance.active and not deleted
+
+    def apply():
+        if alive:
+            index.upsert(*typeahead.customer_entry(pk, name, identification))
+        else:
+            index.remove(pk)
+        index.bump_version()
+
+    transaction.on_commit(apply)
+
+
+def _plan_task_typeahead(sender, instance, **kwargs):
+    index = typeahead.TYPEAHEAD_INDEXES["plan_task"]
+    deleted = "created" not in kwargs
+    pk, name, plan_id = instance.pk, instance.name, instance.plan_id  # sin leer el plan
+    alive = instance.active and not deleted
+
+    def apply():
+        if not alive:
+            index.remove(pk)
+        else:
+            # El nombre del plan sale del propio índice. Si no lo tiene (plan inactivo o
+            # sin tareas cargadas) se recarga completo, y la carga ya filtra planes inactivos.
+            plan_name = index.group_label(plan_id)
+            if plan_name is None:
+                index.invalidate()
+                return
+            index.upsert(*typeahead.plan_task_entry(pk, name, plan_id, plan_name))
+        index.bump_version()
+
+    transaction.on_commit(apply)
+
+
+def _plan_typeahead(sender, instance, **kwargs):
+    # nombre / estado del plan afectan a todas sus tareas: recarga completa
+    transaction.on_commit(typeahead.TYPEAHEAD_INDEXES["plan_task"].invalidate)
+
+
+def connect_typeahead_signals():
+    from customers.models import Customer
+    from plans.models import Plan, PlanTask
+
+    for signal in (post_save, post_delete):
+        name = "save" if signal is post_save else "delete"
+        signal.connect(_customer_typeahead, sender=Customer, dispatch_uid=f"typeahead-{name}-customer")
+        signal.connect(_plan_task_typeahead, sender=PlanTask, dispatch_uid=f"typeahead-{name}-plantask")
+        signal.connect(_plan_typeahead, sender=Plan, dispatch_uid=f"typeahead-{name}-plan")
@@ -0,0 +1,39 @@
+# core/sqlshape.py
+"""
+"Forma" de una consulta SQL: el texto sin literales, para agrupar las que solo
+cambian en parámetros (el síntoma de un N+1: la misma forma repetida por fila).
+
+    SELECT ... WHERE "visits_visit"."id" = 17   ->  SELECT ... WHERE "visits_visit"."id" = ?
+    ... IN (1, 2, 3)                             ->  ... IN (?)
+"""
+import re
+from collections import Counter
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"(?<![\w\"`])-?\d+(?:\.\d+)?\b")
+_IN_LIST_RE = re.compile(r"\bIN\s*\((?:\s*\?\s*,)*\s*\?\s*\)", re.IGNORECASE)
+_SPACE_RE = re.compile(r"\s+")
+
+
+def sql_shape(sql):
+    shape = _STRING_RE.sub("?", sql)
+    shape = _NUMBER_RE.sub("?", shape)
+    shape = _IN_LIST_RE.sub("IN (?)", shape)
+    shape = shape.replace("%s", "?")
+    return _SPACE_RE.sub(" ", shape).strip()
+
+
+def shape_counts(queries):
+    """queries: [{'sql': ...}] (CaptureQueriesContext / connection.queries) o [str]."""
+    return Counter(sql_shape(q["sql"] if isinstance(q, dict) else q) for q in queries)
+
+
+def repeated_shapes(queries, threshold=2):
+    """[(forma, veces)] que se repiten al menos `threshold` veces, de más a menos."""
+    return [(shape, n) for shape, n in shape_counts(queries).most_common() if n >= threshold]
+
+
+def grown_shapes(small, large):
+    """[(forma, veces_chico, veces_grande)] de las que crecen con los datos."""
+    before, after = shape_counts(small), shape_counts(large)
+    return [(shape, before.get(shape, 0), n) for shape, n in after.most_common() if n > before.get(shape, 0)]
@@ -0,0 +1,147 @@
+# core/sync.py
+"""
+Sync delta para la app móvil (técnicos offline).
+
+Cada tabla se recorre por keyset (updated_at, id) sobre su índice *_sync_idx.
+El cursor es opaco para el cliente: base64 de {tabla: [updated_at_iso, id]}.
+Las filas con active=False viajan como tombstones (solo el id).
+"""
+import base64
+import binascii
+import json
+import os
+from datetime import datetime, timedelta
+
+from django.core.files.storage import default_storage
+from django.db import models
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from customers.models import Customer, CustomerContact
+from plans.models import Plan, PlanTask, PlanSubscription
+from visits.models import Visit, Assessment, Evidence, TaskCompleted, MaterialUsed
+
+# Tablas sincronizables (clave pública -> modelo). El orden es el de aplicación en el
+# cliente: padres antes que hijos.
+SYNC_MODELS = {
+    "customers": Customer,
+    "contacts": CustomerContact,
+    "plans": Plan,
+    "plan_tasks": PlanTask,
+    "subscriptions": PlanSubscription,
+    "visits": Visit,
+    "assessments": Assessment,
+    "evidences": Evidence,
+    "tasks_completed": TaskCompleted,
+    "materials_used": MaterialUsed,
+}
+
+SYNC_DEFAULT_LIMIT = 200
+SYNC_MAX_LIMIT = 1000
+
+# updated_at lo fija la app al guardar, no el commit: una transacción larga puede
+# confirmar filas "en el pasado". No entregamos lo más reciente hasta que se asiente.
+# Límite: una fila confirmada más de SYNC_SETTLE después de fijar su updated_at puede
+# quedar detrás de un cursor ya entregado y no llegar al cliente hasta que se vuelva a
+# modificar. Debe superar la transacción de escritura más larga (importaciones, cierres
+# masivos); se ajusta con SYNC_SETTLE_SECONDS.
+SYNC_SETTLE = timedelta(seconds=float(os.getenv("SYNC_SETTLE_SECONDS", "5")))
+
+
+def _sync_fields(model):
+    """Columnas planas del modelo (FKs como *_id), sin columnas generadas internas."""
+    return [
+        f.attname for f in model._meta.concrete_fields
+        if not getattr(f, "generated", False)
+    ]
+
+
+def _file_fields(model):
+    return [f.attname for f in model._meta.concrete_fields if isinstance(f, models.FileField)]
+
+
+def encode_cursor(marks):
+    raw = json.dumps(
+        {name: [ts.isoformat(), pk] for name, (ts, pk) in marks.items()},
+        separators=(",", ":"),
+    )
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """Cursor -> {tabla: (updated_at, id)}. Cursor vacío = sync completo."""
+    if not cursor:
+        return {}
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        data = json.loads(raw)
+        return {
+            name: (datetime.fromisoformat(ts), int(pk))
+            for name, (ts, pk) in data.items()
+            if name in SYNC_MODELS
+        }
+    except (binascii.Error, ValueError, TypeError, AttributeError):
+        raise ValidationError({"cursor": "Cursor inválido; reinicia el sync sin cursor."})
+
+
+def changed_rows(model, mark, upto, limit):
+    """
+    Filas de model con (updated_at, id) > mark y updated_at <= upto, ordenadas.
+    updated_at >= ts es un rango sobre el índice; el exclude solo descarta los
+    empates ya entregados. Sin mark (sync inicial) no se mandan tombstones.
+    """
+    qs = model.objects.filter(updated_at__lte=upto)
+    if mark is None:
+        qs = qs.filter(active=True)
+    else:
+        ts, pk = mark
+        qs = qs.filter(updated_at__gte=ts).exclude(updated_at=ts, id__lte=pk)
+    return list(qs.order_by("updated_at", "id").values(*_sync_fields(model))[: limit + 1])
+
+
+def sync_page(cursor=None, limit=SYNC_DEFAULT_LIMIT, tables=None, request=None):
+    """
+    Una página de cambios para todas las tablas pedidas.
+    Devuelve {"changes": {tabla: [filas]}, "deleted": {tabla: [ids]}, "cursor", "has_more"}.
+    Una tabla sin cambios cuesta una sola consulta (LIMIT sobre su índice de sync).
+    """
+    marks = decode_cursor(cursor)
+    names = [n for n in SYNC_MODELS if not tables or n in tables]
+    upto = timezone.now() - SYNC_SETTLE
+
+    changes, deleted, has_more = {}, {}, False
+    for name in names:
+        model = SYNC_MODELS[name]
+        rows = changed_rows(model, marks.get(name), upto, limit)
+        if len(rows) > limit:
+            rows = rows[:limit]
+            has_more = True
+        if not rows:
+            if name not in marks:
+                # tabla vacía en el sync inicial: fijamos la marca para no repetir el barrido
+                marks[name] = (upto, 0)
+            continue
+
+        marks[name] = (rows[-1]["updated_at"], rows[-1]["id"])
+        files = _file_fields(model)
+        live, gone = [], []
+        for row in rows:
+            if not row["active"]:
+                gone.append(row["id"])
+                continue
+            for f in files:
+                if row[f]:
+                    url = default_storage.url(row[f])
+                    row[f] = request.build_absolute_uri(url) if request is not None else url
+            live.append(row)
+        if live:
+            changes[name] = live
+        if gone:
+            deleted[name] = gone
+
+    return {
+        "changes": changes,
+        "deleted": deleted,
+        "cursor": encode_cursor(marks),
+        "has_more": has_more,
+    }
@@ -1,3 +1,967 @@
-from django.test import TestCase
+import io
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import tracemalloc
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock, skipIf
 
-# Create your tests here.
+import msgpack
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.apps import apps
+from django.db import IntegrityError, connection, connections, transaction
+from django.db.models import Exists, OuterRef
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLResolver, get_resolver, reverse
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from core import (
+    imports, memory, nplusone, pagination, profiling, querycache, renderers, search, sqlshape, sync, typeahead,
+)
+from core import views as core_views
+from core.db import pool, routers
+from core.exceptions import ResponseTooLarge
+from core.models import SearchEntry
+from core.query_budgets import READ_QUERY_BUDGETS, READ_QUERY_PARAMS, WRITE_QUERY_BUDGETS
+from core.db.backends.sqlite3.base import DatabaseWrapper as PooledSQLiteWrapper
+from customers.models import Customer, CustomerContact
+from customers.serializers import CustomerContactSerializer
+from plans.models import Plan, PlanTask, PlanSubscription
+from users.models import User
+from visits.models import Visit, TaskCompleted, MaterialUsed, Evidence, Assessment
+from visits.serializers import VisitSerializer
+
+
+class WriteQueryBudgetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="admin", email="admin@x.com", password="x", is_staff=True)
+        cls.customer = Customer.objects.create(name="ACME", identification="1-111", email="acme@x.com")
+        cls.contact = CustomerContact.objects.create(customer=cls.customer, name="Ana", email="ana@x.com", phone="1")
+        cls.plan = Plan.objects.create(name="Básico", price=100)
+        cls.task = PlanTask.objects.create(plan=cls.plan, name="Limpieza")
+        PlanTask.objects.create(plan=cls.plan, name="Revisión")
+        cls.sub = PlanSubscription.objects.create(
+            customer=cls.customer, plan=cls.plan, start_date=date.today(), status="active"
+        )
+        start = timezone.now() + timedelta(days=1)
+        cls.visit = Visit.objects.create(subscription=cls.sub, user=cls.user, start=start, end=start + timedelta(hours=1))
+        cls.done = TaskCompleted.objects.create(visit=cls.visit, plan_task=cls.task, name="Limpieza")
+        cls.material = MaterialUsed.objects.create(visit=cls.visit, description="Cable", unit_cost=5)
+        cls.evidence = Evidence.objects.create(visit=cls.visit, description="Foto")
+        cls.other_visit = Visit.objects.create(subscription=cls.sub, user=cls.user, start=start + timedelta(days=3))
+        cls.assessment = Assessment.objects.create(visit=cls.other_visit, rating=4)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def assertWithinBudget(self, name, method, url, payload, expected_status):
+        with CaptureQueriesContext(connection) as ctx:
+            resp = getattr(self.client, method)(url, payload, format="json")
+        self.assertEqual(resp.status_code, expected_status, resp.content)
+        used = len(ctx.captured_queries)
+        budget = WRITE_QUERY_BUDGETS[name]
+        sql = "\n".join(f"  {i + 1}. {q['sql']}" for i, q in enumerate(ctx.captured_queries))
+        self.assertLessEqual(used, budget, f"{name}: {used} consultas (presupuesto {budget})\n{sql}")
+        return resp
+
+    def test_users(self):
+        self.assertWithinBudget(
+            "user-create", "post", "/api/users/",
+            {"username": "tec", "password": "S3gura!2025", "email": "tec@x.com"}, 201,
+        )
+        self.assertWithinBudget("user-update", "patch", f"/api/users/{self.user.pk}/", {"phone": "8888"}, 200)
+
+    def test_customers(self):
+        self.assertWithinBudget("customer-create", "post", "/api/customers/", {"name": "Beta"}, 201)
+        self.assertWithinBudget(
+            "customer-update", "patch", f"/api/customers/{self.customer.pk}/", {"phone": "2222"}, 200
+        )
+
+    def test_customer_contacts(self):
+        self.assertWithinBudget(
+            "customer-contact-create", "post", "/api/customer-contact/",
+            {"customer": self.customer.pk, "name": "Luis", "email": "l@x.com", "phone": "3", "is_main": True}, 201,
+        )
+        self.assertWithinBudget(
+            "customer-contact-update", "patch", f"/api/customer-contact/{self.contact.pk}/", {"is_main": True}, 200
+        )
+
+    def test_plans(self):
+        self.assertWithinBudget("plan-create", "post", "/api/plans/", {"name": "Pro", "price": "10.00"}, 201)
+        self.assertWithinBudget("plan-update", "patch", f"/api/plans/{self.plan.pk}/", {"price": "120.00"}, 200)
+
+    def test_plan_tasks(self):
+        self.assertWithinBudget(
+            "plan-task-create", "post", f"/api/plan-tasks/?plan={self.plan.pk}", {"name": "Backup"}, 201
+        )
+        self.assertWithinBudget(
+            "plan-task-update", "patch", f"/api/plan-tasks/{self.task.pk}/", {"description": "x"}, 200
+        )
+
+    def test_plan_subscriptions(self):
+        self.assertWithinBudget(
+            "plan-subscription-create", "post", "/api/plan-subscriptions/",
+            {"customer": self.customer.pk, "plan": self.plan.pk, "start_date": str(date.today()), "status": "active"},
+            201,
+        )
+        self.assertWithinBudget(
+            "plan-subscription-update", "patch", f"/api/plan-subscriptions/{self.sub.pk}/", {"notes": "x"}, 200
+        )
+
+    def test_visits(self):
+        start = timezone.now() + timedelta(days=10)
+        self.assertWithinBudget(
+            "visit-create", "post", "/api/visit/?checklist=1",
+            {"subscription": self.sub.pk, "user": self.user.pk, "start": start.isoformat()}, 201,
+        )
+        self.assertWithinBudget("visit-update", "patch", f"/api/visit/{self.visit.pk}/", {"notes": "x"}, 200)
+
+    def test_visit_children(self):
+        self.assertWithinBudget(
+            "task-completed-create", "post", "/api/task-completed/",
+            {"visit": self.visit.pk, "plan_task": self.task.pk, "name": "Extra"}, 201,
+        )
+        self.assertWithinBudget(
+            "task-completed-update", "patch", f"/api/task-completed/{self.done.pk}/", {"completada": True}, 200
+        )
+        self.assertWithinBudget(
+            "material-used-create", "post", "/api/material-used/",
+            {"visit": self.visit.pk, "description": "Tornillos", "unit_cost": "1.50"}, 201,
+        )
+        self.assertWithinBudget(
+            "material-used-update", "patch", f"/api/material-used/{self.material.pk}/", {"unit": "caja"}, 200
+        )
+        self.assertWithinBudget(
+            "assessment-create", "post", "/api/assessment/", {"visit": self.visit.pk, "rating": 5}, 201
+        )
+        self.assertWithinBudget(
+            "assessment-update", "patch", f"/api/assessment/{self.assessment.pk}/", {"comment": "ok"}, 200
+        )
+        self.assertWithinBudget(
+            "evidence-create", "post", "/api/evidence/", {"visit": self.visit.pk, "description": "Antes"}, 201
+        )
+        self.assertWithinBudget(
+            "evidence-update", "patch", f"/api/evidence/{self.evidence.pk}/", {"description": "otra"}, 200
+        )
+
+
+# SQLite en archivo como sustituto local de MySQL: mismo ciclo conectar/prestar/devolver
+class ConnectionPoolTests(SimpleTestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix=".sqlite3")
+        os.close(fd)
+        self.addCleanup(os.remove, self.path)
+        self.opened = 0
+
+    def _connect(self):
+        self.opened += 1
+        return sqlite3.connect(self.path, check_same_thread=False)
+
+    def _pool(self, **kwargs):
+        p = pool.ConnectionPool("test", self._connect, lambda raw: raw.execute("SELECT 1"), **kwargs)
+        self.addCleanup(p.close_idle)
+        return p
+
+    def test_reuses_released_connections(self):
+        p = self._pool(max_size=2)
+        for _ in range(5):
+            raw = p.acquire()
+            raw.execute("SELECT 1")
+            p.release(raw)
+        self.assertEqual(self.opened, 1)
+        stats = p.stats()
+        self.assertEqual((stats["created"], stats["reused"], stats["in_use"], stats["idle"]), (1, 4, 0, 1))
+
+    def test_bounded_waits_then_times_out(self):
+        p = self._pool(max_size=1, timeout=0.05)
+        held = p.acquire()
+        with self.assertRaises(pool.PoolTimeout):
+            p.acquire()
+
+        got = []
+        waiter = threading.Thread(target=lambda: got.append(p.acquire()))
+        p.timeout = 2
+        waiter.start()
+        p.release(held)
+        waiter.join(2)
+        self.assertEqual(got, [held])
+        stats = p.stats()
+        self.assertEqual((stats["waits"], stats["timeouts"], stats["created"]), (2, 1, 1))
+
+    def test_health_check_replaces_broken_connection(self):
+        p = self._pool(max_size=1, check_idle=0)
+        raw = p.acquire()
+        p.release(raw)
+        raw.close()  # p.ej. el servidor la cortó por wait_timeout
+        fresh = p.acquire()
+        self.assertIsNot(fresh, raw)
+        self.assertEqual((p.stats()["broken"], self.opened), (1, 2))
+
+    def test_broken_connection_keeps_its_slot_while_replaced(self):
+        p = self._pool(max_size=1, timeout=0, check_idle=0)
+        raw = p.acquire()
+        p.release(raw)
+
+        def ping(conn):
+            # durante el health check el cupo sigue ocupado: nadie más abre otra
+            with self.assertRaises(pool.PoolTimeout):
+                p.acquire()
+            raise sqlite3.OperationalError("gone")
+
+        p._ping = ping
+        fresh = p.acquire()
+        self.assertIsNot(fresh, raw)
+        stats = p.stats()
+        self.assertEqual((stats["in_use"], stats["idle"], stats["broken"], self.opened), (1, 0, 1, 2))
+        p.release(fresh)
+        self.assertEqual(p.stats()["in_use"], 0)
+
+    def test_unusable_or_expired_connections_are_not_returned(self):
+        p = self._pool(max_size=2, max_lifetime=0)
+        raw = p.acquire()
+        p.release(raw)
+        self.assertEqual(p.stats()["idle"], 0)
+        raw = p.acquire()
+        p.release(raw, reusable=False)
+        self.assertEqual((p.stats()["discarded"], self.opened), (1, 2))
+
+    def test_backend_returns_connection_on_close(self):
+        settings_dict = {
+            **connection.settings_dict,
+            "ENGINE": "core.db.backends.sqlite3", "NAME": self.path, "CONN_MAX_AGE": 0,
+            "POOL": {"MAX_SIZE": 2},
+        }
+        self.addCleanup(lambda: [
+            pool._pools.pop(key).close_idle() for key in list(pool._pools) if key[0] == "pool-test"
+        ])
+        wrapper = PooledSQLiteWrapper(settings_dict, alias="pool-test")
+        for _ in range(3):
+            with wrapper.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            wrapper.close()
+        stats = pool.pool_stats()["pool-test"]
+        self.assertEqual((stats["created"], stats["reused"], stats["idle"]), (1, 2, 1))
+        # cerrada a mitad de transacción: se descarta
+        wrapper.set_autocommit(False)
+        wrapper.in_atomic_block = True
+        wrapper.close()
+        self.assertEqual(pool.pool_stats()["pool-test"]["idle"], 0)
+
+
+class ReplicaRoutingTests(TransactionTestCase):
+    """
+    La réplica es un segundo SQLite (archivo temporal) registrado solo para esta clase:
+    con TEST.MIRROR ambos alias serían la misma BD y no se distinguiría de dónde se leyó.
+    El alias se agrega a `databases` en setUpClass: el runner no lo conoce.
+    """
+    databases = {"default"}
+
+    @classmethod
+    def setUpClass(cls):
+        alias = routers.REPLICA_ALIAS
+        cls._tmp = tempfile.TemporaryDirectory()
+        replica = {"ENGINE": "django.db.backends.sqlite3", "NAME": os.path.join(cls._tmp.name, "replica.sqlite3")}
+        cls._override = override_settings(DATABASES={**settings.DATABASES, alias: replica})
+        cls._override.enable()
+        cls._previous = connections.settings.get(alias)
+        if hasattr(connections._connections, alias):
+            del connections[alias]
+        connections.settings[alias] = connections.configure_settings({**connections.settings, alias: replica})[alias]
+        with connections[alias].schema_editor() as editor:
+            for model in apps.get_models():
+                if model._meta.managed and not model._meta.proxy:
+                    editor.create_model(model)
+        cls.databases = {"default", alias}
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        alias = routers.REPLICA_ALIAS
+        cls.databases = {"default"}
+        connections[alias].close()
+        del connections[alias]
+        if cls._previous is None:
+            del connections.settings[alias]
+        else:
+            connections.settings[alias] = cls._previous
+        cls._override.disable()
+        cls._tmp.cleanup()
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="admin", email="admin@x.com", password="x", is_staff=True)
+        Customer.objects.using("default").create(name="Primario", identification="1-111")
+        Customer.objects.using(routers.REPLICA_ALIAS).create(name="Replica", identification="2-222")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _customer_names(self):
+        resp = self.client.get("/api/customers/")
+        self.assertEqual(resp.status_code, 200, resp.content)
+        return [row["name"] for row in resp.json()["results"]]
+
+    def test_router(self):
+        router = routers.ReplicaRouter()
+        self.assertEqual(router.db_for_read(Customer), "default")
+        with routers.read_from(routers.REPLICA_ALIAS):
+            self.assertEqual(router.db_for_read(Customer), routers.REPLICA_ALIAS)
+            self.assertEqual(router.db_for_write(Customer), "default")
+            with transaction.atomic():
+                self.assertEqual(router.db_for_read(Customer), "default")
+
+    def test_viewset_and_dashboard_reads_go_to_replica(self):
+        self.assertEqual(self._customer_names(), ["Replica"])
+        resp = self.client.get("/api/dashboard/overview/")
+        self.assertEqual(resp.status_code, 200, resp.content)
+        self.assertEqual(resp.json()["totals"]["total_customers"], 1)
+        # lo que no es viewset ni replica_reads sigue en el primario
+        resp = self.client.get("/api/search/", {"q": "primario"})
+        self.assertEqual(resp.status_code, 200, resp.content)
+
+    def test_reads_stay_on_primary_after_own_write(self):
+        resp = self.client.post("/api/customers/", {"name": "Nuevo", "identification": "3-333"}, format="json")
+        self.assertEqual(resp.status_code, 201, resp.content)
+        self.assertEqual(self._customer_names(), ["Nuevo", "Primario"])
+
+        cache.clear()  # vence la marca de REPLICA_PIN_SECONDS
+        self.assertEqual(self._customer_names(), ["Replica"])
+
+
+# TransactionTestCase: las versiones suben al confirmar (TestCase nunca confirma)
+class QueryCacheTests(TransactionTestCase):
+    databases = "__all__"
+
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch.object(querycache, "QUERY_CACHE_ENABLED", True)  # apagado sin REDIS_URL
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.plan = Plan.objects.create(name="Básico", price=100)
+        self.task = PlanTask.objects.create(plan=self.plan, name="Limpieza")
+
+    def _get_plan(self, **annotations):
+        return Plan.objects.cached().annotate(**annotations).get(pk=self.plan.pk)
+
+    def assertQueries(self, n, fn):
+        with CaptureQueriesContext(connection) as ctx:
+            result = fn()
+        self.assertEqual(len(ctx.captured_queries), n, [q["sql"] for q in ctx.captured_queries])
+        return result
+
+    def test_repeated_lookup_served_from_cache(self):
+        self.assertQueries(1, self._get_plan)
+        plan = self.assertQueries(0, self._get_plan)
+        self.assertEqual(plan.name, "Básico")
+        self.assertQueries(1, lambda: Plan.objects.get(pk=self.plan.pk))  # sin .cached(): BD
+
+    def test_queryset_update_invalidates(self):
+        self._get_plan()
+        Plan.objects.filter(pk=self.plan.pk).update(name="Premium")
+        self.assertEqual(self.assertQueries(1, self._get_plan).name, "Premium")
+
+    def test_subquery_tables_are_versioned(self):
+        has_tasks = Exists(PlanTask.objects.filter(plan=OuterRef("pk"), active=True))
+        self.assertTrue(self._get_plan(has_tasks=has_tasks).has_tasks)
+        PlanTask.objects.filter(pk=self.task.pk).update(active=False)
+        self.assertFalse(self.assertQueries(1, lambda: self._get_plan(has_tasks=has_tasks)).has_tasks)
+
+    def test_own_uncommitted_writes_bypass_cache_until_commit(self):
+        self._get_plan()
+        with transaction.atomic():
+            Plan.objects.filter(pk=self.plan.pk).update(name="En curso")
+            self.assertEqual(self.assertQueries(1, self._get_plan).name, "En curso")
+            self.assertQueries(1, self._get_plan)
+        self.assertEqual(self.assertQueries(1, self._get_plan).name, "En curso")
+        self.assertQueries(0, self._get_plan)
+
+    def test_rolled_back_writes_keep_cache(self):
+        self._get_plan()
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            Plan.objects.filter(pk=self.plan.pk).update(name="Revertido")
+            raise RuntimeError
+        self.assertEqual(self.assertQueries(0, self._get_plan).name, "Básico")
+
+    def test_serializer_fk_lookup_uses_cache(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user(username="a", email="a@x.com", password="x"))
+        client.post("/api/plan-tasks/", {"plan": self.plan.pk, "name": "Uno"}, format="json")
+        with CaptureQueriesContext(connection) as ctx:
+            resp = client.post("/api/plan-tasks/", {"plan": self.plan.pk, "name": "Dos"}, format="json")
+        self.assertEqual(resp.status_code, 201, resp.content)
+        self.assertFalse(any('FROM "plans_plan"' in q["sql"] for q in ctx.captured_queries))
+
+
+def _router_get_routes():
+    """(nombre, patrón) de cada ruta GET registrada en un router (viewsets y @action)."""
+    def walk(patterns):
+        for p in patterns:
+            if isinstance(p, URLResolver):
+                yield from walk(p.url_patterns)
+            else:
+                yield p
+
+    routes = {}
+    for p in walk(get_resolver().url_patterns):
+        actions = getattr(p.callback, "actions", None)
+        if not actions or "get" not in actions or "format" in p.pattern.regex.groupindex:
+            continue
+        routes.setdefault(p.name, p)
+    return routes
+
+
+class NPlusOneDetectorTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="tec", email="tec@x.com", password="x")
+        plan = Plan.objects.create(name="Básico", price=100)
+        task = PlanTask.objects.create(plan=plan, name="Limpieza")
+        for i in range(4):
+            customer = Customer.objects.create(name=f"Cliente {i}", identification=f"1-{i:03d}")
+            sub = PlanSubscription.objects.create(customer=customer, plan=plan, start_date=date.today())
+            visit = Visit.objects.create(subscription=sub, user=cls.user, start=timezone.now())
+            TaskCompleted.objects.create(visit=visit, plan_task=task, name=f"Tarea {i}", hours=1)
+
+    def test_lazy_foreign_key_suggests_select_related(self):
+        with nplusone.track_queries(threshold=2) as tracker:
+            for visit in Visit.objects.all():
+                visit.subscription.status
+        findings = tracker.findings()
+        self.assertEqual(len(findings), 1)
+        self.assertEqual(findings[0]["count"], 4)
+        self.assertEqual(findings[0]["relation"], "Visit.subscription")
+        self.assertEqual(findings[0]["suggestion"], 'select_related("subscription")')
+        self.assertTrue(findings[0]["code"].startswith("core/tests.py:"))
+
+    def test_reverse_relation_in_serializer_suggests_prefetch_related(self):
+        qs = Visit.objects.select_related("subscription__customer", "subscription__plan", "assessment")
+        with nplusone.track_queries(threshold=2) as tracker:
+            VisitSerializer(qs, many=True).data
+        by_relation = {f["relation"]: f for f in tracker.findings()}
+        finding = by_relation["Visit.tasks_completed"]
+        self.assertEqual(finding["suggestion"], 'prefetch_related("tasks_completed")')
+        self.assertEqual(finding["serializer_field"], "VisitSerializer.tasks_completed")
+
+    def test_below_threshold_is_not_reported(self):
+        with nplusone.track_queries(threshold=5) as tracker:
+            for visit in Visit.objects.all():
+                visit.subscription.status
+        self.assertEqual(tracker.findings(), [])
+
+    def test_report_aggregates_by_route_and_shape(self):
+        self.addCleanup(nplusone.clear)
+        finding = {"shape": "SELECT ?", "count": 7, "relation": "Visit.subscription",
+                   "serializer_field": None, "code": None, "suggestion": 'select_related("subscription")'}
+        with self.assertLogs("core.nplusone", "WARNING"):
+            nplusone.record("api/visits/", "GET", [finding])
+            nplusone.record("api/visits/", "GET", [dict(finding, count=3)])
+        [row] = nplusone.report()
+        self.assertEqual((row["requests"], row["max_count"], row["count"]), (2, 7, 3))
+
+
+class ProfilingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(username="admin", email="admin@x.com", password="x", is_staff=True)
+        cls.tech = User.objects.create_user(username="tec", email="tec@x.com", password="x")
+        Customer.objects.create(name="ACME", identification="1-111")
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        for ctx in (override_settings(PROFILES_DIR=tmp.name), mock.patch.object(profiling, "DISABLE_AUTH", False)):
+            ctx.__enter__()
+            self.addCleanup(ctx.__exit__, None, None, None)
+        self.client = APIClient()
+
+    def _login(self, user):
+        # JWT (como la app): el middleware corre antes que la autenticación de DRF
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(user)}")
+
+    def test_unflagged_request_is_not_profiled(self):
+        self._login(self.staff)
+        response = self.client.get("/api/customers/")
+        self.assertNotIn("X-Profile-Id", response)
+        self.assertEqual(profiling.list_profiles(), [])
+
+    def test_non_staff_flag_is_ignored(self):
+        self._login(self.tech)
+        response = self.client.get("/api/customers/?_profile=1")
+        self.assertNotIn("X-Profile-Id", response)
+        self.assertEqual(profiling.list_profiles(), [])
+
+    def test_staff_session_is_not_enough(self):
+        self.client.force_login(self.staff)
+        response = self.client.get("/api/customers/?_profile=1")
+        self.assertNotIn("X-Profile-Id", response)
+        self.assertEqual(profiling.list_profiles(), [])
+
+    def test_staff_profile_is_stored_with_sql(self):
+        self._login(self.staff)
+        response = self.client.get("/api/customers/", HTTP_X_PROFILE="1")
+        self.assertEqual(response.status_code, 200)
+        profile_id = response["X-Profile-Id"]
+
+        [listed] = profiling.list_profiles()
+        self.assertEqual((listed["id"], listed["path"], listed["status"]), (profile_id, "/api/customers/", 200))
+        self.assertNotIn("queries", listed)
+        meta = profiling.load_meta(profile_id)
+        self.assertEqual(meta["query_count"], len(meta["queries"]))
+        self.assertTrue(any("customers_customer" in q["sql"] for q in meta["queries"]))
+
+        self.assertIn("function calls", profiling.stats_text(profile_id))
+        self.assertTrue(profiling.flame_svg(profile_id).startswith("<svg"))
+
+    def test_unknown_or_malformed_id_is_not_found(self):
+        with self.assertRaises(FileNotFoundError):
+            profiling.load_meta("../../etc/passwd")
+        with self.assertRaises(FileNotFoundError):
+            profiling.stats_text("20250101T000000-deadbeef")
+
+
+class UnpaginatedBudgetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = Customer.objects.create(name="ACME", identification="1-111")
+        for i in range(5):
+            CustomerContact.objects.create(customer=cls.customer, name=f"Contacto {i}", email=f"c{i}@x.com")
+
+    def setUp(self):
+        self.qs = CustomerContact.active_objects.filter(customer=self.customer).order_by("id")
+        self.patch(pagination, UNPAGINATED_CHUNK=2)
+
+    def patch(self, target, **values):
+        for name, value in values.items():
+            patcher = mock.patch.object(target, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _expected(self):
+        return CustomerContactSerializer(self.qs, many=True).data
+
+    def test_within_budget_is_a_regular_response(self):
+        response = pagination.unpaginated_response(self.qs, CustomerContactSerializer, {})
+        self.assertEqual(response.data, self._expected())
+
+    def test_over_row_budget_streams_the_same_json(self):
+        self.patch(pagination, UNPAGINATED_MAX_ROWS=3)
+        response = pagination.unpaginated_response(self.qs, CustomerContactSerializer, {})
+        self.assertTrue(response.streaming)
+        body = b"".join(response.streaming_content)
+        self.assertEqual(json.loads(body), json.loads(JSONRenderer().render(self._expected())))
+
+    def test_over_budget_rejects_instead_of_streaming_json_to_msgpack_clients(self):
+        self.patch(pagination, UNPAGINATED_MAX_ROWS=3)
+        request = RequestFactory().get("/")
+        request.accepted_renderer = renderers.MessagePackRenderer()
+        with self.assertRaises(ResponseTooLarge):
+            pagination.unpaginated_response(self.qs, CustomerContactSerializer, {"request": request})
+        request.accepted_renderer = renderers.ORJSONRenderer()
+        response = pagination.unpaginated_response(self.qs, CustomerContactSerializer, {"request": request})
+        self.assertTrue(response.streaming)
+
+    def test_over_byte_budget_rejects_when_configured(self):
+        self.patch(pagination, UNPAGINATED_MAX_BYTES=100, UNPAGINATED_OVER_BUDGET="reject")
+        with self.assertRaises(ResponseTooLarge):
+            pagination.unpaginated_response(self.qs, CustomerContactSerializer, {})
+
+
+class MemoryInstrumentationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(username="admin", email="admin@x.com", password="x", is_staff=True)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.staff)
+
+    def test_metrics_report_memory_per_route(self):
+        self.client.get("/api/customers/")
+        routes = self.client.get("/api/metrics/").json()["memory"]["routes"]
+        self.assertGreaterEqual(routes["GET api/customers/"]["requests"], 1)
+        self.assertGreater(routes["GET api/customers/"]["rss_max_kb"], 0)
+
+    def test_snapshot_endpoints_are_off_by_default(self):
+        with mock.patch.object(memory, "MEMORY_DEBUG", False):
+            self.assertEqual(self.client.post("/api/memory/snapshots/").status_code, 404)
+
+    def test_snapshot_and_diff(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(5)
+            self.addCleanup(tracemalloc.stop)
+        self.addCleanup(memory.clear_snapshots)
+        with mock.patch.object(memory, "MEMORY_DEBUG", True):
+            first = self.client.post("/api/memory/snapshots/?limit=5")
+            self.assertEqual(first.status_code, 201)
+            self.assertLessEqual(len(first.json()["top"]), 5)
+            kept = [bytearray(1024) for _ in range(100)]
+            second = self.client.post("/api/memory/snapshots/").json()
+            diff = self.client.get(f"/api/memory/snapshots/{second['id']}/diff/?base={first.json()['id']}")
+            self.assertEqual(diff.status_code, 200)
+            self.assertGreater(diff.json()["size_diff_kb"], 0)
+            self.assertEqual(self.client.get("/api/memory/snapshots/999/diff/").status_code, 404)
+        del kept
+
+
+class RendererTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(username="admin", email="admin@x.com", password="x", is_staff=True)
+        cls.customer = Customer.objects.create(name="Ñandú \u2028 Ltda", identification="1-111")
+        plan = Plan.objects.create(name="Básico", price=Decimal("100.50"))
+        sub = PlanSubscription.objects.create(customer=cls.customer, plan=plan, start_date=date.today())
+        visit = Visit.objects.create(subscription=sub, user=cls.staff, start=timezone.now())
+        MaterialUsed.objects.create(visit=visit, description="Cable", unit="m", unit_cost=Decimal("12.345"))
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.staff)
+
+    def test_orjson_matches_drf_json_byte_for_byte(self):
+        payloads = [
+            VisitSerializer(Visit.objects.all(), many=True).data,
+            {"when": timezone.now(), "day": date.today(), "total": Decimal("1.10"), "name": self.customer.name},
+        ]
+        for data in payloads:
+            self.assertEqual(renderers.ORJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_orjson_falls_back_for_indent_and_big_ints(self):
+        data = {"n": 2 ** 70}
+        self.assertEqual(renderers.ORJSONRenderer().render(data), JSONRenderer().render(data))
+        indented = renderers.ORJSONRenderer().render({"a": 1}, "application/json; indent=2")
+        self.assertEqual(indented, b'{\n  "a": 1\n}')
+
+    def test_msgpack_by_accept_header(self):
+        as_json = self.client.get("/api/customers/")
+        as_msgpack = self.client.get("/api/customers/", HTTP_ACCEPT="application/msgpack")
+        self.assertEqual(as_msgpack["Content-Type"], "application/msgpack")
+        self.assertEqual(msgpack.unpackb(as_msgpack.content), json.loads(as_json.content))
+        self.assertLess(len(as_msgpack.content), len(as_json.content))
+
+    def test_msgpack_request_body(self):
+        body = msgpack.packb({"name": "Nuevo", "identification": "2-222", "email": "n@x.com"})
+        response = self.client.post("/api/customers/", body, content_type="application/msgpack")
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertTrue(Customer.objects.filter(identification="2-222").exists())
+
+        bad = self.client.post("/api/customers/", b"\xc1", content_type="application/msgpack")
+        self.assertEqual(bad.status_code, 400)
+
+
+class ReadQueryBudgetTests(TestCase):
+    """
+    Cada GET del router, con pocos datos y con más datos: el número de consultas
+    no puede crecer con las filas (N+1) ni pasar su presupuesto en core/query_budgets.py.
+    """
+    SMALL, LARGE = 2, 6
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="admin", email="admin@x.com", password="x", is_staff=True)
+        cls.customer = Customer.objects.create(name="ACME", identification="1-111", email="acme@x.com")
+        cls.plan = Plan.objects.create(name="Básico", price=100)
+        cls.task = PlanTask.objects.create(plan=cls.plan, name="Limpieza")
+        cls.sub = PlanSubscription.objects.create(
+            customer=cls.customer, plan=cls.plan, start_date=date.today(), status="active"
+        )
+        cls.visit = Visit.objects.create(subscription=cls.sub, user=cls.user, start=timezone.now() + timedelta(hours=1))
+        cls.seeded = 0
+        cls.grow(cls.SMALL)
+
+    @classmethod
+    def grow(cls, size):
+        """Agrega filas hasta `size` por colección (las del mismo cliente / plan / visita)."""
+        now = timezone.now()
+        for i in range(cls.seeded, size):
+            tech = User.objects.create_user(username=f"tec{i}", email=f"tec{i}@x.com", password="x")
+            other = Customer.objects.create(name=f"Cliente {i}", identification=f"9-{i:03d}")
+            other_plan = Plan.objects.create(name=f"Plan {i}", price=10 + i)
+            PlanSubscription.objects.create(customer=other, plan=other_plan, start_date=date.today(), status="active")
+            CustomerContact.objects.create(
+                customer=cls.customer, name=f"Contacto {i}", email=f"c{i}@x.com", phone=str(i), is_main=i == 0
+            )
+            task = PlanTask.objects.create(plan=cls.plan, name=f"Tarea {i}")
+            PlanSubscription.objects.create(
+                customer=other, plan=cls.plan, start_date=date.today(), status="paused"
+            )
+            start = now + timedelta(days=i + 1)
+            visit = Visit.objects.create(subscription=cls.sub, user=tech if i % 2 else cls.user, start=start,
+                                         end=start + timedelta(hours=1))
+            Assessment.objects.create(visit=visit, rating=1 + i % 5)
+            for v in (visit, cls.visit):
+                TaskCompleted.objects.create(visit=v, plan_task=task, name=f"Tarea {i}", hours=1, completada=True)
+                MaterialUsed.objects.create(visit=v, description=f"Material {i}", unit_cost=i)
+                Evidence.objects.create(visit=v, description=f"Foto {i}")
+        cls.seeded = max(cls.seeded, size)
+
+    def _url(self, name, pattern):
+        kwargs = {}
+        for group in pattern.pattern.regex.groupindex:
+            if group == "pk":
+                view = pattern.callback.cls
+                model = view.queryset.model if view.queryset is not None else view.serializer_class.Meta.model
+                kwargs["pk"] = model._default_manager.order_by("pk").values_list("pk", flat=True).first()
+            else:
+                kwargs[group] = {"customer_id": self.customer.pk, "plan_id": self.plan.pk,
+                                 "visit_id": self.visit.pk}[group]
+        return reverse(name, kwargs=kwargs)
+
+    def _measure(self, client, name, pattern):
+        url = self._url(name, pattern)
+        params = READ_QUERY_PARAMS.get(name, {})
+        client.get(url, params)  # calentar caches de proceso (contenttypes, índices en memoria)
+        with CaptureQueriesContext(connection) as ctx:
+            resp = client.get(url, params)
+            if resp.streaming:
+                b"".join(resp.streaming_content)
+        self.assertEqual(resp.status_code, 200, f"{name}: {resp.status_code} {url}")
+        return ctx.captured_queries
+
+    def test_read_endpoints(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        routes = _router_get_routes()
+        small = {name: self._measure(client, name, p) for name, p in routes.items()}
+        self.grow(self.LARGE)
+        large = {name: self._measure(client, name, p) for name, p in routes.items()}
+
+        missing = {name: len(large[name]) for name in routes if name not in READ_QUERY_BUDGETS}
+        if missing:
+            self.fail(f"Rutas sin presupuesto en core/query_budgets.py (medido): {missing}")
+        for name in sorted(routes):
+            with self.subTest(route=name):
+                grown = sqlshape.grown_shapes(small[name], large[name])
+                if grown:
+                    self.fail(
+                        f"{name}: las consultas crecen con las filas ({len(small[name])} -> {len(large[name])}):\n"
+                        + "\n".join(f"  {a} -> {b} veces: {shape}" for shape, a, b in grown)
+                    )
+                used, budget = len(large[name]), READ_QUERY_BUDGETS[name]
+                sql = "\n".join(f"  {i + 1}. {q['sql']}" for i, q in enumerate(large[name]))
+                self.assertLessEqual(used, budget, f"{name}: {used} consultas (presupuesto {budget})\n{sql}")
+
+
+class SyncTests(TestCase):
+    """Sync delta (core/sync.py): paginación por cursor, tombstones y ventana de asentamiento."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="tec", email="tec@x.com", password="x")
+        cls.customers = [Customer.objects.create(name=f"C{i}", identification=f"9-{i}") for i in range(3)]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        patcher = mock.patch.object(sync, "SYNC_SETTLE", timedelta(0))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _page(self, cursor=None, limit=2):
+        params = {"tables": "customers", "limit": limit}
+        if cursor:
+            params["cursor"] = cursor
+        resp = self.client.get("/api/sync/", params)
+        self.assertEqual(resp.status_code, 200, resp.data)
+        return resp.data
+
+    def test_pages_follow_the_cursor_without_repeats(self):
+        first = self._page()
+        self.assertTrue(first["has_more"])
+        second = self._page(first["cursor"])
+        self.assertFalse(second["has_more"])
+        ids = [r["id"] for page in (first, second) for r in page["changes"]["customers"]]
+        self.assertEqual(ids, [c.pk for c in self.customers])
+
+        third = self._page(second["cursor"])
+        self.assertEqual((third["changes"], third["deleted"], third["has_more"]), ({}, {}, False))
+
+    def test_soft_delete_travels_as_tombstone(self):
+        cursor = self._page(limit=10)["cursor"]
+        self.customers[1].delete()
+        page = self._page(cursor, limit=10)
+        self.assertEqual(page["deleted"], {"customers": [self.customers[1].pk]})
+        self.assertEqual(page["changes"], {})
+
+    def test_recent_rows_wait_for_the_settle_window(self):
+        with mock.patch.object(sync, "SYNC_SETTLE", timedelta(minutes=5)):
+            page = self._page(limit=10)
+        self.assertEqual(page["changes"], {})
+        # la marca queda antes de las filas sin asentar: llegan en el siguiente sync
+        self.assertEqual(len(self._page(page["cursor"], limit=10)["changes"]["customers"]), 3)
+
+    def test_invalid_cursor_and_limit(self):
+        self.assertEqual(self.client.get("/api/sync/", {"cursor": "%%%"}).status_code, 400)
+        self.assertEqual(self.client.get("/api/sync/", {"limit": "0"}).status_code, 400)
+        self.assertEqual(self.client.get("/api/sync/", {"tables": "nope"}).status_code, 400)
+
+
+class SearchIndexTests(TestCase):
+    """Índice de búsqueda global (core/search.py) y GET /api/search/."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="tec", email="tec@x.com", password="x")
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.customer = Customer.objects.create(name="Peña Álvarez", identification="1-0234-0567")
+            plan = Plan.objects.create(name="Básico", price=10)
+            self.sub = PlanSubscription.objects.create(customer=self.customer, plan=plan,
+                                                       start_date=date.today(), notes="Portón azul")
+            self.visit = Visit.objects.create(subscription=self.sub, user=self.user, start=timezone.now())
+
+    def _hits(self, q, types=None):
+        params = {"q": q, **({"types": types} if types else {})}
+        resp = self.client.get("/api/search/", params)
+        self.assertEqual(resp.status_code, 200, resp.data)
+        return [(r["type"], r["id"]) for r in resp.data["results"]]
+
+    def test_accents_prefixes_and_compact_identification(self):
+        self.assertIn(("customer", self.customer.pk), self._hits("pena alv"))
+        self.assertEqual(self._hits("102340567", "customer"), [("customer", self.customer.pk)])
+        self.assertEqual(self._hits("pena inexistente"), [])
+        self.assertEqual(self.client.get("/api/search/", {"q": " "}).status_code, 400)
+
+    def test_visit_is_found_by_subscription_notes(self):
+        self.assertEqual(self._hits("porton", "visit"), [("visit", self.visit.pk)])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.sub.notes = "Reja verde"
+            self.sub.save(update_fields=["notes", "updated_at"])
+        self.assertEqual(self._hits("porton", "visit"), [])
+        self.assertEqual(self._hits("reja", "visit"), [("visit", self.visit.pk)])
+
+    def test_subscription_save_reindexes_visits_only_when_notes_change(self):
+        sub = PlanSubscription.objects.get(pk=self.sub.pk)
+        with mock.patch.object(search, "index_queryset") as index, self.captureOnCommitCallbacks(execute=True):
+            sub.status = "inactive"
+            sub.save()
+        index.assert_not_called()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            sub.notes = "Reja verde"
+            sub.save()
+        self.assertEqual(self._hits("reja", "visit"), [("visit", self.visit.pk)])
+        with mock.patch.object(search, "index_queryset") as index, self.captureOnCommitCallbacks(execute=True):
+            sub.save()  # mismas notas que lo ya indexado
+        index.assert_not_called()
+
+    def test_list_search_falls_back_to_like_while_the_index_is_empty(self):
+        resp = self.client.get("/api/customers/", {"search": "pena"})
+        self.assertEqual([c["id"] for c in resp.data["results"]], [self.customer.pk])
+
+        SearchEntry.objects.filter(kind="customer").delete()  # despliegue sin rebuild
+        resp = self.client.get("/api/customers/", {"search": "Peña Álv"})
+        self.assertEqual([c["id"] for c in resp.data["results"]], [self.customer.pk])
+        resp = self.client.get("/api/customers/", {"search": "pena"})  # LIKE: sin normalizar acentos
+        self.assertEqual(resp.data["results"], [])
+
+    def test_rebuild_failure_keeps_the_previous_index(self):
+        with mock.patch.object(search, "index_queryset", side_effect=RuntimeError("boom")), \
+                self.assertRaises(RuntimeError):
+            call_command("rebuild_search_index", kind=["visit"], stdout=io.StringIO())
+        self.assertEqual(self._hits("porton", "visit"), [("visit", self.visit.pk)])
+
+        call_command("rebuild_search_index", kind=["visit"], stdout=io.StringIO())
+        self.assertEqual(self._hits("porton", "visit"), [("visit", self.visit.pk)])
+
+
+class TypeaheadTests(TestCase):
+    """Autocompletado en memoria (core/typeahead.py) y sus señales."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="tec", email="tec@x.com", password="x")
+        cls.customer = Customer.objects.create(name="Peña Álvarez Ltda", identification="3-0012-345")
+        cls.plan = Plan.objects.create(name="Básico", price=10)
+        cls.task = PlanTask.objects.create(plan=cls.plan, name="Limpieza")
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.tasks = typeahead.TYPEAHEAD_INDEXES["plan_task"]
+        for index in typeahead.TYPEAHEAD_INDEXES.values():
+            index.invalidate()
+            self.addCleanup(index.invalidate)
+
+    def _labels(self, kind, q, **params):
+        resp = self.client.get(f"/api/typeahead/{kind}/", {"q": q, **params})
+        self.assertEqual(resp.status_code, 200, resp.data)
+        return [r["label"] for r in resp.data["results"]]
+
+    def test_word_and_identification_prefixes(self):
+        self.assertEqual(self._labels("customer", "alv"), ["Peña Álvarez Ltda"])
+        self.assertEqual(self._labels("customer", "30012"), ["Peña Álvarez Ltda"])
+        self.assertEqual(self._labels("plan_task", "lim", plan=self.plan.pk), ["Limpieza · Básico"])
+        self.assertEqual(self._labels("plan_task", "lim", plan=self.plan.pk + 1), [])
+
+    def test_task_save_takes_the_plan_name_from_the_index(self):
+        self.tasks.lookup("")  # carga el índice
+        task = PlanTask.objects.get(pk=self.task.pk)
+        with self.assertNumQueries(1), self.captureOnCommitCallbacks(execute=True):
+            task.name = "Lavado"
+            task.save(update_fields=["name", "updated_at"])
+        self.assertEqual(self.tasks.lookup("lav"), [{"id": task.pk, "label": "Lavado · Básico"}])
+        self.assertEqual(self.tasks.lookup("lim"), [])
+
+    def test_task_of_unknown_plan_reloads_the_index(self):
+        self.tasks.lookup("")
+        other = Plan.objects.create(name="Premium", price=20)
+        with self.captureOnCommitCallbacks(execute=True):
+            task = PlanTask.objects.create(plan=other, name="Pintura")
+        self.assertEqual(self.tasks.lookup("pin"), [{"id": task.pk, "label": "Pintura · Premium"}])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            other.active = False
+            other.save(update_fields=["active", "updated_at"])
+            PlanTask.objects.create(plan=other, name="Pulido")
+        self.assertEqual(self.tasks.lookup("p"), [])
+
+
+class ImportTests(TestCase):
+    """Importación masiva (core/imports.py) y POST /api/import/<resource>/."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(username="admin", email="admin@x.com", password="x", is_staff=True)
+        cls.tech = User.objects.create_user(username="tec", email="tec@x.com", password="x")
+
+    def _csv(self, user, body):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client.post("/api/import/customers/", body, content_type="text/csv")
+
+    @skipIf(core_views.DISABLE_AUTH, "con DISABLE_AUTH=1 la vista es AllowAny")
+    def test_import_is_staff_only(self):
+        body = "name,identification\nACME,1-111\n"
+        self.assertEqual(self._csv(self.tech, body).status_code, 403)
+        self.assertEqual(self._csv(self.staff, body).data["imported"], 1)
+
+    def test_integrity_error_is_reported_on_its_row(self):
+        real = imports.CustomerImporter.write
+
+        def write(importer, rows):
+            if any(attrs["name"] == "Choca" for attrs in rows):
+                raise IntegrityError("UNIQUE constraint failed")
+            return real(importer, rows)
+
+        body = "name,identification\nACME,1-111\nChoca,2-222\nBeta,3-333\n"
+        with mock.patch.object(imports.CustomerImporter, "write", write):
+            report = self._csv(self.staff, body).data
+        self.assertEqual((report["imported"], report["failed"]), (2, 1))
+        self.assertEqual(report["errors"], [{"line": 3, "errors": imports.ROW_CONFLICT}])
+        self.assertEqual(
+            sorted(Customer.objects.values_list("identification", flat=True)), ["1-111", "3-333"]
+        )
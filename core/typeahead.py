@@ -0,0 +1,205 @@
+# core/typeahead.py
+"""
+Autocompletado de pickers (clientes, tareas de plan) con un índice en memoria
+por proceso: lista ordenada de (clave normalizada, id) + bisect.
+
+- Claves: el texto normalizado a partir de cada palabra ("pena alvarez ltda",
+  "alvarez ltda", "ltda") y la identificación sin separadores, así "alv" o
+  "102340" encuentran al cliente.
+- Se carga completo la primera vez (una consulta .values()) y se actualiza
+  incrementalmente por señales (core/signals.py) en el proceso que guarda.
+- Los demás procesos se enteran por una versión en el cache de Django (si es
+  compartido: Redis/Memcached) o, en el peor caso, al vencer TYPEAHEAD_TTL.
+"""
+import re
+import threading
+import time
+from bisect import bisect_left, insort
+
+from django.core.cache import cache
+
+from .search import normalize
+
+TYPEAHEAD_TTL = 300                 # recarga completa cada 5 min como red de seguridad
+TYPEAHEAD_VERSION_CHECK = 1.0       # consulta la versión compartida como mucho 1 vez/seg
+TYPEAHEAD_DEFAULT_LIMIT = 10
+TYPEAHEAD_MAX_LIMIT = 50
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+def normalize_words(text):
+    return " ".join(_WORD_RE.findall(normalize(text)))
+
+
+def word_keys(text):
+    """'Peña Álvarez Ltda' -> ['pena alvarez ltda', 'alvarez ltda', 'ltda']"""
+    words = _WORD_RE.findall(normalize(text))
+    return [" ".join(words[i:]) for i in range(len(words))]
+
+
+def compact_key(text):
+    return "".join(_WORD_RE.findall(normalize(text)))
+
+
+class PrefixIndex:
+    """
+    Índice de prefijos thread-safe. Cada entrada: id -> (label, grupo, claves);
+    además guarda el nombre de cada grupo (p.ej. el plan de las tareas).
+    lookup() es O(log n + resultados).
+    """
+
+    def __init__(self, name, loader, ttl=TYPEAHEAD_TTL):
+        self.name = name
+        self.loader = loader            # () -> iterable de (id, label, claves, grupo, nombre del grupo)
+        self.ttl = ttl
+        self._lock = threading.RLock()
+        self._keys = []                 # [(clave, id)] ordenada
+        self._entries = {}              # id -> (label, grupo, claves)
+        self._group_labels = {}         # grupo -> nombre
+        self._version = None
+        self._loaded_at = None
+        self._checked_at = 0.0
+
+    # ---------- versión compartida entre procesos ----------
+    @property
+    def _version_key(self):
+        return f"typeahead:{self.name}:version"
+
+    def bump_version(self):
+        key = self._version_key
+        if cache.add(key, 1, None):
+            new = 1
+        else:
+            try:
+                new = cache.incr(key)
+            except ValueError:
+                cache.set(key, 1, None)
+                new = 1
+        with self._lock:
+            # si nadie más cambió entre medio, este proceso ya está al día
+            if self._version is not None and new == self._version + 1:
+                self._version = new
+
+    # ---------- carga ----------
+    def reload(self):
+        version = cache.get(self._version_key, 0)  # antes de leer la BD
+        entries, keys, group_labels = {}, [], {}
+        for pk, label, entry_keys, group, group_label in self.loader():
+            entry_keys = sorted({k for k in entry_keys if k})
+            entries[pk] = (label, group, entry_keys)
+            keys.extend((k, pk) for k in entry_keys)
+            if group is not None:
+                group_labels[group] = group_label
+        keys.sort()
+        with self._lock:
+            self._entries, self._keys, self._group_labels = entries, keys, group_labels
+            self._version = version
+            self._loaded_at = self._checked_at = time.monotonic()
+
+    def ensure_fresh(self):
+        now = time.monotonic()
+        if self._loaded_at is None or now - self._loaded_at > self.ttl:
+            self.reload()
+            return
+        if now - self._checked_at > TYPEAHEAD_VERSION_CHECK:
+            self._checked_at = now
+            if cache.get(self._version_key, 0) != self._version:
+                self.reload()
+
+    # ---------- cambios incrementales ----------
+    def _drop(self, pk):
+        old = self._entries.pop(pk, None)
+        if old is None:
+            return
+        for k in old[2]:
+            i = bisect_left(self._keys, (k, pk))
+            if i < len(self._keys) and self._keys[i] == (k, pk):
+                del self._keys[i]
+
+    def upsert(self, pk, label, keys, group=None, group_label=None):
+        if self._loaded_at is None:
+            return  # aún no cargado: la primera búsqueda lo leerá de la BD
+        keys = sorted({k for k in keys if k})
+        with self._lock:
+            self._drop(pk)
+            self._entries[pk] = (label, group, keys)
+            if group is not None:
+                self._group_labels[group] = group_label
+            for k in keys:
+                insort(self._keys, (k, pk))
+
+    def remove(self, pk):
+        with self._lock:
+            self._drop(pk)
+
+    def group_label(self, group):
+        """Nombre de un grupo ya cargado (None si el índice no lo tiene)."""
+        with self._lock:
+            if self._loaded_at is None:
+                return None
+            return self._group_labels.get(group)
+
+    def invalidate(self):
+        """Fuerza recarga completa en la próxima consulta (en todos los procesos)."""
+        with self._lock:
+            self._loaded_at = None
+        self.bump_version()
+
+    # ---------- consulta ----------
+    def lookup(self, text, limit=TYPEAHEAD_DEFAULT_LIMIT, group=None):
+        self.ensure_fresh()
+        words = normalize_words(text)
+        # "3-0012" también como "30012" (claves de identificación sin separadores)
+        prefixes = [p for p in dict.fromkeys((words, compact_key(text))) if p]
+        out, seen = [], set()
+        with self._lock:
+            keys = self._keys
+            for prefix in prefixes:
+                i = bisect_left(keys, (prefix,))
+                while i < len(keys) and len(out) < limit and keys[i][0].startswith(prefix):
+                    pk = keys[i][1]
+                    i += 1
+                    if pk in seen:
+                        continue
+                    label, entry_group, _ = self._entries[pk]
+                    if group is not None and entry_group != group:
+                        continue
+                    seen.add(pk)
+                    out.append({"id": pk, "label": label})
+        return out
+
+
+# ---------------- Fuentes ----------------
+
+def customer_entry(pk, name, identification):
+    keys = word_keys(name) + [compact_key(identification)]
+    return pk, name, keys, None, None
+
+
+def _load_customers():
+    from customers.models import Customer
+    for row in Customer.active_objects.values_list("id", "name", "identification").iterator():
+        yield customer_entry(*row)
+
+
+def plan_task_entry(pk, name, plan_id, plan_name):
+    return pk, f"{name} · {plan_name}", word_keys(name), plan_id, plan_name
+
+
+def _load_plan_tasks():
+    from plans.models import PlanTask
+    rows = (
+        PlanTask.active_objects
+        .filter(plan__active=True)
+        .values_list("id", "name", "plan_id", "plan__name")
+        .iterator()
+    )
+    for row in rows:
+        yield plan_task_entry(*row)
+
+
+TYPEAHEAD_INDEXES = {
+    "customer": PrefixIndex("customer", _load_customers),
+    "plan_task": PrefixIndex("plan_task", _load_plan_tasks),
+}
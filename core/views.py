@@ -1,3 +1,315 @@
-from django.shortcuts import render
+# core/views.py
+import os
+
+from django.http import FileResponse, HttpResponse
+from rest_framework import permissions, status
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from . import imports, memory, nplusone, profiling, search, typeahead
+from .db.pool import pool_stats
+from .querycache import query_cache_stats
+from .sync import SYNC_DEFAULT_LIMIT, SYNC_MAX_LIMIT, SYNC_MODELS, sync_page
+
+DISABLE_AUTH = os.getenv("DISABLE_AUTH", "0") == "1"
+
+
+def _actor_or_none(request):
+    u = getattr(request, "user", None)
+    return u if (u and getattr(u, "is_authenticated", False)) else None
+
+
+class SyncView(APIView):
+    """
+    GET /api/sync/?cursor=<opaco>&limit=200&tables=visits,tasks_completed
+
+    Cambios desde el cursor (sin cursor = descarga inicial, sin tombstones).
+    El cliente repite con el 'cursor' devuelto mientras 'has_more' sea true y
+    lo guarda como marca para el siguiente sync.
+    """
+    permission_classes = [permissions.AllowAny] if DISABLE_AUTH else [permissions.IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        limit = request.query_params.get("limit")
+        if limit is None:
+            limit = SYNC_DEFAULT_LIMIT
+        elif not limit.isdigit() or not 1 <= int(limit) <= SYNC_MAX_LIMIT:
+            raise ValidationError({"limit": f"Debe ser un entero entre 1 y {SYNC_MAX_LIMIT}."})
+        else:
+            limit = int(limit)
+
+        tables = None
+        tables_q = request.query_params.get("tables")
+        if tables_q:
+            tables = {t.strip() for t in tables_q.split(",") if t.strip()}
+            unknown = sorted(tables - set(SYNC_MODELS))
+            if unknown:
+                raise ValidationError({"tables": f"Tablas desconocidas: {', '.join(unknown)}."})
+
+        data = sync_page(request.query_params.get("cursor"), limit=limit, tables=tables, request=request)
+        return Response(data, status=status.HTTP_200_OK)
+
+
+class SearchView(APIView):
+    """
+    GET /api/search/?q=texto&types=customer,visit&limit=20
+
+    Búsqueda global rankeada sobre el índice (core/search.py): cada palabra se
+    busca por prefijo y deben aparecer todas. Resultados tipados:
+    [{type, id, label, subtitle, score}]
+    """
+    permission_classes = [permissions.AllowAny] if DISABLE_AUTH else [permissions.IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        q = request.query_params.get("q", "")
+        if not q.strip():
+            raise ValidationError({"q": "Este parámetro es requerido."})
+
+        limit = request.query_params.get("limit")
+        if limit is None:
+            limit = search.SEARCH_DEFAULT_LIMIT
+        elif not limit.isdigit() or not 1 <= int(limit) <= search.SEARCH_MAX_LIMIT:
+            raise ValidationError({"limit": f"Debe ser un entero entre 1 y {search.SEARCH_MAX_LIMIT}."})
+        else:
+            limit = int(limit)
+
+        kinds = None
+        types_q = request.query_params.get("types")
+        if types_q:
+            kinds = [t.strip() for t in types_q.split(",") if t.strip()]
+            unknown = sorted(set(kinds) - set(search.SEARCH_SOURCES))
+            if unknown:
+                raise ValidationError({"types": f"Tipos desconocidos: {', '.join(unknown)}."})
+
+        results = search.search(q, kinds=kinds, limit=limit)
+        return Response({"q": q, "count": len(results), "results": results}, status=status.HTTP_200_OK)
+
+
+class TypeaheadView(APIView):
+    """
+    GET /api/typeahead/<kind>/?q=pe&limit=10[&plan=<id>]   kind: customer | plan_task
+
+    Autocompletado por prefijo de palabra contra un índice en memoria
+    (core/typeahead.py). Solo devuelve [{id, label}], sin tocar la BD.
+    """
+    permission_classes = [permissions.AllowAny] if DISABLE_AUTH else [permissions.IsAuthenticated]
+
+    def get(self, request, kind=None, *args, **kwargs):
+        index = typeahead.TYPEAHEAD_INDEXES.get(kind)
+        if index is None:
+            raise ValidationError({"kind": f"Opciones: {', '.join(sorted(typeahead.TYPEAHEAD_INDEXES))}."})
+
+        limit = request.query_params.get("limit")
+        if limit is None:
+            limit = typeahead.TYPEAHEAD_DEFAULT_LIMIT
+        elif not limit.isdigit() or not 1 <= int(limit) <= typeahead.TYPEAHEAD_MAX_LIMIT:
+            raise ValidationError({"limit": f"Debe ser un entero entre 1 y {typeahead.TYPEAHEAD_MAX_LIMIT}."})
+        else:
+            limit = int(limit)
+
+        group = None
+        plan = request.query_params.get("plan")
+        if plan and kind == "plan_task":
+            if not plan.isdigit():
+                raise ValidationError({"plan": "Debe ser un id numérico."})
+            group = int(plan)
+
+        results = index.lookup(request.query_params.get("q", ""), limit=limit, group=group)
+        return Response({"results": results}, status=status.HTTP_200_OK)
+
+
+class ImportView(APIView):
+    """
+    POST /api/import/<resource>/?dry_run=1&batch_size=500
+    resource: customers | contacts | plans | plan_tasks | subscriptions
+
+    El archivo va como multipart ("file", .csv / .jsonl) o como cuerpo crudo con
+    Content-Type text/csv o application/x-ndjson (?input_format=csv|jsonl para forzar).
+    Se procesa por streaming en lotes (core/imports.py) y responde un reporte:
+    {rows, imported, failed, errors: [{line, errors}], errors_truncated}
+    Solo staff: escribe en masa sobre datos de todos los clientes.
+    """
+    permission_classes = [permissions.AllowAny] if DISABLE_AUTH else [permissions.IsAdminUser]
+
+    def post(self, request, resource=None, *args, **kwargs):
+        importer_cls = imports.IMPORTERS.get(resource)
+        if importer_cls is None:
+            raise ValidationError({"resource": f"Opciones: {', '.join(imports.IMPORTERS)}."})
+
+        batch_size = request.query_params.get("batch_size")
+        if batch_size is None:
+            batch_size = imports.IMPORT_BATCH_SIZE
+        elif not batch_size.isdigit() or not 1 <= int(batch_size) <= imports.IMPORT_MAX_BATCH_SIZE:
+            raise ValidationError({"batch_size": f"Debe ser un entero entre 1 y {imports.IMPORT_MAX_BATCH_SIZE}."})
+        else:
+            batch_size = int(batch_size)
+
+        explicit = request.query_params.get("input_format")
+        if request.content_type.startswith("multipart/"):
+            upload = request.FILES.get("file")
+            if upload is None:
+                raise ValidationError({"file": "Adjunta el archivo en el campo 'file'."})
+            stream, fmt = upload, imports.detect_format(upload.name, upload.content_type, explicit)
+        else:
+            # cuerpo crudo: se lee por líneas directo del socket, sin pasar por request.data
+            stream, fmt = request.stream or [], imports.detect_format("", request.content_type, explicit)
+        if fmt is None:
+            raise ValidationError({"input_format": f"No se reconoce el formato. Opciones: {', '.join(imports.IMPORT_FORMATS)}."})
+
+        importer = importer_cls(
+            actor=_actor_or_none(request),
+            dry_run=request.query_params.get("dry_run") in ("1", "true", "True"),
+            batch_size=batch_size,
+            context={"request": request},
+        )
+        report = importer.run(imports.read_rows(stream, fmt))
+        # 200 aunque haya filas con error: el reporte dice cuáles (las demás sí se guardaron)
+        return Response(report, status=status.HTTP_200_OK)
+
+
+class MetricsView(APIView):
+    """
+    GET /api/metrics/  (solo staff)
+
+    Métricas del worker que atiende el request (cada proceso tiene las suyas):
+    db_pools: por alias, conexiones en uso/libres, creadas/reutilizadas y esperas.
+    query_cache: aciertos / fallos / consultas sin cache / versiones subidas.
+    memory: RSS actual y pico, y por ruta RSS máximo, crecimiento, veces que
+    subió el pico del proceso y bloques asignados (core/memory.py).
+    """
+    permission_classes = [permissions.AllowAny] if DISABLE_AUTH else [permissions.IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        return Response({
+            "pid": os.getpid(),
+            "db_pools": pool_stats(),
+            "query_cache": query_cache_stats(),
+            "memory": memory.memory_stats(),
+        }, status=status.HTTP_200_OK)
+
+
+class NPlusOneReportView(APIView):
+    """
+    GET /api/nplusone/  (solo staff)
+
+    Consultas repetidas detectadas por NPlusOneMiddleware en este worker (solo
+    con NPLUSONE=1), agrupadas por ruta y forma, con el campo del serializer,
+    la relación, la línea de código y la sugerencia. DELETE las borra.
+    """
+    permission_classes = [permissions.AllowAny] if DISABLE_AUTH else [permissions.IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        return Response({
+            "enabled": nplusone.NPLUSONE_ENABLED,
+            "threshold": nplusone.NPLUSONE_THRESHOLD,
+            "findings": nplusone.report(),
+        }, status=status.HTTP_200_OK)
+
+    def delete(self, request, *args, **kwargs):
+        nplusone.clear()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class ProfileListView(APIView):
+    """
+    GET /api/profiles/  (solo staff)
+
+    Perfiles guardados por ProfilingMiddleware (requests con ?_profile=1 o
+    X-Profile: 1), del más nuevo al más viejo, sin las consultas.
+    """
+    permission_classes = [permissions.AllowAny] if DISABLE_AUTH else [permissions.IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        return Response(profiling.list_profiles(), status=status.HTTP_200_OK)
+
+
+class ProfileDetailView(APIView):
+    """
+    GET /api/profiles/<id>/                       metadatos + consultas SQL con sus tiempos
+    GET /api/profiles/<id>/?view=stats&sort=tottime   texto de pstats
+    GET /api/profiles/<id>/?view=flame            flame graph (SVG)
+    GET /api/profiles/<id>/?view=raw              el .prof (snakeviz, gprof2dot)
+    DELETE /api/profiles/<id>/
+    """
+    permission_classes = [permissions.AllowAny] if DISABLE_AUTH else [permissions.IsAdminUser]
+
+    def get(self, request, profile_id, *args, **kwargs):
+        view = request.query_params.get("view", "")
+        try:
+            if view == "stats":
+                text = profiling.stats_text(profile_id, sort=request.query_params.get("sort", "cumulative"))
+                return HttpResponse(text, content_type="text/plain; charset=utf-8")
+            if view == "flame":
+                return HttpResponse(profiling.flame_svg(profile_id), content_type="image/svg+xml")
+            if view == "raw":
+                return FileResponse(open(profiling.profile_file(profile_id), "rb"),
+                                    as_attachment=True, filename=f"{profile_id}.prof")
+            if view:
+                raise ValidationError({"view": "Opciones: stats, flame, raw."})
+            return Response(profiling.load_meta(profile_id), status=status.HTTP_200_OK)
+        except FileNotFoundError:
+            raise NotFound("Perfil no encontrado.")
+
+    def delete(self, request, profile_id, *args, **kwargs):
+        profiling.delete_profile(profile_id)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+def _int_param(request, name, default):
+    raw = request.query_params.get(name)
+    if raw in (None, ""):
+        return default
+    try:
+        return int(raw)
+    except ValueError:
+        raise ValidationError({name: "Debe ser un entero."})
+
+
+def _require_tracemalloc():
+    if not memory.MEMORY_DEBUG:
+        raise NotFound("tracemalloc está desactivado en este worker (MEMORY_DEBUG=1).")
+
+
+class MemorySnapshotListView(APIView):
+    """
+    Solo con MEMORY_DEBUG=1 y solo staff (snapshots del worker que atiende):
+
+    GET    /api/memory/snapshots/          los guardados (los 5 más nuevos)
+    POST   /api/memory/snapshots/?limit=30 toma uno y devuelve las líneas que más memoria tienen
+    DELETE /api/memory/snapshots/
+    """
+    permission_classes = [permissions.AllowAny] if DISABLE_AUTH else [permissions.IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        _require_tracemalloc()
+        return Response(memory.list_snapshots(), status=status.HTTP_200_OK)
+
+    def post(self, request, *args, **kwargs):
+        _require_tracemalloc()
+        limit = _int_param(request, "limit", 30)
+        return Response(memory.take_snapshot(limit=limit), status=status.HTTP_201_CREATED)
+
+    def delete(self, request, *args, **kwargs):
+        _require_tracemalloc()
+        memory.clear_snapshots()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class MemorySnapshotDiffView(APIView):
+    """
+    GET /api/memory/snapshots/<id>/diff/?base=<id>&limit=30   (MEMORY_DEBUG=1, staff)
+
+    Qué creció entre `base` (por defecto el snapshot anterior) y <id>.
+    """
+    permission_classes = [permissions.AllowAny] if DISABLE_AUTH else [permissions.IsAdminUser]
+
+    def get(self, request, snapshot_id, *args, **kwargs):
+        _require_tracemalloc()
+        base_id = _int_param(request, "base", snapshot_id - 1)
+        try:
+            diff = memory.diff_snapshots(snapshot_id, base_id, limit=_int_param(request, "limit", 30))
+        except KeyError:
+            raise NotFound("Snapshot no encontrado.")
+        return Response(diff, status=status.HTTP_200_OK)
 
-# Create your views here.
@@ -1,5 +1,7 @@
 
 from django.db import models, transaction
+from django.db.models import Case, F, When
+from django.utils import timezone
 from core.models import BaseModel, TimeStampedModel
 
 # customers/models.py
@@ -18,6 +20,22 @@ class Customer(BaseModel, TimeStampedModel):
     location = models.CharField(max_length=255, blank=True, null=True)
     direction = models.CharField(max_length=255, blank=True, null=True)
 
+    class Meta:
+        constraints = [
+            # clave natural (importación masiva); varios NULL están permitidos
+            models.UniqueConstraint(fields=["identification"], name="customer_identification_uniq"),
+        ]
+        indexes = [
+            # sync delta (/api/sync/): keyset por (updated_at, id)
+            models.Index(fields=["updated_at", "id"], name="customer_sync_idx"),
+        ]
+
+    def save(self, *args, **kwargs):
+        # "" no es una identificación: bajo el UNIQUE solo NULL puede repetirse
+        if self.identification is not None and not self.identification.strip():
+            self.identification = None
+        super().save(*args, **kwargs)
+
     @transaction.atomic
     def soft_delete_cascade(self):
         """
@@ -31,41 +49,44 @@ class Customer(BaseModel, TimeStampedModel):
         from visits.models import Visit, Assessment, Evidence, TaskCompleted, MaterialUsed
         from customers.models import CustomerContact
 
+        # updated_at también: el sync delta usa las bajas lógicas como tombstones
+        now = timezone.now()
+
         # a) Suscripciones del cliente
         PlanSubscription.objects.filter(
             customer_id=self.pk,
             active=True,
-        ).update(active=False)
+        ).update(active=False, updated_at=now)
 
         # b) Visitas de esas suscripciones
         Visit.objects.filter(
             subscription__customer_id=self.pk,
             active=True,
-        ).update(active=False)
+        ).update(active=False, updated_at=now)
 
         # c) Hijos de visitas
         Assessment.objects.filter(
             visit__subscription__customer_id=self.pk,
             active=True,
-        ).update(active=False)
+        ).update(active=False, updated_at=now)
         Evidence.objects.filter(
             visit__subscription__customer_id=self.pk,
             active=True,
-        ).update(active=False)
+        ).update(active=False, updated_at=now)
         TaskCompleted.objects.filter(
             visit__subscription__customer_id=self.pk,
             active=True,
-        ).update(active=False)
+        ).update(active=False, updated_at=now)
         MaterialUsed.objects.filter(
             visit__subscription__customer_id=self.pk,
             active=True,
-        ).update(active=False)
+        ).update(active=False, updated_at=now)
 
         # d) Contactos del cliente
         CustomerContact.objects.filter(
             customer_id=self.pk,
             active=True,
-        ).update(active=False)
+        ).update(active=False, updated_at=now)
 
     @transaction.atomic
     def delete(self, using=None, keep_parents=False):
@@ -101,6 +122,36 @@ class CustomerContact(BaseModel, TimeStampedModel):
     email = models.EmailField()
     phone = models.CharField(max_length=30)
     is_main = models.BooleanField(default=False)
+    # customer_id solo si es principal y activo (NULL si no): el UNIQUE permite un único
+    # principal por cliente y sirve de índice para la degradación (MySQL no tiene índices
+    # parciales); un contacto dado de baja no ocupa el lugar
+    main_for_customer = models.GeneratedField(
+        expression=Case(When(is_main=True, active=True, then=F("customer")), default=None),
+        output_field=models.BigIntegerField(null=True),
+        db_persist=True,
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["main_for_customer"], name="contact_one_main_per_customer"),
+            # clave natural (importación masiva)
+            models.UniqueConstraint(fields=["customer", "email"], name="contact_customer_email_uniq"),
+        ]
+        indexes = [
+            # sync delta (/api/sync/): keyset por (updated_at, id)
+            models.Index(fields=["updated_at", "id"], name="contact_sync_idx"),
+        ]
 
     def __str__(self):
-        return f"{self.name} ({self.customer})"
\ No newline at end of file
+        return f"{self.name} ({self.customer})"
+
+
+def demote_main_contact(customer_id, exclude_pk=None):
+    """
+    Quita la marca de principal al contacto principal actual del cliente.
+    Toca a lo sumo una fila, buscada por el índice único de main_for_customer.
+    """
+    qs = CustomerContact.objects.filter(main_for_customer=customer_id)
+    if exclude_pk is not None:
+        qs = qs.exclude(pk=exclude_pk)
+    return qs.update(is_main=False, updated_at=timezone.now())
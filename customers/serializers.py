@@ -1,4 +1,5 @@
 from rest_framework import serializers
+from core.bulk import BulkListSerializer, PreloadedPrimaryKeyRelatedField
 from .models import Customer, CustomerContact
 
 class CustomerMiniSerializer(serializers.ModelSerializer):
@@ -27,3 +28,29 @@ class CustomerContactSerializer(serializers.ModelSerializer):
             "active", "created_at", "updated_at", "created_by", "updated_by",
         )
         read_only_fields = ("active", "created_at", "updated_at", "created_by", "updated_by")
+        # (customer, email) es UNIQUE en BD, pero el customer puede venir por URL/query:
+        # sin UniqueTogetherValidator; un duplicado responde 409 desde la vista
+        validators = []
+
+
+# ---- Importación masiva (core/imports.py) ----
+class CustomerImportSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Customer
+        fields = ("name", "identification", "email", "phone", "location", "direction")
+        # identification es la clave natural: obligatoria y sin UniqueValidator (es un upsert)
+        extra_kwargs = {
+            "identification": {"required": True, "allow_null": False, "allow_blank": False, "validators": []},
+        }
+        list_serializer_class = BulkListSerializer
+
+
+class CustomerContactImportSerializer(serializers.ModelSerializer):
+    # FK resueltas en lote (una consulta por campo para todo el lote)
+    serializer_related_field = PreloadedPrimaryKeyRelatedField
+
+    class Meta:
+        model = CustomerContact
+        fields = ("customer", "name", "email", "phone", "is_main")
+        validators = []  # upsert por (customer, email)
+        list_serializer_class = BulkListSerializer
@@ -1,3 +1,90 @@
+from unittest import mock
+
 from django.test import TestCase
+from rest_framework.test import APIClient
+from rest_framework.validators import UniqueValidator
+
+from customers.models import Customer, CustomerContact
+from users.models import User
+
+
+class MainContactUniquenessTests(TestCase):
+    """Un único contacto principal activo por cliente (UNIQUE sobre main_for_customer)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="ops", email="ops@x.com", password="x")
+        cls.customer = Customer.objects.create(name="ACME", identification="1-111")
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _contact(self, email, **extra):
+        return CustomerContact.objects.create(
+            customer=self.customer, name=email, email=email, phone="1", **extra
+        )
+
+    def test_inactive_main_does_not_hold_the_slot(self):
+        old = self._contact("a@x.com", is_main=True)
+        self.assertEqual(self.client.delete(f"/api/customer-contact/{old.pk}/").status_code, 204)
+
+        new = self._contact("b@x.com", is_main=True)  # sin degradar: el UNIQUE lo permite
+
+        old.refresh_from_db()
+        self.assertIsNone(old.main_for_customer)
+        self.assertEqual(CustomerContact.objects.get(pk=new.pk).main_for_customer, self.customer.pk)
+
+    def test_create_demotes_previous_main(self):
+        old = self._contact("a@x.com", is_main=True)
+        response = self.client.post(
+            "/api/customer-contact/",
+            {"customer": self.customer.pk, "name": "B", "email": "b@x.com", "phone": "2", "is_main": True},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 201, response.data)
+        old.refresh_from_db()
+        self.assertFalse(old.is_main)
+
+    def test_concurrent_main_is_a_conflict(self):
+        self._contact("a@x.com", is_main=True)
+        # Otra petición asignó su principal entre la degradación y el INSERT
+        with mock.patch("customers.views.demote_main_contact"):
+            response = self.client.post(
+                "/api/customer-contact/",
+                {"customer": self.customer.pk, "name": "B", "email": "b@x.com", "phone": "2", "is_main": True},
+                format="json",
+            )
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(CustomerContact.objects.filter(customer=self.customer).count(), 1)
+
+
+class CustomerIdentificationTests(TestCase):
+    """identification es UNIQUE: vacía se guarda como NULL y los choques responden 409."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="ops", email="ops@x.com", password="x")
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_blank_identification_is_stored_as_null(self):
+        for name in ("A", "B"):
+            response = self.client.post("/api/customers/", {"name": name, "identification": ""}, format="json")
+            self.assertEqual(response.status_code, 201, response.data)
+            self.assertIsNone(response.data["identification"])
+        self.assertIsNone(Customer.objects.create(name="C", identification="  ").identification)
 
-# Create your tests here.
+    def test_concurrent_duplicate_is_a_conflict(self):
+        Customer.objects.create(name="A", identification="1-111")
+        other = Customer.objects.create(name="B", identification="2-222")
+        # la otra petición insertó entre la validación y el INSERT
+        with mock.patch.object(UniqueValidator, "__call__", return_value=None):
+            created = self.client.post("/api/customers/", {"name": "C", "identification": "1-111"}, format="json")
+            updated = self.client.patch(f"/api/customers/{other.pk}/", {"identification": "1-111"}, format="json")
+        self.assertEqual((created.status_code, updated.status_code), (409, 409))
+        self.assertIn("identification", created.data)
+        other.refresh_from_db()
+        self.assertEqual(other.identification, "2-222")
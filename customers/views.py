@@ -5,11 +5,24 @@ from rest_framework import viewsets, permissions, decorators, response, status,
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.exceptions import ValidationError
 
-from .models import Customer, CustomerContact
-from .serializers import CustomerSerializer, CustomerContactSerializer
+from analytics.aggregates import customer_overview
+from core.exceptions import conflict_on_integrity_error
+from core.filters import IndexedSearchFilter
+from core.pagination import unpaginated_response
+from .models import Customer, CustomerContact, demote_main_contact
+from .serializers import CustomerSerializer, CustomerContactSerializer, CustomerMiniSerializer
 
 DISABLE_AUTH = os.getenv("DISABLE_AUTH", "0") == "1"
 
+# UNIQUE en BD: un principal por cliente y (customer, email)
+MAIN_CONTACT_CONFLICT = {
+    "detail": "El cliente ya tiene un contacto con ese email, u otro contacto principal se asignó "
+              "al mismo tiempo; revisa los datos y vuelve a intentarlo."
+}
+
+# UNIQUE en BD: identificación (clave natural de la importación)
+IDENTIFICATION_CONFLICT = {"identification": "Ya existe un cliente con esta identificación."}
+
 def _actor_or_none(request):
     u = getattr(request, "user", None)
     return u if (u and getattr(u, "is_authenticated", False)) else None
@@ -18,15 +31,17 @@ class CustomerViewSet(viewsets.ModelViewSet):
     queryset = Customer.active_objects.all().order_by("name", "id")
     serializer_class = CustomerSerializer
     permission_classes = [permissions.AllowAny] if DISABLE_AUTH else [permissions.IsAuthenticated]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, IndexedSearchFilter, filters.OrderingFilter]
     filterset_fields = ["active", "identification"]
+    search_kind = "customer"  # ?search= usa el índice global (core/search.py)
     search_fields = ["name", "email", "phone", "location", "direction", "identification"]
     ordering_fields = ["name", "id", "created_at", "updated_at"]
     ordering = ["name"]
 
     def perform_create(self, serializer):
         actor = _actor_or_none(self.request)
-        serializer.save(created_by=actor, updated_by=actor)
+        with conflict_on_integrity_error(IDENTIFICATION_CONFLICT), transaction.atomic():
+            serializer.save(created_by=actor, updated_by=actor)
 
     def perform_update(self, serializer):
         actor = _actor_or_none(self.request)
@@ -35,13 +50,14 @@ class CustomerViewSet(viewsets.ModelViewSet):
         old_customer: Customer = serializer.instance
         was_active = getattr(old_customer, "active", None)
 
-        # Guardamos cambios
-        customer: Customer = serializer.save(updated_by=actor)
-        is_active_now = getattr(customer, "active", None)
+        with conflict_on_integrity_error(IDENTIFICATION_CONFLICT), transaction.atomic():
+            # Guardamos cambios
+            customer: Customer = serializer.save(updated_by=actor)
+            is_active_now = getattr(customer, "active", None)
 
-        # Si pasó de active=True -> active=False, corremos cascada
-        if was_active and not is_active_now:
-            customer.soft_delete_cascade()
+            # Si pasó de active=True -> active=False, corremos cascada
+            if was_active and not is_active_now:
+                customer.soft_delete_cascade()
 
     def perform_destroy(self, instance):
         instance.delete()
@@ -54,16 +70,32 @@ class CustomerViewSet(viewsets.ModelViewSet):
     def restore(self, request, pk=None):
         obj = self.get_object()
         obj.active = True
-        obj.save(update_fields=["active"])
+        obj.save(update_fields=["active", "updated_at"])
         return response.Response({"detail": "Customer restored"}, status=status.HTTP_200_OK)
+
+    @decorators.action(
+        detail=True,
+        methods=["get"],
+        permission_classes=[permissions.AllowAny] if DISABLE_AUTH else [permissions.IsAuthenticated],
+    )
+    def overview(self, request, pk=None):
+        """
+        GET /api/customers/<id>/overview/
+        Vista 360: contactos, suscripción activa, visitas por estado, horas, materiales y
+        calificación promedio. Los agregados corren en paralelo (analytics/aggregates.py).
+        """
+        customer = self.get_object()
+        data = {"customer": CustomerMiniSerializer(customer).data, **customer_overview(customer.pk)}
+        return response.Response(data, status=status.HTTP_200_OK)
     
 # -------- CustomerContacts (no anidado) --------
 class CustomerContactViewSet(viewsets.ModelViewSet):
-    queryset = CustomerContact.active_objects.all().order_by("name", "id")
+    queryset = CustomerContact.active_objects.select_related("customer").order_by("name", "id")
     serializer_class = CustomerContactSerializer
     permission_classes = [permissions.AllowAny] if DISABLE_AUTH else [permissions.IsAuthenticated]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, IndexedSearchFilter, filters.OrderingFilter]
     filterset_fields = ["active", "is_main", "customer", "email"]
+    search_kind = "contact"
     search_fields = ["name", "email", "phone"]
     ordering_fields = ["id", "name", "email", "is_main", "created_at", "updated_at"]
     ordering = ["name"]
@@ -93,12 +125,12 @@ class CustomerContactViewSet(viewsets.ModelViewSet):
         if "customer" not in serializer.validated_data and customer_id:
             save_kwargs["customer_id"] = customer_id
 
-        # Unicidad de principal por cliente si se crea como is_main=True
+        # Unicidad de principal por cliente (UNIQUE en BD): se degrada el anterior
         is_main = bool(serializer.validated_data.get("is_main", False))
-        with transaction.atomic():
+        with conflict_on_integrity_error(MAIN_CONTACT_CONFLICT), transaction.atomic():
             if is_main:
                 cid = save_kwargs.get("customer_id") or serializer.validated_data["customer"].id
-                CustomerContact.objects.filter(customer_id=cid, is_main=True).update(is_main=False)
+                demote_main_contact(cid)
             if actor:
                 save_kwargs.update(created_by=actor, updated_by=actor)
             serializer.save(**save_kwargs)
@@ -106,11 +138,11 @@ class CustomerContactViewSet(viewsets.ModelViewSet):
     def perform_update(self, serializer):
         actor = _actor_or_none(self.request)
         # Si cambia a principal, desmarcamos otros del mismo cliente
-        instance = self.get_object()
+        instance = serializer.instance  # ya cargado por get_object() en update()
         will_be_main = serializer.validated_data.get("is_main", instance.is_main)
-        with transaction.atomic():
+        with conflict_on_integrity_error(MAIN_CONTACT_CONFLICT), transaction.atomic():
             if will_be_main:
-                CustomerContact.objects.filter(customer=instance.customer, is_main=True).exclude(pk=instance.pk).update(is_main=False)
+                demote_main_contact(instance.customer_id, exclude_pk=instance.pk)
             if actor:
                 serializer.save(updated_by=actor)
             else:
@@ -127,7 +159,7 @@ class CustomerContactViewSet(viewsets.ModelViewSet):
     def restore(self, request, pk=None):
         obj = self.get_object()
         obj.active = True
-        obj.save(update_fields=["active"])
+        obj.save(update_fields=["active", "updated_at"])
         return response.Response({"detail": "Contact restored"}, status=status.HTTP_200_OK)
 
     @decorators.action(
@@ -135,13 +167,13 @@ class CustomerContactViewSet(viewsets.ModelViewSet):
         methods=["post"],
         permission_classes=[permissions.AllowAny] if DISABLE_AUTH else [permissions.IsAuthenticated],
     )
-    @transaction.atomic
     def set_main(self, request, pk=None):
         obj = self.get_object()
-        CustomerContact.objects.filter(customer=obj.customer, is_main=True).exclude(pk=obj.pk).update(is_main=False)
         if not obj.is_main:
-            obj.is_main = True
-            obj.save(update_fields=["is_main"])
+            with conflict_on_integrity_error(MAIN_CONTACT_CONFLICT), transaction.atomic():
+                demote_main_contact(obj.customer_id, exclude_pk=obj.pk)
+                obj.is_main = True
+                obj.save(update_fields=["is_main", "updated_at"])
         ser = CustomerContactSerializer(obj, context={"request": request})
         return response.Response(ser.data, status=status.HTTP_200_OK)
 
@@ -158,11 +190,15 @@ class CustomerContactViewSet(viewsets.ModelViewSet):
         POST /api/customer-contact/by-customer/<customer_id>/
         """
         # Usamos Customer.objects para no excluir inactivos (si tienes soft-delete)
-        customer = get_object_or_404(Customer.objects, pk=customer_id)
+        customer = get_object_or_404(Customer.objects.cached(), pk=customer_id)
 
         if request.method.lower() == "get":
             only_main = request.query_params.get("only_main")
-            qs = CustomerContact.active_objects.filter(customer=customer).order_by("-is_main", "name", "id")
+            qs = (
+                CustomerContact.active_objects.filter(customer=customer)
+                .select_related("customer")  # customer_detail por fila
+                .order_by("-is_main", "name", "id")
+            )
             if only_main in ("1", "true", "True"):
                 qs = qs.filter(is_main=True)
 
@@ -172,8 +208,7 @@ class CustomerContactViewSet(viewsets.ModelViewSet):
                 ser = CustomerContactSerializer(page, many=True, context={"request": request})
                 return self.get_paginated_response(ser.data)
 
-            ser = CustomerContactSerializer(qs, many=True, context={"request": request})
-            return response.Response(ser.data, status=status.HTTP_200_OK)
+            return unpaginated_response(qs, CustomerContactSerializer, {"request": request})
 
         # POST: crear contacto para ESTE customer (no envíes "customer" en el body)
         ser = CustomerContactSerializer(data=request.data, context={"request": request})
@@ -182,9 +217,9 @@ class CustomerContactViewSet(viewsets.ModelViewSet):
         actor = _actor_or_none(request)
         is_main = bool(ser.validated_data.get("is_main", False))
 
-        with transaction.atomic():
+        with conflict_on_integrity_error(MAIN_CONTACT_CONFLICT), transaction.atomic():
             if is_main:
-                CustomerContact.objects.filter(customer=customer, is_main=True).update(is_main=False)
+                demote_main_contact(customer.pk)
 
             save_kwargs = {"customer": customer}
             if actor:
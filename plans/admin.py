@@ -16,6 +16,6 @@ class PlanTaskAdmin(admin.ModelAdmin):
 
 @admin.register(PlanSubscription)
 class PlanSubscriptionAdmin(admin.ModelAdmin):
-    list_display = ("customer", "plan", "start_date", "status")
-    list_filter = ("status", "plan")
+    list_display = ("customer", "plan", "start_date", "status", "recurrence", "technician")
+    list_filter = ("status", "plan", "recurrence")
     search_fields = ("customer__name", "plan__name")
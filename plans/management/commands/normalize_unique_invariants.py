@@ -0,0 +1,105 @@
+# plans/management/commands/normalize_unique_invariants.py
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.functions import Lower, Trim
+from django.utils import timezone
+
+from customers.models import Customer, CustomerContact
+from plans.models import Plan, PlanTask, PlanSubscription
+
+# Claves naturales UNIQUE (importación masiva): no se pueden fusionar solas, solo se reportan
+NATURAL_KEYS = (
+    (Customer, ("identification",)),
+    (CustomerContact, ("customer_id", "email")),
+    (Plan, ("name",)),
+    (PlanTask, ("plan_id", "name")),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Deja los datos listos para las restricciones UNIQUE de 'un contacto principal' y "
+        "'una suscripción activa' por cliente: normaliza PlanSubscription.status a minúsculas "
+        "y degrada los duplicados (se conserva el más reciente); pasa a NULL las identificaciones "
+        "de cliente vacías. Reporta además las claves "
+        "naturales duplicadas (identificación, email por cliente, nombre de plan / tarea). "
+        "Correr ANTES de migrar."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Solo contar, sin escribir.")
+
+    def handle(self, *args, **opts):
+        dry_run = opts["dry_run"]
+        valid = PlanSubscription.Status.values
+        # Solo columnas base (values/update): las columnas generadas aún no existen
+        subs = PlanSubscription.objects.only("id")
+
+        # identificación vacía -> NULL: bajo el UNIQUE solo NULL puede repetirse
+        blank_ids = Customer.objects.filter(identification__regex=r"^\s*$")
+
+        with transaction.atomic():
+            blank_identifications = blank_ids.count()
+            if not dry_run:
+                blank_ids.update(identification=None, updated_at=timezone.now())
+            to_normalize = subs.exclude(status__in=valid).count()
+            if not dry_run:
+                subs.exclude(status__in=valid).update(status=Lower(Trim("status")))
+                unknown = sorted(set(subs.exclude(status__in=valid).values_list("status", flat=True)))
+                if unknown:
+                    raise CommandError(f"Estados desconocidos en PlanSubscription.status: {unknown}")
+
+            demoted_subs = self._demote_duplicates(
+                PlanSubscription.objects.filter(status=PlanSubscription.Status.ACTIVE, active=True),
+                order=("-start_date", "-id"),
+                changes={"status": PlanSubscription.Status.INACTIVE},
+                dry_run=dry_run,
+            )
+            demoted_contacts = self._demote_duplicates(
+                CustomerContact.objects.filter(is_main=True, active=True),
+                order=("-updated_at", "-id"),
+                changes={"is_main": False},
+                dry_run=dry_run,
+            )
+            if dry_run:
+                transaction.set_rollback(True)
+
+        prefix = "[dry-run] " if dry_run else ""
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}Identificaciones vacías -> NULL: {blank_identifications}. "
+            f"Estados normalizados: {to_normalize}. "
+            f"Suscripciones activas degradadas: {demoted_subs}. "
+            f"Contactos principales degradados: {demoted_contacts}."
+        ))
+
+        duplicated = 0
+        for model, fields in NATURAL_KEYS:
+            rows = (
+                model.objects.order_by().exclude(**{f"{fields[0]}__isnull": True})
+                .values(*fields).annotate(n=Count("id")).filter(n__gt=1)
+            )
+            for row in rows:
+                if row[fields[0]] == "":
+                    continue  # identificación vacía: pasa a NULL arriba (en --dry-run solo se cuenta)
+                duplicated += 1
+                key = ", ".join(f"{f}={row[f]!r}" for f in fields)
+                self.stderr.write(f"  {model.__name__} duplicado ({key}): {row['n']} filas")
+        if duplicated:
+            self.stderr.write(self.style.WARNING(
+                f"{duplicated} claves naturales duplicadas: corrígelas a mano antes de migrar."
+            ))
+
+    def _demote_duplicates(self, qs, order, changes, dry_run):
+        """Por cliente con más de una fila en qs, conserva la primera según 'order' y degrada el resto."""
+        dup_customers = (
+            qs.order_by().values("customer_id").annotate(n=Count("id")).filter(n__gt=1)
+            .values_list("customer_id", flat=True)
+        )
+        losers = []
+        for customer_id in dup_customers:
+            ids = list(qs.filter(customer_id=customer_id).order_by(*order).values_list("id", flat=True))
+            losers.extend(ids[1:])
+        if losers and not dry_run:
+            qs.model.objects.filter(id__in=losers).update(updated_at=timezone.now(), **changes)
+        return len(losers)
@@ -1,4 +1,8 @@
+from datetime import time
+from django.conf import settings
 from django.db import models
+from django.db.models import Case, Exists, F, OuterRef, When
+from django.utils import timezone
 from customers.models import Customer
 from core.models import BaseModel, TimeStampedModel
 
@@ -10,6 +14,14 @@ class Plan(BaseModel, TimeStampedModel):
 
     class Meta:
         ordering = ["name"]
+        constraints = [
+            # clave natural (importación masiva)
+            models.UniqueConstraint(fields=["name"], name="plan_name_uniq"),
+        ]
+        indexes = [
+            # sync delta (/api/sync/): keyset por (updated_at, id)
+            models.Index(fields=["updated_at", "id"], name="plan_sync_idx"),
+        ]
 
     def __str__(self) -> str:
         return self.name
@@ -21,21 +33,95 @@ class PlanTask(BaseModel, TimeStampedModel):
 
     class Meta:
         ordering = ["plan_id", "name"]
-        constraints = []
+        constraints = [
+            # clave natural (importación masiva)
+            models.UniqueConstraint(fields=["plan", "name"], name="plantask_plan_name_uniq"),
+        ]
+        indexes = [
+            # sync delta (/api/sync/): keyset por (updated_at, id)
+            models.Index(fields=["updated_at", "id"], name="plantask_sync_idx"),
+        ]
 
 
     def __str__(self) -> str:
         return f"{self.plan.name} . {self.name}"
 
 class PlanSubscription(BaseModel, TimeStampedModel):
+    class Status(models.TextChoices):
+        ACTIVE = "active", "Activa"
+        INACTIVE = "inactive", "Inactiva"
+        CANCELLED = "cancelled", "Cancelada"
+
+    class Recurrence(models.TextChoices):
+        NONE = "none", "Sin recurrencia"
+        DAILY = "daily", "Cada N días"
+        WEEKLY = "weekly", "Cada N semanas"
+        MONTHLY = "monthly", "Cada N meses"
+
     customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name="subscriptions")
     plan = models.ForeignKey(Plan, on_delete=models.PROTECT, related_name="subscriptions")
     start_date = models.DateField()
-    status = models.CharField(max_length=10)
+    status = models.CharField(max_length=10, choices=Status.choices, db_index=True)
     notes = models.TextField(blank=True)
 
+    # Regla de recurrencia para generar visitas (ver visits/recurring.py)
+    recurrence = models.CharField(max_length=10, choices=Recurrence.choices, default=Recurrence.NONE)
+    recurrence_interval = models.PositiveSmallIntegerField(default=1)
+    recurrence_time = models.TimeField(default=time(8, 0))
+    recurrence_until = models.DateField(null=True, blank=True)
+    recurrence_exceptions = models.JSONField(default=list, blank=True)  # fechas ISO a omitir
+    technician = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="assigned_subscriptions",
+    )
+    # customer_id solo si status='active' y no está dada de baja (NULL si no): el UNIQUE
+    # garantiza una sola suscripción activa por cliente y sirve de índice para la degradación
+    active_for_customer = models.GeneratedField(
+        expression=Case(When(status="active", active=True, then=F("customer")), default=None),
+        output_field=models.BigIntegerField(null=True),
+        db_persist=True,
+    )
+
     class Meta:
         ordering = ["-start_date"]
+        indexes = [
+            models.Index(fields=["recurrence", "id"], name="plansub_recurrence_idx"),
+            # sync delta (/api/sync/): keyset por (updated_at, id)
+            models.Index(fields=["updated_at", "id"], name="plansub_sync_idx"),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=["active_for_customer"], name="plansub_one_active_per_customer"),
+        ]
 
     def __str__(self) -> str:
         return f"{self.customer.name} → {self.plan.name} ({self.status})"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        obj = super().from_db(db, field_names, values)
+        # notas tal como se leyeron: las visitas las indexan y solo se reindexan si
+        # cambian (core/signals.py); None si la columna no se cargó
+        obj._loaded_notes = obj.__dict__.get("notes")
+        return obj
+
+
+def inactive_tasks_exist(plan_ref="pk"):
+    """
+    Exists(...) de tareas inactivas del plan. Se usa como anotación para que la
+    validación "plan sin tareas inactivas" viaje en la misma consulta que carga el plan.
+    """
+    return Exists(PlanTask.objects.filter(plan=OuterRef(plan_ref), active=False))
+
+
+def demote_active_subscription(customer_id, exclude_pk=None):
+    """
+    Pasa a 'inactive' la suscripción activa actual del cliente.
+    Toca a lo sumo una fila, buscada por el índice único de active_for_customer.
+    """
+    qs = PlanSubscription.objects.filter(active_for_customer=customer_id)
+    if exclude_pk is not None:
+        qs = qs.exclude(pk=exclude_pk)
+    return qs.update(status=PlanSubscription.Status.INACTIVE, updated_at=timezone.now())
@@ -0,0 +1,67 @@
+# plans/recurrence.py
+import calendar
+from datetime import date, timedelta
+
+from .models import PlanSubscription
+
+Recurrence = PlanSubscription.Recurrence
+
+
+def _add_months(d: date, months: int, day: int) -> date:
+    """Suma meses manteniendo el día ancla (recortado al último día del mes)."""
+    month_index = d.month - 1 + months
+    year = d.year + month_index // 12
+    month = month_index % 12 + 1
+    return date(year, month, min(day, calendar.monthrange(year, month)[1]))
+
+
+def _exceptions(sub):
+    out = set()
+    for raw in sub.recurrence_exceptions or ():
+        try:
+            out.add(date.fromisoformat(str(raw)))
+        except ValueError:
+            continue
+    return out
+
+
+def occurrence_dates(sub, from_date: date, to_date: date):
+    """
+    Fechas de visita de la suscripción en [from_date, to_date] (inclusive).
+    Salta directamente a la primera ocurrencia de la ventana (sin recorrer el historial).
+    """
+    if sub.recurrence == Recurrence.NONE:
+        return []
+
+    interval = max(int(sub.recurrence_interval or 1), 1)
+    anchor = sub.start_date
+    first = max(from_date, anchor)
+    last = min(to_date, sub.recurrence_until) if sub.recurrence_until else to_date
+    if first > last:
+        return []
+
+    skip = _exceptions(sub)
+    out = []
+
+    if sub.recurrence in (Recurrence.DAILY, Recurrence.WEEKLY):
+        step = interval * (7 if sub.recurrence == Recurrence.WEEKLY else 1)
+        k = -(-(first - anchor).days // step)  # ceil
+        current = anchor + timedelta(days=k * step)
+        while current <= last:
+            if current not in skip:
+                out.append(current)
+            current += timedelta(days=step)
+        return out
+
+    if sub.recurrence == Recurrence.MONTHLY:
+        months = (first.year - anchor.year) * 12 + (first.month - anchor.month)
+        k = max(months // interval, 0)
+        current = _add_months(anchor, k * interval, anchor.day)
+        while current <= last:
+            if current >= first and current not in skip:
+                out.append(current)
+            k += 1
+            current = _add_months(anchor, k * interval, anchor.day)
+        return out
+
+    return []
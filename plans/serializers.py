@@ -1,5 +1,8 @@
+from datetime import date
 from rest_framework import serializers
-from .models import Plan, PlanTask, PlanSubscription
+from core.bulk import BulkListSerializer, PreloadedPrimaryKeyRelatedField
+from core.fastserializers import ValuesSerializer
+from .models import Plan, PlanTask, PlanSubscription, inactive_tasks_exist
 # Si necesitas Customer info específica en otro serializer, importa:
 # from customers.models import Customer
 
@@ -16,18 +19,51 @@ class PlanSerializer(serializers.ModelSerializer):
     class Meta:
         model = Plan
         fields = ["id", "name", "description", "price", "active", "tasks"]
+        # name es UNIQUE en BD: el duplicado responde 409 desde la vista (sin SELECT previo)
+        extra_kwargs = {"name": {"validators": []}}
+
+
+class CaseInsensitiveChoiceField(serializers.ChoiceField):
+    """ChoiceField que acepta 'Active' / ' ACTIVE ' y guarda siempre el valor canónico."""
+
+    def to_internal_value(self, data):
+        if isinstance(data, str):
+            data = data.strip().lower()
+        return super().to_internal_value(data)
 
 
 class PlanSubscriptionSerializer(serializers.ModelSerializer):
+    # El plan se carga ya anotado con has_inactive_tasks (validación sin consulta extra)
+    plan = serializers.PrimaryKeyRelatedField(
+        queryset=Plan.objects.annotate(has_inactive_tasks=inactive_tasks_exist())
+    )
+    status = CaseInsensitiveChoiceField(choices=PlanSubscription.Status.choices)
 
     class Meta:
         model = PlanSubscription
-        fields = ["id", "customer", "plan", "start_date", "status", "notes"]
+        fields = [
+            "id", "customer", "plan", "start_date", "status", "notes",
+            "recurrence", "recurrence_interval", "recurrence_time",
+            "recurrence_until", "recurrence_exceptions", "technician",
+        ]
         extra_kwargs = {
             "start_date": {"required": False},
             "notes": {"required": False},
         }
 
+    def validate_recurrence_interval(self, value):
+        if value < 1:
+            raise serializers.ValidationError("Debe ser mayor o igual a 1.")
+        return value
+
+    def validate_recurrence_exceptions(self, value):
+        if not isinstance(value, list):
+            raise serializers.ValidationError("Debe ser una lista de fechas AAAA-MM-DD.")
+        try:
+            return sorted({date.fromisoformat(str(v)).isoformat() for v in value})
+        except ValueError:
+            raise serializers.ValidationError("Debe ser una lista de fechas AAAA-MM-DD.")
+
     def to_representation(self, instance):
         data = super().to_representation(instance)
         request = self.context.get("request")
@@ -45,3 +81,77 @@ class PlanSubscriptionSerializer(serializers.ModelSerializer):
             } if c else None
 
         return data
+
+
+# ---- Listas de solo lectura (core/fastserializers.py): mismo JSON, desde .values() ----
+class PlanTaskValuesSerializer(ValuesSerializer):
+    serializer_class = PlanTaskSerializer
+
+
+class PlanValuesSerializer(ValuesSerializer):
+    serializer_class = PlanSerializer
+    nested = ("tasks",)
+
+
+class PlanSubscriptionValuesSerializer(ValuesSerializer):
+    serializer_class = PlanSubscriptionSerializer
+    CUSTOMER_COLUMNS = ("customer__name", "customer__identification", "customer__email", "customer__phone")
+
+    @classmethod
+    def values(cls, queryset, *extra):
+        return super().values(queryset, *PlanValuesSerializer.columns("plan__"), *cls.CUSTOMER_COLUMNS, *extra)
+
+    def add_nested(self, rows, data):
+        request = self.context.get("request")
+        if not (request and request.method == "GET"):
+            return
+        # plan_detail: un dict por plan, con sus tareas activas (como el Prefetch del viewset)
+        plan_serializer = PlanValuesSerializer(context=self.context, prefix="plan__")
+        plans = {}
+        for r in rows:
+            if r["plan_id"] not in plans:
+                plans[r["plan_id"]] = plan_serializer.to_row(r)
+        plan_ids = [{"plan_id": plan_id} for plan_id in plans]
+        plan_serializer.nest_many(plan_ids, list(plans.values()), "tasks", PlanTaskValuesSerializer,
+                                  PlanTask.active_objects.order_by("name", "id"), "plan_id", pk="plan_id")
+        for r, item in zip(rows, data):
+            item["plan_detail"] = plans[r["plan_id"]]
+            item["customer_info"] = {
+                "id": r["customer_id"],
+                "name": r["customer__name"],
+                "identification": r["customer__identification"],
+                "email": r["customer__email"],
+                "phone": r["customer__phone"],
+            } if r["customer_id"] is not None else None
+
+
+# ---- Importación masiva (core/imports.py) ----
+class PlanImportSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Plan
+        fields = ["name", "description", "price"]
+        extra_kwargs = {"name": {"validators": []}}  # clave natural: es un upsert
+        list_serializer_class = BulkListSerializer
+
+
+class PlanTaskImportSerializer(serializers.ModelSerializer):
+    serializer_related_field = PreloadedPrimaryKeyRelatedField
+
+    class Meta:
+        model = PlanTask
+        fields = ["plan", "name", "description"]
+        validators = []  # upsert por (plan, name)
+        list_serializer_class = BulkListSerializer
+
+
+class PlanSubscriptionImportSerializer(PlanSubscriptionSerializer):
+    serializer_related_field = PreloadedPrimaryKeyRelatedField
+    plan = PreloadedPrimaryKeyRelatedField(
+        queryset=Plan.objects.annotate(has_inactive_tasks=inactive_tasks_exist())
+    )
+
+    class Meta(PlanSubscriptionSerializer.Meta):
+        fields = [f for f in PlanSubscriptionSerializer.Meta.fields if f != "id"]
+        # (customer, plan, start_date) es la clave natural del import
+        extra_kwargs = {"notes": {"required": False}}
+        list_serializer_class = BulkListSerializer
@@ -1,3 +1,141 @@
+from datetime import date
+from decimal import Decimal
+from unittest import mock
+
+from django.db.models import Prefetch
 from django.test import TestCase
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from customers.models import Customer
+from plans.models import Plan, PlanTask, PlanSubscription
+from plans.recurrence import occurrence_dates
+from plans.serializers import PlanSubscriptionSerializer, PlanSubscriptionValuesSerializer
+from users.models import User
+
+
+class RecurrenceTests(TestCase):
+    """Fechas de ocurrencia de una suscripción recurrente (plans/recurrence.py)."""
+
+    def _sub(self, recurrence, start, interval=1, until=None, exceptions=()):
+        return PlanSubscription(
+            start_date=start, recurrence=recurrence, recurrence_interval=interval,
+            recurrence_until=until, recurrence_exceptions=list(exceptions),
+        )
+
+    def test_weekly_jumps_to_the_window(self):
+        sub = self._sub("weekly", date(2025, 1, 6), interval=2)
+        self.assertEqual(
+            occurrence_dates(sub, date(2025, 3, 1), date(2025, 3, 31)),
+            [date(2025, 3, 3), date(2025, 3, 17), date(2025, 3, 31)],
+        )
+
+    def test_monthly_keeps_anchor_day_clamped_to_month_end(self):
+        sub = self._sub("monthly", date(2025, 1, 31))
+        self.assertEqual(
+            occurrence_dates(sub, date(2025, 1, 1), date(2025, 4, 30)),
+            [date(2025, 1, 31), date(2025, 2, 28), date(2025, 3, 31), date(2025, 4, 30)],
+        )
+
+    def test_until_exceptions_and_start(self):
+        sub = self._sub("daily", date(2025, 5, 3), interval=2, until=date(2025, 5, 11), exceptions=["2025-05-07", "x"])
+        self.assertEqual(
+            occurrence_dates(sub, date(2025, 5, 1), date(2025, 5, 31)),
+            [date(2025, 5, 3), date(2025, 5, 5), date(2025, 5, 9), date(2025, 5, 11)],
+        )
+        self.assertEqual(occurrence_dates(self._sub("none", date(2025, 5, 3)), date(2025, 5, 1), date(2025, 5, 31)), [])
+
+
+class SubscriptionValuesSerializerParityTests(TestCase):
+    """PlanSubscriptionValuesSerializer (core/fastserializers.py) da el mismo JSON que DRF."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="tec", email="tec@x.com", password="x")
+        cls.customer = Customer.objects.create(name="ACME", identification="1-111", email="acme@x.com")
+        other = Customer.objects.create(name="Beta", identification="2-222")
+        cls.plan = Plan.objects.create(name="Básico", price=Decimal("100.50"))
+        empty = Plan.objects.create(name="Vacío", price=0)
+        PlanTask.objects.create(plan=cls.plan, name="Revisión")
+        PlanTask.objects.create(plan=cls.plan, name="Limpieza")
+        PlanTask.objects.create(plan=cls.plan, name="Vieja", active=False)
+        PlanSubscription.objects.create(customer=cls.customer, plan=cls.plan, start_date=date(2025, 1, 1),
+                                        technician=cls.user, recurrence_exceptions=["2025-02-01"])
+        PlanSubscription.objects.create(customer=other, plan=cls.plan, start_date=date(2025, 2, 1))
+        PlanSubscription.objects.create(customer=other, plan=empty, start_date=date(2025, 3, 1))
+
+    def setUp(self):
+        self.context = {"request": Request(APIRequestFactory().get("/"))}
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _drf(self, qs):
+        qs = qs.select_related("plan", "customer").prefetch_related(
+            Prefetch("plan__tasks", queryset=PlanTask.active_objects.order_by("name", "id"))
+        )
+        return JSONRenderer().render(PlanSubscriptionSerializer(qs, many=True, context=self.context).data)
+
+    def test_subscriptions_match_drf(self):
+        qs = PlanSubscription.active_objects.order_by("-start_date", "id")
+        rows = list(PlanSubscriptionValuesSerializer.values(qs))
+        fast = PlanSubscriptionValuesSerializer(rows, many=True, context=self.context).data
+        self.assertEqual(JSONRenderer().render(fast), self._drf(qs))
+        self.assertEqual([t["name"] for t in fast[-1]["plan_detail"]["tasks"]], ["Limpieza", "Revisión"])
+        self.assertEqual(fast[0]["plan_detail"]["tasks"], [])
+
+    def test_only_get_adds_plan_detail(self):
+        context = {"request": Request(APIRequestFactory().post("/"))}
+        rows = list(PlanSubscriptionValuesSerializer.values(PlanSubscription.objects.all()))
+        fast = PlanSubscriptionValuesSerializer(rows, many=True, context=context).data
+        self.assertNotIn("plan_detail", fast[0])
+        self.assertNotIn("customer_info", fast[0])
+
+    def test_list_endpoints_unchanged(self):
+        qs = PlanSubscription.active_objects.order_by("-start_date", "id")
+        paths = {
+            "/api/plan-subscriptions/": qs,
+            f"/api/plan-subscriptions/by-customer/{self.customer.pk}/": qs.filter(customer=self.customer),
+            f"/api/plan-subscriptions/by-plan/{self.plan.pk}/": qs.filter(plan=self.plan),
+        }
+        for path, expected in paths.items():
+            response = self.client.get(path)
+            self.assertEqual(response.status_code, 200, path)
+            self.assertEqual(JSONRenderer().render(response.data["results"]), self._drf(expected), path)
+
+
+class ActiveSubscriptionUniquenessTests(TestCase):
+    """Una única suscripción activa (y no dada de baja) por cliente."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="ops", email="ops@x.com", password="x")
+        cls.customer = Customer.objects.create(name="ACME", identification="1-111")
+        cls.plan = Plan.objects.create(name="Básico", price=Decimal("10"))
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _payload(self):
+        return {"customer": self.customer.pk, "plan": self.plan.pk, "start_date": "2025-06-01", "status": "active"}
+
+    def test_deleted_active_subscription_does_not_hold_the_slot(self):
+        old = PlanSubscription.objects.create(customer=self.customer, plan=self.plan,
+                                              start_date=date(2025, 1, 1), status="active")
+        self.assertEqual(self.client.delete(f"/api/plan-subscriptions/{old.pk}/").status_code, 204)
+
+        new = PlanSubscription.objects.create(customer=self.customer, plan=self.plan,
+                                              start_date=date(2025, 6, 1), status="active")
+
+        old.refresh_from_db()
+        self.assertIsNone(old.active_for_customer)
+        self.assertEqual(PlanSubscription.objects.get(pk=new.pk).active_for_customer, self.customer.pk)
 
-# Create your tests here.
+    def test_concurrent_active_subscription_is_a_conflict(self):
+        PlanSubscription.objects.create(customer=self.customer, plan=self.plan,
+                                        start_date=date(2025, 1, 1), status="active")
+        with mock.patch("plans.views.demote_active_subscription"):
+            response = self.client.post("/api/plan-subscriptions/", self._payload(), format="json")
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(PlanSubscription.objects.filter(customer=self.customer).count(), 1)
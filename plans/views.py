@@ -6,13 +6,21 @@ from rest_framework import viewsets, permissions, decorators, response, status,
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.exceptions import ValidationError
 
-from .models import Plan, PlanTask, PlanSubscription
+from .models import Plan, PlanTask, PlanSubscription, inactive_tasks_exist, demote_active_subscription
 from customers.models import Customer
-from .serializers import PlanSerializer, PlanTaskSerializer, PlanSubscriptionSerializer
+from core.exceptions import conflict_on_integrity_error
+from core.filters import IndexedSearchFilter
+from core.fastserializers import ValuesListMixin
+from core.pagination import unpaginated_response
+from .serializers import PlanSerializer, PlanTaskSerializer, PlanSubscriptionSerializer, PlanSubscriptionValuesSerializer
 
 # ---------- Auth toggle ----------
 DISABLE_AUTH = os.getenv("DISABLE_AUTH", "0") == "1"
 
+PLAN_NAME_CONFLICT = {"name": "Ya existe un plan con este nombre."}
+TASK_NAME_CONFLICT = {"name": "El plan ya tiene una tarea con este nombre."}
+ACTIVE_SUBSCRIPTION_CONFLICT = {"status": "Otra suscripción activa se registró al mismo tiempo para este cliente; vuelve a intentarlo."}
+
 
 def _actor_or_none(request):
     u = getattr(request, "user", None)
@@ -26,8 +34,9 @@ class PlanViewSet(viewsets.ModelViewSet):
     """
     serializer_class = PlanSerializer
     permission_classes = [permissions.AllowAny] if DISABLE_AUTH else [permissions.IsAuthenticated]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, IndexedSearchFilter, filters.OrderingFilter]
     filterset_fields = ["active"]
+    search_kind = "plan"  # ?search= usa el índice global (core/search.py)
     search_fields = ["name", "description"]
     ordering_fields = ["name", "price", "id", "created_at", "updated_at"]
     ordering = ["name"]
@@ -43,11 +52,13 @@ class PlanViewSet(viewsets.ModelViewSet):
 
     def perform_create(self, serializer):
         actor = _actor_or_none(self.request)
-        serializer.save(created_by=actor, updated_by=actor)
+        with conflict_on_integrity_error(PLAN_NAME_CONFLICT):
+            serializer.save(created_by=actor, updated_by=actor)
 
     def perform_update(self, serializer):
         actor = _actor_or_none(self.request)
-        serializer.save(updated_by=actor)
+        with conflict_on_integrity_error(PLAN_NAME_CONFLICT):
+            serializer.save(updated_by=actor)
 
     def perform_destroy(self, instance):
         instance.delete()
@@ -60,7 +71,7 @@ class PlanViewSet(viewsets.ModelViewSet):
     def restore(self, request, pk=None):
         obj = self.get_object()
         obj.active = True
-        obj.save(update_fields=["active"])
+        obj.save(update_fields=["active", "updated_at"])
         return response.Response({"detail": "Plan restored"}, status=status.HTTP_200_OK)
 
 
@@ -98,28 +109,30 @@ class PlanTaskViewSet(viewsets.ModelViewSet):
                 raise ValidationError({"plan": "No se pueden crear tareas en un plan inactivo."})
         else:
             if plan_id:
-                plan = get_object_or_404(Plan.objects, pk=plan_id)
+                plan = get_object_or_404(Plan.objects.cached(), pk=plan_id)
                 if not plan.active:
                     raise ValidationError({"plan": "No se pueden crear tareas en un plan inactivo."})
                 save_kwargs["plan"] = plan
 
         if actor:
             save_kwargs.update(created_by=actor, updated_by=actor)
-        serializer.save(**save_kwargs)
+        with conflict_on_integrity_error(TASK_NAME_CONFLICT):
+            serializer.save(**save_kwargs)
 
     def perform_update(self, serializer):
         actor = _actor_or_none(self.request)
-        instance = self.get_object()
+        instance = serializer.instance  # ya cargado (con plan) por get_object() en update()
 
         # 🚫 Bloquear edición si el plan asociado (nuevo o actual) está inactivo
         target_plan = serializer.validated_data.get("plan") or getattr(instance, "plan", None)
         if target_plan is not None and not target_plan.active:
             raise ValidationError({"plan": "No se pueden modificar tareas asociadas a un plan inactivo."})
 
-        if actor:
-            serializer.save(updated_by=actor)
-        else:
-            serializer.save()
+        with conflict_on_integrity_error(TASK_NAME_CONFLICT):
+            if actor:
+                serializer.save(updated_by=actor)
+            else:
+                serializer.save()
 
     def perform_destroy(self, instance):
         instance.delete()
@@ -132,7 +145,7 @@ class PlanTaskViewSet(viewsets.ModelViewSet):
     def restore(self, request, pk=None):
         obj = self.get_object()
         obj.active = True
-        obj.save(update_fields=["active"])
+        obj.save(update_fields=["active", "updated_at"])
         return response.Response({"detail": "Task restored"}, status=status.HTTP_200_OK)
 
     # -------- by-plan (GET lista / POST crea) --------
@@ -147,7 +160,7 @@ class PlanTaskViewSet(viewsets.ModelViewSet):
         GET  /api/plan-task/by-plan/<plan_id>/
         POST /api/plan-task/by-plan/<plan_id>/
         """
-        plan = get_object_or_404(Plan.objects, pk=plan_id)
+        plan = get_object_or_404(Plan.objects.cached(), pk=plan_id)
 
         if request.method.lower() == "get":
             qs = PlanTask.active_objects.filter(plan=plan).order_by("name", "id")
@@ -155,8 +168,7 @@ class PlanTaskViewSet(viewsets.ModelViewSet):
             if page is not None:
                 ser = PlanTaskSerializer(page, many=True, context={"request": request})
                 return self.get_paginated_response(ser.data)
-            ser = PlanTaskSerializer(qs, many=True, context={"request": request})
-            return response.Response(ser.data, status=status.HTTP_200_OK)
+            return unpaginated_response(qs, PlanTaskSerializer, {"request": request})
 
         # 🚫 POST: crear task para ESTE plan -> bloquear si está inactivo
         if not plan.active:
@@ -176,12 +188,15 @@ class PlanTaskViewSet(viewsets.ModelViewSet):
 
 
 # ==================== PlanSubscriptions ====================
-class PlanSubscriptionViewSet(viewsets.ModelViewSet):
+class PlanSubscriptionViewSet(ValuesListMixin, viewsets.ModelViewSet):
     """
     GET: trae plan y customer con select_related, y prefetch de plan__tasks SOLO en GET
          para que el serializer añada plan_detail (con tasks) y customer_info.
+         Las listas (list, by-customer, by-plan) salen de .values() con
+         PlanSubscriptionValuesSerializer: mismo JSON, una consulta más para las tasks.
     """
     serializer_class = PlanSubscriptionSerializer
+    values_serializer_class = PlanSubscriptionValuesSerializer
     permission_classes = [permissions.AllowAny] if DISABLE_AUTH else [permissions.IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ["active", "customer", "plan", "status", "start_date"]
@@ -205,12 +220,19 @@ class PlanSubscriptionViewSet(viewsets.ModelViewSet):
             qs = qs.prefetch_related(
                 Prefetch("plan__tasks", queryset=PlanTask.active_objects.order_by("name", "id"))
             )
+        else:
+            # En escrituras la validación del plan actual viaja en la misma consulta
+            qs = qs.annotate(plan_has_inactive_tasks=inactive_tasks_exist("plan_id"))
         return qs
 
-    def _assert_plan_and_tasks_active(self, plan: Plan):
+    def _assert_plan_and_tasks_active(self, plan: Plan, has_inactive_tasks=None):
         if not plan.active:
             raise ValidationError({"plan": "No se pueden crear o modificar suscripciones con un plan inactivo."})
-        if PlanTask.objects.filter(plan=plan, active=False).exists():
+        if has_inactive_tasks is None:
+            has_inactive_tasks = getattr(plan, "has_inactive_tasks", None)
+        if has_inactive_tasks is None:
+            has_inactive_tasks = PlanTask.objects.filter(plan=plan, active=False).exists()
+        if has_inactive_tasks:
             raise ValidationError({"plan": "No se pueden crear o modificar suscripciones: el plan tiene tareas inactivas."})
 
     def perform_create(self, serializer):
@@ -224,12 +246,12 @@ class PlanSubscriptionViewSet(viewsets.ModelViewSet):
         if plan:
             self._assert_plan_and_tasks_active(plan)
 
-        # Si se marca 'active', desactivar otras activas del mismo cliente
+        # Si se marca 'active', desactivar la activa anterior del mismo cliente (UNIQUE en BD)
         status_in = serializer.validated_data.get("status")
         customer = serializer.validated_data.get("customer")
-        if status_in and status_in.lower() == "active" and customer:
-            with transaction.atomic():
-                PlanSubscription.objects.filter(customer=customer, status__iexact="active").update(status="inactive")
+        if status_in == PlanSubscription.Status.ACTIVE and customer:
+            with conflict_on_integrity_error(ACTIVE_SUBSCRIPTION_CONFLICT), transaction.atomic():
+                demote_active_subscription(customer.pk)
                 serializer.save(**save_kwargs)
                 return
 
@@ -237,17 +259,32 @@ class PlanSubscriptionViewSet(viewsets.ModelViewSet):
 
     def perform_update(self, serializer):
         actor = _actor_or_none(self.request)
-        instance = self.get_object()
+        instance = serializer.instance  # ya cargado (anotado) por get_object() en update()
 
         # Validar plan (nuevo o actual) y tasks
-        plan = serializer.validated_data.get("plan") or getattr(instance, "plan", None)
+        plan = serializer.validated_data.get("plan")
         if plan:
             self._assert_plan_and_tasks_active(plan)
+        elif instance.plan_id:
+            self._assert_plan_and_tasks_active(
+                instance.plan, getattr(instance, "plan_has_inactive_tasks", None)
+            )
 
-        if actor:
-            serializer.save(updated_by=actor)
-        else:
-            serializer.save()
+        # Pasa a 'active' (o cambia de cliente siendo activa): degradar la activa del cliente
+        new_status = serializer.validated_data.get("status", instance.status)
+        customer = serializer.validated_data.get("customer")
+        customer_id = customer.pk if customer else instance.customer_id
+        becomes_active = new_status == PlanSubscription.Status.ACTIVE and (
+            instance.status != PlanSubscription.Status.ACTIVE or customer_id != instance.customer_id
+        )
+        save_kwargs = {"updated_by": actor} if actor else {}
+        if becomes_active:
+            with conflict_on_integrity_error(ACTIVE_SUBSCRIPTION_CONFLICT), transaction.atomic():
+                demote_active_subscription(customer_id, exclude_pk=instance.pk)
+                serializer.save(**save_kwargs)
+                return
+
+        serializer.save(**save_kwargs)
 
     def perform_destroy(self, instance):
         instance.delete()
@@ -260,7 +297,7 @@ class PlanSubscriptionViewSet(viewsets.ModelViewSet):
     def restore(self, request, pk=None):
         obj = self.get_object()
         obj.active = True
-        obj.save(update_fields=["active"])
+        obj.save(update_fields=["active", "updated_at"])
         return response.Response({"detail": "Subscription restored"}, status=status.HTTP_200_OK)
 
     # -------- by-customer (GET lista / POST crea) --------
@@ -275,7 +312,7 @@ class PlanSubscriptionViewSet(viewsets.ModelViewSet):
         GET  /api/plan-subscription/by-customer/<customer_id>/?status=active
         POST /api/plan-subscription/by-customer/<customer_id>/   (en body enviar plan, fechas, etc. SIN 'customer')
         """
-        customer = get_object_or_404(Customer.objects, pk=customer_id)
+        customer = get_object_or_404(Customer.objects.cached(), pk=customer_id)
 
         if request.method.lower() == "get":
             status_q = request.query_params.get("status")
@@ -286,19 +323,8 @@ class PlanSubscriptionViewSet(viewsets.ModelViewSet):
                 .order_by("-start_date", "id")
             )
             if status_q:
-                qs = qs.filter(status__iexact=status_q)
-
-            qs = qs.prefetch_related(
-                Prefetch("plan__tasks", queryset=PlanTask.active_objects.order_by("name", "id"))
-            )
-
-            page = self.paginate_queryset(qs)
-            if page is not None:
-                ser = PlanSubscriptionSerializer(page, many=True, context={"request": request})
-                return self.get_paginated_response(ser.data)
-
-            ser = PlanSubscriptionSerializer(qs, many=True, context={"request": request})
-            return response.Response(ser.data, status=status.HTTP_200_OK)
+                qs = qs.filter(status=status_q.lower())
+            return self.values_list_response(qs)
 
         # POST: crear suscripción para ESTE customer (no enviar 'customer' en body)
         ser = PlanSubscriptionSerializer(data=request.data, context={"request": request})
@@ -315,9 +341,9 @@ class PlanSubscriptionViewSet(viewsets.ModelViewSet):
             save_kwargs.update(created_by=actor, updated_by=actor)
 
         status_in = ser.validated_data.get("status")
-        with transaction.atomic():
-            if status_in and status_in.lower() == "active":
-                PlanSubscription.objects.filter(customer=customer, status__iexact="active").update(status="inactive")
+        with conflict_on_integrity_error(ACTIVE_SUBSCRIPTION_CONFLICT), transaction.atomic():
+            if status_in == PlanSubscription.Status.ACTIVE:
+                demote_active_subscription(customer.pk)
             obj = ser.save(**save_kwargs)
 
         out = PlanSubscriptionSerializer(obj, context={"request": request})
@@ -335,7 +361,9 @@ class PlanSubscriptionViewSet(viewsets.ModelViewSet):
         GET  /api/plan-subscription/by-plan/<plan_id>/?status=active
         POST /api/plan-subscription/by-plan/<plan_id>/   (en body enviar customer, fechas, etc. SIN 'plan')
         """
-        plan = get_object_or_404(Plan.objects, pk=plan_id)
+        plan = get_object_or_404(
+            Plan.objects.cached().annotate(has_inactive_tasks=inactive_tasks_exist()), pk=plan_id
+        )
 
         if request.method.lower() == "get":
             status_q = request.query_params.get("status")
@@ -346,22 +374,11 @@ class PlanSubscriptionViewSet(viewsets.ModelViewSet):
                 .order_by("-start_date", "id")
             )
             if status_q:
-                qs = qs.filter(status__iexact=status_q)
-
-            qs = qs.prefetch_related(
-                Prefetch("plan__tasks", queryset=PlanTask.active_objects.order_by("name", "id"))
-            )
-
-            page = self.paginate_queryset(qs)
-            if page is not None:
-                ser = PlanSubscriptionSerializer(page, many=True, context={"request": request})
-                return self.get_paginated_response(ser.data)
-
-            ser = PlanSubscriptionSerializer(qs, many=True, context={"request": request})
-            return response.Response(ser.data, status=status.HTTP_200_OK)
+                qs = qs.filter(status=status_q.lower())
+            return self.values_list_response(qs)
 
         # POST: crear suscripción para ESTE plan -> bloquear si plan inactivo o con tasks inactivas
-        if not plan.active or PlanTask.objects.filter(plan=plan, active=False).exists():
+        if not plan.active or plan.has_inactive_tasks:
             raise ValidationError({"plan": "No se pueden crear suscripciones: plan inactivo o con tareas inactivas."})
 
         ser = PlanSubscriptionSerializer(data=request.data, context={"request": request})
@@ -374,9 +391,9 @@ class PlanSubscriptionViewSet(viewsets.ModelViewSet):
 
         customer = ser.validated_data.get("customer")
         status_in = ser.validated_data.get("status")
-        with transaction.atomic():
-            if status_in and status_in.lower() == "active" and customer:
-                PlanSubscription.objects.filter(customer=customer, status__iexact="active").update(status="inactive")
+        with conflict_on_integrity_error(ACTIVE_SUBSCRIPTION_CONFLICT), transaction.atomic():
+            if status_in == PlanSubscription.Status.ACTIVE and customer:
+                demote_active_subscription(customer.pk)
             obj = ser.save(**save_kwargs)
 
         out = PlanSubscriptionSerializer(obj, context={"request": request})
@@ -390,6 +407,6 @@ class PlanSubscriptionViewSet(viewsets.ModelViewSet):
     def cancel(self, request, pk=None):
         """Marcar suscripción como cancelada."""
         obj = self.get_object()
-        obj.status = "cancelled"
-        obj.save(update_fields=["status"])
+        obj.status = PlanSubscription.Status.CANCELLED
+        obj.save(update_fields=["status", "updated_at"])
         return response.Response({"detail": "Subscription cancelled"}, status=status.HTTP_200_OK)
@@ -1,9 +1,13 @@
 # users/models.py
 from django.contrib.auth.models import AbstractUser, UserManager
 from django.db import models
-from core.models import BaseModel, TimeStampedModel  # te da active, created_at, updated_at
+from core.models import BaseModel, CacheableManager, TimeStampedModel  # te da active, created_at, updated_at
+from core.querycache import CacheableQuerySet
 
-class ActiveUserManager(models.Manager):
+class CacheableUserManager(UserManager.from_queryset(CacheableQuerySet)):
+    pass
+
+class ActiveUserManager(CacheableManager):
     def get_queryset(self):
         return super().get_queryset().filter(active=True)  # usa 'active' del BaseModel
 
@@ -19,7 +23,7 @@ class User(AbstractUser, BaseModel, TimeStampedModel):
     )
 
     # ¡Importante!: mantener el manager de auth con get_by_natural_key
-    objects = UserManager()
+    objects = CacheableUserManager()
     active_objects = ActiveUserManager()
 
     def __str__(self):
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Visit, Assessment, Evidence, TaskCompleted, MaterialUsed
+from .models import Visit, Assessment, Evidence, TaskCompleted, MaterialUsed, MutationReceipt, VisitEvent
 
 @admin.register(Visit)
 class VisitAdmin(admin.ModelAdmin):
@@ -28,3 +28,14 @@ class TaskCompletedAdmin(admin.ModelAdmin):
 class MaterialUsedAdmin(admin.ModelAdmin):
     list_display = ("visit","description","unit","unit_cost")
     list_filter = ("visit",)
+
+@admin.register(MutationReceipt)
+class MutationReceiptAdmin(admin.ModelAdmin):
+    list_display = ("key","op","user","status_code","created_at")
+    list_filter = ("op","status_code")
+    search_fields = ("key",)
+
+@admin.register(VisitEvent)
+class VisitEventAdmin(admin.ModelAdmin):
+    list_display = ("id","visit","status","technician","customer","created_at")
+    list_filter = ("status",)
@@ -0,0 +1,229 @@
+# visits/agenda.py
+import hashlib
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.db.models import Count, Max
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare, salted_hmac
+from rest_framework.exceptions import ValidationError
+
+from .models import Visit
+from .scheduling import effective_end
+
+# Ventana por defecto y máxima (en días) para agenda / feed .ics
+AGENDA_DEFAULT_DAYS = 7
+AGENDA_MAX_DAYS = 92
+
+# Campos "ligeros" que devuelve la agenda (sin hijos anidados)
+AGENDA_FIELDS = (
+    "id",
+    "start",
+    "end",
+    "status",
+    "site_address",
+    "subscription_id",
+    "subscription__customer_id",
+    "subscription__customer__name",
+    "subscription__plan__name",
+)
+
+
+def _parse_date(value, field):
+    try:
+        return date.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise ValidationError({field: "Formato de fecha inválido (use AAAA-MM-DD)."})
+
+
+def agenda_window(query_params):
+    """
+    Devuelve (desde, hasta) como datetimes aware a partir de ?from=&to= (fechas ISO).
+    - Por defecto: hoy .. hoy + AGENDA_DEFAULT_DAYS
+    - 'to' es inclusivo (se toma hasta el final de ese día)
+    """
+    from_str = query_params.get("from")
+    to_str = query_params.get("to")
+
+    from_date = _parse_date(from_str, "from") if from_str else timezone.localdate()
+    to_date = _parse_date(to_str, "to") if to_str else from_date + timedelta(days=AGENDA_DEFAULT_DAYS)
+
+    if to_date < from_date:
+        raise ValidationError({"to": "La fecha final no puede ser anterior a la inicial."})
+    if (to_date - from_date).days > AGENDA_MAX_DAYS:
+        raise ValidationError({"to": f"La ventana no puede superar {AGENDA_MAX_DAYS} días."})
+
+    tz = timezone.get_current_timezone()
+    start = timezone.make_aware(datetime.combine(from_date, time.min), tz)
+    end = timezone.make_aware(datetime.combine(to_date + timedelta(days=1), time.min), tz)
+    return start, end
+
+
+def agenda_queryset(user_id, start, end):
+    """
+    Visitas activas del técnico en [start, end). Usa el índice (user, start, end).
+    """
+    return (
+        Visit.active_objects
+        .filter(user_id=user_id, start__gte=start, start__lt=end)
+        .order_by("start", "id")
+    )
+
+
+def agenda_rows(qs):
+    """Filas planas (dict) para la respuesta JSON de la agenda."""
+    for row in qs.values(*AGENDA_FIELDS):
+        yield {
+            "id": row["id"],
+            "start": row["start"],
+            "end": row["end"],
+            "status": row["status"],
+            "site_address": row["site_address"],
+            "subscription": row["subscription_id"],
+            "customer": {
+                "id": row["subscription__customer_id"],
+                "name": row["subscription__customer__name"],
+            },
+            "plan": row["subscription__plan__name"],
+        }
+
+
+def agenda_etag(qs):
+    """
+    ETag barato para la ventana: una sola agregación (count + max(id) + max(updated_at)
+    de las visitas y de lo que el feed muestra de ellas: suscripción, cliente y plan).
+    Cualquier alta, baja lógica o cambio que toque updated_at lo invalida.
+    """
+    agg = qs.order_by().aggregate(
+        n=Count("id"),
+        top=Max("id"),
+        visit_last=Max("updated_at"),
+        subscription_last=Max("subscription__updated_at"),
+        customer_last=Max("subscription__customer__updated_at"),
+        plan_last=Max("subscription__plan__updated_at"),
+    )
+    stamps = (
+        agg[k].isoformat() if agg[k] else ""
+        for k in ("visit_last", "subscription_last", "customer_last", "plan_last")
+    )
+    raw = f"{agg['n']}:{agg['top'] or 0}:" + ":".join(stamps)
+    return '"%s"' % hashlib.md5(raw.encode()).hexdigest()
+
+
+# ----------------- Token del feed (suscripción de calendario) -----------------
+# Las apps de calendario no mandan Authorization: el feed se autentica con un token
+# firmado en la URL que solo sirve para el .ics de ese técnico. Se invalida al
+# cambiar la contraseña del usuario (la firma incluye un hash de ella).
+
+FEED_TOKEN_SALT = "visits.agenda.ics"
+
+
+def _password_fingerprint(user):
+    return salted_hmac(FEED_TOKEN_SALT, user.password).hexdigest()[:16]
+
+
+def feed_token(user):
+    return signing.dumps({"u": user.pk, "p": _password_fingerprint(user)}, salt=FEED_TOKEN_SALT, compress=True)
+
+
+def feed_token_user(token):
+    """El usuario (activo) del token, o None si no es válido o fue revocado."""
+    try:
+        data = signing.loads(token, salt=FEED_TOKEN_SALT)
+    except signing.BadSignature:
+        return None
+    if not isinstance(data, dict):
+        return None
+    user = get_user_model().objects.filter(pk=data.get("u"), is_active=True).first()
+    if user is None or not constant_time_compare(str(data.get("p", "")), _password_fingerprint(user)):
+        return None
+    return user
+
+
+# ----------------- iCalendar (RFC 5545) -----------------
+
+ICS_STATUS = {
+    Visit.Status.SCHEDULED: "CONFIRMED",
+    Visit.Status.IN_PROGRESS: "CONFIRMED",
+    Visit.Status.COMPLETED: "CONFIRMED",
+    Visit.Status.CANCELED: "CANCELLED",
+}
+
+ICS_FIELDS = (
+    "id",
+    "start",
+    "end",
+    "status",
+    "site_address",
+    "notes",
+    "updated_at",
+    "subscription__customer__name",
+    "subscription__plan__name",
+)
+
+
+def _ics_dt(value):
+    return value.astimezone(dt_timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+
+def _ics_text(value):
+    return (
+        (value or "")
+        .replace("\\", "\\\\")
+        .replace(";", "\\;")
+        .replace(",", "\\,")
+        .replace("\r\n", "\\n")
+        .replace("\n", "\\n")
+    )
+
+
+def _ics_line(line):
+    """Pliega líneas a 75 octetos como pide el RFC (continuación con un espacio)."""
+    raw = line.encode("utf-8")
+    if len(raw) <= 75:
+        return line + "\r\n"
+    parts, chunk = [], b""
+    for ch in line:
+        b = ch.encode("utf-8")
+        if len(chunk) + len(b) > (75 if not parts else 74):
+            parts.append(chunk.decode("utf-8"))
+            chunk = b""
+        chunk += b
+    parts.append(chunk.decode("utf-8"))
+    return "\r\n ".join(parts) + "\r\n"
+
+
+def ics_stream(qs, calendar_name="Agenda", chunk_size=500):
+    """
+    Generador del feed .ics. Itera con .iterator() para no cargar
+    todo el historial en memoria.
+    """
+    yield _ics_line("BEGIN:VCALENDAR")
+    yield _ics_line("VERSION:2.0")
+    yield _ics_line("PRODID:-//Computadores Hidalgo//Visitas//ES")
+    yield _ics_line("CALSCALE:GREGORIAN")
+    yield _ics_line(f"X-WR-CALNAME:{_ics_text(calendar_name)}")
+
+    for row in qs.values(*ICS_FIELDS).iterator(chunk_size=chunk_size):
+        start = row["start"]
+        end = effective_end(start, row["end"])
+        customer = row["subscription__customer__name"] or ""
+        plan = row["subscription__plan__name"] or ""
+        summary = f"Visita #{row['id']}" + (f" — {customer}" if customer else "")
+
+        yield _ics_line("BEGIN:VEVENT")
+        yield _ics_line(f"UID:visit-{row['id']}@hidalgo")
+        yield _ics_line(f"DTSTAMP:{_ics_dt(row['updated_at'])}")
+        yield _ics_line(f"DTSTART:{_ics_dt(start)}")
+        yield _ics_line(f"DTEND:{_ics_dt(end)}")
+        yield _ics_line(f"SUMMARY:{_ics_text(summary)}")
+        if row["site_address"]:
+            yield _ics_line(f"LOCATION:{_ics_text(row['site_address'])}")
+        description = "\n".join(x for x in (plan, row["notes"]) if x)
+        if description:
+            yield _ics_line(f"DESCRIPTION:{_ics_text(description)}")
+        yield _ics_line(f"STATUS:{ICS_STATUS.get(row['status'], 'CONFIRMED')}")
+        yield _ics_line("END:VEVENT")
+
+    yield _ics_line("END:VCALENDAR")
@@ -0,0 +1,105 @@
+# visits/checklist.py
+from collections import defaultdict
+
+from plans.models import PlanSubscription, PlanTask
+from core.bulk import bulk_create_with_pks
+from .models import Visit, TaskCompleted
+
+
+def build_checklists(visits, actor=None):
+    """
+    Genera el checklist (TaskCompleted) de cada visita a partir de los PlanTask
+    activos del plan de su suscripción.
+
+    - Una consulta para las tareas de todos los planes involucrados
+      (+1 solo si las suscripciones no vienen cargadas)
+    - Un único bulk_create para todas las visitas
+    Devuelve la lista de TaskCompleted creados.
+    """
+    visits = [v for v in visits if v.pk and v.subscription_id]
+    if not visits:
+        return []
+
+    plan_by_sub = {}
+    missing = set()
+    for v in visits:
+        if Visit.subscription.is_cached(v):
+            plan_by_sub[v.subscription_id] = v.subscription.plan_id
+        else:
+            missing.add(v.subscription_id)
+    if missing:
+        plan_by_sub.update(
+            PlanSubscription.objects.filter(pk__in=missing).values_list("id", "plan_id")
+        )
+
+    tasks_by_plan = defaultdict(list)
+    for task in (
+        PlanTask.active_objects
+        .filter(plan_id__in=set(plan_by_sub.values()))
+        .order_by("name", "id")
+        .values("id", "plan_id", "name", "description")
+    ):
+        tasks_by_plan[task["plan_id"]].append(task)
+
+    audit = {"created_by": actor, "updated_by": actor} if actor else {}
+    rows = [
+        TaskCompleted(
+            visit=v,
+            plan_task_id=task["id"],
+            name=task["name"],
+            description=task["description"],
+            **audit,
+        )
+        for v in visits
+        for task in tasks_by_plan.get(plan_by_sub.get(v.subscription_id), ())
+    ]
+    return bulk_create_with_pks(TaskCompleted, rows)
+
+
+def materialize_checklists(visits_qs):
+    """
+    Variante masiva para el generador de recurrencias y el backfill:
+    un solo INSERT ... SELECT en el servidor que crea el checklist de todas las
+    visitas de `visits_qs` que aún no tienen tareas (sin traer filas a Python).
+    Devuelve la cantidad de TaskCompleted insertados.
+    """
+    from django.db import connections, router
+    from django.db.models import Exists, OuterRef
+    from django.utils import timezone
+
+    using = router.db_for_write(TaskCompleted)
+    connection = connections[using]
+    qn = connection.ops.quote_name
+
+    ids_qs = (
+        visits_qs
+        .filter(~Exists(TaskCompleted.objects.filter(visit=OuterRef("pk"))))
+        .order_by()
+        .values("id")
+    )
+    ids_sql, ids_params = ids_qs.query.get_compiler(using=using).as_sql()
+
+    tc = TaskCompleted._meta
+    pt = PlanTask._meta
+    sub = PlanSubscription._meta
+    visit = Visit._meta
+    col = lambda meta, name: qn(meta.get_field(name).column)
+
+    now = connection.ops.adapt_datetimefield_value(timezone.now())
+    sql = (
+        f"INSERT INTO {qn(tc.db_table)} "
+        f"({col(tc, 'visit')}, {col(tc, 'plan_task')}, {col(tc, 'name')}, {col(tc, 'description')}, "
+        f"{col(tc, 'hours')}, {col(tc, 'completada')}, {col(tc, 'active')}, "
+        f"{col(tc, 'created_at')}, {col(tc, 'updated_at')}) "
+        f"SELECT v.{col(visit, 'id')}, t.{col(pt, 'id')}, t.{col(pt, 'name')}, t.{col(pt, 'description')}, "
+        f"0, %s, %s, %s, %s "
+        f"FROM {qn(visit.db_table)} v "
+        f"INNER JOIN {qn(sub.db_table)} s ON s.{col(sub, 'id')} = v.{col(visit, 'subscription')} "
+        f"INNER JOIN {qn(pt.db_table)} t ON t.{col(pt, 'plan')} = s.{col(sub, 'plan')} AND t.{col(pt, 'active')} = %s "
+        f"WHERE v.{col(visit, 'id')} IN ({ids_sql}) "
+        f"ORDER BY v.{col(visit, 'id')}, t.{col(pt, 'name')}, t.{col(pt, 'id')}"
+    )
+    params = [False, True, now, now, True, *ids_params]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.rowcount
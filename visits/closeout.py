@@ -0,0 +1,208 @@
+# visits/closeout.py
+"""
+Cierre de visita en una sola petición (POST /api/visit/<id>/close-out/):
+
+    {
+      "tasks":      [{"id": 88, "completada": true, "hours": 2}, ...],   # checklist existente
+      "materials":  [{"description": "Cable", "unit": "m", "unit_cost": "3.50"},   # sin id: alta
+                     {"id": 7, "unit_cost": "4.00"}],                              # con id: edición
+      "assessment": {"rating": 5, "comment": "..."},
+      "evidences":  [{"id": 31, "description": "Antes"}],               # solo metadatos
+      "notes": "Trabajo terminado"
+    }
+
+Todo ocurre en una transacción que empieza bloqueando la visita (SELECT ... FOR UPDATE),
+así nadie cambia su estado ni sus hijos entre la validación y la escritura:
+1) Se valida TODO en una pasada (un 400 con los errores de cada sección).
+2) UPDATE condicional a 'completed' (evita dos cierres simultáneos), bulk_update /
+   bulk_create de hijos y upsert de la evaluación.
+3) El correo se encola con on_commit, así que siempre sale con los datos completos.
+"""
+from django.db import transaction
+from rest_framework.exceptions import NotFound, ValidationError
+
+from core.bulk import BULK_MAX_ITEMS, _is_id, _item_errors
+from core.exceptions import Conflict
+from .models import Visit, Assessment, Evidence, TaskCompleted, MaterialUsed
+from .serializers import (
+    AssessmentSerializer,
+    EvidenceSerializer,
+    TaskCompletedSerializer,
+    MaterialUsedSerializer,
+)
+from .transitions import TRANSITIONS, apply_transition
+from .utils import send_visit_completed_email_async
+
+CLOSE_OUT_SECTIONS = ("tasks", "materials", "assessment", "evidences", "notes")
+
+
+def _section_list(payload, name, errors):
+    items = payload.get(name, [])
+    if not isinstance(items, list):
+        errors[name] = "Debe ser un arreglo."
+        return []
+    if len(items) > BULK_MAX_ITEMS:
+        errors[name] = f"Máximo {BULK_MAX_ITEMS} ítems."
+        return []
+    bad = [i for i, item in enumerate(items) if not isinstance(item, dict)]
+    if bad:
+        errors[name] = [{"index": i, "errors": {"detail": "Debe ser un objeto."}} for i in bad]
+        return []
+    return items
+
+
+class CloseOut:
+    """Valida y aplica el cierre de una visita. Uso: CloseOut(...).apply()."""
+
+    def __init__(self, visit_id, payload, request, actor=None):
+        if not isinstance(payload, dict):
+            raise ValidationError({"detail": "Se esperaba un objeto JSON."})
+        unknown = sorted(set(payload) - set(CLOSE_OUT_SECTIONS))
+        if unknown:
+            raise ValidationError({"detail": f"Secciones desconocidas: {', '.join(unknown)}."})
+        self.visit_id = int(visit_id)
+        self.payload = payload
+        self.context = {"request": request}
+        self.actor = actor
+        self.serializers = {}
+
+    # ---------- validación ----------
+    def _children(self, name, model, serializer_cls, errors, allow_create=True):
+        """
+        Separa el arreglo en ediciones (con id) y altas (sin id), ambas como
+        ListSerializer masivos. Las ediciones solo pueden tocar hijos de ESTA visita.
+        """
+        items = _section_list(self.payload, name, errors)
+        if not items:
+            return
+        updates = [{k: v for k, v in item.items() if k != "visit"} for item in items if "id" in item]
+        creates = [{**item, "visit": self.visit_id} for item in items if "id" not in item]
+
+        section_errors = []
+        if creates and not allow_create:
+            section_errors.append({"detail": "Solo se permiten ediciones (con id)."})
+
+        if updates:
+            ids = [u["id"] for u in updates]
+            invalid = [pk for pk in ids if not _is_id(pk)]
+            instances = model.active_objects.filter(visit_id=self.visit_id).in_bulk(
+                [pk for pk in ids if _is_id(pk)]
+            )
+            missing = [pk for pk in ids if _is_id(pk) and pk not in instances]
+            if invalid:
+                section_errors.append({"id": f"Deben ser ids numéricos: {invalid}"})
+            elif missing:
+                section_errors.append({"id": f"No pertenecen a la visita o no existen: {missing}"})
+            else:
+                ser = serializer_cls([instances[pk] for pk in ids], data=updates, many=True, partial=True,
+                                     context=self.context)
+                ser._instances_by_pk = instances
+                if ser.is_valid():
+                    self.serializers[f"{name}_update"] = ser
+                else:
+                    section_errors.append({"update": _item_errors(ser.errors)})
+
+        if creates and allow_create:
+            ser = serializer_cls(data=creates, many=True, context=self.context)
+            if ser.is_valid():
+                self.serializers[f"{name}_create"] = ser
+            else:
+                section_errors.append({"create": _item_errors(ser.errors)})
+
+        if section_errors:
+            errors[name] = section_errors
+
+    def validate(self):
+        """Debe correr dentro de la transacción de apply(): bloquea la visita."""
+        errors = {}
+        current_status = (
+            Visit.active_objects.select_for_update()
+            .filter(pk=self.visit_id)
+            .values_list("status", flat=True)
+            .first()
+        )
+        if current_status is None:
+            raise NotFound("Visita no encontrada.")
+        complete = TRANSITIONS["complete"]
+        if current_status not in complete.sources:
+            raise Conflict({"detail": complete.error, "status": current_status})
+
+        self._children("tasks", TaskCompleted, TaskCompletedSerializer, errors)
+        self._children("materials", MaterialUsed, MaterialUsedSerializer, errors)
+        self._children("evidences", Evidence, EvidenceSerializer, errors, allow_create=False)
+
+        assessment = self.payload.get("assessment")
+        if assessment is not None:
+            if not isinstance(assessment, dict):
+                errors["assessment"] = "Debe ser un objeto."
+            else:
+                # OneToOne: si ya existe (aunque esté inactiva) se edita esa
+                current = Assessment.objects.filter(visit_id=self.visit_id).first()
+                ser = AssessmentSerializer(
+                    current, data={**assessment, "visit": self.visit_id},
+                    partial=current is not None, context=self.context,
+                )
+                if ser.is_valid():
+                    self.serializers["assessment"] = ser
+                else:
+                    errors["assessment"] = ser.errors
+
+        notes = self.payload.get("notes")
+        if notes is not None and not isinstance(notes, str):
+            errors["notes"] = "Debe ser texto."
+
+        if errors:
+            raise ValidationError(errors)
+        return self
+
+    # ---------- escritura ----------
+    def apply(self):
+        with transaction.atomic():
+            self.validate()
+            out = self._save()
+        return self._represent(out)
+
+    def _save(self):
+        create_kwargs = {"created_by": self.actor, "updated_by": self.actor} if self.actor else {}
+        update_kwargs = {"updated_by": self.actor} if self.actor else {}
+        extra = {}
+        if self.payload.get("notes") is not None:
+            extra["notes"] = self.payload["notes"]
+
+        out = {}
+        # Primero el estado: el UPDATE condicional sigue siendo el que manda
+        out["visit"] = apply_transition(self.visit_id, "complete", actor=self.actor, extra=extra)
+
+        for name in ("tasks", "materials", "evidences"):
+            rows = []
+            ser = self.serializers.get(f"{name}_update")
+            if ser is not None:
+                rows.extend(ser.save(**update_kwargs))
+            ser = self.serializers.get(f"{name}_create")
+            if ser is not None:
+                rows.extend(ser.save(**create_kwargs))
+            if rows:
+                out[name] = rows
+
+        ser = self.serializers.get("assessment")
+        if ser is not None:
+            if ser.instance is None:
+                out["assessment"] = ser.save(**create_kwargs)
+            else:
+                out["assessment"] = ser.save(active=True, **update_kwargs)
+
+        visit_id = self.visit_id
+        transaction.on_commit(lambda: send_visit_completed_email_async(visit_id))
+        return out
+
+    def _represent(self, out):
+        data = {"visit": out["visit"]}
+        for name, serializer_cls in (
+            ("tasks", TaskCompletedSerializer),
+            ("materials", MaterialUsedSerializer),
+            ("evidences", EvidenceSerializer),
+        ):
+            data[name] = serializer_cls(out.get(name, []), many=True, context=self.context).data
+        assessment = out.get("assessment")
+        data["assessment"] = AssessmentSerializer(assessment, context=self.context).data if assessment else None
+        return data
@@ -0,0 +1,207 @@
+# visits/events.py
+"""
+Feed en vivo de cambios de estado de visitas (SSE, GET /api/visit-events/).
+
+- record_status_change() guarda un VisitEvent dentro de la transacción del cambio
+  y, tras el commit, lo publica en el hub en memoria del proceso.
+- Cada pantalla abierta es un suscriptor del hub (una asyncio.Queue).
+- Con varios workers, un único poller por proceso lee de la tabla los eventos
+  nuevos (una consulta por rango de pk cada VISIT_EVENTS_POLL segundos, sin
+  importar cuántas pantallas haya) y los reparte igual; los ya publicados
+  localmente se descartan por id.
+- Un cliente que se reconecta con Last-Event-ID recibe primero lo que se perdió.
+- EventSource no manda cabeceras: se autentica con un token de stream firmado,
+  de vida corta y que solo sirve para este feed (stream_token()), nunca con el JWT
+  en la URL (quedaría en los logs de acceso de los proxies).
+"""
+import asyncio
+import json
+import os
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.db import close_old_connections, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import VisitEvent
+
+# Segundos entre lecturas de la tabla (eventos de otros workers); 0 = solo el hub local
+VISIT_EVENTS_POLL = float(os.getenv("VISIT_EVENTS_POLL", "2"))
+# Comentario keep-alive para proxies que cortan conexiones ociosas
+VISIT_EVENTS_HEARTBEAT = 15
+# Eventos por suscriptor sin leer antes de cortarlo (el cliente reanuda con Last-Event-ID)
+VISIT_EVENTS_QUEUE_SIZE = 500
+# Máximo de eventos reenviados al reanudar
+VISIT_EVENTS_BACKLOG = 500
+# Un INSERT puede confirmarse después de otro con id mayor: el poller relee esta ventana
+VISIT_EVENTS_SETTLE = timedelta(seconds=5)
+
+# Vida del token de stream: alcanza para abrir la conexión; al expirar, el cliente
+# pide otro y reabre con ?last_event_id= (EventSource reintenta con la misma URL)
+VISIT_EVENTS_TOKEN_TTL = int(os.getenv("VISIT_EVENTS_TOKEN_TTL", "60"))
+STREAM_TOKEN_SALT = "visits.events.stream"
+
+_SEEN_MAX = 5000
+_OVERFLOW = object()
+
+
+def event_payload(event):
+    """Forma compacta que viaja al navegador."""
+    return {
+        "id": event.pk,
+        "visit": event.visit_id,
+        "status": event.status,
+        "technician": event.technician_id,
+        "customer": event.customer_id,
+        "at": event.created_at.isoformat(),
+    }
+
+
+def record_status_change(visit_id, status, technician_id=None, customer_id=None):
+    """Registra el cambio (en la transacción en curso) y lo publica después del commit."""
+    event = VisitEvent.objects.create(
+        visit_id=visit_id, status=status, technician_id=technician_id, customer_id=customer_id,
+    )
+    payload = event_payload(event)
+    transaction.on_commit(lambda: hub.publish(payload))
+    return event
+
+
+def stream_token(user):
+    return signing.dumps({"u": user.pk}, salt=STREAM_TOKEN_SALT)
+
+
+def stream_token_user(token):
+    """El usuario (activo) del token de stream, o None si no es válido o ya expiró."""
+    try:
+        data = signing.loads(token, salt=STREAM_TOKEN_SALT, max_age=VISIT_EVENTS_TOKEN_TTL)
+    except signing.BadSignature:  # incluye SignatureExpired
+        return None
+    if not isinstance(data, dict):
+        return None
+    return get_user_model().objects.filter(pk=data.get("u"), is_active=True).first()
+
+
+def matches(payload, filters):
+    return all(payload.get(field) == value for field, value in filters.items())
+
+
+def events_after(last_id, filters, limit=VISIT_EVENTS_BACKLOG):
+    qs = VisitEvent.objects.filter(pk__gt=last_id, **{f"{k}_id": v for k, v in filters.items()})
+    return [event_payload(e) for e in qs.order_by("id")[:limit]]
+
+
+class EventHub:
+    """
+    Difusión en memoria: publish() se llama desde cualquier hilo (on_commit de una
+    vista síncrona) y entrega en el event loop de cada suscriptor.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}           # queue -> loop
+        self._seen = OrderedDict()       # ids ya repartidos (evita duplicar lo que trae el poller)
+        self._poller = None
+        self._cursor = None
+
+    def subscribe(self):
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(maxsize=VISIT_EVENTS_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers[queue] = loop
+            if VISIT_EVENTS_POLL > 0 and (self._poller is None or self._poller.done()):
+                self._poller = loop.create_task(self._poll())
+        return queue
+
+    def unsubscribe(self, queue):
+        with self._lock:
+            self._subscribers.pop(queue, None)
+
+    def publish(self, payload):
+        with self._lock:
+            if payload["id"] in self._seen:
+                return
+            self._seen[payload["id"]] = True
+            while len(self._seen) > _SEEN_MAX:
+                self._seen.popitem(last=False)
+            targets = list(self._subscribers.items())
+        for queue, loop in targets:
+            try:
+                loop.call_soon_threadsafe(_offer, queue, payload)
+            except RuntimeError:
+                self.unsubscribe(queue)  # loop cerrado
+
+    # ---------- respaldo entre workers ----------
+    def _read_table(self):
+        close_old_connections()
+        try:
+            if self._cursor is None:
+                self._cursor = VisitEvent.objects.aggregate(top=Max("id"))["top"] or 0
+                return []
+            rows = list(VisitEvent.objects.filter(pk__gt=self._cursor).order_by("id")[:VISIT_EVENTS_BACKLOG])
+            settled = timezone.now() - VISIT_EVENTS_SETTLE
+            for e in rows:
+                if e.created_at > settled:
+                    break
+                self._cursor = e.pk
+            return [event_payload(e) for e in rows]
+        finally:
+            close_old_connections()
+
+    async def _poll(self):
+        read = sync_to_async(self._read_table, thread_sensitive=False)
+        while True:
+            with self._lock:
+                if not self._subscribers:
+                    self._poller = self._cursor = None
+                    return
+            for payload in await read():
+                self.publish(payload)
+            await asyncio.sleep(VISIT_EVENTS_POLL)
+
+
+def _offer(queue, payload):
+    if queue.full():
+        # suscriptor que no lee: se le corta y reanuda desde la tabla
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(_OVERFLOW)
+        return
+    queue.put_nowait(payload)
+
+
+hub = EventHub()
+
+
+def _sse(payload):
+    return f"id: {payload['id']}\nevent: visit.status\ndata: {json.dumps(payload, separators=(',', ':'))}\n\n"
+
+
+async def event_stream(filters, last_id=None):
+    """Iterador async de texto SSE para StreamingHttpResponse."""
+    queue = hub.subscribe()  # antes del backlog: no se pierde nada entre medio
+    try:
+        yield "retry: 3000\n\n"
+        sent = set()
+        if last_id is not None:
+            for payload in await sync_to_async(events_after)(last_id, filters):
+                sent.add(payload["id"])
+                yield _sse(payload)
+        while True:
+            try:
+                payload = await asyncio.wait_for(queue.get(), timeout=VISIT_EVENTS_HEARTBEAT)
+            except asyncio.TimeoutError:
+                yield ": ping\n\n"
+                continue
+            if payload is _OVERFLOW:
+                return
+            if payload["id"] in sent or not matches(payload, filters):
+                continue
+            yield _sse(payload)
+    finally:
+        hub.unsubscribe(queue)
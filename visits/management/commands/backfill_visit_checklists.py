@@ -0,0 +1,44 @@
+# visits/management/commands/backfill_visit_checklists.py
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+
+from visits.checklist import materialize_checklists
+from visits.models import Visit, TaskCompleted
+
+
+class Command(BaseCommand):
+    help = "Genera el checklist (TaskCompleted desde PlanTask) de las visitas que no tienen ninguno."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument("--include-inactive", action="store_true", help="Incluir visitas con soft-delete.")
+        parser.add_argument("--dry-run", action="store_true", help="Solo contar, sin escribir.")
+
+    def handle(self, *args, **opts):
+        qs = (
+            Visit.objects
+            .annotate(has_tasks=Exists(TaskCompleted.objects.filter(visit=OuterRef("pk"))))
+            .filter(has_tasks=False)
+            .exclude(status=Visit.Status.CANCELED)
+            .order_by("id")
+        )
+        if not opts["include_inactive"]:
+            qs = qs.filter(active=True)
+
+        visits_done = tasks_done = 0
+        last_id = 0
+        while True:
+            batch = list(qs.filter(id__gt=last_id).values_list("id", flat=True)[: opts["batch_size"]])
+            if not batch:
+                break
+            last_id = batch[-1]
+            visits_done += len(batch)
+            if opts["dry_run"]:
+                continue
+            with transaction.atomic():
+                tasks_done += materialize_checklists(Visit.objects.filter(id__in=batch))
+            self.stdout.write(f"  ... hasta visita #{last_id}: {tasks_done} tareas")
+
+        verb = "sin checklist" if opts["dry_run"] else "procesadas"
+        self.stdout.write(self.style.SUCCESS(f"Visitas {verb}: {visits_done}. Tareas creadas: {tasks_done}."))
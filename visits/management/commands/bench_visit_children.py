@@ -0,0 +1,86 @@
+# visits/management/commands/bench_visit_children.py
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from visits.models import Visit, TaskCompleted
+from visits.serializers import TaskCompletedSerializer, MaterialUsedSerializer
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara el alta uno-a-uno contra el alta masiva (many=True + bulk_create) "
+        "de tareas y materiales sobre una visita existente. Todo se revierte al final."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--visit", type=int, help="Id de la visita (por defecto la más reciente).")
+        parser.add_argument("--items", type=int, default=30, help="Ítems por recurso (default 30).")
+        parser.add_argument("--rounds", type=int, default=5, help="Repeticiones (default 5).")
+
+    def handle(self, *args, **opts):
+        visit = (
+            Visit.objects.filter(pk=opts["visit"]).first() if opts["visit"]
+            else Visit.objects.order_by("-id").first()
+        )
+        if visit is None:
+            raise CommandError("No hay visitas para medir.")
+        plan_task_id = (
+            TaskCompleted.objects.filter(visit=visit).values_list("plan_task_id", flat=True).first()
+            or visit.subscription.plan.tasks.values_list("id", flat=True).first()
+        )
+        if plan_task_id is None:
+            raise CommandError("El plan de la visita no tiene tareas.")
+
+        n = opts["items"]
+        tasks = [
+            {"visit": visit.pk, "plan_task": plan_task_id, "name": f"Tarea {i}", "hours": 1, "completada": True}
+            for i in range(n)
+        ]
+        materials = [
+            {"visit": visit.pk, "description": f"Material {i}", "unit": "u", "unit_cost": "12.50"}
+            for i in range(n)
+        ]
+        payloads = [(TaskCompletedSerializer, tasks), (MaterialUsedSerializer, materials)]
+
+        def one_by_one():
+            for ser_class, items in payloads:
+                for item in items:
+                    ser = ser_class(data=item)
+                    ser.is_valid(raise_exception=True)
+                    ser.save()
+
+        def bulk():
+            for ser_class, items in payloads:
+                ser = ser_class(data=items, many=True)
+                ser.is_valid(raise_exception=True)
+                ser.save()
+
+        self.stdout.write(f"Visita #{visit.pk}: {n} tareas + {n} materiales, {opts['rounds']} rondas")
+        for label, fn in (("uno-a-uno", one_by_one), ("masivo", bulk)):
+            elapsed, queries = self._measure(fn, opts["rounds"])
+            rate = (2 * n * opts["rounds"]) / elapsed if elapsed else float("inf")
+            self.stdout.write(
+                f"{label:>10}: {elapsed * 1000:9.1f} ms  {rate:9.0f} ítems/s  {queries:5d} consultas/ronda"
+            )
+
+    def _measure(self, fn, rounds):
+        elapsed, queries = 0.0, 0
+        for _ in range(rounds):
+            try:
+                with transaction.atomic():
+                    with CaptureQueriesContext(connection) as ctx:
+                        t0 = time.perf_counter()
+                        fn()
+                        elapsed += time.perf_counter() - t0
+                    queries = len(ctx.captured_queries)
+                    raise _Rollback
+            except _Rollback:
+                pass
+        return elapsed, queries
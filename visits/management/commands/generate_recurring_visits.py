@@ -0,0 +1,48 @@
+# visits/management/commands/generate_recurring_visits.py
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from visits.recurring import generate_visits
+
+
+class Command(BaseCommand):
+    help = (
+        "Genera las visitas futuras de las suscripciones con recurrencia "
+        "(idempotente: no duplica visitas ya generadas)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--from", dest="from_date", help="Fecha inicial AAAA-MM-DD (default: hoy).")
+        parser.add_argument("--days", type=int, default=90, help="Horizonte en días (default 90).")
+        parser.add_argument("--batch-size", type=int, default=1000, help="Suscripciones por lote.")
+        parser.add_argument("--dry-run", action="store_true", help="Solo contar, sin escribir.")
+
+    def handle(self, *args, **opts):
+        try:
+            from_date = date.fromisoformat(opts["from_date"]) if opts["from_date"] else timezone.localdate()
+        except ValueError:
+            raise CommandError("--from debe tener formato AAAA-MM-DD.")
+        if opts["days"] < 1:
+            raise CommandError("--days debe ser mayor que 0.")
+        to_date = from_date + timedelta(days=opts["days"] - 1)
+
+        t0 = time.perf_counter()
+        totals = generate_visits(
+            from_date,
+            to_date,
+            batch_size=opts["batch_size"],
+            dry_run=opts["dry_run"],
+            stdout=self.stdout if opts["verbosity"] > 1 else None,
+        )
+        elapsed = time.perf_counter() - t0
+
+        prefix = "[dry-run] " if opts["dry_run"] else ""
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}{from_date} .. {to_date}: {totals['subscriptions']} suscripciones, "
+            f"{totals['visits']} visitas nuevas, {totals['tasks']} tareas, "
+            f"{totals['skipped']} ya existentes, {totals['conflicts']} omitidas por choque de horario "
+            f"({elapsed:.2f}s)"
+        ))
@@ -0,0 +1,24 @@
+# visits/management/commands/prune_visit_events.py
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from visits.models import VisitEvent
+
+
+class Command(BaseCommand):
+    help = (
+        "Borra eventos del feed SSE de visitas más antiguos que --days "
+        "(solo sirven para reanudar conexiones). Ej: prune_visit_events --days 7"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=7)
+
+    def handle(self, *args, **opts):
+        if opts["days"] < 1:
+            raise CommandError("--days debe ser mayor o igual a 1.")
+        cutoff = timezone.now() - timedelta(days=opts["days"])
+        deleted, _ = VisitEvent.objects.filter(created_at__lt=cutoff).delete()
+        self.stdout.write(self.style.SUCCESS(f"Eventos borrados: {deleted}"))
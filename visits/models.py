@@ -1,5 +1,6 @@
 # visits/models.py
 from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 from core.models import BaseModel, TimeStampedModel
 
@@ -30,12 +31,25 @@ class Visit(BaseModel, TimeStampedModel):
     site_address = models.CharField(max_length=250, blank=True, default="")
     notes = models.TextField(blank=True, default="")
     cancel_reason = models.CharField(max_length=200, blank=True, default="")
+    # Fecha de la ocurrencia que la generó (visits/recurring.py); no cambia si la visita
+    # se reprograma, así el generador no vuelve a crear la ocurrencia original
+    occurrence_date = models.DateField(null=True, blank=True, editable=False)
 
     def __str__(self):
         return f"Visit #{self.pk} — {self.get_status_display()}"
 
     class Meta:
         ordering = ["-start", "id"]
+        indexes = [
+            # agenda / feed .ics y detección de choques por técnico y rango de fechas
+            models.Index(fields=["user", "start", "end"], name="visit_user_start_end_idx"),
+            # sync delta (/api/sync/): keyset por (updated_at, id)
+            models.Index(fields=["updated_at", "id"], name="visit_sync_idx"),
+        ]
+        constraints = [
+            # una visita generada por ocurrencia (varios NULL: visitas manuales)
+            models.UniqueConstraint(fields=["subscription", "occurrence_date"], name="visit_subscription_occurrence_uniq"),
+        ]
 
 
 # --------- Assessment (1:1 con Visit) Feedback ---------
@@ -51,6 +65,10 @@ class Assessment(BaseModel, TimeStampedModel):
 
     class Meta:
         ordering = ["-created_at", "id"]
+        indexes = [
+            # sync delta (/api/sync/): keyset por (updated_at, id)
+            models.Index(fields=["updated_at", "id"], name="assessment_sync_idx"),
+        ]
 
 
 # --------- Evidence ---------
@@ -72,6 +90,10 @@ class Evidence(BaseModel, TimeStampedModel):
 
     class Meta:
         ordering = ["-subido_en", "id"]
+        indexes = [
+            # sync delta (/api/sync/): keyset por (updated_at, id)
+            models.Index(fields=["updated_at", "id"], name="evidence_sync_idx"),
+        ]
 
 
 # --------- TaskCompleted ---------
@@ -92,6 +114,10 @@ class TaskCompleted(BaseModel, TimeStampedModel):
 
     class Meta:
         ordering = ["id"]
+        indexes = [
+            # sync delta (/api/sync/): keyset por (updated_at, id)
+            models.Index(fields=["updated_at", "id"], name="taskdone_sync_idx"),
+        ]
 
 
 # --------- MaterialUsed ---------
@@ -108,3 +134,69 @@ class MaterialUsed(BaseModel, TimeStampedModel):
 
     class Meta:
         ordering = ["id"]
+        indexes = [
+            # sync delta (/api/sync/): keyset por (updated_at, id)
+            models.Index(fields=["updated_at", "id"], name="material_sync_idx"),
+        ]
+
+
+# --------- MutationReceipt (idempotencia de la carga offline) ---------
+class MutationReceipt(models.Model):
+    """
+    Resultado de una operación ya aplicada por /api/visit/mutations/, por clave de
+    idempotencia generada en el cliente. Un reintento con la misma clave devuelve
+    este resultado en lugar de aplicar la operación de nuevo. La clave es única por
+    usuario: dos técnicos no pueden pisarse ni leer el resultado del otro.
+    """
+    key = models.CharField(max_length=64)
+    op = models.CharField(max_length=40)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+",
+    )
+    status_code = models.PositiveSmallIntegerField()
+    result = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.op} [{self.key}] -> {self.status_code}"
+
+    class Meta:
+        ordering = ["-created_at", "id"]
+        constraints = [
+            models.UniqueConstraint(fields=["user", "key"], name="mutationreceipt_user_key_uniq"),
+        ]
+
+
+# --------- VisitEvent (feed SSE de cambios de estado, ver visits/events.py) ---------
+class VisitEvent(models.Model):
+    """
+    Un cambio de estado de visita. Lo reparte en vivo el hub en memoria del proceso;
+    la tabla es el respaldo entre workers y para reanudar con Last-Event-ID.
+    """
+    visit = models.ForeignKey(Visit, on_delete=models.CASCADE, related_name="events")
+    status = models.CharField(max_length=12, choices=Visit.Status.choices)
+    technician = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+",
+    )
+    customer = models.ForeignKey(
+        "customers.Customer",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+",
+    )
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"Visit #{self.visit_id} -> {self.status}"
+
+    class Meta:
+        ordering = ["id"]
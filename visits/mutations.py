@@ -0,0 +1,325 @@
+# visits/mutations.py
+"""
+Carga por lotes de mutaciones offline (POST /api/visit/mutations/).
+
+El técnico acumula sin señal: iniciar visita, marcar tareas, materiales,
+evaluación, completar... y las sube en una sola petición:
+
+    {"operations": [
+        {"key": "<uuid>", "op": "visit.start", "visit": 12},
+        {"key": "<uuid>", "op": "task_completed.update", "id": 88, "data": {"completada": true}},
+        {"key": "<uuid>", "op": "material_used.create", "data": {"visit": 12, "description": "Cable"}},
+        {"key": "<uuid>", "op": "assessment.upsert", "visit": 12, "data": {"rating": 5}},
+        {"key": "<uuid>", "op": "visit.complete", "visit": 12}
+    ], "continue_on_error": false}
+
+- Todo va en UNA transacción; cada operación en su propio savepoint.
+- Cada operación aplicada deja un MutationReceipt con su clave: si el cliente
+  reintenta el lote (p.ej. se cortó la respuesta), esas operaciones no se
+  repiten y se devuelve el resultado guardado ("replayed": true).
+- Los recibos son por usuario: la misma clave de otro técnico es otra operación.
+- Por defecto se detiene en el primer error (las siguientes quedan "skipped")
+  porque el orden importa: completar sin haber iniciado, etc. Un error inesperado
+  en una operación se reporta en esa operación (500) sin tumbar el lote.
+"""
+import logging
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import IntegrityError, transaction
+from rest_framework import status
+from rest_framework.exceptions import APIException, NotFound, ValidationError
+
+from core.exceptions import Conflict
+from .models import Visit, Assessment, Evidence, TaskCompleted, MaterialUsed, MutationReceipt
+from .serializers import (
+    VisitSerializer,
+    AssessmentSerializer,
+    EvidenceSerializer,
+    TaskCompletedSerializer,
+    MaterialUsedSerializer,
+)
+from .events import record_status_change
+from .transitions import apply_transition
+from .utils import send_visit_completed_email_async
+from .validations import (
+    validate_visit_dates,
+    ensure_active_user,
+    ensure_active_subscription,
+    ensure_no_schedule_conflict,
+)
+
+# Límite de operaciones por lote
+MUTATIONS_MAX_OPERATIONS = 200
+MUTATION_KEY_MAX_LENGTH = 64
+
+logger = logging.getLogger("visits.mutations")
+
+
+def _require_int(op, field):
+    value = op.get(field)
+    if not isinstance(value, int) or isinstance(value, bool):
+        raise ValidationError({field: "Debe ser un id numérico."})
+    return value
+
+
+def _data(op):
+    data = op.get("data", {})
+    if not isinstance(data, dict):
+        raise ValidationError({"data": "Debe ser un objeto."})
+    return data
+
+
+class MutationBatch:
+    """Aplica un lote ordenado de operaciones con el actor y el contexto del request."""
+
+    def __init__(self, request, actor=None):
+        self.request = request
+        self.actor = actor
+        self.context = {"request": request}
+        self._instances = {}
+
+    # ---------- helpers ----------
+    def create_kwargs(self):
+        return {"created_by": self.actor, "updated_by": self.actor} if self.actor else {}
+
+    def update_kwargs(self):
+        return {"updated_by": self.actor} if self.actor else {}
+
+    def preload(self, operations):
+        """Una consulta por modelo para todas las instancias que el lote va a editar/borrar."""
+        ids = {}
+        for op in operations:
+            handler = HANDLERS.get(op.get("op"))
+            model = getattr(handler, "model", None)
+            pk = op.get("id")
+            if model is not None and isinstance(pk, int) and not isinstance(pk, bool):
+                ids.setdefault(model, set()).add(pk)
+        for model, pks in ids.items():
+            qs = model.active_objects.all()
+            if model is Visit:
+                qs = qs.select_related("subscription__customer", "subscription__plan", "user")
+            self._instances[model] = qs.in_bulk(pks)
+
+    def refresh_state(self, model, pk, values):
+        obj = self._instances.get(model, {}).get(pk)
+        if obj is not None:
+            for attr, value in values.items():
+                setattr(obj, attr, value)
+
+    def instance(self, model, op):
+        pk = _require_int(op, "id")
+        obj = self._instances.get(model, {}).get(pk)
+        if obj is None:
+            obj = model.active_objects.filter(pk=pk).first()
+        if obj is None:
+            raise NotFound(f"{model.__name__} #{pk} no encontrado.")
+        return obj
+
+    # ---------- ejecución ----------
+    def run(self, operations, continue_on_error=False):
+        keys = [op["key"] for op in operations]
+        receipts = {
+            r.key: r for r in MutationReceipt.objects.filter(user=self.actor, key__in=keys)
+        }
+        self.preload(operations)
+
+        results = []
+        failed = False
+        with transaction.atomic():
+            for index, op in enumerate(operations):
+                key, name = op["key"], op["op"]
+                base = {"index": index, "key": key, "op": name}
+                if failed and not continue_on_error:
+                    results.append({**base, "status": None, "skipped": True})
+                    continue
+
+                receipt = receipts.get(key)
+                if receipt is None:
+                    try:
+                        with transaction.atomic():
+                            code, data = HANDLERS[name](self, op)
+                            receipt = MutationReceipt.objects.create(
+                                key=key, op=name, user=self.actor, status_code=code, result=data,
+                            )
+                    except APIException as exc:
+                        failed = True
+                        self._instances.clear()  # el savepoint se revirtió: descartar lo editado en memoria
+                        results.append({**base, "status": exc.status_code, "errors": exc.detail})
+                        continue
+                    except DjangoValidationError as exc:
+                        failed = True
+                        self._instances.clear()
+                        results.append({
+                            **base,
+                            "status": status.HTTP_400_BAD_REQUEST,
+                            "errors": exc.message_dict if hasattr(exc, "error_dict") else {"detail": exc.messages},
+                        })
+                        continue
+                    except IntegrityError:
+                        # Otra petición registró la misma clave (o chocó una restricción)
+                        self._instances.clear()
+                        receipt = MutationReceipt.objects.filter(user=self.actor, key=key).first()
+                        if receipt is None:
+                            failed = True
+                            results.append({
+                                **base,
+                                "status": status.HTTP_409_CONFLICT,
+                                "errors": {"detail": Conflict.default_detail},
+                            })
+                            continue
+                    except Exception:
+                        # Fallo inesperado: el savepoint ya se revirtió; se reporta en la operación
+                        logger.exception("Mutación %s (%s) falló", name, key)
+                        failed = True
+                        self._instances.clear()
+                        results.append({
+                            **base,
+                            "status": status.HTTP_500_INTERNAL_SERVER_ERROR,
+                            "errors": {"detail": "Error interno al aplicar la operación."},
+                        })
+                        continue
+                    else:
+                        receipts[key] = receipt
+                        results.append({**base, "status": code, "data": data})
+                        continue
+
+                if receipt.op != name:
+                    failed = True
+                    results.append({
+                        **base,
+                        "status": status.HTTP_409_CONFLICT,
+                        "errors": {"key": f"La clave ya se usó para '{receipt.op}'."},
+                    })
+                    continue
+                results.append({**base, "status": receipt.status_code, "replayed": True, "data": receipt.result})
+
+        return results
+
+
+def validate_operations(payload):
+    """Valida la forma del lote antes de tocar la BD (400 para todo el lote)."""
+    if not isinstance(payload, dict) or not isinstance(payload.get("operations"), list):
+        raise ValidationError({"operations": "Se esperaba {\"operations\": [...]}."})
+    operations = payload["operations"]
+    if not operations:
+        raise ValidationError({"operations": "La lista está vacía."})
+    if len(operations) > MUTATIONS_MAX_OPERATIONS:
+        raise ValidationError({"operations": f"Máximo {MUTATIONS_MAX_OPERATIONS} operaciones por lote."})
+
+    errors = []
+    for index, op in enumerate(operations):
+        if not isinstance(op, dict):
+            errors.append({"index": index, "errors": {"detail": "Debe ser un objeto."}})
+            continue
+        item = {}
+        key = op.get("key")
+        if not isinstance(key, str) or not 0 < len(key) <= MUTATION_KEY_MAX_LENGTH:
+            item["key"] = f"Requerido: texto de 1 a {MUTATION_KEY_MAX_LENGTH} caracteres."
+        if op.get("op") not in HANDLERS:
+            item["op"] = f"Operación desconocida. Opciones: {', '.join(sorted(HANDLERS))}."
+        if item:
+            errors.append({"index": index, "errors": item})
+    if errors:
+        raise ValidationError({"errors": errors})
+    return operations
+
+
+# ================= Handlers: (batch, op) -> (status_code, data) =================
+
+def _transition_handler(name):
+    def handler(batch, op):
+        visit_id = _require_int(op, "visit")
+        state = apply_transition(visit_id, name, actor=batch.actor, reason=op.get("cancel_reason") or "")
+        # el UPDATE condicional deja obsoleta la instancia precargada: un save() completo
+        # posterior (visit.update) pisaría el nuevo estado
+        batch.refresh_state(Visit, visit_id, state)
+        if name == "complete":
+            transaction.on_commit(lambda: send_visit_completed_email_async(visit_id))
+        return status.HTTP_200_OK, state
+    return handler
+
+
+def _visit_update(batch, op):
+    instance = batch.instance(Visit, op)
+    old_status = instance.status
+    ser = VisitSerializer(instance, data=_data(op), partial=True, context=batch.context)
+    ser.is_valid(raise_exception=True)
+    validate_visit_dates(ser, instance=instance)
+    ensure_active_user(ser, instance=instance)
+    ensure_active_subscription(ser, instance=instance)
+    ensure_no_schedule_conflict(ser, instance=instance)
+    visit = ser.save(**batch.update_kwargs())
+    if old_status != visit.status:
+        record_status_change(visit.pk, visit.status, visit.user_id, visit.subscription.customer_id)
+    if old_status != visit.status and visit.status == Visit.Status.COMPLETED:
+        transaction.on_commit(lambda: send_visit_completed_email_async(visit.pk))
+    return status.HTTP_200_OK, {"id": visit.pk, "status": visit.status, "updated_at": visit.updated_at}
+
+
+_visit_update.model = Visit
+
+
+def _child_handlers(model, serializer_cls):
+    def create(batch, op):
+        data = _data(op)
+        if "visit" in op and "visit" not in data:
+            data = {**data, "visit": op["visit"]}
+        ser = serializer_cls(data=data, context=batch.context)
+        ser.is_valid(raise_exception=True)
+        obj = ser.save(**batch.create_kwargs())
+        return status.HTTP_201_CREATED, serializer_cls(obj, context=batch.context).data
+
+    def update(batch, op):
+        instance = batch.instance(model, op)
+        ser = serializer_cls(instance, data=_data(op), partial=True, context=batch.context)
+        ser.is_valid(raise_exception=True)
+        obj = ser.save(**batch.update_kwargs())
+        return status.HTTP_200_OK, serializer_cls(obj, context=batch.context).data
+
+    def delete(batch, op):
+        instance = batch.instance(model, op)
+        instance.delete()
+        return status.HTTP_200_OK, {"id": instance.pk, "deleted": True}
+
+    update.model = model
+    delete.model = model
+    return create, update, delete
+
+
+def _assessment_upsert(batch, op):
+    """Igual que POST /api/assessment/by-visit/<id>/: crea o reactiva/edita la evaluación."""
+    visit_id = _require_int(op, "visit")
+    # OneToOne: si ya hay evaluación (aunque esté inactiva) se edita esa
+    obj = Assessment.objects.filter(visit_id=visit_id).first()
+    ser = AssessmentSerializer(
+        obj, data={**_data(op), "visit": visit_id}, partial=obj is not None, context=batch.context
+    )
+    ser.is_valid(raise_exception=True)
+    if obj is None:
+        obj = ser.save(**batch.create_kwargs())
+        return status.HTTP_201_CREATED, AssessmentSerializer(obj, context=batch.context).data
+    obj = ser.save(active=True, **batch.update_kwargs())
+    return status.HTTP_200_OK, AssessmentSerializer(obj, context=batch.context).data
+
+
+_task_create, _task_update, _task_delete = _child_handlers(TaskCompleted, TaskCompletedSerializer)
+_material_create, _material_update, _material_delete = _child_handlers(MaterialUsed, MaterialUsedSerializer)
+_, _evidence_update, _evidence_delete = _child_handlers(Evidence, EvidenceSerializer)
+
+HANDLERS = {
+    "visit.start": _transition_handler("start"),
+    "visit.complete": _transition_handler("complete"),
+    "visit.cancel": _transition_handler("cancel"),
+    "visit.restore": _transition_handler("restore"),
+    "visit.update": _visit_update,
+    "task_completed.create": _task_create,
+    "task_completed.update": _task_update,
+    "task_completed.delete": _task_delete,
+    "material_used.create": _material_create,
+    "material_used.update": _material_update,
+    "material_used.delete": _material_delete,
+    "assessment.upsert": _assessment_upsert,
+    # las evidencias se suben aparte (multipart); aquí solo metadatos / baja
+    "evidence.update": _evidence_update,
+    "evidence.delete": _evidence_delete,
+}
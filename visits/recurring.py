@@ -0,0 +1,134 @@
+# visits/recurring.py
+from datetime import datetime
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from core import search
+from core.bulk import bulk_create_with_pks
+from plans.models import PlanSubscription
+from plans.recurrence import occurrence_dates
+from .checklist import materialize_checklists
+from .models import Visit
+from .scheduling import VISIT_DEFAULT_DURATION, busy_intervals, effective_end, lock_technicians
+
+# ids por consulta al generar checklists / índice de las visitas nuevas
+_IDS_CHUNK = 1000
+
+
+def recurring_subscriptions():
+    """Suscripciones activas con regla de recurrencia y técnico asignado."""
+    return (
+        PlanSubscription.active_objects
+        .exclude(recurrence=PlanSubscription.Recurrence.NONE)
+        .filter(status=PlanSubscription.Status.ACTIVE, technician__isnull=False)
+        .select_related("customer")
+        .order_by("id")
+    )
+
+
+def _existing_occurrences(subs, from_date, to_date, window_start, window_end):
+    """
+    (suscripción, fecha) ya cubiertas: las generadas por su occurrence_date (aunque
+    se hayan reprogramado, cancelado o desactivado) y las manuales por la fecha local
+    de su inicio.
+    """
+    rows = (
+        Visit.objects
+        .filter(subscription_id__in=[s.id for s in subs])
+        .filter(
+            Q(occurrence_date__gte=from_date, occurrence_date__lte=to_date)
+            | Q(occurrence_date__isnull=True, start__gte=window_start, start__lte=window_end)
+        )
+        .values_list("subscription_id", "occurrence_date", "start")
+    )
+    return {(sub_id, day or timezone.localdate(start)) for sub_id, day, start in rows}
+
+
+def _without_conflicts(visits, window_start, window_end):
+    """
+    Quita las visitas que chocan con otra del técnico (existente o generada antes en
+    el mismo lote), como ensure_no_schedule_conflict en el alta manual.
+    Una consulta para todos los técnicos del lote.
+    """
+    busy = busy_intervals({v.user_id for v in visits}, window_start, window_end + VISIT_DEFAULT_DURATION)
+    kept = []
+    for visit in visits:
+        end = effective_end(visit.start, visit.end)
+        slots = busy.setdefault(visit.user_id, [])
+        if any(start < end and slot_end > visit.start for start, slot_end in slots):
+            continue
+        slots.append((visit.start, end))
+        kept.append(visit)
+    return kept
+
+
+def generate_visits(from_date, to_date, batch_size=1000, dry_run=False, stdout=None):
+    """
+    Materializa las visitas futuras de todas las suscripciones recurrentes en
+    [from_date, to_date]. Por lote de suscripciones:
+      - 1 consulta para las suscripciones (keyset por id)
+      - 1 consulta para las ocurrencias ya generadas en la ventana (idempotencia)
+      - técnicos bloqueados + 1 consulta de su agenda (choques de horario)
+      - bulk_create de visitas + un INSERT ... SELECT para sus checklists
+    Cada visita guarda su occurrence_date: una ocurrencia ya generada (aunque se
+    haya movido de fecha, cancelado o desactivado) no se vuelve a crear, así que
+    re-ejecutar el comando es seguro. Las que chocan con la agenda del técnico se
+    omiten y se cuentan en "conflicts".
+    """
+    tz = timezone.get_current_timezone()
+    window_start = timezone.make_aware(datetime.combine(from_date, datetime.min.time()), tz)
+    window_end = timezone.make_aware(datetime.combine(to_date, datetime.max.time()), tz)
+
+    totals = {"subscriptions": 0, "visits": 0, "tasks": 0, "skipped": 0, "conflicts": 0}
+    last_id = 0
+    while True:
+        subs = list(recurring_subscriptions().filter(id__gt=last_id)[:batch_size])
+        if not subs:
+            break
+        last_id = subs[-1].id
+
+        existing = _existing_occurrences(subs, from_date, to_date, window_start, window_end)
+
+        new_visits = []
+        for sub in subs:
+            address = sub.customer.direction or sub.customer.location or ""
+            for day in occurrence_dates(sub, from_date, to_date):
+                if (sub.id, day) in existing:
+                    totals["skipped"] += 1
+                    continue
+                new_visits.append(Visit(
+                    subscription=sub,
+                    user_id=sub.technician_id,
+                    start=timezone.make_aware(datetime.combine(day, sub.recurrence_time), tz),
+                    status=Visit.Status.SCHEDULED,
+                    site_address=address[:250],
+                    occurrence_date=day,
+                ))
+        new_visits.sort(key=lambda v: (v.start, v.subscription_id))
+
+        totals["subscriptions"] += len(subs)
+        if new_visits and dry_run:
+            kept = _without_conflicts(new_visits, window_start, window_end)
+        elif new_visits:
+            with transaction.atomic():
+                lock_technicians({v.user_id for v in new_visits})
+                kept = _without_conflicts(new_visits, window_start, window_end)
+                bulk_create_with_pks(Visit, kept)
+                # checklist e índice solo de las visitas creadas en esta corrida
+                ids = [v.pk for v in kept]
+                for i in range(0, len(ids), _IDS_CHUNK):
+                    created = Visit.objects.filter(pk__in=ids[i:i + _IDS_CHUNK])
+                    totals["tasks"] += materialize_checklists(created)
+                    # bulk_create no dispara señales: indexar para la búsqueda global
+                    search.index_queryset("visit", created)
+        else:
+            kept = []
+        totals["visits"] += len(kept)
+        totals["conflicts"] += len(new_visits) - len(kept)
+
+        if stdout is not None:
+            stdout.write(f"  ... suscripciones hasta #{last_id}: {totals['visits']} visitas")
+
+    return totals
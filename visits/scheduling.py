@@ -0,0 +1,110 @@
+# visits/scheduling.py
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.db.models import Q
+
+from .models import Visit
+
+# Duración asumida para visitas sin 'end' (mismo criterio que el feed .ics)
+VISIT_DEFAULT_DURATION = timedelta(hours=1)
+
+
+def effective_end(start, end):
+    return end or start + VISIT_DEFAULT_DURATION
+
+
+def _overlap_filter(start, end):
+    """
+    Q de solapamiento contra [start, end): otra.start < end y fin_efectivo(otra) > start.
+    Ambas ramas son rangos sobre el índice (user, start, end).
+    """
+    return Q(start__lt=end) & (
+        Q(end__gt=start) | Q(end__isnull=True, start__gt=start - VISIT_DEFAULT_DURATION)
+    )
+
+
+def lock_technicians(user_ids):
+    """
+    SELECT ... FOR UPDATE sobre las filas de los técnicos (en orden de pk): las
+    escrituras de visitas de un mismo técnico se serializan hasta el commit, así dos
+    altas concurrentes no pasan las dos el chequeo de choques. Debe llamarse dentro
+    de transaction.atomic().
+    """
+    list(
+        get_user_model().objects.select_for_update()
+        .filter(pk__in=user_ids).order_by("pk").values_list("pk", flat=True)
+    )
+
+
+def lock_technician(user_id):
+    lock_technicians([user_id])
+
+
+def overlapping_visits(user_id, start, end=None, exclude_pk=None):
+    """Visitas activas no canceladas del técnico que se cruzan con [start, end)."""
+    qs = (
+        Visit.active_objects
+        .filter(user_id=user_id)
+        .filter(_overlap_filter(start, effective_end(start, end)))
+        .exclude(status=Visit.Status.CANCELED)
+    )
+    if exclude_pk is not None:
+        qs = qs.exclude(pk=exclude_pk)
+    return qs
+
+
+def busy_intervals(user_ids, start, end):
+    """{técnico: [(inicio, fin_efectivo), ...]} de sus visitas que se cruzan con [start, end)."""
+    rows = (
+        Visit.active_objects
+        .filter(user_id__in=user_ids)
+        .filter(_overlap_filter(start, end))
+        .exclude(status=Visit.Status.CANCELED)
+        .values_list("user_id", "start", "end")
+    )
+    busy = {}
+    for user_id, visit_start, visit_end in rows:
+        busy.setdefault(user_id, []).append((visit_start, effective_end(visit_start, visit_end)))
+    return busy
+
+
+def find_conflicts(window_start, window_end, user_id=None):
+    """
+    Reporte de choques de horario en la ventana: UNA consulta ordenada por
+    (user, start) y un barrido lineal por técnico.
+
+    Para cada técnico se mantiene la visita que termina más tarde hasta el momento;
+    si la siguiente empieza antes de ese fin, hay conflicto.
+    """
+    qs = (
+        Visit.active_objects
+        .filter(_overlap_filter(window_start, window_end))
+        .exclude(status=Visit.Status.CANCELED)
+    )
+    if user_id is not None:
+        qs = qs.filter(user_id=user_id)
+
+    rows = qs.order_by("user_id", "start", "id").values_list("id", "user_id", "start", "end")
+
+    conflicts = []
+    current_user = None
+    reach_id, reach_end = None, None
+    for visit_id, user, start, end in rows.iterator(chunk_size=2000):
+        end = effective_end(start, end)
+        if user != current_user:
+            current_user, reach_id, reach_end = user, visit_id, end
+            continue
+
+        if start < reach_end:
+            conflicts.append({
+                "user": user,
+                "visit": visit_id,
+                "conflicts_with": reach_id,
+                "overlap_start": start,
+                "overlap_end": min(end, reach_end),
+            })
+        if end > reach_end:
+            reach_id, reach_end = visit_id, end
+
+    return conflicts
@@ -1,21 +1,34 @@
 from rest_framework import serializers
+from core.bulk import BulkListSerializer, PreloadedPrimaryKeyRelatedField
+from core.fastserializers import ValuesSerializer
+from plans.models import PlanSubscription
 from .models import Visit, Assessment, Evidence, TaskCompleted, MaterialUsed
 
 class MaterialUsedSerializer(serializers.ModelSerializer):
+    # FK resueltas en lote cuando se valida un arreglo (many=True)
+    serializer_related_field = PreloadedPrimaryKeyRelatedField
+
     class Meta:
         model = MaterialUsed
         fields = ["id", "visit", "description", "unit", "unit_cost"]
+        list_serializer_class = BulkListSerializer
 
 class TaskCompletedSerializer(serializers.ModelSerializer):
+    serializer_related_field = PreloadedPrimaryKeyRelatedField
+
     class Meta:
         model = TaskCompleted
         fields = ["id", "visit", "plan_task", "name", "description", "hours", "completada"]
+        list_serializer_class = BulkListSerializer
 
 class EvidenceSerializer(serializers.ModelSerializer):
+    serializer_related_field = PreloadedPrimaryKeyRelatedField
+
     class Meta:
         model = Evidence
         fields = ["id", "visit", "file", "description", "subido_en"]
         read_only_fields = ["subido_en"]
+        list_serializer_class = BulkListSerializer
 
 class AssessmentSerializer(serializers.ModelSerializer):
     class Meta:
@@ -24,6 +37,10 @@ class AssessmentSerializer(serializers.ModelSerializer):
         read_only_fields = ["created_at"]
 
 class VisitSerializer(serializers.ModelSerializer):
+    # customer y plan vienen en la misma consulta del FK (los usa subscription_info)
+    subscription = serializers.PrimaryKeyRelatedField(
+        queryset=PlanSubscription.objects.select_related("customer", "plan"), required=False
+    )
     assessment = AssessmentSerializer(read_only=True)
     evidences = EvidenceSerializer(many=True, read_only=True)
     tasks_completed = TaskCompletedSerializer(many=True, read_only=True)
@@ -62,4 +79,63 @@ class VisitSerializer(serializers.ModelSerializer):
                     } if p else None,
                 }
 
-            return data
\ No newline at end of file
+            return data
+
+
+# ---- Listas de solo lectura (core/fastserializers.py): mismo JSON, desde .values() ----
+class MaterialUsedValuesSerializer(ValuesSerializer):
+    serializer_class = MaterialUsedSerializer
+
+class TaskCompletedValuesSerializer(ValuesSerializer):
+    serializer_class = TaskCompletedSerializer
+
+class EvidenceValuesSerializer(ValuesSerializer):
+    serializer_class = EvidenceSerializer
+
+class AssessmentValuesSerializer(ValuesSerializer):
+    serializer_class = AssessmentSerializer
+
+class VisitValuesSerializer(ValuesSerializer):
+    serializer_class = VisitSerializer
+    nested = ("assessment", "evidences", "tasks_completed", "materials_used")
+    # lo que usa subscription_info, en la misma consulta
+    SUBSCRIPTION_COLUMNS = (
+        "subscription__status", "subscription__start_date",
+        "subscription__customer_id", "subscription__customer__name",
+        "subscription__customer__email", "subscription__customer__phone",
+        "subscription__plan_id", "subscription__plan__name", "subscription__plan__price",
+    )
+
+    @classmethod
+    def values(cls, queryset, *extra):
+        return super().values(
+            queryset, *AssessmentValuesSerializer.columns("assessment__"), *cls.SUBSCRIPTION_COLUMNS, *extra
+        )
+
+    def add_nested(self, rows, data):
+        # los hijos como en el prefetch del viewset: manager por defecto y Meta.ordering
+        self.nest_one(rows, data, "assessment", AssessmentValuesSerializer, "assessment__")
+        self.nest_many(rows, data, "evidences", EvidenceValuesSerializer, Evidence.objects.all(), "visit_id")
+        self.nest_many(rows, data, "tasks_completed", TaskCompletedValuesSerializer,
+                       TaskCompleted.objects.all(), "visit_id")
+        self.nest_many(rows, data, "materials_used", MaterialUsedValuesSerializer,
+                       MaterialUsed.objects.all(), "visit_id")
+        for r, item in zip(rows, data):
+            if r["subscription_id"] is None:
+                continue
+            item["subscription_info"] = {
+                "id": r["subscription_id"],
+                "status": r["subscription__status"],
+                "start_date": str(r["subscription__start_date"]),
+                "customer": {
+                    "id": r["subscription__customer_id"],
+                    "name": r["subscription__customer__name"],
+                    "email": r["subscription__customer__email"],
+                    "phone": r["subscription__customer__phone"],
+                } if r["subscription__customer_id"] is not None else None,
+                "plan": {
+                    "id": r["subscription__plan_id"],
+                    "name": r["subscription__plan__name"],
+                    "price": str(r["subscription__plan__price"]),
+                } if r["subscription__plan_id"] is not None else None,
+            }
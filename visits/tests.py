@@ -1,3 +1,559 @@
-from django.test import TestCase
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.db import IntegrityError, connection, transaction
+from django.db.models import QuerySet
+from django.test import RequestFactory, TestCase
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.tokens import AccessToken
+
+from customers.models import Customer
+from plans.models import Plan, PlanTask, PlanSubscription
+from users.models import User
+from visits.models import Visit, Assessment, Evidence, TaskCompleted, MaterialUsed, MutationReceipt, VisitEvent
+from visits.serializers import (
+    VisitSerializer, VisitValuesSerializer, EvidenceSerializer, EvidenceValuesSerializer,
+)
+from visits import events, mutations, scheduling
+from visits.agenda import feed_token
+from visits.recurring import generate_visits
+from visits.views import events as event_views, visits as visit_views
+
+
+class AgendaFeedTests(TestCase):
+    """Feed .ics: token firmado en la URL (sin JWT) y ETag que ve cambios del cliente y plan."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tech = User.objects.create_user(username="tec", email="tec@x.com", password="x")
+        cls.other = User.objects.create_user(username="otro", email="otro@x.com", password="x")
+        cls.customer = Customer.objects.create(name="ACME", identification="1-111")
+        plan = Plan.objects.create(name="Básico", price=100)
+        sub = PlanSubscription.objects.create(customer=cls.customer, plan=plan, start_date=date.today())
+        Visit.objects.create(subscription=sub, user=cls.tech, start=timezone.now() + timedelta(hours=1))
+
+    def setUp(self):
+        patcher = mock.patch.object(visit_views, "DISABLE_AUTH", False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = APIClient()
+        self.client.force_authenticate(self.tech)
+        self.url = self.client.get("/api/visit/agenda/ics-token/").data["url"]
+        self.anonymous = APIClient()
+
+    def test_feed_token_works_without_authorization_header(self):
+        response = self.anonymous.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        body = b"".join(response.streaming_content).decode()
+        self.assertIn("SUMMARY:Visita #", body)
+        self.assertIn("ACME", body)
+
+    def test_feed_requires_credentials(self):
+        self.assertEqual(self.anonymous.get("/api/visit/agenda/ics/").status_code, 401)
+        self.assertEqual(self.anonymous.get("/api/visit/agenda/ics/", {"feed": "x:y"}).status_code, 401)
+
+    def test_password_change_revokes_token(self):
+        self.tech.set_password("nueva")
+        self.tech.save()
+        self.assertEqual(self.anonymous.get(self.url).status_code, 401)
+
+    def test_token_for_another_technician_is_staff_only(self):
+        response = self.client.get("/api/visit/agenda/ics-token/", {"user": self.other.pk})
+        self.assertEqual(response.status_code, 403)
+
+    def test_etag_changes_when_customer_is_renamed(self):
+        etag = self.anonymous.get(self.url)["ETag"]
+        self.assertEqual(self.anonymous.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.customer.name = "ACME Renombrada"
+        self.customer.save()
+        response = self.anonymous.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("ACME Renombrada", b"".join(response.streaming_content).decode())
+
+
+class ScheduleConflictTests(TestCase):
+    """Choques de horario del técnico: al escribir (409/400) y en el reporte por barrido."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tech = User.objects.create_user(username="tec", email="tec@x.com", password="x")
+        customer = Customer.objects.create(name="ACME", identification="1-111")
+        plan = Plan.objects.create(name="Básico", price=100)
+        cls.sub = PlanSubscription.objects.create(customer=customer, plan=plan, start_date=date.today())
+        cls.start = timezone.now().replace(microsecond=0) + timedelta(days=1)
+        cls.visit = Visit.objects.create(subscription=cls.sub, user=cls.tech, start=cls.start,
+                                         end=cls.start + timedelta(hours=2))
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.tech)
+
+    def _post(self, start, end=None):
+        data = {"subscription": self.sub.pk, "user": self.tech.pk, "start": start.isoformat()}
+        if end:
+            data["end"] = end.isoformat()
+        return self.client.post("/api/visit/", data, format="json")
+
+    def test_overlapping_create_is_rejected(self):
+        response = self._post(self.start + timedelta(hours=1))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(f"#{self.visit.pk}", str(response.data["start"]))
+
+    def test_adjacent_and_canceled_do_not_clash(self):
+        self.assertEqual(self._post(self.start + timedelta(hours=2)).status_code, 201)
+        Visit.objects.filter(pk=self.visit.pk).update(status=Visit.Status.CANCELED)
+        self.assertEqual(self._post(self.start + timedelta(minutes=30)).status_code, 201)
+
+    def test_check_runs_with_technician_locked_in_the_save_transaction(self):
+        calls = []
+        real = scheduling.lock_technician
+
+        def spy(user_id):
+            calls.append((user_id, connection.in_atomic_block))
+            return real(user_id)
+
+        with mock.patch.object(scheduling, "lock_technician", spy):
+            self.assertEqual(self._post(self.start + timedelta(days=1)).status_code, 201)
+        self.assertEqual(calls, [(self.tech.pk, True)])
+
+    def test_edits_that_keep_the_schedule_skip_the_check_and_lock(self):
+        # datos previos: ya se cruza con self.visit
+        legacy = Visit.objects.create(subscription=self.sub, user=self.tech, start=self.start + timedelta(hours=1))
+        url = f"/api/visit/{legacy.pk}/"
+        with mock.patch.object(scheduling, "lock_technician") as lock:
+            self.assertEqual(self.client.patch(url, {"notes": "Portón"}, format="json").status_code, 200)
+            same = {"start": legacy.start.isoformat(), "user": self.tech.pk}
+            self.assertEqual(self.client.patch(url, same, format="json").status_code, 200)
+            response = self.client.post("/api/visit/mutations/", {"operations": [
+                {"key": "n1", "op": "visit.update", "id": legacy.pk, "data": {"notes": "Reja"}},
+            ]}, format="json")
+            self.assertEqual(response.data["results"][0]["status"], 200)
+        lock.assert_not_called()
+
+        moved = {"start": (self.start + timedelta(minutes=30)).isoformat()}
+        self.assertEqual(self.client.patch(url, moved, format="json").status_code, 400)
+
+    def test_restore_checks_the_schedule_again(self):
+        canceled = Visit.objects.create(subscription=self.sub, user=self.tech, start=self.start + timedelta(days=2))
+        self.assertEqual(self.client.post(f"/api/visit/{canceled.pk}/cancel/").status_code, 200)
+        Visit.objects.create(subscription=self.sub, user=self.tech, start=canceled.start + timedelta(minutes=30))
+
+        response = self.client.post(f"/api/visit/{canceled.pk}/restore/")
+        self.assertEqual(response.status_code, 409)
+        canceled.refresh_from_db()
+        self.assertEqual(canceled.status, Visit.Status.CANCELED)
+
+    def test_restore_drops_the_end_set_by_cancel(self):
+        future = Visit.objects.create(subscription=self.sub, user=self.tech, start=self.start + timedelta(days=5))
+        self.client.post(f"/api/visit/{future.pk}/cancel/", {"cancel_reason": "lluvia"}, format="json")
+        future.refresh_from_db()
+        self.assertLess(future.end, future.start)  # COALESCE(end, now) de la cancelación
+
+        response = self.client.post(f"/api/visit/{future.pk}/restore/")
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual((response.data["status"], response.data["end"], response.data["cancel_reason"]),
+                         (Visit.Status.SCHEDULED, None, ""))
+
+        # un end propio de la visita se conserva
+        self.client.post(f"/api/visit/{self.visit.pk}/cancel/")
+        self.assertEqual(self.client.post(f"/api/visit/{self.visit.pk}/restore/").data["end"],
+                         self.start + timedelta(hours=2))
+
+    def test_conflict_report_sweep(self):
+        clash = Visit.objects.create(subscription=self.sub, user=self.tech, start=self.start + timedelta(hours=1))
+        Visit.objects.create(subscription=self.sub, user=self.tech, start=self.start + timedelta(hours=3))
+        window = {"from": self.start.date().isoformat(), "to": (self.start + timedelta(days=1)).date().isoformat()}
+        response = self.client.get("/api/visit/conflicts/", window)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(c["visit"], c["conflicts_with"]) for c in response.data["results"]], [(clash.pk, self.visit.pk)]
+        )
+
+
+class RecurringVisitsTests(TestCase):
+    """Generador de visitas recurrentes (visits/recurring.py)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tech = User.objects.create_user(username="tec", email="tec@x.com", password="x")
+        customer = Customer.objects.create(name="ACME", identification="1-111", direction="Calle 1")
+        plan = Plan.objects.create(name="Básico", price=100)
+        PlanTask.objects.create(plan=plan, name="Limpieza")
+        cls.sub = PlanSubscription.objects.create(
+            customer=customer, plan=plan, start_date=date(2030, 1, 1), status="active",
+            recurrence="weekly", technician=cls.tech,
+        )
+        cls.window = (date(2030, 1, 1), date(2030, 1, 28))  # 4 martes
+
+    def test_generates_occurrences_with_checklists_once(self):
+        totals = generate_visits(*self.window)
+        self.assertEqual((totals["visits"], totals["tasks"]), (4, 4))
+        visits = Visit.objects.filter(subscription=self.sub).order_by("start")
+        self.assertEqual([v.occurrence_date.day for v in visits], [1, 8, 15, 22])
+        self.assertEqual(visits[0].site_address, "Calle 1")
+
+        again = generate_visits(*self.window)
+        self.assertEqual((again["visits"], again["skipped"]), (0, 4))
+
+    def test_moved_occurrence_is_not_recreated(self):
+        generate_visits(*self.window)
+        moved = Visit.objects.get(subscription=self.sub, occurrence_date=date(2030, 1, 8))
+        moved.start += timedelta(days=2)
+        moved.save()
+        self.assertEqual(generate_visits(*self.window)["visits"], 0)
+        self.assertEqual(Visit.objects.filter(subscription=self.sub).count(), 4)
+
+    def test_checklists_only_for_visits_created_in_the_run(self):
+        manual = Visit.objects.create(subscription=self.sub, user=self.tech, start=timezone.now())  # sin checklist
+        generate_visits(*self.window)
+        self.assertFalse(TaskCompleted.objects.filter(visit=manual).exists())
+
+    def test_skips_occurrences_that_clash_with_the_agenda(self):
+        other_sub = PlanSubscription.objects.create(
+            customer=Customer.objects.create(name="Beta", identification="2-222"),
+            plan=self.sub.plan, start_date=date(2030, 1, 1),
+        )
+        busy = timezone.make_aware(datetime(2030, 1, 15, 8, 30))
+        Visit.objects.create(subscription=other_sub, user=self.tech, start=busy)
+        totals = generate_visits(*self.window)
+        self.assertEqual((totals["visits"], totals["conflicts"]), (3, 1))
+        rerun = generate_visits(*self.window, dry_run=True)
+        self.assertEqual((rerun["visits"], rerun["skipped"], rerun["conflicts"]), (0, 3, 1))
+
+
+class VisitChecklistTests(TestCase):
+    """El checklist del plan se genera al crear la visita solo con ?checklist=1."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tech = User.objects.create_user(username="tec", email="tec@x.com", password="x")
+        customer = Customer.objects.create(name="ACME", identification="1-111")
+        plan = Plan.objects.create(name="Básico", price=100)
+        PlanTask.objects.create(plan=plan, name="Revisión")
+        PlanTask.objects.create(plan=plan, name="Limpieza")
+        PlanTask.objects.create(plan=plan, name="Vieja", active=False)
+        cls.sub = PlanSubscription.objects.create(customer=customer, plan=plan, start_date=date.today())
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.tech)
+        self.data = {"subscription": self.sub.pk, "user": self.tech.pk, "start": timezone.now().isoformat()}
+
+    def test_no_checklist_by_default(self):
+        response = self.client.post("/api/visit/", self.data, format="json")
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertFalse(TaskCompleted.objects.filter(visit_id=response.data["id"]).exists())
+
+    def test_checklist_on_request(self):
+        response = self.client.post("/api/visit/?checklist=1", self.data, format="json")
+        self.assertEqual(response.status_code, 201, response.content)
+        names = TaskCompleted.objects.filter(visit_id=response.data["id"]).order_by("id").values_list("name", flat=True)
+        self.assertEqual(list(names), ["Limpieza", "Revisión"])
+
+
+class BulkChildrenTests(TestCase):
+    """Alta / edición / baja masiva de hijos de visita (core/bulk.py)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tech = User.objects.create_user(username="tec", email="tec@x.com", password="x")
+        customer = Customer.objects.create(name="ACME", identification="1-111")
+        plan = Plan.objects.create(name="Básico", price=100)
+        cls.task = PlanTask.objects.create(plan=plan, name="Limpieza")
+        sub = PlanSubscription.objects.create(customer=customer, plan=plan, start_date=date.today())
+        cls.visit = Visit.objects.create(subscription=sub, user=cls.tech, start=timezone.now())
+        cls.other = Visit.objects.create(subscription=sub, user=cls.tech, start=timezone.now() + timedelta(days=1))
+        cls.material = MaterialUsed.objects.create(visit=cls.visit, description="Cable", unit_cost=5)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.tech)
+
+    def test_bulk_create_assigns_ids(self):
+        items = [{"visit": self.visit.pk, "description": f"M{i}", "unit_cost": "1.00"} for i in range(3)]
+        response = self.client.post("/api/material-used/", items, format="json")
+        self.assertEqual(response.status_code, 201, response.content)
+        created = MaterialUsed.objects.filter(description__startswith="M").order_by("id")
+        self.assertEqual(sorted(row["id"] for row in response.data), list(created.values_list("id", flat=True)))
+
+    def test_bulk_create_reports_errors_by_index(self):
+        items = [{"visit": self.visit.pk, "description": "Ok"}, {"visit": [1], "description": "Mal"}]
+        response = self.client.post("/api/material-used/", items, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([e["index"] for e in response.data["errors"]], [1])
+        self.assertFalse(MaterialUsed.objects.filter(description="Ok").exists())
+
+    def test_bulk_update_rejects_non_integer_ids(self):
+        for bad in ([1, 2], {"id": 1}, "7", True):
+            response = self.client.patch("/api/material-used/bulk/", [{"id": bad, "unit": "m"}], format="json")
+            self.assertEqual(response.status_code, 400, bad)
+            self.assertEqual(response.data["errors"][0]["errors"], {"id": ["Debe ser un id numérico."]})
+
+    def test_bulk_update_cannot_move_item_to_another_visit(self):
+        items = [{"id": self.material.pk, "visit": self.other.pk, "unit": "m"}]
+        response = self.client.patch("/api/material-used/bulk/", items, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.material.refresh_from_db()
+        self.assertEqual((self.material.visit_id, self.material.unit), (self.visit.pk, ""))
+
+        items = [{"id": self.material.pk, "visit": self.visit.pk, "unit": "m"}]
+        self.assertEqual(self.client.patch("/api/material-used/bulk/", items, format="json").status_code, 200)
+
+    def test_close_out_rejects_non_integer_ids(self):
+        payload = {"materials": [{"id": [self.material.pk], "unit": "m"}]}
+        response = self.client.post(f"/api/visit/{self.visit.pk}/close-out/", payload, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("materials", response.data)
+
+
+class ValuesSerializerParityTests(TestCase):
+    """Las listas desde .values() (core/fastserializers.py) dan el mismo JSON que DRF."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="tec", email="tec@x.com", password="x")
+        customer = Customer.objects.create(name="Ñandú Ltda", identification="1-111", email="n@x.com")
+        plan = Plan.objects.create(name="Básico", price=Decimal("100.50"))
+        task = PlanTask.objects.create(plan=plan, name="Limpieza")
+        sub = PlanSubscription.objects.create(customer=customer, plan=plan, start_date=date.today())
+        now = timezone.now()
+        cls.full = Visit.objects.create(subscription=sub, user=cls.user, start=now, end=now + timedelta(hours=2),
+                                        notes="con   todo")
+        Visit.objects.create(subscription=sub, user=cls.user, start=now - timedelta(days=1))  # sin hijos
+        Assessment.objects.create(visit=cls.full, rating=4, comment="ok")
+        Evidence.objects.create(visit=cls.full, file="evidences/a.jpg", description="foto")
+        Evidence.objects.create(visit=cls.full, description="sin archivo")
+        Evidence.objects.create(visit=cls.full, description="borrada", active=False)
+        TaskCompleted.objects.create(visit=cls.full, plan_task=task, name="Limpieza", hours=2, completada=True)
+        MaterialUsed.objects.create(visit=cls.full, description="Cable", unit="m", unit_cost=Decimal("12.30"))
+        MaterialUsed.objects.create(visit=cls.full, description="Viejo", unit_cost=0, active=False)
+
+    def setUp(self):
+        self.context = {"request": Request(APIRequestFactory().get("/"))}
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def assertSameJSON(self, fast, drf):
+        self.assertEqual(JSONRenderer().render(fast), JSONRenderer().render(drf))
+
+    def test_visits_match_drf(self):
+        qs = (Visit.active_objects
+              .select_related("subscription__customer", "subscription__plan", "user", "assessment")
+              .prefetch_related("evidences", "tasks_completed", "materials_used")
+              .order_by("-start", "id"))
+        rows = list(VisitValuesSerializer.values(qs))
+        fast = VisitValuesSerializer(rows, many=True, context=self.context).data
+        self.assertSameJSON(fast, VisitSerializer(qs, many=True, context=self.context).data)
+        self.assertIsNone(fast[1]["assessment"])
+        self.assertEqual(len(fast[0]["evidences"]), 3)  # como el prefetch: también las inactivas
+
+    def test_evidences_match_drf(self):
+        qs = Evidence.objects.order_by("-subido_en", "id")
+        rows = list(EvidenceValuesSerializer.values(qs))
+        fast = EvidenceValuesSerializer(rows, many=True, context=self.context).data
+        self.assertSameJSON(fast, EvidenceSerializer(qs, many=True, context=self.context).data)
+        self.assertTrue(any(e["file"] and e["file"].startswith("http://testserver/") for e in fast))
+
+    def test_list_endpoints_unchanged(self):
+        response = self.client.get("/api/visit/")
+        self.assertEqual(response.status_code, 200)
+        qs = Visit.active_objects.order_by("-start", "id")
+        self.assertSameJSON(response.data["results"], VisitSerializer(qs, many=True, context=self.context).data)
+
+        response = self.client.get(f"/api/evidence/by-visit/{self.full.pk}/")
+        qs = Evidence.active_objects.filter(visit=self.full).order_by("-subido_en", "id")
+        self.assertSameJSON(response.data["results"], EvidenceSerializer(qs, many=True, context=self.context).data)
+
+    def test_detail_and_writes_stay_on_drf(self):
+        response = self.client.get(f"/api/visit/{self.full.pk}/")
+        self.assertSameJSON(response.data, VisitSerializer(self.full, context=self.context).data)
+        response = self.client.patch(f"/api/visit/{self.full.pk}/", {"notes": "editada"}, format="json")
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.data["notes"], "editada")
+
+
+class MutationBatchTests(TestCase):
+    """POST /api/visit/mutations/: recibos por usuario y errores por operación."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tech = User.objects.create_user(username="tec", email="tec@x.com", password="x")
+        cls.other = User.objects.create_user(username="tec2", email="tec2@x.com", password="x")
+        customer = Customer.objects.create(name="ACME", identification="1-111")
+        plan = Plan.objects.create(name="Básico", price=100)
+        sub = PlanSubscription.objects.create(customer=customer, plan=plan, start_date=date.today())
+        cls.visit = Visit.objects.create(subscription=sub, user=cls.tech, start=timezone.now())
+
+    def _post(self, user, operations, **extra):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client.post("/api/visit/mutations/", {"operations": operations, **extra}, format="json")
+
+    def _material(self, key, description="Cable"):
+        return {"key": key, "op": "material_used.create", "visit": self.visit.pk, "data": {"description": description}}
+
+    def test_receipt_key_is_unique_per_user(self):
+        names = [c.name for c in MutationReceipt._meta.constraints]
+        self.assertIn("mutationreceipt_user_key_uniq", names)
+        MutationReceipt.objects.create(key="k", op="visit.start", user=self.tech, status_code=200)
+        MutationReceipt.objects.create(key="k", op="visit.start", user=self.other, status_code=200)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            MutationReceipt.objects.create(key="k", op="visit.start", user=self.tech, status_code=200)
+
+    def test_replay_is_scoped_per_user(self):
+        first = self._post(self.tech, [self._material("k1")])
+        self.assertEqual(first.data["results"][0]["status"], 201)
+        again = self._post(self.tech, [self._material("k1")])
+        self.assertTrue(again.data["results"][0]["replayed"])
+        self.assertEqual(again.data["results"][0]["data"], first.data["results"][0]["data"])
+
+        # la misma clave de otro técnico es otra operación: se aplica y no ve el recibo ajeno
+        other = self._post(self.other, [self._material("k1", "Tubo")])
+        self.assertEqual(other.data["results"][0]["status"], 201)
+        self.assertNotIn("replayed", other.data["results"][0])
+        self.assertEqual(MaterialUsed.objects.filter(visit=self.visit).count(), 2)
+
+    def test_continue_on_error_parses_strings(self):
+        ops = [{"key": "bad", "op": "task_completed.update", "id": 999999, "data": {}}, self._material("k2")]
+        stopped = self._post(self.tech, ops, continue_on_error="false")
+        self.assertEqual(stopped.data["results"][0]["status"], 404)
+        self.assertTrue(stopped.data["results"][1]["skipped"])
+
+        kept = self._post(self.tech, ops, continue_on_error="true")
+        self.assertEqual(kept.data["results"][1]["status"], 201)
+        self.assertEqual(self._post(self.tech, ops, continue_on_error="quizás").status_code, 400)
+
+    def test_unexpected_error_is_reported_per_operation(self):
+        def boom(batch, op):
+            MaterialUsed.objects.create(visit_id=self.visit.pk, description="a medias")
+            raise RuntimeError("boom")
+
+        with mock.patch.dict(mutations.HANDLERS, {"assessment.upsert": boom}), \
+                self.assertLogs("visits.mutations", "ERROR"):
+            response = self._post(
+                self.tech,
+                [{"key": "x", "op": "assessment.upsert", "visit": self.visit.pk}, self._material("k3")],
+                continue_on_error=True,
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r["status"] for r in response.data["results"]], [500, 201])
+        # el savepoint de la operación fallida se revirtió
+        self.assertEqual(list(MaterialUsed.objects.values_list("description", flat=True)), ["Cable"])
+
+
+class CloseOutTests(TestCase):
+    """POST /api/visit/<id>/close-out/: todo o nada, con la visita bloqueada."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tech = User.objects.create_user(username="tec", email="tec@x.com", password="x")
+        customer = Customer.objects.create(name="ACME", identification="1-111")
+        plan = Plan.objects.create(name="Básico", price=100)
+        sub = PlanSubscription.objects.create(customer=customer, plan=plan, start_date=date.today())
+        cls.visit = Visit.objects.create(subscription=sub, user=cls.tech, start=timezone.now())
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.tech)
+        patcher = mock.patch("visits.closeout.send_visit_completed_email_async")
+        self.send_email = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _close(self, payload):
+        return self.client.post(f"/api/visit/{self.visit.pk}/close-out/", payload, format="json")
+
+    def test_close_out_locks_the_visit_before_validating(self):
+        calls = []
+        real = QuerySet.select_for_update
+
+        def spy(qs, *args, **kwargs):
+            calls.append((qs.model, connection.in_atomic_block))
+            return real(qs, *args, **kwargs)
+
+        with mock.patch.object(QuerySet, "select_for_update", spy), \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self._close({"materials": [{"description": "Cable"}], "assessment": {"rating": 5}})
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(calls[0], (Visit, True))
+        self.assertEqual(response.data["visit"]["status"], Visit.Status.COMPLETED)
+        self.send_email.assert_called_once_with(self.visit.pk)
+
+    def test_failure_after_completing_rolls_everything_back(self):
+        with mock.patch("visits.closeout.AssessmentSerializer.save", side_effect=RuntimeError("boom")), \
+                self.assertRaises(RuntimeError):
+            self._close({"materials": [{"description": "Cable"}], "assessment": {"rating": 5}})
+        self.visit.refresh_from_db()
+        self.assertEqual(self.visit.status, Visit.Status.SCHEDULED)
+        self.assertFalse(MaterialUsed.objects.filter(visit=self.visit).exists())
+        self.send_email.assert_not_called()
+
+    def test_completed_visit_is_a_conflict(self):
+        Visit.objects.filter(pk=self.visit.pk).update(status=Visit.Status.COMPLETED)
+        response = self._close({"materials": [{"description": "Cable"}]})
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(MaterialUsed.objects.exists())
+
+
+class VisitEventsTests(TestCase):
+    """Feed SSE de cambios de estado (visits/events.py): registro, filtros, reanudación y auth."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tech = User.objects.create_user(username="tec", email="tec@x.com", password="x")
+        cls.other = User.objects.create_user(username="tec2", email="tec2@x.com", password="x")
+        customer = Customer.objects.create(name="ACME", identification="1-111")
+        plan = Plan.objects.create(name="Básico", price=100)
+        sub = PlanSubscription.objects.create(customer=customer, plan=plan, start_date=date.today())
+        cls.customer = customer
+        cls.visit = Visit.objects.create(subscription=sub, user=cls.tech, start=timezone.now())
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.tech)
+
+    def test_status_change_and_event_commit_together(self):
+        url = f"/api/visit/{self.visit.pk}/"
+        with mock.patch.object(visit_views, "record_status_change", side_effect=RuntimeError("boom")), \
+                self.assertRaises(RuntimeError):
+            self.client.patch(url, {"status": "in_progress"}, format="json")
+        self.visit.refresh_from_db()
+        self.assertEqual(self.visit.status, Visit.Status.SCHEDULED)
+
+        self.assertEqual(self.client.patch(url, {"status": "in_progress"}, format="json").status_code, 200)
+        self.assertEqual(
+            list(VisitEvent.objects.values_list("visit_id", "status", "technician_id", "customer_id")),
+            [(self.visit.pk, "in_progress", self.tech.pk, self.customer.pk)],
+        )
+
+    def test_resume_returns_only_later_matching_events(self):
+        first = events.record_status_change(self.visit.pk, "in_progress", self.tech.pk, self.customer.pk)
+        events.record_status_change(self.visit.pk, "canceled", self.other.pk, self.customer.pk)
+        last = events.record_status_change(self.visit.pk, "scheduled", self.tech.pk, self.customer.pk)
+
+        missed = events.events_after(first.pk, {"technician": self.tech.pk})
+        self.assertEqual([e["id"] for e in missed], [last.pk])
+        self.assertTrue(events.matches(missed[0], {"technician": self.tech.pk, "customer": self.customer.pk}))
+        self.assertFalse(events.matches(missed[0], {"visit": self.visit.pk + 1}))
+        self.assertEqual(len(events.events_after(0, {"customer": self.customer.pk})), 3)
+
+    def test_stream_token_is_short_lived_and_single_purpose(self):
+        response = self.client.post("/api/visit/events-token/")
+        self.assertEqual(response.status_code, 200)
+        token = response.data["token"]
+        self.assertIn(f"?stream_token={token}", response.data["url"])
+
+        factory = RequestFactory()
+        self.assertEqual(event_views._request_user(factory.get("/", {"stream_token": token})), self.tech)
+        with mock.patch.object(events, "VISIT_EVENTS_TOKEN_TTL", -1):
+            self.assertIsNone(event_views._request_user(factory.get("/", {"stream_token": token})))
+        # otros tokens firmados (feed .ics) y el JWT en la URL ya no sirven
+        self.assertIsNone(event_views._request_user(factory.get("/", {"stream_token": feed_token(self.tech)})))
+        jwt = str(AccessToken.for_user(self.tech))
+        self.assertIsNone(event_views._request_user(factory.get("/", {"token": jwt})))
+        self.assertEqual(
+            event_views._request_user(factory.get("/", HTTP_AUTHORIZATION=f"Bearer {jwt}")), self.tech
+        )
@@ -0,0 +1,131 @@
+# visits/transitions.py
+from dataclasses import dataclass
+
+from django.db import transaction
+from django.db.models import F, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from rest_framework.exceptions import NotFound
+
+from core import search
+from core.exceptions import Conflict
+from .events import record_status_change
+from .models import Visit
+from .scheduling import lock_technician, overlapping_visits
+
+S = Visit.Status
+
+# Campos que devuelve una transición (sin tocar hijos)
+STATE_FIELDS = ("id", "status", "start", "end", "cancel_reason", "updated_at")
+
+
+@dataclass(frozen=True)
+class Transition:
+    name: str
+    sources: frozenset
+    target: str
+    close_end: bool = False          # end = COALESCE(end, now)
+    clear_reason: bool = False       # cancel_reason = ""
+    takes_reason: bool = False       # cancel_reason = <motivo>
+    reschedules: bool = False        # vuelve a la agenda: chequeo de choques y end de la cancelación fuera
+    error: str = ""
+
+
+TRANSITIONS = {
+    "start": Transition(
+        "start", frozenset({S.SCHEDULED}), S.IN_PROGRESS,
+        error="Solo se puede iniciar una visita programada.",
+    ),
+    "complete": Transition(
+        "complete", frozenset({S.SCHEDULED, S.IN_PROGRESS}), S.COMPLETED, close_end=True,
+        error="Solo se puede completar una visita programada o en progreso.",
+    ),
+    "cancel": Transition(
+        "cancel", frozenset({S.SCHEDULED, S.IN_PROGRESS}), S.CANCELED, close_end=True, takes_reason=True,
+        error="Solo se puede cancelar una visita programada o en progreso.",
+    ),
+    "restore": Transition(
+        "restore", frozenset({S.CANCELED}), S.SCHEDULED, clear_reason=True, reschedules=True,
+        error="Solo se puede restaurar una visita cancelada.",
+    ),
+}
+
+
+def _reschedule(pk, t, changes):
+    """
+    La visita vuelve a la agenda (restore): con el técnico bloqueado, como en el alta,
+    devuelve la visita con la que ahora choca (o None). El end que puso la cancelación
+    (COALESCE(end, now), mismo instante que updated_at) o uno anterior al inicio se descarta.
+    """
+    user_id = Visit.active_objects.filter(pk=pk).values_list("user_id", flat=True).first()
+    if user_id is None:
+        return None  # el UPDATE condicional responde 404 / 409
+    lock_technician(user_id)
+    row = (
+        Visit.active_objects.select_for_update()
+        .filter(pk=pk, status__in=t.sources)
+        .values("user_id", "start", "end", "updated_at")
+        .first()
+    )
+    if row is None:
+        return None
+    end = row["end"]
+    if end is not None and (end == row["updated_at"] or end < row["start"]):
+        end = None
+    changes["end"] = end
+    return overlapping_visits(row["user_id"], row["start"], end, exclude_pk=pk).values_list("id", flat=True).first()
+
+
+def apply_transition(pk, name, actor=None, reason="", extra=None):
+    """
+    Aplica la transición como un único UPDATE condicional:
+
+        UPDATE visit SET status=..., ... WHERE id=%s AND active AND status IN (...)
+
+    - 0 filas: 404 si la visita no existe / está inactiva, 409 si el estado no lo permite
+      (incluye perder la carrera contra otra petición concurrente).
+    - Devuelve el nuevo estado (dict con STATE_FIELDS) sin cargar evidencias, tareas ni materiales.
+    - extra: columnas adicionales a fijar en el mismo UPDATE (p.ej. notes en el cierre).
+    - restore: antes del UPDATE, chequeo de choques con el técnico bloqueado (_reschedule).
+    """
+    t = TRANSITIONS[name]
+    now = timezone.now()
+
+    changes = {"status": t.target, "updated_at": now}
+    if t.close_end:
+        changes["end"] = Coalesce(F("end"), Value(now))
+    if t.clear_reason:
+        changes["cancel_reason"] = ""
+    if t.takes_reason:
+        changes["cancel_reason"] = (reason or "")[:200]
+    if actor is not None:
+        changes["updated_by"] = actor
+    if extra:
+        changes.update(extra)
+
+    # savepoint=False: dentro de otra transacción (p.ej. el lote de mutaciones) solo se une
+    with transaction.atomic(savepoint=False):
+        clash = _reschedule(pk, t, changes) if t.reschedules else None
+        updated = 0 if clash else Visit.active_objects.filter(pk=pk, status__in=t.sources).update(**changes)
+        state = (
+            Visit.active_objects.filter(pk=pk)
+            .values(*STATE_FIELDS, "user_id", "subscription__customer_id")
+            .first()
+        )
+        if state is not None:
+            technician_id = state.pop("user_id")
+            customer_id = state.pop("subscription__customer_id")
+            if updated:
+                # feed en vivo del tablero (SSE); se publica tras el commit
+                record_status_change(state["id"], state["status"], technician_id, customer_id)
+
+    if state is None:
+        raise NotFound("Visita no encontrada.")
+    if clash:
+        raise Conflict({"detail": f"El técnico ya tiene la visita #{clash} en ese horario.", "status": state["status"]})
+    if not updated:
+        raise Conflict({"detail": t.error, "status": state["status"]})
+    if t.takes_reason or t.clear_reason or extra:
+        # el UPDATE no dispara post_save: textos indexados (motivo / notas) al índice
+        search.schedule_reindex("visit", [state["id"]])
+    return state
@@ -1,3 +1,4 @@
+from django.urls import path
 from rest_framework.routers import DefaultRouter
 from visits.views import (
     VisitViewSet,
@@ -5,6 +6,7 @@ from visits.views import (
     EvidenceViewSet,
     TaskCompletedViewSet,
     MaterialUsedViewSet,
+    visit_events,
 )
 
 router = DefaultRouter()
@@ -14,5 +16,8 @@ router.register(r"evidence", EvidenceViewSet, basename="evidence")
 router.register(r"task-completed", TaskCompletedViewSet, basename="task-completed")
 router.register(r"material-used", MaterialUsedViewSet, basename="material-used")
 
-urlpatterns = router.urls
+urlpatterns = [
+    # SSE (solo ASGI): fuera del router para no chocar con visit/<pk>/
+    path("visit-events/", visit_events, name="visit-events"),
+] + router.urls
 
@@ -33,3 +33,42 @@ def ensure_active_subscription(serializer=None, instance=None, subscription_over
         return
     if not getattr(sub, "active", True):
         raise ValidationError({"subscription": "La suscripción seleccionada está inactiva y no puede usarse en visitas."})
+
+# Campos que pueden crear un choque de horario: (campo del serializer, atributo de la instancia)
+SCHEDULE_FIELDS = (("start", "start"), ("end", "end"), ("user", "user_id"), ("status", "status"))
+
+def ensure_no_schedule_conflict(serializer, instance=None):
+    """
+    Bloquea visitas que se cruzan con otra del mismo técnico (activa y no cancelada).
+    Una consulta sobre el índice (user, start, end), con la fila del técnico bloqueada:
+    llamar dentro de la misma transacción que el save(). En update solo corre (y solo
+    bloquea) si cambia el horario, el técnico o el estado: editar notas de una visita
+    que ya se cruzaba con otra sigue permitido.
+    """
+    from visits.models import Visit
+    from visits.scheduling import lock_technician, overlapping_visits
+
+    data = serializer.validated_data
+    if instance is not None and not any(
+        field in data and getattr(data[field], "pk", data[field]) != getattr(instance, attname)
+        for field, attname in SCHEDULE_FIELDS
+    ):
+        return
+    status_ = data.get("status", getattr(instance, "status", None))
+    if status_ == Visit.Status.CANCELED:
+        return
+
+    user = data.get("user", getattr(instance, "user", None))
+    start = data.get("start", getattr(instance, "start", None))
+    end = data.get("end", getattr(instance, "end", None))
+    if user is None or start is None:
+        return
+
+    lock_technician(user.pk)
+    clash = (
+        overlapping_visits(user.pk, start, end, exclude_pk=getattr(instance, "pk", None))
+        .values_list("id", flat=True)
+        .first()
+    )
+    if clash:
+        raise ValidationError({"start": f"El técnico ya tiene la visita #{clash} en ese horario."})
@@ -4,6 +4,7 @@ from .assessments import AssessmentViewSet
 from .evidences import EvidenceViewSet
 from .tasks_completed import TaskCompletedViewSet
 from .materials_used import MaterialUsedViewSet
+from .events import visit_events
 
 __all__ = [
     "VisitViewSet",
@@ -11,4 +12,5 @@ __all__ = [
     "EvidenceViewSet",
     "TaskCompletedViewSet",
     "MaterialUsedViewSet",
+    "visit_events",
 ]
@@ -5,6 +5,8 @@ from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import viewsets, permissions, decorators, response, status, filters
 
+from core.pagination import unpaginated_response
+
 from ..models import Visit, Assessment
 from ..serializers import AssessmentSerializer
 
@@ -40,7 +42,7 @@ class AssessmentViewSet(viewsets.ModelViewSet):
     def restore(self, request, pk=None):
         obj = self.get_object()
         obj.active = True
-        obj.save(update_fields=["active"])
+        obj.save(update_fields=["active", "updated_at"])
         return response.Response({"detail": "Assessment restored"}, status=status.HTTP_200_OK)
 
     @decorators.action(detail=False, methods=["get", "post"], url_path=r"by-visit/(?P<visit_id>\d+)",
@@ -89,5 +91,4 @@ class AssessmentViewSet(viewsets.ModelViewSet):
         if page is not None:
             ser = AssessmentSerializer(page, many=True, context={"request": request})
             return self.get_paginated_response(ser.data)
-        ser = AssessmentSerializer(qs, many=True, context={"request": request})
-        return response.Response(ser.data, status=status.HTTP_200_OK)
+        return unpaginated_response(qs, AssessmentSerializer, {"request": request})
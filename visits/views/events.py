@@ -0,0 +1,76 @@
+# visits/views/events.py
+"""
+GET /api/visit-events/ — stream SSE de cambios de estado de visitas.
+
+Vista async de Django (no DRF: DRF no soporta respuestas async) y solo bajo
+ASGI; en WSGI cada conexión abierta ocuparía un worker completo.
+
+Filtros: ?technician=<id>, ?customer=<id>, ?visit=<id>.
+Reanudación: cabecera Last-Event-ID (la manda EventSource) o ?last_event_id=.
+Auth: JWT en Authorization: Bearer ... o, desde EventSource (no permite cabeceras),
+?stream_token= pedido antes a POST /api/visit/events-token/ (ver visits/events.py).
+"""
+import os
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+
+from visits.events import event_stream, stream_token_user
+
+DISABLE_AUTH = os.getenv("DISABLE_AUTH", "0") == "1"
+
+FILTER_PARAMS = ("technician", "customer", "visit")
+
+
+def _authenticate(raw_token):
+    auth = JWTAuthentication()
+    try:
+        user = auth.get_user(auth.get_validated_token(raw_token))
+    except (InvalidToken, TokenError):
+        return None
+    return user if user.is_active else None
+
+
+def _request_user(request):
+    header = request.headers.get("Authorization", "")
+    if header.startswith("Bearer "):
+        return _authenticate(header[len("Bearer "):].strip())
+    token = request.GET.get("stream_token")
+    return stream_token_user(token) if token else None
+
+
+def _int_param(value, name):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"'{name}' debe ser un entero.")
+
+
+async def visit_events(request):
+    if request.method != "GET":
+        return JsonResponse({"detail": "Método no permitido."}, status=405)
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({"detail": "El feed de eventos solo está disponible bajo ASGI."}, status=501)
+
+    if not DISABLE_AUTH:
+        user = await sync_to_async(_request_user)(request)
+        if user is None:
+            return JsonResponse({"detail": "Credenciales no válidas o ausentes."}, status=401)
+
+    try:
+        filters = {
+            name: _int_param(request.GET[name], name)
+            for name in FILTER_PARAMS if request.GET.get(name)
+        }
+        last_id = request.headers.get("Last-Event-ID") or request.GET.get("last_event_id")
+        last_id = _int_param(last_id, "last_event_id") if last_id else None
+    except ValueError as e:
+        return JsonResponse({"detail": str(e)}, status=400)
+
+    resp = StreamingHttpResponse(event_stream(filters, last_id), content_type="text/event-stream")
+    resp["Cache-Control"] = "no-cache"
+    resp["X-Accel-Buffering"] = "no"  # nginx: no acumular el stream
+    return resp
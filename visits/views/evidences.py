@@ -4,8 +4,10 @@ from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import viewsets, permissions, decorators, response, status, filters
 
+from core.fastserializers import ValuesListMixin
+
 from ..models import Visit, Evidence
-from ..serializers import EvidenceSerializer
+from ..serializers import EvidenceSerializer, EvidenceValuesSerializer
 
 DISABLE_AUTH = os.getenv("DISABLE_AUTH", "0") == "1"
 
@@ -15,9 +17,10 @@ def _actor_or_none(request):
     return u if (u and getattr(u, "is_authenticated", False)) else None
 
 
-class EvidenceViewSet(viewsets.ModelViewSet):
+class EvidenceViewSet(ValuesListMixin, viewsets.ModelViewSet):
     queryset = Evidence.active_objects.select_related("visit").all().order_by("-subido_en", "id")
     serializer_class = EvidenceSerializer
+    values_serializer_class = EvidenceValuesSerializer  # GET list / by-* (core/fastserializers.py)
     permission_classes = [permissions.AllowAny] if DISABLE_AUTH else [permissions.IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ["visit"]
@@ -42,7 +45,7 @@ class EvidenceViewSet(viewsets.ModelViewSet):
     def restore(self, request, pk=None):
         obj = self.get_object()
         obj.active = True
-        obj.save(update_fields=["active"])
+        obj.save(update_fields=["active", "updated_at"])
         return response.Response({"detail": "Evidence restored"}, status=status.HTTP_200_OK)
 
     # by-visit (GET lista / POST sube)
@@ -53,12 +56,7 @@ class EvidenceViewSet(viewsets.ModelViewSet):
 
         if request.method.lower() == "get":
             qs = Evidence.active_objects.filter(visit=visit).order_by("-subido_en", "id")
-            page = self.paginate_queryset(qs)
-            if page is not None:
-                ser = EvidenceSerializer(page, many=True, context={"request": request})
-                return self.get_paginated_response(ser.data)
-            ser = EvidenceSerializer(qs, many=True, context={"request": request})
-            return response.Response(ser.data, status=status.HTTP_200_OK)
+            return self.values_list_response(qs)
 
         ser = EvidenceSerializer(data=request.data, context={"request": request})
         ser.is_valid(raise_exception=True)
@@ -78,11 +76,5 @@ class EvidenceViewSet(viewsets.ModelViewSet):
     def by_customer(self, request, customer_id=None):
         qs = (Evidence.active_objects
               .filter(visit__subscription__customer_id=customer_id)
-              .select_related("visit")
               .order_by("-subido_en", "id"))
-        page = self.paginate_queryset(qs)
-        if page is not None:
-            ser = EvidenceSerializer(page, many=True, context={"request": request})
-            return self.get_paginated_response(ser.data)
-        ser = EvidenceSerializer(qs, many=True, context={"request": request})
-        return response.Response(ser.data, status=status.HTTP_200_OK)
+        return self.values_list_response(qs)
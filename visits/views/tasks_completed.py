@@ -4,6 +4,9 @@ from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import viewsets, permissions, decorators, response, status, filters
 
+from core.bulk import BulkWriteMixin
+from core.pagination import unpaginated_response
+
 from ..models import Visit, TaskCompleted
 from ..serializers import TaskCompletedSerializer
 
@@ -14,7 +17,7 @@ def _actor_or_none(request):
     return u if (u and getattr(u, "is_authenticated", False)) else None
 
 
-class TaskCompletedViewSet(viewsets.ModelViewSet):
+class TaskCompletedViewSet(BulkWriteMixin, viewsets.ModelViewSet):
     queryset = (
         TaskCompleted.active_objects
         .select_related("visit", "plan_task")
@@ -44,10 +47,11 @@ class TaskCompletedViewSet(viewsets.ModelViewSet):
     def restore(self, request, pk=None):
         obj = self.get_object()
         obj.active = True
-        obj.save(update_fields=["active"])
+        obj.save(update_fields=["active", "updated_at"])
         return response.Response({"detail": "TaskCompleted restored"}, status=status.HTTP_200_OK)
 
-    @decorators.action(detail=False, methods=["get", "post"], url_path=r"by-visit/(?P<visit_id>\d+)",
+    # by-visit (GET lista / POST objeto o arreglo / PATCH y DELETE masivos con arreglo)
+    @decorators.action(detail=False, methods=["get", "post", "patch", "delete"], url_path=r"by-visit/(?P<visit_id>\d+)",
                        permission_classes=[permissions.AllowAny] if DISABLE_AUTH else [permissions.IsAuthenticated])
     def by_visit(self, request, visit_id=None):
         visit = get_object_or_404(Visit.objects, pk=visit_id)
@@ -61,8 +65,15 @@ class TaskCompletedViewSet(viewsets.ModelViewSet):
             if page is not None:
                 ser = TaskCompletedSerializer(page, many=True, context={"request": request})
                 return self.get_paginated_response(ser.data)
-            ser = TaskCompletedSerializer(qs, many=True, context={"request": request})
-            return response.Response(ser.data, status=status.HTTP_200_OK)
+            return unpaginated_response(qs, TaskCompletedSerializer, {"request": request})
+
+        if request.method.lower() == "patch":
+            return self.bulk_update_items(request, request.data, TaskCompleted.active_objects.filter(visit=visit))
+        if request.method.lower() == "delete":
+            return self.bulk_soft_delete_items(request, request.data, TaskCompleted.active_objects.filter(visit=visit))
+        if isinstance(request.data, list):
+            items = [{**item, "visit": visit.pk} if isinstance(item, dict) else item for item in request.data]
+            return self.bulk_create_items(request, items, visit=visit)
 
         ser = TaskCompletedSerializer(data=request.data, context={"request": request})
         ser.is_valid(raise_exception=True)
@@ -87,5 +98,4 @@ class TaskCompletedViewSet(viewsets.ModelViewSet):
         if page is not None:
             ser = TaskCompletedSerializer(page, many=True, context={"request": request})
             return self.get_paginated_response(ser.data)
-        ser = TaskCompletedSerializer(qs, many=True, context={"request": request})
-        return response.Response(ser.data, status=status.HTTP_200_OK)
+        return unpaginated_response(qs, TaskCompletedSerializer, {"request": request})
@@ -1,19 +1,36 @@
 # visits/views/visits.py
 import os
-from django.utils import timezone
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.http import HttpResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils.http import parse_etags
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework import viewsets, permissions, decorators, response, status, filters
-from rest_framework.exceptions import ValidationError
+from rest_framework import viewsets, permissions, decorators, response, serializers, status, filters
+from rest_framework.exceptions import NotAuthenticated, PermissionDenied, ValidationError
 
+from core.fastserializers import ValuesListMixin
+from core.filters import IndexedSearchFilter
+
+from visits.agenda import (
+    agenda_window, agenda_queryset, agenda_rows, agenda_etag, ics_stream, feed_token, feed_token_user,
+)
 from visits.utils import send_visit_completed_email_async
 from visits.validations import (
     validate_visit_dates,
     ensure_active_user,
     ensure_active_subscription,
+    ensure_no_schedule_conflict,
 )
+from visits.checklist import build_checklists
+from visits.scheduling import find_conflicts
+from visits.transitions import apply_transition
+from visits.mutations import MutationBatch, validate_operations
+from visits.closeout import CloseOut
+from visits.events import record_status_change, stream_token, VISIT_EVENTS_TOKEN_TTL
 
 from ..models import Visit, Assessment
-from ..serializers import VisitSerializer, AssessmentSerializer
+from ..serializers import VisitSerializer, VisitValuesSerializer, AssessmentSerializer
 
 DISABLE_AUTH = os.getenv("DISABLE_AUTH", "0") == "1"
 
@@ -23,18 +40,20 @@ def _actor_or_none(request):
   return u if (u and getattr(u, "is_authenticated", False)) else None
 
 
-class VisitViewSet(viewsets.ModelViewSet):
+class VisitViewSet(ValuesListMixin, viewsets.ModelViewSet):
   queryset = (
     Visit.active_objects
-    .select_related("subscription", "user")
+    .select_related("subscription__customer", "subscription__plan", "user", "assessment")
     .prefetch_related("evidences", "tasks_completed", "materials_used")
     .all()
     .order_by("-start", "id")
   )
   serializer_class = VisitSerializer
+  values_serializer_class = VisitValuesSerializer  # GET list (core/fastserializers.py)
   permission_classes = [permissions.AllowAny] if DISABLE_AUTH else [permissions.IsAuthenticated]
-  filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+  filter_backends = [DjangoFilterBackend, IndexedSearchFilter, filters.OrderingFilter]
   filterset_fields = ["status", "subscription", "user", "start"]
+  search_kind = "visit"  # ?search= usa el índice global (core/search.py)
   search_fields = [
     "notes",
     "site_address",
@@ -48,6 +67,9 @@ class VisitViewSet(viewsets.ModelViewSet):
 
   def get_queryset(self):
     qs = super().get_queryset()
+    # En escrituras DRF descarta los hijos prefetcheados tras guardar: no los cargamos
+    if self.request.method not in permissions.SAFE_METHODS:
+      qs = qs.prefetch_related(None)
     sub_id = self.request.query_params.get("subscription")
     user_id = self.request.query_params.get("user")
     status_q = self.request.query_params.get("status")
@@ -69,11 +91,19 @@ class VisitViewSet(viewsets.ModelViewSet):
     save_kwargs = {}
     if actor:
       save_kwargs.update(created_by=actor, updated_by=actor)
-    serializer.save(**save_kwargs)
+
+    # Checklist del plan generado en el servidor solo a pedido (?checklist=1): los
+    # clientes que mandan sus propias tareas después no reciben uno duplicado
+    with transaction.atomic():
+      # chequeo de choques con el técnico bloqueado hasta el commit (ver scheduling.lock_technician)
+      ensure_no_schedule_conflict(serializer)
+      visit = serializer.save(**save_kwargs)
+      if self.request.query_params.get("checklist") in ("1", "true", "True"):
+        build_checklists([visit], actor=actor)
 
   # --- update (PUT/PATCH) ---
   def perform_update(self, serializer):
-    instance = self.get_object()
+    instance = serializer.instance  # ya cargado por DRF (get_object) en update()
     old_status = instance.status
 
     validate_visit_dates(serializer, instance=instance)
@@ -81,17 +111,24 @@ class VisitViewSet(viewsets.ModelViewSet):
     ensure_active_subscription(serializer, instance=instance)
 
     actor = _actor_or_none(self.request)
-    if actor:
-      serializer.save(updated_by=actor)
-    else:
-      serializer.save()
-
-    instance.refresh_from_db()
-    if old_status != instance.status and instance.status == Visit.Status.COMPLETED:
-      send_visit_completed_email_async(instance)
+    with transaction.atomic():
+      ensure_no_schedule_conflict(serializer, instance=instance)
+      if actor:
+        visit = serializer.save(updated_by=actor)
+      else:
+        visit = serializer.save()
+
+      # el evento se confirma (o se revierte) junto con el cambio de estado
+      if old_status != visit.status:
+        record_status_change(visit.pk, visit.status, visit.user_id, visit.subscription.customer_id)
+      if old_status != visit.status and visit.status == Visit.Status.COMPLETED:
+        transaction.on_commit(lambda: send_visit_completed_email_async(visit.pk))
 
   # ================= ACCIONES PERSONALIZADAS =================
 
+  # Las transiciones de estado son un UPDATE condicional (ver visits/transitions.py):
+  # no se usa get_object() para no cargar evidencias/tareas/materiales.
+
   @decorators.action(
     detail=True,
     methods=["post"],
@@ -99,22 +136,10 @@ class VisitViewSet(viewsets.ModelViewSet):
   )
   def start_now(self, request, pk=None):
     """
-    Marca la visita como 'in_progress'. Si no tiene start, lo fija a ahora.
+    Marca la visita como 'in_progress' (solo desde 'scheduled').
     """
-    obj = self.get_object()
-
-    if obj.status == Visit.Status.CANCELED:
-      return response.Response(
-        {"detail": "No se puede iniciar una visita cancelada"},
-        status=status.HTTP_400_BAD_REQUEST,
-      )
-
-    if not obj.start:
-      obj.start = timezone.now()
-    obj.status = Visit.Status.IN_PROGRESS
-    obj.save(update_fields=["start", "status"])
-
-    return response.Response({"detail": "Visit started"}, status=status.HTTP_200_OK)
+    state = apply_transition(pk, "start", actor=_actor_or_none(request))
+    return response.Response({"detail": "Visit started", **state}, status=status.HTTP_200_OK)
 
   @decorators.action(
     detail=True,
@@ -123,20 +148,32 @@ class VisitViewSet(viewsets.ModelViewSet):
   )
   def complete(self, request, pk=None):
     """
-    Marca la visita como 'completed' y dispara el correo al cliente.
+    Marca la visita como 'completed' (fija end si no tiene) y dispara el correo al cliente.
     """
-    obj = self.get_object()
+    state = apply_transition(pk, "complete", actor=_actor_or_none(request))
 
-    # si no tiene end, se cierra ahora
-    if not obj.end:
-      obj.end = timezone.now()
-    obj.status = Visit.Status.COMPLETED
-    obj.save(update_fields=["end", "status"])
+    # dispara correo asíncrono (después del commit)
+    transaction.on_commit(lambda: send_visit_completed_email_async(state["id"]))
 
-    # dispara correo asíncrono
-    send_visit_completed_email_async(obj)
+    return response.Response({"detail": "Visit completed", **state}, status=status.HTTP_200_OK)
 
-    return response.Response({"detail": "Visit completed"}, status=status.HTTP_200_OK)
+  @decorators.action(
+    detail=True,
+    methods=["post"],
+    url_path="close-out",
+    url_name="close-out",
+    permission_classes=[permissions.AllowAny] if DISABLE_AUTH else [permissions.IsAuthenticated],
+  )
+  def close_out(self, request, pk=None):
+    """
+    POST /api/visit/<id>/close-out/  {tasks, materials, assessment, evidences, notes}
+    Cierra la visita en una sola transacción (ver visits/closeout.py); el correo
+    se envía después del commit, con todos los hijos ya guardados.
+    """
+    if not str(pk).isdigit():
+      raise ValidationError({"id": "Debe ser un id numérico."})
+    data = CloseOut(pk, request.data, request, actor=_actor_or_none(request)).apply()
+    return response.Response(data, status=status.HTTP_200_OK)
 
   @decorators.action(
     detail=True,
@@ -145,35 +182,181 @@ class VisitViewSet(viewsets.ModelViewSet):
   )
   def cancel(self, request, pk=None):
     """
-    Cancela la visita, guardando el motivo si viene en el body.
+    Cancela la visita, guardando el motivo si viene en el body (fija end si no tiene).
     """
-    obj = self.get_object()
     reason = (request.data.get("cancel_reason") or "").strip()
+    state = apply_transition(pk, "cancel", actor=_actor_or_none(request), reason=reason)
+    return response.Response({"detail": "Visit canceled", **state}, status=status.HTTP_200_OK)
 
-    obj.status = Visit.Status.CANCELED
-    obj.cancel_reason = reason
-    # si quieres cerrar la visita al cancelar:
-    if not obj.end:
-      obj.end = timezone.now()
+  @decorators.action(
+    detail=True,
+    methods=["post"],
+    permission_classes=[permissions.AllowAny] if DISABLE_AUTH else [permissions.IsAuthenticated],
+  )
+  def restore(self, request, pk=None):
+    """
+    Vuelve a poner una visita cancelada en 'scheduled' y limpia el motivo de cancelación.
+    """
+    state = apply_transition(pk, "restore", actor=_actor_or_none(request))
+    return response.Response({"detail": "Visit restored", **state}, status=status.HTTP_200_OK)
+
+  @decorators.action(
+    detail=False,
+    methods=["post"],
+    permission_classes=[permissions.AllowAny] if DISABLE_AUTH else [permissions.IsAuthenticated],
+  )
+  def mutations(self, request):
+    """
+    POST /api/visit/mutations/  {"operations": [{key, op, ...}], "continue_on_error": false}
+    Cola offline del técnico en una sola petición y una sola transacción
+    (ver visits/mutations.py). Responde un resultado por operación.
+    """
+    operations = validate_operations(request.data)
+    batch = MutationBatch(request, actor=_actor_or_none(request))
+    try:
+      continue_on_error = serializers.BooleanField().to_internal_value(
+        request.data.get("continue_on_error", False)
+      )
+    except ValidationError as exc:
+      raise ValidationError({"continue_on_error": exc.detail})
+    results = batch.run(operations, continue_on_error=continue_on_error)
+    return response.Response({"results": results}, status=status.HTTP_200_OK)
 
-    obj.save(update_fields=["status", "cancel_reason", "end"])
+  @decorators.action(
+    detail=False,
+    methods=["get"],
+    permission_classes=[permissions.AllowAny] if DISABLE_AUTH else [permissions.IsAuthenticated],
+  )
+  def conflicts(self, request):
+    """
+    GET /api/visit/conflicts/?from=AAAA-MM-DD&to=AAAA-MM-DD[&user=<id>]
+    Reporte de choques de horario (una consulta + barrido lineal por técnico).
+    """
+    start, end = agenda_window(request.query_params)
+    user_id = request.query_params.get("user")
+    if user_id and not user_id.isdigit():
+      raise ValidationError({"user": "Debe ser un id numérico."})
+    data = find_conflicts(start, end, user_id=int(user_id) if user_id else None)
+    return response.Response(
+      {"from": start, "to": end, "count": len(data), "results": data},
+      status=status.HTTP_200_OK,
+    )
+
+  # ================= AGENDA DEL TÉCNICO =================
+
+  def _agenda_user_id(self, request):
+    user_id = request.query_params.get("user")
+    if user_id:
+      if not user_id.isdigit():
+        raise ValidationError({"user": "Debe ser un id numérico."})
+      return int(user_id)
+    actor = _actor_or_none(request)
+    if actor is None:
+      raise ValidationError({"user": "Este parámetro es requerido (?user=<id>)."})
+    return actor.pk
 
-    return response.Response({"detail": "Visit canceled"}, status=status.HTTP_200_OK)
+  @decorators.action(
+    detail=False,
+    methods=["get"],
+    permission_classes=[permissions.AllowAny] if DISABLE_AUTH else [permissions.IsAuthenticated],
+  )
+  def agenda(self, request):
+    """
+    GET /api/visit/agenda/?user=<id>&from=AAAA-MM-DD&to=AAAA-MM-DD
+    Vista ligera (sin hijos) de las visitas del técnico en la ventana.
+    Por defecto: usuario autenticado, hoy .. +7 días.
+    """
+    user_id = self._agenda_user_id(request)
+    start, end = agenda_window(request.query_params)
+    qs = agenda_queryset(user_id, start, end)
+    return response.Response(
+      {"user": user_id, "from": start, "to": end, "results": list(agenda_rows(qs))},
+      status=status.HTTP_200_OK,
+    )
 
   @decorators.action(
-    detail=True,
+    detail=False,
     methods=["post"],
+    url_path="events-token",
+    url_name="events-token",
+    permission_classes=[permissions.IsAuthenticated],
+  )
+  def events_token(self, request):
+    """
+    POST /api/visit/events-token/
+    Token de vida corta para abrir el feed SSE desde EventSource, que no manda
+    cabeceras: /api/visit-events/?stream_token=<token>. Al expirar se pide otro.
+    """
+    token = stream_token(request.user)
+    url = request.build_absolute_uri(reverse("visit-events")) + f"?stream_token={token}"
+    return response.Response(
+      {"token": token, "expires_in": VISIT_EVENTS_TOKEN_TTL, "url": url}, status=status.HTTP_200_OK
+    )
+
+  @decorators.action(
+    detail=False,
+    methods=["get"],
+    url_path="agenda/ics-token",
+    url_name="agenda-ics-token",
     permission_classes=[permissions.AllowAny] if DISABLE_AUTH else [permissions.IsAuthenticated],
   )
-  def restore(self, request, pk=None):
+  def agenda_ics_token(self, request):
     """
-    Vuelve a poner la visita en 'scheduled' y limpia el motivo de cancelación.
+    GET /api/visit/agenda/ics-token/[?user=<id>]
+    URL del feed .ics con token firmado, para suscribirse desde una app de calendario.
+    Cada técnico pide la suya; ?user= de otro técnico solo para staff.
     """
-    obj = self.get_object()
-    obj.status = Visit.Status.SCHEDULED
-    obj.cancel_reason = ""
-    obj.save(update_fields=["status", "cancel_reason"])
-    return response.Response({"detail": "Visit restored"}, status=status.HTTP_200_OK)
+    actor = _actor_or_none(request)
+    user_id = self._agenda_user_id(request)
+    if actor is not None and user_id != actor.pk and not actor.is_staff:
+      raise PermissionDenied("Solo staff puede pedir el feed de otro técnico.")
+    user = get_user_model().objects.filter(pk=user_id, is_active=True).first()
+    if user is None:
+      raise ValidationError({"user": "Usuario inexistente o inactivo."})
+    token = feed_token(user)
+    url = request.build_absolute_uri(reverse("visit-agenda-ics")) + f"?feed={token}"
+    return response.Response({"user": user.pk, "token": token, "url": url}, status=status.HTTP_200_OK)
+
+  @decorators.action(
+    detail=False,
+    methods=["get"],
+    url_path="agenda/ics",
+    url_name="agenda-ics",
+    permission_classes=[permissions.AllowAny],  # JWT o ?feed=<token> (se valida en la vista)
+  )
+  def agenda_ics(self, request):
+    """
+    GET /api/visit/agenda/ics/?feed=<token>&from=&to=   (apps de calendario)
+    GET /api/visit/agenda/ics/?user=<id>&from=&to=      (con JWT)
+    Feed iCalendar en streaming. Responde 304 si el ETag (If-None-Match) no cambió.
+    """
+    token = request.query_params.get("feed")
+    if token:
+      feed_user = feed_token_user(token)
+      if feed_user is None:
+        raise NotAuthenticated("Token de feed inválido o revocado.")
+      user_id = feed_user.pk
+    elif DISABLE_AUTH or _actor_or_none(request) is not None:
+      user_id = self._agenda_user_id(request)
+    else:
+      raise NotAuthenticated()
+    start, end = agenda_window(request.query_params)
+    qs = agenda_queryset(user_id, start, end)
+
+    etag = agenda_etag(qs)
+    if etag in parse_etags(request.headers.get("If-None-Match", "")):
+      not_modified = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+      not_modified["ETag"] = etag
+      return not_modified
+
+    resp = StreamingHttpResponse(
+      ics_stream(qs, calendar_name=f"Visitas técnico {user_id}"),
+      content_type="text/calendar; charset=utf-8",
+    )
+    resp["ETag"] = etag
+    resp["Cache-Control"] = "private, no-cache"
+    resp["Content-Disposition"] = f'inline; filename="agenda-{user_id}.ics"'
+    return resp
 
 
 # Si también usas Assessment, lo dejo como estaba (ajusta según tu proyecto):